@@ -0,0 +1,8 @@
+"""
+Conversion of the attrs and states attributes of the views of Odoo addons to the attributes of Odoo 17, replacement of
+their tree views by list views and update of their manifests, run by replace_attrs.py
+"""
+from .convert import convert_document
+from .domains import DomainSyntaxError, parse_attrs
+from .processing import convert_file, convert_xml_file
+from .rules import CONVERSION_RULES, ConversionContext, ConversionRule, register_conversion_rule
@@ -0,0 +1,246 @@
+"""
+Caches of the conversion: the domain cache of the converted attrs values, and the conversion cache of the outcome
+of each file, reused by the next runs
+"""
+import hashlib
+import json
+import mmap
+import os
+from collections import OrderedDict
+
+from .domains import NEW_ATTRS, normalize_attrs_text, parse_attrs, stringify_attr
+from . import simplify
+from .simplify import simplify_expression
+from .stats import RUN_STATS
+from . import verify
+
+
+# Version of the conversion output, to increase whenever a change in the conversion gives different results for the
+# same file, so that the outcomes recorded in conversion caches by previous versions aren't reused
+CONVERTER_VERSION = 4
+
+
+def compile_new_attrs(attrs):
+    """
+    Converts an attrs dictionary into the separate attribute conditions, without going through the DOMAIN_CACHE
+
+    :param str attrs:
+    :rtype: dict[bool|str|int]
+    :raises DomainSyntaxError: if the attrs value is not a valid attrs dictionary
+    """
+    new_attrs = {}
+    attrs = attrs.replace("&lt;", "<").replace("&gt;", ">").strip()
+    if attrs:
+        # attrs can be an empty value, which has nothing to convert
+        for attr, attr_value in parse_attrs(attrs).items():
+            if attr not in NEW_ATTRS:
+                # We don't know what to do with attributes not in NEW_ATTR, so the user will have to process those
+                # manually when checking the differences post-conversion
+                continue
+            new_attrs[attr] = simplify_expression(stringify_attr(attr_value))
+    return new_attrs
+
+
+class DomainCache:
+    """
+    Bounded LRU cache of converted attrs values, keyed by their normalized text, that can be saved to a file
+    """
+
+    def __init__(self, maxsize=65536):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.new_entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, attrs):
+        """
+        :param str attrs:
+        :returns: the result of compile_new_attrs() for the given attrs
+        :rtype: dict[bool|str|int]
+        """
+        key = normalize_attrs_text(attrs)
+        if (new_attrs := self.entries.get(key)) is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        else:
+            self.misses += 1
+            with RUN_STATS.phase('domains'):
+                new_attrs = compile_new_attrs(attrs)
+            self.put(key, new_attrs)
+            self.new_entries[key] = new_attrs
+        # Copy so callers can't alter the cached value
+        return dict(new_attrs)
+
+    def put(self, key, new_attrs):
+        self.entries[key] = new_attrs
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def pop_updates(self):
+        """
+        :returns: the entries computed and the hits and misses counted since the previous call
+        :rtype: (dict[str, dict], int, int)
+        """
+        updates = self.new_entries, self.hits, self.misses
+        self.new_entries = {}
+        self.hits = self.misses = 0
+        return updates
+
+    def merge_updates(self, updates):
+        """
+        :param (dict[str, dict], int, int) updates: result of pop_updates() in another process
+        """
+        new_entries, hits, misses = updates
+        for key, new_attrs in new_entries.items():
+            self.put(key, new_attrs)
+        self.hits += hits
+        self.misses += misses
+
+    def load(self, path):
+        """
+        :param str path: file written by save(), entries written by another CONVERTER_VERSION or with another
+            SIMPLIFY_EXPRESSIONS are ignored
+        """
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CONVERTER_VERSION and data.get('simplify', True) == simplify.SIMPLIFY_EXPRESSIONS:
+                for key, new_attrs in data.get('domains', {}).items():
+                    self.put(key, new_attrs)
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError) as e:
+            print(f"Warning: Ignoring invalid domain cache {path}: {e}")
+
+    def save(self, path):
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CONVERTER_VERSION, 'simplify': simplify.SIMPLIFY_EXPRESSIONS, 'domains': self.entries}, f, indent=0)
+        os.replace(temporary_path, path)
+
+
+DOMAIN_CACHE = DomainCache()
+
+
+def get_new_attrs(attrs):
+    """
+    Converts an attrs dictionary into the separate attribute conditions, reusing the conversion of identical attrs
+    values from the DOMAIN_CACHE
+
+    :param str attrs:
+    :rtype: dict[bool|str|int]
+    """
+    new_attrs = DOMAIN_CACHE.get(attrs)
+    if verify.DOMAIN_VERIFIER.enabled:
+        verify.DOMAIN_VERIFIER.verify(attrs, new_attrs)
+    return new_attrs
+
+
+def get_file_fingerprint(file_path, contents=None):
+    """
+    :param str file_path:
+    :param bytes contents: contents of the file if they are already known, else the file is hashed without being
+        loaded in memory
+    :returns: size, modification time in nanoseconds and SHA-1 hash of the contents of the file
+    :rtype: (int, int, str)
+    """
+    stat = os.stat(file_path)
+    if contents is None:
+        with open(file_path, 'rb') as f:
+            if stat.st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                    sha1 = hashlib.sha1(mapped_file).hexdigest()
+            else:
+                sha1 = hashlib.sha1(b'').hexdigest()
+    else:
+        sha1 = hashlib.sha1(contents).hexdigest()
+    return stat.st_size, stat.st_mtime_ns, sha1
+
+
+class ConversionCache:
+    """
+    Persistent outcome of the conversion of each file, skipping the files that didn't change since
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: path of the cache file, its entries are loaded if it exists
+        """
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == CONVERTER_VERSION:
+                self.entries = data.get('files', {})
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError) as e:
+            print(f"Warning: Ignoring invalid conversion cache {path}: {e}")
+
+    def get_key(self, file_path):
+        """
+        Files are keyed by path relative to the cache file, so the cache stays valid when the whole directory is moved
+        """
+        return os.path.relpath(os.path.abspath(file_path), self.directory)
+
+    def lookup(self, file_path):
+        """
+        :param str file_path:
+        :returns: the recorded outcome and reason if the file didn't change since they were recorded, else None
+        :rtype: None|(str, None|str)
+        """
+        key = self.get_key(file_path)
+        entry = self.entries.get(key)
+        outcome = None
+        try:
+            if entry is not None:
+                stat = os.stat(file_path)
+                if stat.st_size == entry['size']:
+                    if stat.st_mtime_ns == entry['mtime_ns']:
+                        outcome = entry['outcome'], entry.get('reason')
+                    elif get_file_fingerprint(file_path)[2] == entry['sha1']:
+                        # Touched (e.g. by a checkout) but not modified
+                        entry['mtime_ns'] = stat.st_mtime_ns
+                        outcome = entry['outcome'], entry.get('reason')
+        except OSError:
+            pass
+        if outcome is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return outcome
+
+    def record(self, file_path, outcome, fingerprint, reason=None):
+        """
+        :param str file_path:
+        :param str outcome: 'converted', 'unchanged' or 'failed'
+        :param (int, int, str) fingerprint: result of get_file_fingerprint() for the current contents of the file
+        :param str reason: reason of the failure
+        """
+        size, mtime_ns, sha1 = fingerprint
+        entry = {'outcome': outcome, 'size': size, 'mtime_ns': mtime_ns, 'sha1': sha1}
+        if reason is not None:
+            entry['reason'] = reason
+        self.entries[self.get_key(file_path)] = entry
+
+    def refresh(self, file_path, fingerprint):
+        """
+        Keeps the recorded outcome of a file rewritten by another pass, which doesn't change its attrs and states
+
+        :param str file_path:
+        :param (int, int, str) fingerprint: result of get_file_fingerprint() for the new contents of the file
+        """
+        if (entry := self.entries.get(self.get_key(file_path))) is not None:
+            entry['size'], entry['mtime_ns'], entry['sha1'] = fingerprint
+
+    def save(self):
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CONVERTER_VERSION, 'files': self.entries}, f, indent=0, sort_keys=True)
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,297 @@
+"""
+Census of the attrs/states usage of a repository, without converting anything
+"""
+import csv
+import os
+import re
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+from .cache import CONVERTER_VERSION, DOMAIN_CACHE
+from .domains import DomainLeaf, DomainSyntaxError, NEW_ATTRS, parse_attrs
+from .files import read_file
+from . import modules
+from .processing import init_worker
+from .reports import print_banner, write_run_report
+from .rules import CONVERSION_RULES, ConversionContext, find_converted_nodes
+from . import simplify
+from .stats import RUN_STATS
+from . import verify
+from . import views
+
+
+# Counters of the census of each module:
+#   - files: view files with attrs or states attributes or overrides
+#   - attrs_tags, attrs_overrides, states_tags, states_overrides: nodes of each conversion rule
+#   - domains: domains of the attrs values, unsupported_operators: their child_of and parent_of terms, like_wildcards:
+#     their like terms with _ or % wildcards, that the conversion fails on
+#   - invalid_attrs: attrs values that can't be parsed
+#   - todos: TODO comments the conversion adds, failed_files: files the conversion fails on
+CENSUS_COUNTERS = ['files', 'attrs_tags', 'attrs_overrides', 'states_tags', 'states_overrides', 'domains', 'invalid_attrs',
+                   'unsupported_operators', 'like_wildcards', 'todos', 'failed_files']
+UNSUPPORTED_OPERATORS = {'child_of', 'parent_of'}
+LIKE_WILDCARD_REGEX = re.compile(r"[_%]")
+TODO_COMMENTS_XPATH = etree.XPath("count(//comment()[starts-with(., 'TODO')])")
+# census_attrs() of the attrs values already counted by the process
+ATTRS_CENSUS_CACHE = {}
+# Census of a view file: counters (see CENSUS_COUNTERS), and histograms of the operators of the domains, of the
+# attributes of the attrs values and of the TODO comments added by each conversion rule, and the error of the
+# conversion if it fails
+FileCensus = namedtuple('FileCensus', ['file_path', 'counters', 'operators', 'attributes', 'todos', 'error'])
+
+
+def census_attrs(attrs):
+    """
+    Counts the attributes of an attrs value and the operators of its domains, once per distinct attrs value of the
+    process
+
+    :param str attrs:
+    :returns: counters (see CENSUS_COUNTERS), and histograms of the operators and of the attributes of the attrs value
+    :rtype: (collections.Counter, collections.Counter, collections.Counter)
+    """
+    if (census := ATTRS_CENSUS_CACHE.get(attrs)) is not None:
+        return census
+    counters, operators, attributes = census = Counter(), Counter(), Counter()
+    ATTRS_CENSUS_CACHE[attrs] = census
+    text = attrs.replace("&lt;", "<").replace("&gt;", ">").strip()
+    if not text:
+        return census
+    try:
+        parsed_attrs = parse_attrs(text)
+    except DomainSyntaxError:
+        counters['invalid_attrs'] += 1
+        return census
+    for attr, attr_value in parsed_attrs.items():
+        attributes[attr] += 1
+        if attr not in NEW_ATTRS or type(attr_value) is not list:
+            continue
+        counters['domains'] += 1
+        for leaf in attr_value:
+            if type(leaf) is not DomainLeaf:
+                continue
+            operators[leaf.operator] += 1
+            if leaf.operator in UNSUPPORTED_OPERATORS:
+                counters['unsupported_operators'] += 1
+            elif 'like' in leaf.operator and type(leaf.right) is str and LIKE_WILDCARD_REGEX.search(leaf.right):
+                counters['like_wildcards'] += 1
+    return census
+
+
+def census_file(file_path):
+    """
+    Counts what the conversion of a view file converts, by converting it in memory without serializing nor writing
+    anything
+
+    :param str file_path:
+    :returns: None if the file has no attrs or states attribute or override
+    :rtype: None|FileCensus
+    """
+    counters, operators, attributes, todos = Counter(), Counter(), Counter(), Counter()
+    try:
+        contents = read_file(file_path, prefilter=True)
+        if contents is None:
+            return None
+        doc = etree.fromstring(contents)
+    except (OSError, etree.XMLSyntaxError) as e:
+        counters['failed_files'] += 1
+        return FileCensus(file_path, counters, operators, attributes, todos, str(e))
+    converted_nodes = find_converted_nodes(doc)
+    if not any(converted_nodes.values()):
+        return None
+    counters['files'] += 1
+    for rule in CONVERSION_RULES:
+        counters[rule.name] += len(converted_nodes[rule.name])
+    attrs_values = [node.get('attrs') for node in converted_nodes.get('attrs_tags', ())]
+    attrs_values += [node.text or '' for node in converted_nodes.get('attrs_overrides', ())]
+    for attrs, occurrences in Counter(attrs_values).items():
+        for file_histogram, attrs_histogram in zip((counters, operators, attributes), census_attrs(attrs)):
+            for name, count in attrs_histogram.items():
+                file_histogram[name] += count * occurrences
+
+    # The rules are applied one at a time, like convert_document() does, to count the TODO comments each one adds
+    context = ConversionContext(doc, views.VIEW_INDEX, views.VIEW_INDEX.get_module(file_path))
+    file_todos = Counter()
+    todo_count = TODO_COMMENTS_XPATH(doc)
+    try:
+        for rule in CONVERSION_RULES:
+            rule.convert(converted_nodes[rule.name], context)
+            file_todos[rule.name] += int(TODO_COMMENTS_XPATH(doc) - todo_count)
+            todo_count = TODO_COMMENTS_XPATH(doc)
+    except Exception as e:
+        # The file is left as is by the conversion, without any TODO comment
+        counters['failed_files'] += 1
+        return FileCensus(file_path, counters, operators, attributes, todos, str(e))
+    todos.update(+file_todos)
+    counters['todos'] += sum(file_todos.values())
+    return FileCensus(file_path, counters, operators, attributes, todos, None)
+
+
+def iter_census_files(files, jobs=1):
+    """
+    Yields the census_file() of every file, in the same order as the given files, in a pool of worker processes with
+    more than one job
+
+    :param list[str] files:
+    :param int jobs: number of worker processes, 0 to use one per CPU
+    :rtype: collections.abc.Iterator[None|FileCensus]
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(files) < 2:
+        yield from map(census_file, files)
+        return
+    chunksize = max(1, min(64, len(files) // (jobs * 4)))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(dict(DOMAIN_CACHE.entries), views.VIEW_INDEX, modules.MODULE_GRAPH, verify.DOMAIN_VERIFIER, simplify.SIMPLIFY_EXPRESSIONS)) as executor:
+        yield from executor.map(census_file, files, chunksize=chunksize)
+
+
+class Census:
+    """
+    Census of the attrs and states attributes of the views of a repository, aggregated by module, to size their
+    conversion before running it
+    """
+
+    def __init__(self):
+        self.modules = {}
+        self.operators = Counter()
+        self.attributes = Counter()
+        self.todos = Counter()
+        self.failed = []
+        self.scanned_files = 0
+        self.scanned_bytes = 0
+
+    def add(self, file_census, module):
+        """
+        :param FileCensus file_census:
+        :param None|str module: module of the file, None if it's outside of any module
+        """
+        self.modules.setdefault(module or '', Counter()).update(file_census.counters)
+        self.operators.update(file_census.operators)
+        self.attributes.update(file_census.attributes)
+        self.todos.update(file_census.todos)
+        if file_census.error is not None:
+            self.failed.append((file_census.file_path, file_census.error))
+
+    def get_totals(self):
+        """
+        :returns: the counters of all the modules, see CENSUS_COUNTERS
+        :rtype: dict[str, int]
+        """
+        totals = Counter()
+        for counters in self.modules.values():
+            totals.update(counters)
+        return {name: totals[name] for name in CENSUS_COUNTERS}
+
+    def get_module_rows(self):
+        """
+        :returns: the counters of each module (see CENSUS_COUNTERS), the modules with the most converted nodes first,
+            files outside of any module being counted in the module ''
+        :rtype: list[(str, list[int])]
+        """
+        rows = [(module, [counters[name] for name in CENSUS_COUNTERS]) for module, counters in self.modules.items()]
+        return sorted(rows, key=lambda row: (-sum(row[1][1:5]), row[0]))
+
+    def get_report(self):
+        """
+        :returns: the census, to be dumped as JSON
+        :rtype: dict
+        """
+        return {
+            'scanned_files': self.scanned_files,
+            'scanned_bytes': self.scanned_bytes,
+            'totals': self.get_totals(),
+            'operators': dict(self.operators.most_common()),
+            'attributes': dict(self.attributes.most_common()),
+            'todos': dict(self.todos.most_common()),
+            'modules': {module: dict(zip(CENSUS_COUNTERS, row)) for module, row in self.get_module_rows()},
+            'failed_files': [{'file': file_path, 'reason': reason} for file_path, reason in self.failed],
+        }
+
+    def write_csv(self, path):
+        """
+        Writes the counters of each module as CSV, a row per module
+
+        :param str path:
+        """
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['module'] + CENSUS_COUNTERS)
+            for module, row in self.get_module_rows():
+                writer.writerow([module] + row)
+
+
+def run_census(root_dir, files_by_role, jobs=1, census_paths=None, view_index=True):
+    """
+    Prints the census of the views of the root directory, and writes it to the given files
+
+    :param str root_dir:
+    :param dict[str, list[str]] files_by_role: result of index_files() for the root directory
+    :param int jobs: see iter_census_files()
+    :param list[str] census_paths: files the census is written to, as CSV if they end with .csv, as JSON otherwise,
+        none to only print it
+    :param bool view_index: whether the views are indexed, to count the TODO comments like a run without --no-view-index
+    :returns: exit code, always 0 as nothing is converted
+    :rtype: int
+    """
+    start_time = time.perf_counter()
+    with RUN_STATS.phase('graph'):
+        modules.MODULE_GRAPH.build(files_by_role['manifest'])
+    views.VIEW_INDEX = views.ViewIndex()
+    if view_index:
+        with RUN_STATS.phase('index'):
+            views.VIEW_INDEX.build(files_by_role['manifest'], files_by_role['view_xml'] + files_by_role['xml'])
+    census = Census()
+    files = files_by_role['view_xml']
+    census.scanned_files = len(files)
+    for file_path in files:
+        try:
+            census.scanned_bytes += os.path.getsize(file_path)
+        except OSError:
+            pass
+    for file_census in iter_census_files(files, jobs):
+        if file_census is not None:
+            census.add(file_census, modules.MODULE_GRAPH.get_module(file_census.file_path))
+    wall_time = time.perf_counter() - start_time
+
+    totals = census.get_totals()
+    print_banner('Census of the attrs/states Attributes')
+    print(f"Scanned {census.scanned_files} view files ({census.scanned_bytes / 1024 / 1024:.1f} MB) in {wall_time:.2f}s, "
+          f"{totals['files']} with attrs or states attributes")
+    print('\nTags and overrides:')
+    for name in ('attrs_tags', 'attrs_overrides', 'states_tags', 'states_overrides'):
+        print(f"{name:<20} {totals[name]:>8}")
+    print(f"\nOperators of the {totals['domains']} domains ({totals['invalid_attrs']} invalid attrs values):")
+    for operator, count in census.operators.most_common():
+        print(f"{operator:<20} {count:>8}" + ('  (unsupported)' if operator in UNSUPPORTED_OPERATORS else ''))
+    print(f"{'like with wildcards':<20} {totals['like_wildcards']:>8}  (unsupported)")
+    print('\nAttributes of the attrs values:')
+    for attribute, count in census.attributes.most_common():
+        print(f"{attribute:<20} {count:>8}" + ('' if attribute in NEW_ATTRS else '  (left out by the conversion)'))
+    print(f"\nTODO comments added by the conversion: {totals['todos']}")
+    for rule_name, count in census.todos.most_common():
+        print(f"{rule_name:<20} {count:>8}")
+    print('\nModules:')
+    name_width = max([len('module')] + [len(module) for module in census.modules])
+    print(f"{'module':<{name_width}} " + ' '.join(f"{name:>{len(name)}}" for name in CENSUS_COUNTERS))
+    for module, row in census.get_module_rows():
+        print(f"{module or '-':<{name_width}} " + ' '.join(f"{value:>{len(name)}}" for name, value in zip(CENSUS_COUNTERS, row)))
+    print('\nFailed on files:')
+    for file_path, reason in census.failed:
+        print(file_path)
+        print('Reason: ', reason)
+    if not census.failed:
+        print('No files')
+
+    for census_path in census_paths or ():
+        try:
+            if census_path.endswith('.csv'):
+                census.write_csv(census_path)
+            else:
+                write_run_report(census_path, {'version': CONVERTER_VERSION, 'root': root_dir, 'wall_time': round(wall_time, 6),
+                                               **census.get_report()})
+            print(f"Census written to {census_path}")
+        except OSError as e:
+            print(f"Warning: Could not write the census {census_path}: {e}")
+    return 0
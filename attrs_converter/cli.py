@@ -0,0 +1,252 @@
+"""
+Command line of replace_attrs.py
+"""
+import argparse
+import math
+import os
+import time
+from pathlib import Path
+
+from .census import run_census
+from .files import CACHE_FILE_NAME, IGNORED_GLOBS, index_files
+from .modules import MANIFEST_AUTHOR, MANIFEST_VERSION
+from .processing import PASSES
+from .run import ConversionRun
+from .sharding import SHARD_KEYS, merge_results_files
+from . import simplify
+from .stats import RUN_STATS
+from .streaming import STREAM_THRESHOLD_MB
+from .watch import WATCH_POLL_INTERVAL, watch_files
+
+
+# verbose: every converted tag before and after its conversion, summary: only the summary of the run,
+# diff: a unified diff of every changed file in a patch file, jsonl: a JSON object per processed file
+OUTPUT_MODES = ['verbose', 'summary', 'diff', 'jsonl']
+
+
+def parse_passes(value):
+    """
+    :param str value: comma separated list of passes
+    :rtype: list[str]
+    """
+    passes = [p.strip() for p in value.split(',') if p.strip()]
+    if unknown_passes := [p for p in passes if p not in PASSES]:
+        raise argparse.ArgumentTypeError(f"unknown passes {unknown_passes}, choose among {', '.join(PASSES)}")
+    return passes
+
+
+def parse_shard(value):
+    """
+    :param str value: i/N, the shard to process among N shards, from 1 to N
+    :returns: index and count of the shards
+    :rtype: (int, int)
+    """
+    index, separator, count = value.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        index = count = 0
+    if not separator or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"invalid shard {value!r}, expected i/N with 1 <= i <= N, e.g. 1/4")
+    return index, count
+
+
+def parse_stream_threshold(value):
+    """
+    :param str value: size in MB, 0 to never stream
+    :returns: the size in bytes
+    :rtype: int
+    """
+    try:
+        size = float(value)
+    except ValueError:
+        size = -1
+    if not 0 <= size < math.inf or (size and int(size * 1024 * 1024) == 0):
+        raise argparse.ArgumentTypeError(f"invalid stream threshold {value!r}, expected 0 or a size of at least one byte in MB")
+    return int(size * 1024 * 1024)
+
+
+def get_argument_parser():
+    """
+    :rtype: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(description="Replace attrs and states attributes in Odoo XML views by their Odoo 17 equivalents. "
+                                                 "Anything that isn't given as an argument is asked interactively, unless --yes or --dry-run is used.")
+    parser.add_argument('root', nargs='?',
+                        help="Root directory to check (default: current directory)")
+    parser.add_argument('--passes', type=parse_passes,
+                        help=f"Comma separated passes to run among {', '.join(PASSES)} (default with --yes or --dry-run: attrs)")
+    parser.add_argument('-y', '--yes', action='store_true',
+                        help="Replace without asking for any confirmation")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Only report what would be replaced, without asking anything or writing any file")
+    parser.add_argument('--output', choices=OUTPUT_MODES, default='verbose',
+                        help="verbose: print every converted tag before and after its conversion (default), summary: "
+                             "only print the summary of the run, diff: write a unified diff of every changed file to a "
+                             "patch file, jsonl: write a JSON object per processed file")
+    parser.add_argument('--output-file', metavar='PATH',
+                        help="File the diff or jsonl output is written to (default: replace_attrs.patch or "
+                             "replace_attrs.jsonl in the current directory)")
+    parser.add_argument('--write-mode', choices=['full', 'splice'], default='full',
+                        help="full: serialize the whole converted XML files (default), splice: only rewrite the converted "
+                             "tags in the files, keeping the rest of them byte for byte")
+    parser.add_argument('--stream-threshold', type=parse_stream_threshold, default=str(STREAM_THRESHOLD_MB), metavar='MB',
+                        help="Size in MB from which XML files are converted while they are parsed, one record at a time, "
+                             "to bound the memory used (0 = never, default: %(default)s). Not used when each file is "
+                             "confirmed, with --output diff or --write-mode splice, that need the whole files in memory")
+    parser.add_argument('--manifest-version', default=MANIFEST_VERSION, metavar='VERSION',
+                        help=f"Version set in the manifests by the manifest pass, empty to leave it as is (default: {MANIFEST_VERSION})")
+    parser.add_argument('--manifest-author', default=MANIFEST_AUTHOR, metavar='AUTHOR',
+                        help="Author set in the manifests and added to their maintainers by the manifest pass, empty to "
+                             f"leave them as is (default: {MANIFEST_AUTHOR})")
+    parser.add_argument('--exclude', action='append', default=[], metavar='GLOB',
+                        help="Glob of paths relative to the root directory to skip, can be repeated (always skipped: "
+                             f"{', '.join(IGNORED_GLOBS)} and VCS, cache and dependency directories)")
+    parser.add_argument('--cache', metavar='PATH',
+                        help="Conversion cache file, recording the outcome of each file to skip it while it's unchanged on "
+                             f"the next runs (default: no cache), e.g. {CACHE_FILE_NAME} outside of the root directory")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Convert every file, without reading nor writing the --cache file")
+    parser.add_argument('--domain-cache', metavar='PATH',
+                        help="File to load converted attrs values from, and to save them to, so they are reused by the next runs")
+    parser.add_argument('--no-simplify', action='store_true',
+                        help="Don't simplify the converted conditions (constant folding, duplicate terms, merged "
+                             "comparisons of a same field), keeping them as they are converted from the domains")
+    parser.add_argument('--verify', action='store_true',
+                        help="Check that the expression each domain is converted to gives the same result as the domain, "
+                             "for all the values (or random samples of the values) of its fields around the constants "
+                             "it compares them with, and report the ones that don't with a counterexample")
+    parser.add_argument('--no-view-index', action='store_true',
+                        help="Don't index the views of the root directory, leaving a TODO comment on every attribute override "
+                             "whose attributes in the parent views have to be checked")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="Number of processes converting files in parallel (0 = one per CPU, default: 1)")
+    parser.add_argument('--io-threads', type=int, default=4, metavar='N',
+                        help="Number of threads reading files ahead while a single process converts them (0 = no read-ahead, default: 4)")
+    parser.add_argument('--watch', action='store_true',
+                        help="Once all the files are processed, keep watching the root directory and process the files "
+                             "as soon as they change (with inotify when available), until interrupted with Ctrl+C")
+    parser.add_argument('--poll', action='store_true',
+                        help=f"With --watch, check the files for changes every {WATCH_POLL_INTERVAL}s instead of using "
+                             "inotify, e.g. on network filesystems where inotify doesn't report the changes")
+    parser.add_argument('--census', action='store_true',
+                        help="Only count the attrs and states attributes of the views, the operators of their domains, the "
+                             "TODO comments their conversion would add and the files it would fail on, by module, "
+                             "converting the files in memory without writing anything (with --jobs processes)")
+    parser.add_argument('--census-file', action='append', metavar='PATH',
+                        help="File the census is written to, as CSV (a row per module) if it ends with .csv, as JSON "
+                             "otherwise, can be repeated (default: only printed)")
+    parser.add_argument('--shard', type=parse_shard, metavar='I/N',
+                        help="Only process the I-th of N disjoint slices of the files, assigned by a stable hash of their "
+                             "path, to split a run across machines, and write the results of the slice to the --results file")
+    parser.add_argument('--shard-by', choices=SHARD_KEYS, default='path',
+                        help="With --shard, hash the files by their path (default), or by their module to keep all the "
+                             "files of a module in the same shard")
+    parser.add_argument('--results', metavar='PATH',
+                        help="Write the succeeded and failed files of the run to this JSON file, with paths relative to "
+                             "the root directory (default with --shard: replace_attrs_shard_I_of_N.json in the current directory)")
+    parser.add_argument('--merge', nargs='+', metavar='RESULTS',
+                        help="Instead of processing files, merge the --results files of all the shards of a run into the "
+                             "summary of the whole run, written to the --results file if given")
+    parser.add_argument('--report', metavar='PATH',
+                        help="Write a JSON report of the run to this file: time spent in each phase and on each file, "
+                             "converted tags by category and cache hit rates")
+    parser.add_argument('--slowest', type=int, default=10, metavar='N',
+                        help="Number of slowest files listed in the report (default: 10)")
+    return parser
+
+
+def get_excluded_globs(exclude, cache_path, root_dir):
+    """
+    :param list[str] exclude: globs given with --exclude
+    :param str cache_path: --cache file, if any
+    :param str root_dir:
+    :returns: the globs of the paths to skip, with the cache file and its temporary copy if they're in the root directory
+    :rtype: list[str]
+    """
+    exclude = list(exclude)
+    if cache_path and not (relative_path := os.path.relpath(os.path.abspath(cache_path), os.path.abspath(root_dir))).startswith('..'):
+        exclude += [Path(relative_path).as_posix(), f"{Path(relative_path).as_posix()}.tmp"]
+    return exclude
+
+
+def ask_passes(passes, interactive):
+    """
+    Asks which passes to run before processing any file, as every file is read and written once for all passes
+
+    :param list[str] passes: passes given with --passes, None to ask which ones to run
+    :param bool interactive: whether to ask if the attrs conversion of each file is to be confirmed
+    :returns: the passes to run, and whether the attrs conversion of each file is to be confirmed
+    :rtype: (list[str], bool)
+    """
+    print("\n--- ATTRS/STATES CONVERSION IN VIEWS ---")
+    perform_attrs_states = passes is None or 'attrs' in passes
+    if not interactive or not perform_attrs_states:
+        autoreplace_attrs_states = 'y'
+    else:
+        autoreplace_attrs_states = input('Do you want to auto-replace attrs/states attributes? (y/n) (empty == no) : ') or 'n'
+
+    print("\n--- 'tree' to 'list' REPLACEMENT ---")
+    if passes is not None:
+        perform_tree_to_list = 'y' if 'tree' in passes else 'n'
+    else:
+        perform_tree_to_list = input("Do you want to replace 'tree' with 'list' in all files? (y/n) (empty == no) : ") or 'n'
+
+    print("\n--- ODOO 18 MANIFEST UPDATE ---")
+    if passes is not None:
+        perform_manifest_update = 'y' if 'manifest' in passes else 'n'
+    else:
+        perform_manifest_update = input("Do you want to update __manifest__.py files for Odoo 18 and set author? (y/n) (empty == no) : ") or 'n'
+
+    enabled_passes = []
+    if perform_attrs_states:
+        enabled_passes.append('attrs')
+    if perform_tree_to_list.lower()[0] == 'y':
+        enabled_passes.append('tree')
+    if perform_manifest_update.lower()[0] == 'y':
+        enabled_passes.append('manifest')
+    return enabled_passes, autoreplace_attrs_states.lower()[0] == 'n'
+
+
+def main(argv=None):
+    """
+    Command line entry point
+
+    :param list[str] argv: arguments, sys.argv[1:] when None
+    :returns: exit code, 1 if any file failed to convert or, with --verify, if any converted domain isn't equivalent,
+        2 if the results files given to --merge can't be merged
+    :rtype: int
+    """
+    args = get_argument_parser().parse_args(argv)
+    if args.merge:
+        return merge_results_files(args.merge, args.results)
+    simplify.SIMPLIFY_EXPRESSIONS = not args.no_simplify
+    interactive = not (args.yes or args.dry_run or args.census)
+    start_time = time.perf_counter()
+
+    root_dir = args.root
+    if root_dir is None and interactive:
+        root_dir = input('Enter root directory to check (empty for current directory) : ')
+    root_dir = root_dir or '.'
+    passes = args.passes
+    if passes is None and not interactive:
+        passes = ['attrs']
+    exclude = get_excluded_globs(args.exclude, args.cache, root_dir)
+    # A single traversal of the root directory feeds all passes
+    with RUN_STATS.phase('walk'):
+        files_by_role = index_files(root_dir, exclude)
+    if args.census:
+        return run_census(root_dir, files_by_role, args.jobs, args.census_file, view_index=not args.no_view_index)
+
+    run = ConversionRun(args, root_dir, *ask_passes(passes, interactive))
+    run.plan(files_by_role)
+    run.process_files(run.files_to_process)
+    if args.watch:
+        watch_files(root_dir, exclude, run.process_changed_files, poll=args.poll)
+    run.close()
+    run.print_summary()
+    if args.shard or args.results:
+        run.write_json(args.results or 'replace_attrs_shard_{}_of_{}.json'.format(*args.shard), run.get_results(), 'results')
+    if args.report:
+        run.write_json(args.report, run.get_report(passes, files_by_role, time.perf_counter() - start_time), 'run report')
+    return run.get_exit_code()
@@ -0,0 +1,271 @@
+"""
+Conversion of the attrs and states attributes and overrides of the documents, by the built-in conversion rules
+"""
+from lxml import etree
+
+from .cache import get_new_attrs
+from .domains import NEW_ATTRS
+from .rules import CONVERSION_RULES, ConversionContext, ConversionRule, find_converted_nodes, register_conversion_rule
+from .stats import RUN_STATS
+from .views import get_child_tag_at_index, get_combined_attribute_value, get_combined_invisible_condition, get_inherited_attributes, get_inherited_invisible_condition, get_inherited_missing_attributes, get_inherited_states, get_inherited_tag_type, get_parent_etree_node, get_sibling_attribute_tag_of_type, get_xmlid
+
+
+def convert_tags_with_attrs(tags_with_attrs, context):
+    """
+    Replaces the attrs attribute of the tags with the attributes it's converted to
+
+    :param list[xml.etree.ElementTree.Element] tags_with_attrs:
+    :param ConversionContext context:
+    :rtype: list[xml.etree.ElementTree.Element]
+    """
+    for tag in tags_with_attrs:
+        all_attributes = []
+        attrs = tag.get('attrs', '')
+        new_attrs = get_new_attrs(attrs)
+        for attr_name, attr_value in list(tag.attrib.items()):
+            if attr_name == 'attrs':
+                for new_attr, new_attr_value in new_attrs.items():
+                    if new_attr in tag.attrib:
+                        new_attr_value = get_combined_attribute_value(tag.attrib.get(new_attr), new_attr_value)
+                    all_attributes.append((new_attr, new_attr_value))
+            elif attr_name not in new_attrs:
+                all_attributes.append((attr_name, attr_value))
+        tag.attrib.clear()
+        tag.attrib.update(all_attributes)
+    return tags_with_attrs
+
+
+def convert_attribute_tags_with_attrs(attribute_tags_with_attrs, context):
+    """
+    Replaces the <attribute name="attrs"> overrides with overrides of the attributes they're converted to
+
+    :param list[xml.etree.ElementTree.Element] attribute_tags_with_attrs:
+    :param ConversionContext context:
+    :returns: the inserted overrides and TODO comments
+    :rtype: list[xml.etree.ElementTree.Element]
+    """
+    doc, view_index, module = context
+    attribute_tags_with_attrs_after = []
+    for attribute_tag in attribute_tags_with_attrs:
+        tag_type = get_inherited_tag_type(doc, attribute_tag)
+        tag_index, parent_tag, indent = get_parent_etree_node(doc, attribute_tag)
+        tail = attribute_tag.tail or ''
+        attrs = attribute_tag.text or ''
+        new_attrs = get_new_attrs(attrs)
+        inherited = get_inherited_attributes(view_index, module, attribute_tag)
+        attribute_tags_to_remove = []
+        for new_attr, new_attr_value in new_attrs.items():
+            if (separate_attr_tag := get_sibling_attribute_tag_of_type(doc, attribute_tag, new_attr)) is not None:
+                attribute_tags_to_remove.append(separate_attr_tag)
+                new_attr_value = get_combined_attribute_value(separate_attr_tag.text, new_attr_value)
+            inherited_states = None
+            if new_attr == 'invisible' and get_sibling_attribute_tag_of_type(doc, attribute_tag, 'states') is None:
+                # The states of the parent views are overridden by this invisible attribute, unless combined into it
+                inherited_states = get_inherited_states(inherited)
+                if inherited_states:
+                    new_attr_value = get_combined_invisible_condition(str(new_attr_value), inherited_states)
+            new_tag = etree.Element('attribute', attrib={
+                'name': new_attr
+            })
+            new_tag.text = str(new_attr_value)
+            new_tag.tail = indent
+            parent_tag.insert(tag_index, new_tag)
+            if new_attr == 'invisible' and inherited_states is None:
+                if get_sibling_attribute_tag_of_type(doc, new_tag, 'states') is None:
+                    todo_tag = etree.Comment(
+                        f"TODO: Result from 'attrs' -> 'invisible' conversion without also overriding 'states' attribute"
+                        f"{indent + (' ' * 5)}Check if this {tag_type + ' ' if tag_type else ''}tag contained a states attribute in any of the parent views, in which case it should be combined into this 'invisible' attribute"
+                        f"{indent + (' ' * 5)}(If any states attributes existed in parent views, they'll also be marked with a TODO)")
+                    todo_tag.tail = indent
+                    parent_tag.insert(tag_index, todo_tag)
+                    attribute_tags_with_attrs_after.append(todo_tag)
+                    tag_index += 1
+            attribute_tags_with_attrs_after.append(new_tag)
+            tag_index += 1
+        missing_attrs = []
+        if tag_type == 'field':
+            potentially_missing_attrs = NEW_ATTRS
+        else:
+            potentially_missing_attrs = ['invisible']
+        for missing_attr in potentially_missing_attrs:
+            if missing_attr not in new_attrs and get_sibling_attribute_tag_of_type(doc, attribute_tag, missing_attr) is None:
+                missing_attrs.append(missing_attr)
+        inherited_values = get_inherited_missing_attributes(inherited, missing_attrs) if missing_attrs else None
+        if inherited_values is not None:
+            # Only the attributes that the parent views had in their attrs still need to be overridden
+            for missing_attr, value in inherited_values.items():
+                new_tag = etree.Element('attribute', attrib={
+                    'name': missing_attr
+                })
+                if value:
+                    new_tag.text = value
+                new_tag.tail = indent
+                parent_tag.insert(tag_index, new_tag)
+                attribute_tags_with_attrs_after.append(new_tag)
+                tag_index += 1
+        elif missing_attrs:
+            if tag_type == 'field':
+                new_tag = etree.Comment(
+                    f"TODO: Result from converting 'attrs' attribute override without options for {missing_attrs} to separate attributes"
+                    f"{indent + (' ' * 5)}Remove redundant empty tags below for any of those attributes that are not present in the field tag in any of the parent views"
+                    f"{indent + (' ' * 5)}If someone later adds one of these attributes in the parent views, they would likely be unaware it's still overridden in this view, resulting in unexpected behaviour, which should be avoided")
+                new_tag.tail = indent
+                parent_tag.insert(tag_index, new_tag)
+                attribute_tags_with_attrs_after.append(new_tag)
+                tag_index += 1
+            else:
+                pass # Only invisible for non-field tags, no extra TODO needed if attrs dict didn't provide it
+            for missing_attr in missing_attrs:
+                new_tag = etree.Element('attribute', attrib={
+                    'name': missing_attr
+                })
+                new_tag.tail = indent
+                parent_tag.insert(tag_index, new_tag)
+                if missing_attr == 'invisible':
+                    if get_sibling_attribute_tag_of_type(doc, new_tag, 'states') is None:
+                        todo_tag = etree.Comment(
+                            f"TODO: Result from 'attrs' -> 'invisible' conversion without also overriding 'states' attribute"
+                            f"{indent + (' ' * 5)}Check if this {tag_type + ' ' if tag_type else ''}tag contained a states attribute in any of the parent views, that should be combined into this 'invisible' attribute"
+                            f"{indent + (' ' * 5)}(If any states attributes existed in parent views, they'll also be marked with a TODO)")
+                        todo_tag.tail = indent
+                        parent_tag.insert(tag_index, todo_tag)
+                        attribute_tags_with_attrs_after.append(todo_tag)
+                        tag_index += 1
+                attribute_tags_with_attrs_after.append(new_tag)
+                tag_index += 1
+        # This ensures the tail of the last inserted attribute tag is set correctly
+        if attribute_tags_with_attrs_after:
+            attribute_tags_with_attrs_after[-1].tail = tail
+        parent_tag.remove(attribute_tag)
+        for attribute_tag_to_remove in attribute_tags_to_remove:
+            tag_index, parent_tag, indent = get_parent_etree_node(doc, attribute_tag_to_remove)
+            if tag_index > 0:
+                previous_tag = get_child_tag_at_index(parent_tag, tag_index - 1)
+                previous_tag.tail = attribute_tag_to_remove.tail
+            parent_tag.remove(attribute_tag_to_remove)
+    return attribute_tags_with_attrs_after
+
+
+def convert_tags_with_states(tags_with_states, context):
+    """
+    Combines the states attribute of the tags into their invisible attribute
+
+    :param list[xml.etree.ElementTree.Element] tags_with_states:
+    :param ConversionContext context:
+    :rtype: list[xml.etree.ElementTree.Element]
+    """
+    doc, view_index, module = context
+    for state_tag in tags_with_states:
+        states_attribute = state_tag.get('states', '')
+        invisible_attribute = state_tag.get('invisible', '')
+        tag_index, parent_tag, indent = get_parent_etree_node(doc, state_tag)
+        if invisible_attribute:
+            conversion_action_string = f"Result from merging \"states='{states_attribute}'\" attribute with an 'invisible' attribute"
+        else:
+            conversion_action_string = f"Result from converting \"states='{states_attribute}'\" attribute into an 'invisible' attribute"
+        record = next(state_tag.iterancestors('record'), None)
+        if (view_index is None or record is None or not record.get('id')
+                or view_index.has_other_overrides(get_xmlid(record.get('id'), module), (state_tag.tag, state_tag.get('name')))):
+            todo_tag = etree.Comment(
+                f"TODO: {conversion_action_string}"
+                f"{indent + (' ' * 5)}Manually combine states condition into any 'invisible' overrides in inheriting views as well")
+            todo_tag.tail = indent
+            parent_tag.insert(tag_index, todo_tag)
+
+        new_invisible_attribute = get_combined_invisible_condition(invisible_attribute, states_attribute)
+        all_attributes = []
+        for attr_name, attr_value in list(state_tag.attrib.items()):
+            if attr_name == 'invisible' or (attr_name == 'states' and not invisible_attribute):
+                if new_invisible_attribute:
+                    all_attributes.append(('invisible', new_invisible_attribute))
+            elif attr_name != 'states':
+                all_attributes.append((attr_name, attr_value))
+        state_tag.attrib.clear()
+        state_tag.attrib.update(all_attributes)
+    return tags_with_states
+
+
+def convert_attribute_tags_with_states(attribute_tags_with_states, context):
+    """
+    Combines the <attribute name="states"> overrides into invisible attribute overrides
+
+    :param list[xml.etree.ElementTree.Element] attribute_tags_with_states:
+    :param ConversionContext context:
+    :returns: the invisible attribute overrides and the inserted TODO comments
+    :rtype: list[xml.etree.ElementTree.Element]
+    """
+    doc, view_index, module = context
+    attribute_tags_with_states_after = []
+    for attribute_tag_states in attribute_tags_with_states:
+        tag_type = get_inherited_tag_type(doc, attribute_tag_states)
+        tag_index, parent_tag, indent = get_parent_etree_node(doc, attribute_tag_states)
+        tail = attribute_tag_states.tail
+        states_attribute = attribute_tag_states.text or ''
+        attribute_tag_invisible = get_sibling_attribute_tag_of_type(doc, attribute_tag_states, 'invisible')
+        if attribute_tag_invisible is not None:
+            if tag_index > 0:
+                previous_tag = get_child_tag_at_index(parent_tag, tag_index - 1)
+                previous_tag.tail = attribute_tag_states.tail
+        elif (inherited_invisible := get_inherited_invisible_condition(get_inherited_attributes(view_index, module, attribute_tag_states))) is not None:
+            # The states are combined with the invisible condition of the parent views, that is overridden along with them
+            attribute_tag_invisible = etree.Element('attribute', attrib={'name': 'invisible'})
+            attribute_tag_invisible.text = inherited_invisible or None
+            attribute_tag_invisible.tail = tail
+            parent_tag.insert(tag_index, attribute_tag_invisible)
+        else:
+            todo_tag = etree.Comment(
+                f"TODO: Result from \"states='{states_attribute}'\" -> 'invisible' conversion without also overriding 'attrs' attribute"
+                f"{indent + (' ' * 5)}Check if this {tag_type + ' ' if tag_type else ''}tag contains an invisible attribute in any of the parent views, in which case it should be combined into this new 'invisible' attribute"
+                f"{indent + (' ' * 5)}(Only applies to invisible attributes in the parent views that were not originally states attributes. Those from converted states attributes will be marked with a TODO)")
+            todo_tag.tail = indent
+            parent_tag.insert(tag_index, todo_tag)
+            attribute_tags_with_states_after.append(todo_tag)
+            tag_index += 1
+            attribute_tag_invisible = etree.Element('attribute', attrib={'name': 'invisible'})
+            attribute_tag_invisible.tail = tail
+            parent_tag.insert(tag_index, attribute_tag_invisible)
+
+        invisible_attribute = attribute_tag_invisible.text or ''
+        invisible_condition = get_combined_invisible_condition(invisible_attribute, states_attribute)
+        parent_tag.remove(attribute_tag_states)
+        attribute_tag_invisible.text = invisible_condition
+        attribute_tags_with_states_after.append(attribute_tag_invisible)
+    return attribute_tags_with_states_after
+
+
+register_conversion_rule(ConversionRule('attrs_tags', 'attrs', None, None, convert_tags_with_attrs, changes_attributes=True, changes_parent=False))
+register_conversion_rule(ConversionRule('attrs_overrides', 'name', 'attrs', 'attribute', convert_attribute_tags_with_attrs, changes_attributes=False, changes_parent=True))
+register_conversion_rule(ConversionRule('states_tags', 'states', None, None, convert_tags_with_states, changes_attributes=True, changes_parent=True))
+register_conversion_rule(ConversionRule('states_overrides', 'name', 'states', 'attribute', convert_attribute_tags_with_states, changes_attributes=False, changes_parent=True))
+
+
+def convert_document(doc, tags_found=None, view_index=None, module=None, converted_nodes=None):
+    """
+    Converts all attrs and states attributes of a parsed XML document in place, with the CONVERSION_RULES
+
+    :param xml.etree.ElementTree.Element doc: root node of the document
+    :param list[str] tags_found: if given, the tags that will be converted are added to it, before their conversion
+    :param ViewIndex view_index: if given, the attributes that attribute overrides inherit from the parent views are
+        resolved with it, instead of being left to check in a TODO comment, whenever they can be determined
+    :param str module: module of the document, qualifying the xml ids of its views for the view_index
+    :param dict[str, list] converted_nodes: result of find_converted_nodes() for the document, if already known
+    :returns: the converted tags, along with the tags and TODO comments that were inserted. Empty if the document
+        contains no attrs or states attributes.
+    :rtype: list[xml.etree.ElementTree.Element]
+    """
+    if converted_nodes is None:
+        converted_nodes = find_converted_nodes(doc)
+    if not any(converted_nodes.values()):
+        return []
+    for rule in CONVERSION_RULES:
+        RUN_STATS.count(rule.name, len(converted_nodes[rule.name]))
+
+    if tags_found is not None:
+        with RUN_STATS.phase('serialize'):
+            tags_found.extend(etree.tostring(t, encoding='unicode') for rule in CONVERSION_RULES for t in converted_nodes[rule.name])
+
+    context = ConversionContext(doc, view_index, module)
+    converted_tags = []
+    for rule in CONVERSION_RULES:
+        converted_tags.extend(rule.convert(converted_nodes[rule.name], context))
+    return converted_tags
@@ -0,0 +1,444 @@
+"""
+Parser of the attrs values, and conversion of their domains to Python expressions
+"""
+import ast
+import re
+from collections import namedtuple
+
+
+NEW_ATTRS = ['invisible', 'required', 'readonly', 'column_invisible']
+
+
+DOMAIN_OPERATORS = {
+    '=', '!=', '>', '>=', '<', '<=', '=?', '=like', 'like', 'not like', 'ilike', 'not ilike', '=ilike', 'in', 'not in',
+    'child_of', 'parent_of',
+}
+# Names that refer to the evaluation context of the view rather than to a field of the record
+CONTEXT_VARIABLES = {
+    'context', 'uid', 'active_id', 'active_ids', 'active_model', 'current_company_id', 'allowed_company_ids',
+    'companies', 'today', 'now', 'current_date', 'time', 'datetime', 'relativedelta',
+}
+# Tokens of attrs values: strings, %(xml_id)d references, numbers, names and punctuation. Any other non-space character
+# is matched on its own so that it can be reported as invalid.
+ATTRS_TOKEN_REGEX = re.compile(r"""'(?:[^'\\\n]|\\.)*'|"(?:[^"\\\n]|\\.)*"|%\([\w.]+\)d|-?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*|\S""")
+ATTRS_CONSTANTS = {'True': True, 'False': False, 'None': None}
+# Value of the tokens that aren't valid values, None being the value of the None token
+INVALID_TOKEN = object()
+CLOSING_PUNCTUATION = {'[': ']', '(': ')', '{': '}'}
+OPENING, CLOSING, COMMA, COLON = 1, 2, 3, 4
+ATTRS_PUNCTUATION_KINDS = {'[': OPENING, '(': OPENING, '{': OPENING, ']': CLOSING, ')': CLOSING, '}': CLOSING, ',': COMMA, ':': COLON}
+EXPECT_VALUE, EXPECT_SEPARATOR, EXPECT_COLON = 1, 2, 3
+
+
+class DomainSyntaxError(ValueError):
+    """
+    Invalid attrs value, with the position of the error in the value
+    """
+
+    def __init__(self, message, text, position):
+        self.text = text
+        self.position = position
+        context = text[position:position + 30].split('\n')[0]
+        super().__init__(f"{message} at position {position} of attrs value (near {context!r})" if context else
+                         f"{message} at the end of attrs value")
+
+
+class FieldReference(namedtuple('FieldReference', ['name'])):
+    """
+    Unquoted field of the record, or of its parent (e.g. parent.company_id), in a domain
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return self.name
+
+    __repr__ = __str__
+
+
+class ContextVariable(namedtuple('ContextVariable', ['expression'])):
+    """
+    Variable of the evaluation context of the view in a domain, like uid or context.get('key')
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return self.expression
+
+    __repr__ = __str__
+
+
+class XmlIdReference(namedtuple('XmlIdReference', ['xmlid'])):
+    """
+    %(module.xml_id)d reference to the database id of a record in a domain
+    """
+    __slots__ = ()
+
+    def __str__(self):
+        return f"%({self.xmlid})d"
+
+    __repr__ = __str__
+
+
+class DomainLeaf(namedtuple('DomainLeaf', ['left', 'operator', 'right'])):
+    """
+    (left, operator, right) term of a domain
+    """
+    __slots__ = ()
+
+
+def tokenize_attrs(text):
+    """
+    Splits an attrs value into tokens, in a single pass of ATTRS_TOKEN_REGEX
+
+    :param str text:
+    :rtype: list[str]
+    """
+    return ATTRS_TOKEN_REGEX.findall(text)
+
+
+def get_attrs_syntax_error(message, text, token_index):
+    """
+    :param str message:
+    :param str text: attrs value
+    :param int token_index: index of the token the error is about in the result of tokenize_attrs(),
+        past the last token for an error at the end of the value
+    :rtype: DomainSyntaxError
+    """
+    # Positions are only computed when an error is reported, to keep the tokenization as fast as possible
+    for index, match in enumerate(ATTRS_TOKEN_REGEX.finditer(text)):
+        if index == token_index:
+            return DomainSyntaxError(message, text, match.start())
+    return DomainSyntaxError(message, text, len(text))
+
+
+def get_attrs_scalar(token):
+    """
+    :param str token: token that isn't punctuation
+    :returns: the value of the token, INVALID_TOKEN if the token isn't a valid value
+    :rtype: str|int|float|bool|None|FieldReference|ContextVariable|XmlIdReference
+    """
+    first_character = token[0]
+    try:
+        if first_character in '\'"':
+            return token[1:-1] if '\\' not in token else ast.literal_eval(token)
+        if first_character == '%':
+            return XmlIdReference(token[2:-2])
+        if first_character.isdigit() or first_character in '-.':
+            return float(token) if any(c in token for c in '.eE') else int(token)
+    except (SyntaxError, ValueError):
+        # Malformed escape sequence, or - or . on their own
+        return INVALID_TOKEN
+    if first_character.isalpha() or first_character == '_':
+        if token in ATTRS_CONSTANTS:
+            return ATTRS_CONSTANTS[token]
+        if token.split('.', 1)[0] in CONTEXT_VARIABLES:
+            return ContextVariable(token)
+        return FieldReference(token)
+    return INVALID_TOKEN
+
+
+def parse_attrs(attrs):
+    """
+    Parses an attrs value without evaluating anything, so it's safe on any input
+
+    :param str attrs: attrs dictionary
+    :returns: constant or domain for each attribute
+    :rtype: dict[str, bool|int|float|str|list[str|DomainLeaf]]
+    :raises DomainSyntaxError: if the attrs value is not a valid attrs dictionary
+    """
+    tokens = tokenize_attrs(attrs)
+    token_count = len(tokens)
+    # Containers being parsed: [opening punctuation, values, index of the first token of each value, whether a comma was
+    # found, index of the opening token]
+    stack = []
+    values = value_indexes = None
+    result = None
+    # What's expected next: a value, a separator (a comma or the closing punctuation) or a colon (after a dict key)
+    expected = EXPECT_VALUE
+    index = -1
+    while index + 1 < token_count:
+        index += 1
+        token = tokens[index]
+        token_kind = ATTRS_PUNCTUATION_KINDS.get(token, 0)
+        if token_kind == 0:
+            if expected != EXPECT_VALUE:
+                raise get_attrs_syntax_error("Expected a comma" if expected == EXPECT_SEPARATOR else "Expected a colon", attrs, index)
+            if token[0] == "'" and '\\' not in token:
+                # Fast path for the most common tokens
+                value = token[1:-1]
+            else:
+                value = get_attrs_scalar(token)
+                if value is INVALID_TOKEN:
+                    raise get_attrs_syntax_error("Invalid string" if token[0] in '\'"' else "Unexpected character", attrs, index)
+            value_index = index
+            if index + 1 < token_count and tokens[index + 1] in ('(', '[') and type(value) in (FieldReference, ContextVariable):
+                # Call or subscript, e.g. context.get('key'), kept as written
+                index, expression = get_attrs_reference_expression(attrs, tokens, index)
+                value = ContextVariable(expression)
+        elif token_kind == OPENING:
+            if expected != EXPECT_VALUE:
+                raise get_attrs_syntax_error("Expected a comma" if expected == EXPECT_SEPARATOR else "Expected a colon", attrs, index)
+            values = []
+            value_indexes = []
+            stack.append([token, values, value_indexes, False, index])
+            continue
+        elif token_kind == CLOSING:
+            if not stack or CLOSING_PUNCTUATION[stack[-1][0]] != token:
+                raise get_attrs_syntax_error("Unexpected closing punctuation", attrs, index)
+            opening, values, value_indexes, has_comma, value_index = stack.pop()
+            if expected == EXPECT_COLON or (expected == EXPECT_VALUE and values and not has_comma) or \
+                    (opening == '{' and len(values) % 2):
+                raise get_attrs_syntax_error("Expected a value", attrs, index)
+            if opening == '[':
+                value = values
+            elif opening == '(':
+                value = tuple(values) if has_comma or not values else values[0]
+            else:
+                value = get_attrs_dict(attrs, values, value_indexes, not stack)
+            if stack:
+                values, value_indexes = stack[-1][1], stack[-1][2]
+        elif token_kind == COMMA:
+            if expected != EXPECT_SEPARATOR or not stack:
+                raise get_attrs_syntax_error("Unexpected comma", attrs, index)
+            stack[-1][3] = True
+            expected = EXPECT_VALUE
+            continue
+        else:
+            if expected != EXPECT_COLON:
+                raise get_attrs_syntax_error("Unexpected colon", attrs, index)
+            expected = EXPECT_VALUE
+            continue
+        if not stack:
+            if result is not None or type(value) is not dict:
+                raise get_attrs_syntax_error("Expected a single attrs dictionary", attrs, value_index)
+            result = value
+            expected = EXPECT_SEPARATOR
+            continue
+        if stack[-1][0] == '{' and not len(values) % 2:
+            if type(value) is not str:
+                raise get_attrs_syntax_error("Expected an attribute name", attrs, value_index)
+            expected = EXPECT_COLON
+        else:
+            expected = EXPECT_SEPARATOR
+        values.append(value)
+        value_indexes.append(value_index)
+    if stack or result is None:
+        raise get_attrs_syntax_error("Unexpected end", attrs, token_count)
+    return result
+
+
+def get_attrs_dict(attrs, values, value_indexes, is_attrs_dict):
+    """
+    :param str attrs: attrs value
+    :param list values: keys and values of the dictionary
+    :param list[int] value_indexes: index of the first token of each of the values
+    :param bool is_attrs_dict: whether it's the attrs dictionary itself, whose values of the attributes to convert are
+        checked and whose domains are converted by get_domain()
+    :rtype: dict
+    """
+    value = dict(zip(values[::2], values[1::2]))
+    if is_attrs_dict:
+        for attr_index in range(1, len(values), 2):
+            attr, attr_value = values[attr_index - 1], values[attr_index]
+            if attr not in NEW_ATTRS:
+                continue
+            if type(attr_value) is list:
+                value[attr] = get_domain(attrs, attr_value, value_indexes[attr_index])
+            elif type(attr_value) not in (bool, int, str):
+                raise get_attrs_syntax_error(f"Expected a domain or a constant for {attr!r}", attrs, value_indexes[attr_index])
+    return value
+
+
+def get_attrs_reference_expression(attrs, tokens, index):
+    """
+    :param str attrs: attrs value
+    :param list[str] tokens: tokens of the attrs value
+    :param int index: index of the token of the name that is called or subscripted
+    :returns: index of the last token of the expression, and the expression
+    :rtype: (int, str)
+    """
+    depth = 0
+    end = index + 1
+    while end < len(tokens):
+        if tokens[end] in CLOSING_PUNCTUATION:
+            depth += 1
+        elif tokens[end] in (']', ')', '}'):
+            depth -= 1
+            if depth == 0 and (end + 1 >= len(tokens) or tokens[end + 1] not in ('(', '[')):
+                break
+        end += 1
+    if depth:
+        raise get_attrs_syntax_error("Unexpected end", attrs, len(tokens))
+    expression = ''.join(f"{token} " if token == ',' else token for token in tokens[index:end + 1])
+    return end, expression
+
+
+def get_domain(attrs, value, token_index):
+    """
+    Checks the operators and terms of a domain parsed by parse_attrs() and converts its terms to DomainLeaf
+
+    :param str attrs: attrs value
+    :param list value: list parsed by parse_attrs()
+    :param int token_index: index of the token opening the list
+    :rtype: list[str|DomainLeaf]
+    """
+    domain = []
+    for item in value:
+        if type(item) is str:
+            if item not in ('&', '|', '!'):
+                raise get_attrs_syntax_error(f"Invalid domain operator {item!r}", attrs, find_attrs_token(attrs, token_index, item))
+            domain.append(item)
+        elif type(item) in (tuple, list) and len(item) == 3:
+            if item[1] not in DOMAIN_OPERATORS:
+                raise get_attrs_syntax_error(f"Invalid domain term operator {item[1]!r}", attrs, find_attrs_token(attrs, token_index, item[1]))
+            domain.append(DomainLeaf(*item))
+        else:
+            raise get_attrs_syntax_error(f"Invalid domain term {item!r}", attrs, token_index)
+    return domain
+
+
+def find_attrs_token(attrs, token_index, value):
+    """
+    :returns: the index of the first token from the given index with the given value, to report errors about a value
+    :rtype: int
+    """
+    tokens = tokenize_attrs(attrs)
+    for index in range(token_index, len(tokens)):
+        if tokens[index] not in ATTRS_PUNCTUATION_KINDS and get_attrs_scalar(tokens[index]) == value:
+            return index
+    return token_index
+
+
+def normalize_domain(domain):
+    """
+    Normalize Domain, taken from odoo/osv/expression.py -> just the part so that & operators are added where needed.
+    After that, we can use a part of the def parse() from the same file to manage parenthesis for and/or
+
+    :rtype: list[str|tuple]
+    """
+    if len(domain) == 1:
+        return domain
+    result = []
+    expected = 1  # expected number of expressions
+    op_arity = {'!': 1, '&': 2, '|': 2}
+    for token in domain:
+        if expected == 0:  # more than expected, like in [A, B]
+            result[0:0] = ['&']  # put an extra '&' in front
+            expected = 1
+        if isinstance(token, (list, tuple)):  # domain term
+            expected -= 1
+            if not isinstance(token, DomainLeaf):
+                token = tuple(token)
+        else:
+            expected += op_arity.get(token, 0) - 1
+        result.append(token)
+    return result
+
+
+def stringify_leaf(leaf):
+    """
+    :param tuple leaf:
+    :rtype: str
+    """
+    stringify = ''
+    switcher = False
+    case_insensitive = False
+    # Replace operators not supported in python (=, like, ilike)
+    operator = str(leaf[1])
+    # Take left operand, never to add quotes (should be python object / field)
+    left_operand = leaf[0]
+    # Take care of right operand, don't add quotes if it's list/tuple/set/boolean/number, check if we have a true/false/1/0 string tho.
+    right_operand = leaf[2]
+
+    # Handle '=?'
+    if operator == '=?':
+        if type(right_operand) is str:
+            right_operand = repr(right_operand)
+        return f"({right_operand} in [None, False] or {left_operand} == {right_operand})"
+    # Handle '='
+    elif operator == '=':
+        if right_operand in (False, []):  # Check for False or empty list
+            return f"not {left_operand}"
+        elif right_operand is True:  # Check for True using '==' comparison so only boolean values can evaluate to True
+            return left_operand
+        operator = '=='
+    # Handle '!='
+    elif operator == '!=':
+        if right_operand in (False, []):  # Check for False or empty list
+            return left_operand
+        elif right_operand is True:  # Check for True using '==' comparison so only boolean values can evaluate to True
+            return f"not {left_operand}"
+    # Handle 'like' and other operators
+    elif 'like' in operator:
+        case_insensitive = 'ilike' in operator
+        if type(right_operand) is str and re.search('[_%]', right_operand):
+            # Since wildcards won't work/be recognized after conversion we throw an error so we don't end up with
+            # expressions that behave differently from their originals
+            raise Exception("Script doesn't support 'like' domains with wildcards")
+        if operator in ['=like', '=ilike']:
+            operator = '=='
+        else:
+            if 'not' in operator:
+                operator = 'not in'
+            else:
+                operator = 'in'
+            switcher = True
+    if type(right_operand) is str:
+        right_operand = repr(right_operand)
+    if switcher:
+        temp_operand = left_operand
+        left_operand = right_operand
+        right_operand = temp_operand
+    if not case_insensitive:
+        stringify = f"{left_operand} {operator} {right_operand}"
+    else:
+        stringify = f"{left_operand}.lower() {operator} {right_operand}.lower()"
+    return stringify
+
+
+def stringify_attr(stack):
+    """
+    :param bool|str|int|list stack:
+    :rtype: str
+    """
+    if stack in (True, False, 'True', 'False', 1, 0, '1', '0'):
+        return str(stack)
+    last_parenthesis_index = max(index for index, item in enumerate(stack[::-1]) if item not in ('|', '!'))
+    stack = normalize_domain(stack)
+    stack = stack[::-1]
+    result = []
+    for index, leaf_or_operator in enumerate(stack):
+        if leaf_or_operator == '!':
+            expr = result.pop()
+            result.append('(not (%s))' % expr)
+        elif leaf_or_operator in ['&', '|']:
+            left = result.pop()
+            # In case of a single | or single & , we expect that it's a tag that have an attribute AND a state
+            # the state will be added as OR in states management
+            try:
+                right = result.pop()
+            except IndexError:
+                res = left + ('%s' % ' and' if leaf_or_operator == '&' else ' or')
+                result.append(res)
+                continue
+            form = '(%s %s %s)'
+            if index > last_parenthesis_index:
+                form = '%s %s %s'
+            result.append(form % (left, 'and' if leaf_or_operator == '&' else 'or', right))
+        else:
+            result.append(stringify_leaf(leaf_or_operator))
+    result = result[0]
+    return result
+
+
+# Whitespace around punctuation or repeated, outside of string literals, doesn't change the meaning of an attrs value
+ATTRS_WHITESPACE_REGEX = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")|\s*([\[\](){},:])\s*|(\s+)""")
+
+
+def normalize_attrs_text(attrs):
+    """
+    :param str attrs:
+    :returns: the attrs value without insignificant whitespace, to be used as cache key
+    :rtype: str
+    """
+    return ATTRS_WHITESPACE_REGEX.sub(lambda match: match.group(1) or match.group(2) or ' ', attrs.strip())
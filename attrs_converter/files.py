@@ -0,0 +1,198 @@
+"""
+Traversal of the root directory, and reading of the files
+"""
+import difflib
+import fnmatch
+import mmap
+import os
+import re
+
+from . import rules
+from .stats import RUN_STATS
+
+
+CACHE_FILE_NAME = '.replace_attrs_cache.json'
+
+
+# Directories that never contain anything to convert, they are not even entered while walking the root directory
+IGNORED_DIRECTORIES = {
+    '.git', '.hg', '.svn', '.bzr', '__pycache__', 'node_modules', '.tox', '.nox', '.venv', 'venv', '.idea', '.vscode',
+    '.mypy_cache', '.pytest_cache', '.ruff_cache',
+}
+# Globs of paths (relative to the root directory) that are skipped as well, can be extended with --exclude
+IGNORED_GLOBS = ['*/static/lib', '*/static/img', '*/static/fonts', f'*/{CACHE_FILE_NAME}', f'*/{CACHE_FILE_NAME}.tmp']
+# Files that are never read as text
+ASSET_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.svg', '.webp', '.pdf', '.woff', '.woff2', '.ttf', '.eot', '.otf',
+    '.zip', '.gz', '.tgz', '.tar', '.bz2', '.xz', '.7z', '.mo', '.pyc', '.pyo', '.so', '.dll', '.exe', '.jar', '.mp3',
+    '.mp4', '.mov', '.avi', '.ogg', '.wav', '.xls', '.xlsx', '.doc', '.docx', '.odt', '.ods', '.ppt', '.pptx',
+}
+FILE_ROLES = ['view_xml', 'xml', 'manifest', 'python', 'js', 'other', 'asset']
+
+
+def get_file_role(name, in_views):
+    """
+    :param str name: file name
+    :param bool in_views: whether the file is inside a 'views' directory
+    :returns: one of FILE_ROLES
+    :rtype: str
+    """
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.xml':
+        return 'view_xml' if in_views else 'xml'
+    if name == '__manifest__.py':
+        return 'manifest'
+    if extension == '.py':
+        return 'python'
+    if extension == '.js':
+        return 'js'
+    if extension in ASSET_EXTENSIONS:
+        return 'asset'
+    return 'other'
+
+
+def is_ignored_path(relative_path, ignored_globs):
+    """
+    :param str relative_path: path relative to the root directory, with / separators
+    :param list[str] ignored_globs: IGNORED_GLOBS and the globs given with --exclude
+    :rtype: bool
+    """
+    # Globs starting with */ also have to match at the top level
+    return any(fnmatch.fnmatchcase(relative_path, glob) or (glob.startswith('*/') and fnmatch.fnmatchcase(relative_path, glob[2:]))
+               for glob in ignored_globs)
+
+
+def walk_files(path, exclude=()):
+    """
+    Recursively yields all files within the given path along with their role, using a single directory traversal.
+    Directories in IGNORED_DIRECTORIES and paths matching IGNORED_GLOBS or the given globs are skipped without being entered.
+    Files are yielded in a stable order (depth first, sorted by name).
+
+    :param str path:
+    :param list[str] exclude: additional globs of paths relative to the given path to skip
+    :returns: iterator of (file path, role)
+    :rtype: collections.abc.Iterator[(str, str)]
+    """
+    ignored_globs = IGNORED_GLOBS + list(exclude)
+    stack = [(path, '', False)]
+    while stack:
+        directory, relative_directory, in_views = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Warning: Could not list {directory}: {e}")
+            continue
+        subdirectories = []
+        for entry in entries:
+            relative_path = f"{relative_directory}/{entry.name}" if relative_directory else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in IGNORED_DIRECTORIES and not is_ignored_path(relative_path, ignored_globs):
+                    subdirectories.append((entry.path, relative_path, in_views or entry.name == 'views'))
+            elif entry.is_file() and not is_ignored_path(relative_path, ignored_globs):
+                yield entry.path, get_file_role(entry.name, in_views)
+        stack.extend(reversed(subdirectories))
+
+
+def index_files(path, exclude=()):
+    """
+    Walks the given path once and groups the files found by role, so every pass can be fed from the same traversal
+
+    :param str path:
+    :param list[str] exclude: additional globs of paths relative to the given path to skip
+    :returns: file paths for each of FILE_ROLES
+    :rtype: dict[str, list[str]]
+    """
+    files_by_role = {role: [] for role in FILE_ROLES}
+    for file_path, role in walk_files(path, exclude):
+        files_by_role[role].append(file_path)
+    return files_by_role
+
+
+def get_xml_files_in_views_recursive(path):
+    """
+    Recursively finds all XML files within 'views' subdirectories of the given path.
+    """
+    return [file_path for file_path, role in walk_files(path) if role == 'view_xml']
+
+
+def get_all_files_recursive(path):
+    """
+    Recursively finds all files (not just XML) within the given path, except in ignored directories.
+    """
+    return [file_path for file_path, _ in walk_files(path)]
+
+
+def get_manifest_files_recursive(path):
+    """
+    Recursively finds all __manifest__.py files within the given path.
+    """
+    return [file_path for file_path, role in walk_files(path) if role == 'manifest']
+
+
+def decode_contents(contents):
+    """
+    :param bytes contents:
+    :returns: the decoded contents and their encoding, utf-8 or else latin-1
+    :rtype: (str, str)
+    """
+    try:
+        return contents.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        return contents.decode('latin-1'), 'latin-1'
+
+
+def get_unified_diff(path, original, contents):
+    """
+    :param str path: path of the file in the diff, relative to the directory the patch applies to
+    :param bytes original: current contents of the file
+    :param bytes contents: transformed contents of the file
+    :returns: the unified diff of the file, applicable with git apply or patch -p1
+    :rtype: str
+    """
+    # Only \n separates lines for patch, so \r\n line separators are kept at the end of the lines
+    original_lines, new_lines = (re.findall(r"[^\n]*\n|[^\n]+\Z", decode_contents(c)[0]) for c in (original, contents))
+    diff = []
+    for line in difflib.unified_diff(original_lines, new_lines, f"a/{path}", f"b/{path}"):
+        diff.append(line)
+        if not line.endswith('\n'):
+            diff.append('\n\\ No newline at end of file\n')
+    return ''.join(diff)
+
+
+def read_xml_file_with_attrs_or_states(xml_file):
+    """
+    Returns the decoded contents of the given XML file, but only if it contains an attrs or states attribute or override.
+    The check is done on the memory mapped bytes of the file, so files without anything to convert are never decoded
+    nor parsed, and aren't even loaded in memory.
+
+    :param str xml_file:
+    :returns: None if the file has no attrs or states attribute or override, else the decoded contents of the file
+    :rtype: None|str
+    """
+    with RUN_STATS.phase('read'):
+        contents = read_file(xml_file, prefilter=True)
+    if contents is None:
+        return None
+    with RUN_STATS.phase('decode'):
+        return contents.decode('utf-8')
+
+
+def read_file(file_path, prefilter=False):
+    """
+    :param str file_path:
+    :param bool prefilter: only read the file if it contains an attribute or override some conversion rule applies to
+        (an attrs or states attribute or override), checked on its memory mapped bytes
+    :returns: the contents of the file, None if it's prefiltered out
+    :rtype: None|bytes
+    """
+    with open(file_path, 'rb') as f:
+        if not prefilter:
+            return f.read()
+        if os.fstat(f.fileno()).st_size == 0:
+            # Empty files can't be mapped
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+            if rules.CONVERTED_NODES_BYTES_REGEX.search(mapped_file) is None:
+                return None
+            return mapped_file[:]
@@ -0,0 +1,247 @@
+"""
+Dependency graph of the modules of the root directory, and update of their manifests
+"""
+import ast
+import copy
+import os
+import pprint
+from collections import namedtuple
+
+from .files import decode_contents, read_file
+from .views import get_file_module
+
+
+# Values set by the manifest pass, by default
+MANIFEST_VERSION = '18.0.1.0.0'
+MANIFEST_AUTHOR = 'Joel S. Martinez espinal'
+
+
+# Module of the repository: its name, directory, dependencies (the 'depends' of its manifest, in the repository or not),
+# and the contents of its manifest with the dictionary parsed from them (None if they couldn't be parsed)
+Module = namedtuple('Module', ['name', 'directory', 'depends', 'manifest_text', 'manifest'])
+
+
+def get_strongly_connected_components(graph):
+    """
+    Tarjan's algorithm, without recursion so that long dependency chains don't exceed the recursion limit
+
+    :param dict[str, list[str]] graph: successors of each node
+    :returns: the strongly connected components of the graph, each one after the components it has edges to
+    :rtype: list[list[str]]
+    """
+    indexes = {}
+    lowlinks = {}
+    stack = []
+    on_stack = set()
+    components = []
+    for root in graph:
+        if root in indexes:
+            continue
+        indexes[root] = lowlinks[root] = len(indexes)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in indexes:
+                    indexes[successor] = lowlinks[successor] = len(indexes)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph[successor])))
+                    break
+                if successor in on_stack:
+                    lowlinks[node] = min(lowlinks[node], indexes[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlinks[parent] = min(lowlinks[parent], lowlinks[node])
+                if lowlinks[node] == indexes[node]:
+                    component = []
+                    while not component or component[-1] != node:
+                        component.append(stack.pop())
+                        on_stack.discard(component[-1])
+                    components.append(component)
+    return components
+
+
+class ModuleGraph:
+    """
+    Dependency graph of the modules of a repository, processed level by level in topological order
+    """
+
+    def __init__(self):
+        self.modules = {}
+        self.module_directories = {}
+        self.levels = []
+        self.module_levels = {}
+        self.cycles = []
+        self.missing = {}
+        self.duplicates = {}
+        self.errors = {}
+
+    def build(self, manifest_files):
+        """
+        :param list[str] manifest_files: __manifest__.py files of the modules
+        """
+        # Built from scratch, e.g. by each run of main() in the same process
+        self.__init__()
+        for manifest_file in sorted(manifest_files):
+            directory = os.path.dirname(os.path.abspath(manifest_file))
+            name = os.path.basename(directory)
+            self.module_directories[directory] = name
+            text = manifest = None
+            depends = []
+            try:
+                text = decode_contents(read_file(manifest_file))[0]
+                manifest = ast.literal_eval(text)
+                if not isinstance(manifest, dict):
+                    raise ValueError("Content is not a dictionary.")
+                depends = manifest.get('depends') or []
+                if not isinstance(depends, (list, tuple)) or not all(isinstance(d, str) for d in depends):
+                    raise ValueError("'depends' is not a list of module names.")
+            except (OSError, SyntaxError, ValueError) as e:
+                self.errors[manifest_file] = str(e)
+                if not isinstance(manifest, dict):
+                    manifest = None
+                depends = []
+            if name in self.modules:
+                # Another addons path of the repository, the first module of that name is the one depended on
+                self.duplicates.setdefault(name, [self.modules[name].directory]).append(directory)
+                continue
+            self.modules[name] = Module(name, directory, list(depends), text, manifest)
+
+        graph = {name: [d for d in module.depends if d in self.modules] for name, module in self.modules.items()}
+        for name, module in self.modules.items():
+            if missing := [d for d in module.depends if d not in self.modules]:
+                self.missing[name] = missing
+        for component in get_strongly_connected_components(graph):
+            # The components are sorted in topological order, each one after the ones it depends on
+            level = max((self.module_levels[d] + 1 for name in component for d in graph[name] if d not in component), default=0)
+            if len(component) > 1 or component[0] in graph[component[0]]:
+                self.cycles.append(sorted(component))
+            for name in component:
+                self.module_levels[name] = level
+            while len(self.levels) <= level:
+                self.levels.append([])
+            self.levels[level].extend(sorted(component))
+        for modules in self.levels:
+            modules.sort()
+
+    def get_module(self, file_path):
+        return get_file_module(file_path, self.module_directories)
+
+    def get_level(self, file_path):
+        """
+        :returns: the topological level of the module of the file, after the last level for files outside of any module
+        :rtype: int
+        """
+        module = self.get_module(file_path)
+        return len(self.levels) if module is None else self.module_levels[module]
+
+    def get_schedule_key(self, file_path):
+        """
+        :returns: key sorting files by topological level of their module, then by module, files outside of any module
+            last
+        :rtype: (int, str)
+        """
+        return self.get_level(file_path), self.get_module(file_path) or ''
+
+    def get_manifest(self, file_path, text):
+        """
+        :param str file_path: path of a __manifest__.py file
+        :param str text: its current contents
+        :returns: a copy of the dictionary parsed from the manifest, None if it wasn't parsed from the same contents
+        :rtype: None|dict
+        """
+        directory = os.path.dirname(os.path.abspath(file_path))
+        module = self.modules.get(self.module_directories.get(directory))
+        if module is None or module.directory != directory or module.manifest is None or module.manifest_text != text:
+            return None
+        return copy.deepcopy(module.manifest)
+
+    def get_missing_dependencies(self):
+        """
+        :returns: the modules depending on each dependency that isn't in the repository
+        :rtype: dict[str, list[str]]
+        """
+        dependents = {}
+        for name, missing in self.missing.items():
+            for dependency in missing:
+                dependents.setdefault(dependency, []).append(name)
+        return dict(sorted(dependents.items()))
+
+    def get_report(self):
+        """
+        :rtype: dict
+        """
+        return {
+            'modules': len(self.modules),
+            'levels': self.levels,
+            'cycles': self.cycles,
+            'missing_dependencies': self.get_missing_dependencies(),
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+        }
+
+
+MODULE_GRAPH = ModuleGraph()
+
+
+def update_manifest_contents(contents, file_path, messages, version=MANIFEST_VERSION, author=MANIFEST_AUTHOR, manifest_dict=None):
+    """
+    Updates the contents of a __manifest__.py file for Odoo 18 compatibility and sets author
+
+    :param str contents:
+    :param str file_path: path of the manifest, for the messages
+    :param list[str] messages: warnings are added to it
+    :param str version: version to set, left as is if empty
+    :param str author: author to set and add to the maintainers, left as is if empty
+    :param dict manifest_dict: dictionary already parsed from the contents, if any, updated in place
+    :returns: None if there is nothing to update, else the updated contents
+    :rtype: None|str
+    """
+    if manifest_dict is None:
+        # Attempt to parse as a Python dictionary
+        try:
+            # __manifest__.py typically contains a single dictionary
+            manifest_dict = ast.literal_eval(contents)
+            if not isinstance(manifest_dict, dict):
+                raise ValueError("Content is not a dictionary.")
+        except (SyntaxError, ValueError) as e:
+            messages.append(f"Warning: Could not parse {file_path} as a Python dictionary: {e}. Skipping manifest update.")
+            return None
+
+    changed = False
+
+    # 1. Update version
+    if version and manifest_dict.get('version') != version:
+        manifest_dict['version'] = version
+        changed = True
+
+    # 2. Set author
+    if author and manifest_dict.get('author') != author:
+        manifest_dict['author'] = author
+        changed = True
+
+    # 3. Add / update maintainers
+    if author and 'maintainers' not in manifest_dict:
+        manifest_dict['maintainers'] = [author]
+        changed = True
+    elif author and isinstance(manifest_dict.get('maintainers'), list):
+        if author not in manifest_dict['maintainers']:
+            manifest_dict['maintainers'].append(author)
+            changed = True
+    elif author: # maintainers exists but is not a list (e.g., a string)
+        messages.append(f"Warning: 'maintainers' in {file_path} is not a list. Skipping update for maintainers.")
+
+    if not changed:
+        return None
+    # Use pprint to format the dictionary for writing back
+    # pprint.pformat already formats it as {...}
+    new_contents = pprint.pformat(manifest_dict, indent=4, width=80, compact=False)
+    # Preserve line endings
+    if '\r\n' in contents:
+        new_contents = new_contents.replace('\n', '\r\n')
+    return new_contents
@@ -0,0 +1,574 @@
+"""
+Processing of the files: the passes applied to each file, in worker processes, and the writing of their results
+"""
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from itertools import chain, groupby, islice
+
+from lxml import etree
+
+from .cache import DOMAIN_CACHE, get_file_fingerprint
+from .files import decode_contents, read_file, read_xml_file_with_attrs_or_states
+from . import modules
+from .modules import update_manifest_contents
+from . import simplify
+from .splice import convert_xml_contents
+from .stats import RUN_STATS
+from .streaming import StreamedContents, is_streamed, stream_xml_file
+from .tree import get_tree_rewriter
+from . import verify
+from . import views
+
+
+# Files read ahead by each reader thread, and files waiting to be written, bounding the memory used by their contents
+PREFETCH_PER_THREAD = 4
+WRITE_QUEUE_SIZE = 64
+PASSES = ['attrs', 'tree', 'manifest']
+
+
+def replace_tree_with_list_in_file(file_path, dry_run=False):
+    """
+    Replaces tree views by list views in the given file, with the rewriter of its type in TREE_REWRITERS.
+    Handles different line endings and preserves encoding.
+    Returns True if changes were made (or would be made when dry_run is set), False otherwise.
+    """
+    if get_tree_rewriter(file_path) is None:
+        return False
+    return process_and_write_file(file_path, 'tree', dry_run)
+
+
+def update_manifest_for_odoo18(file_path, dry_run=False):
+    """
+    Updates __manifest__.py file for Odoo 18 compatibility and sets author.
+    Returns True if changes were made (or would be made when dry_run is set), False otherwise.
+    """
+    return process_and_write_file(file_path, 'manifest', dry_run)
+
+
+def process_and_write_file(file_path, pass_name, dry_run=False):
+    """
+    Runs a single pass on the given file and writes the result back
+
+    :param str file_path:
+    :param str pass_name: 'tree' or 'manifest'
+    :param bool dry_run: only check whether the file would be changed, without writing it
+    :returns: True if changes were made (or would be made when dry_run is set), False otherwise
+    :rtype: bool
+    """
+    result = process_file(file_path, [pass_name])
+    for message in result.messages:
+        print(message)
+    if pass_name not in result.changed_passes:
+        return False
+    try:
+        if not dry_run:
+            write_file_atomically(file_path, result.contents)
+    except OSError as e:
+        print(f"Error writing {file_path}: {e}")
+        return False
+    print(get_pass_change_message(file_path, pass_name, dry_run))
+    return True
+
+
+def get_pass_change_message(file_path, pass_name, dry_run):
+    """
+    :returns: the message reporting that the tree or manifest pass changed the given file
+    :rtype: str
+    """
+    if pass_name == 'tree':
+        return f"  - Replacing 'tree' with 'list' in: {file_path}"
+    if dry_run:
+        return f"  - Would update manifest for Odoo 18 and author in: {file_path}"
+    return f"  - Updated manifest for Odoo 18 and author in: {file_path}"
+
+
+def write_file_atomically(file_path, contents):
+    """
+    Writes the file through a temporary file replacing it at once, so it's never left partially written
+
+    :param str file_path:
+    :param bytes|StreamedContents contents: contents, or temporary file already holding them
+    """
+    if isinstance(contents, StreamedContents):
+        temporary_path = contents.path
+    else:
+        directory, name = os.path.split(os.path.abspath(file_path))
+        file_descriptor, temporary_path = tempfile.mkstemp(prefix=f".{name}.", suffix='.tmp', dir=directory)
+    try:
+        if not isinstance(contents, StreamedContents):
+            with os.fdopen(file_descriptor, 'wb') as f:
+                f.write(contents)
+        shutil.copymode(file_path, temporary_path)
+        os.replace(temporary_path, file_path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def convert_xml_file(xml_file):
+    """
+    Converts all attrs and states attributes of the given XML file in memory, without writing anything back
+
+    :param str xml_file: path of the XML file to convert
+    :returns: None if there is nothing to convert, else the tags found, the tags they will be replaced by and the
+        converted contents of the file
+    :rtype: None|(list[str], list[str], bytes)
+    """
+    contents = read_xml_file_with_attrs_or_states(xml_file)
+    if contents is None:
+        return None
+    tags_found = []
+    tags_replaced_by = []
+    xml_string = convert_xml_contents(contents, tags_found, tags_replaced_by)
+    if xml_string is None:
+        return None
+    return tags_found, tags_replaced_by, xml_string
+
+
+def convert_file(xml_file, dry_run=False):
+    """
+    Converts all attrs and states attributes of the given XML file and writes the result back
+
+    :param str xml_file: path of the XML file to convert
+    :param bool dry_run: only check whether the file would be converted, without writing it
+    :returns: True if the file contained attrs or states attributes to convert, False otherwise
+    :rtype: bool
+    """
+    contents = read_xml_file_with_attrs_or_states(xml_file)
+    if contents is None:
+        return False
+    xml_string = convert_xml_contents(contents)
+    if xml_string is None:
+        return False
+    if not dry_run:
+        write_file_atomically(xml_file, xml_string)
+    return True
+
+
+def apply_passes(file_path, original, passes, messages, show_tags=True, write_mode='full', manifest_values=None):
+    """
+    Applies the transforms of the given passes to the contents of a file, in memory and in the order of PASSES
+
+    :param str file_path:
+    :param bytes original: contents of the file
+    :param list[str] passes:
+    :param list[str] messages: warnings and errors of the tree and manifest passes are added to it
+    :param bool show_tags: whether to serialize the tags found and the tags they are replaced by, to display them
+    :param str write_mode: see convert_xml_contents()
+    :param dict manifest_values: version and author set by the manifest pass, see update_manifest_contents()
+    :returns: the transformed contents (None if they are identical to the original ones), the passes that changed
+        them, the tags found and the tags they are replaced by (empty unless show_tags) if the attrs pass converted
+        anything, and the error of the attrs pass if it failed
+    :rtype: (None|bytes, list[str], None|(list[str], list[str]), None|str)
+    """
+    # The contents are only encoded or decoded when the next transform needs it
+    contents, text, encoding = original, None, None
+    changed_passes = []
+    attrs_result = attrs_error = None
+    if 'attrs' in passes:
+        try:
+            with RUN_STATS.phase('decode'):
+                text, encoding = contents.decode('utf-8'), 'utf-8'
+            tags_found = []
+            tags_replaced_by = []
+            xml_string = convert_xml_contents(text, tags_found if show_tags else None, tags_replaced_by if show_tags else None,
+                                              views.VIEW_INDEX, views.VIEW_INDEX.get_module(file_path), write_mode)
+            if xml_string is not None:
+                attrs_result = tags_found, tags_replaced_by
+                contents, text = xml_string, None
+                changed_passes.append('attrs')
+        except Exception as e:
+            attrs_error = str(e)
+    for pass_name in ('tree', 'manifest'):
+        if pass_name not in passes or (pass_name == 'tree' and get_tree_rewriter(file_path) is None):
+            continue
+        try:
+            if text is None:
+                with RUN_STATS.phase('decode'):
+                    text, encoding = decode_contents(contents)
+            with RUN_STATS.phase(pass_name):
+                if pass_name == 'tree':
+                    new_text = get_tree_rewriter(file_path)(text)
+                else:
+                    new_text = update_manifest_contents(text, file_path, messages, **(manifest_values or {}),
+                                                        manifest_dict=modules.MODULE_GRAPH.get_manifest(file_path, text))
+            if new_text is not None and new_text != text:
+                contents, text = None, new_text
+                changed_passes.append(pass_name)
+        except Exception as e:
+            if pass_name == 'tree':
+                messages.append(f"Error replacing 'tree' in {file_path}: {e}")
+            else:
+                messages.append(f"Error updating manifest {file_path}: {e}")
+    if contents is None:
+        with RUN_STATS.phase('serialize'):
+            contents = text.encode(encoding)
+    if contents == original:
+        return None, [], attrs_result, attrs_error
+    return contents, changed_passes, attrs_result, attrs_error
+
+
+# Result of the processing of a file by the pipeline:
+#   - passes: passes applied to the file
+#   - attrs_result: tags found and tags they are replaced by, if the attrs pass converted anything
+#   - attrs_error: error message if the attrs pass failed
+#   - contents: transformed contents to write (StreamedContents for streamed files), None if they are identical to the
+#     current ones
+#   - changed_passes: passes that changed the contents
+#   - original: current contents of the file, if requested and they are transformed, so the other passes can be
+#     applied again without the attrs pass if its changes are declined, or to report the changes
+#   - fingerprint: result of get_file_fingerprint() for the current contents of the file, if requested
+#   - messages: warnings and errors to report
+#   - domain_cache_updates: result of DomainCache.pop_updates(), to merge into the DOMAIN_CACHE of the main process
+#   - stats_updates: result of RunStats.pop_updates(), to merge into the RUN_STATS of the main process
+#   - verification_updates: result of DomainVerifier.pop_updates(), to merge into the DOMAIN_VERIFIER of the main process
+FileResult = namedtuple('FileResult', ['file_path', 'passes', 'attrs_result', 'attrs_error', 'contents', 'changed_passes',
+                                       'original', 'fingerprint', 'messages', 'domain_cache_updates', 'stats_updates',
+                                       'verification_updates'])
+
+
+# Contents of a file read by prefetch_file(), with the error if it couldn't be read, its fingerprint if requested, the
+# (phase, wall time, CPU time) of the reads, to be added to the RUN_STATS by the thread processing it, and whether the
+# file is left unread to be streamed by stream_file()
+PrefetchedFile = namedtuple('PrefetchedFile', ['contents', 'error', 'fingerprint', 'timings', 'streamed'])
+
+
+def prefetch_file(file_path, passes, fingerprint=False, stream_threshold=0):
+    """
+    Reads a file to process, possibly in a reader thread: the stats are returned instead of being added to the
+    RUN_STATS, which are only updated by the thread processing the files
+
+    :param str file_path:
+    :param list[str] passes: passes that will be applied to the file
+    :param bool fingerprint: whether to also compute the fingerprint of the file, for the conversion cache
+    :param int stream_threshold: see is_streamed(), files that are streamed aren't read
+    :rtype: PrefetchedFile
+    """
+    if is_streamed(file_path, passes, stream_threshold):
+        return PrefetchedFile(None, None, None, [], True)
+    contents = error = file_fingerprint = None
+    start_wall, start_cpu = time.perf_counter(), time.thread_time()
+    try:
+        # When the attrs pass is the only one, files without anything to convert are never loaded
+        contents = read_file(file_path, prefilter=passes == ['attrs'])
+    except OSError as e:
+        error = e
+    timings = [('read', time.perf_counter() - start_wall, time.thread_time() - start_cpu)]
+    if fingerprint:
+        start_wall, start_cpu = time.perf_counter(), time.thread_time()
+        try:
+            file_fingerprint = get_file_fingerprint(file_path, contents)
+        except OSError:
+            pass
+        timings.append(('cache', time.perf_counter() - start_wall, time.thread_time() - start_cpu))
+    return PrefetchedFile(contents, error, file_fingerprint, timings, False)
+
+
+def process_file(file_path, passes, fingerprint=False, keep_original=False, prefetched=None, show_tags=True, write_mode='full',
+                 manifest_values=None, stream_threshold=0):
+    """
+    Reads the file once and applies the transforms of the given passes to its contents, without writing anything.
+    Entry point of the workers: errors are returned instead of raised so a failing file doesn't abort the whole run,
+    and are returned as strings so they can always be sent back from a worker process.
+
+    :param str file_path:
+    :param list[str] passes:
+    :param bool fingerprint: whether to also return the fingerprint of the file, for the conversion cache
+    :param bool keep_original: whether to also return the current contents when they are transformed
+    :param PrefetchedFile prefetched: result of prefetch_file() if the file was already read, by a reader thread
+    :param bool show_tags: see apply_passes()
+    :param str write_mode: see convert_xml_contents()
+    :param dict manifest_values: see apply_passes()
+    :param int stream_threshold: see is_streamed()
+    :rtype: FileResult
+    """
+    messages = []
+    contents, changed_passes, attrs_result, attrs_error = None, [], None, None
+    verify.DOMAIN_VERIFIER.file_path = file_path
+    if prefetched is None:
+        prefetched = prefetch_file(file_path, passes, fingerprint, stream_threshold)
+    if prefetched.streamed:
+        return stream_file(file_path, passes, fingerprint, keep_original, show_tags, manifest_values)
+    for name, wall, cpu in prefetched.timings:
+        RUN_STATS.add_time(name, wall, cpu, file_path)
+    original = prefetched.contents
+    if prefetched.error is not None:
+        if 'attrs' in passes:
+            attrs_error = str(prefetched.error)
+        else:
+            messages.append(f"Error reading {file_path}: {prefetched.error}")
+    if original is not None:
+        with RUN_STATS.file(file_path):
+            contents, changed_passes, attrs_result, attrs_error = apply_passes(
+                file_path, original, passes, messages, show_tags, write_mode, manifest_values)
+    if not (keep_original and (attrs_result is not None or contents is not None)):
+        original = None
+    return FileResult(file_path, passes, attrs_result, attrs_error, contents, changed_passes, original,
+                      prefetched.fingerprint, messages, DOMAIN_CACHE.pop_updates(), RUN_STATS.pop_updates(),
+                      verify.DOMAIN_VERIFIER.pop_updates())
+
+
+def stream_file(file_path, passes, fingerprint=False, keep_original=False, show_tags=True, manifest_values=None):
+    """
+    process_file() for a file streamed by stream_xml_file() into a temporary file. Files that can't be streamed or are
+    invalid go through process_file() instead, other errors are returned as the error of the file.
+
+    :param str file_path:
+    :param list[str] passes:
+    :param bool fingerprint: see process_file()
+    :param bool keep_original: see process_file()
+    :param bool show_tags: see apply_passes()
+    :param dict manifest_values: see apply_passes()
+    :rtype: FileResult
+    """
+    tags_found = []
+    tags_replaced_by = []
+    file_fingerprint = converter = temporary_path = None
+    verify.DOMAIN_VERIFIER.file_path = file_path
+    directory, name = os.path.split(os.path.abspath(file_path))
+    try:
+        if fingerprint:
+            with RUN_STATS.phase('cache'):
+                file_fingerprint = get_file_fingerprint(file_path)
+        file_descriptor, temporary_path = tempfile.mkstemp(prefix=f".{name}.", suffix='.tmp', dir=directory)
+        with RUN_STATS.file(file_path), open(file_descriptor, 'w', encoding='utf-8', newline='') as output:
+            converter = stream_xml_file(file_path, output, tags_found if show_tags else None, tags_replaced_by if show_tags else None,
+                                        views.VIEW_INDEX, views.VIEW_INDEX.get_module(file_path), get_tree_rewriter(file_path) if 'tree' in passes else None)
+    except (etree.XMLSyntaxError, ValueError):
+        # Invalid XML, attrs or encoding: converted in memory so it's reported like any other file
+        converter = None
+    except Exception as e:
+        return FileResult(file_path, passes, None, str(e), None, [], None, file_fingerprint, [],
+                          DOMAIN_CACHE.pop_updates(), RUN_STATS.pop_updates(), verify.DOMAIN_VERIFIER.pop_updates())
+    finally:
+        if temporary_path is not None and (converter is None or not converter.converted_tags):
+            os.unlink(temporary_path)
+    if converter is None:
+        RUN_STATS.count('stream_fallbacks')
+        return process_file(file_path, passes, fingerprint, keep_original, show_tags=show_tags, manifest_values=manifest_values)
+    if not converter.converted_tags:
+        other_passes = [pass_name for pass_name in passes if pass_name != 'attrs']
+        if not other_passes:
+            return FileResult(file_path, passes, None, None, None, [], None, file_fingerprint, [],
+                              DOMAIN_CACHE.pop_updates(), RUN_STATS.pop_updates(), verify.DOMAIN_VERIFIER.pop_updates())
+        file_result = process_file(file_path, other_passes, keep_original=keep_original, manifest_values=manifest_values)
+        return file_result._replace(passes=passes, fingerprint=file_fingerprint)
+    RUN_STATS.count('streamed_files')
+    return FileResult(file_path, passes, (tags_found, tags_replaced_by), None,
+                      StreamedContents(temporary_path, converter.todos), ['attrs'] + (['tree'] if converter.tree_changed else []),
+                      None, file_fingerprint, [], DOMAIN_CACHE.pop_updates(), RUN_STATS.pop_updates(),
+                      verify.DOMAIN_VERIFIER.pop_updates())
+
+
+def iter_prefetched_files(files, threads, fingerprint=False, stream_threshold=0):
+    """
+    Reads the given files ahead in reader threads, so reading the next files overlaps with processing the current one.
+    At most PREFETCH_PER_THREAD files per thread are read ahead, to bound the memory used by their contents.
+
+    :param list[(str, list[str])] files: files with the passes that will be applied to each of them
+    :param int threads: number of reader threads
+    :param bool fingerprint: see prefetch_file()
+    :param int stream_threshold: see prefetch_file()
+    :returns: iterator of the given files with the result of prefetch_file() for each of them
+    :rtype: collections.abc.Iterator[(str, list[str], PrefetchedFile)]
+    """
+    files = iter(files)
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='replace_attrs_reader') as executor:
+        pending = []
+
+        def submit(file_and_passes):
+            file_path, passes = file_and_passes
+            pending.append((file_path, passes, executor.submit(prefetch_file, file_path, passes, fingerprint and 'attrs' in passes,
+                                                                  stream_threshold)))
+
+        for file_and_passes in islice(files, threads * PREFETCH_PER_THREAD):
+            submit(file_and_passes)
+        while pending:
+            file_path, passes, future = pending.pop(0)
+            if (file_and_passes := next(files, None)) is not None:
+                submit(file_and_passes)
+            yield file_path, passes, future.result()
+
+
+class FileWriter:
+    """
+    Writes files atomically in a background thread, running their callbacks in the main thread in drain() and close()
+    """
+
+    def __init__(self, maxsize=WRITE_QUEUE_SIZE):
+        self.pending = queue.Queue(maxsize)
+        self.done = queue.Queue()
+        self.thread = None
+
+    def write(self, file_path, contents, callback, fingerprint=False):
+        """
+        :param str file_path:
+        :param bytes|StreamedContents contents:
+        :param collections.abc.Callable callback: called with the error (None if the file was written) and the
+            fingerprint of the written file
+        :param bool fingerprint: whether to compute the fingerprint of the written file
+        """
+        if self.thread is None:
+            # Started on the first write, once the worker processes (if any) are forked
+            self.thread = threading.Thread(target=self.run, name='replace_attrs_writer', daemon=True)
+            self.thread.start()
+        self.pending.put((file_path, contents, callback, fingerprint))
+        self.drain()
+
+    def run(self):
+        while (item := self.pending.get()) is not None:
+            file_path, contents, callback, fingerprint = item
+            file_fingerprint = error = None
+            start_wall, start_cpu = time.perf_counter(), time.thread_time()
+            try:
+                write_file_atomically(file_path, contents)
+                if fingerprint:
+                    # Streamed contents are hashed from the written file
+                    file_fingerprint = get_file_fingerprint(file_path, contents if isinstance(contents, bytes) else None)
+            except Exception as e:
+                error = e
+            self.done.put((file_path, callback, error, file_fingerprint,
+                           time.perf_counter() - start_wall, time.thread_time() - start_cpu))
+
+    def drain(self):
+        """
+        Runs the callbacks of the files written so far
+        """
+        while True:
+            try:
+                file_path, callback, error, file_fingerprint, wall, cpu = self.done.get_nowait()
+            except queue.Empty:
+                return
+            RUN_STATS.add_time('write', wall, cpu, file_path)
+            callback(error, file_fingerprint)
+
+    def close(self):
+        """
+        Waits for all files to be written, and runs their callbacks
+        """
+        if self.thread is not None:
+            self.pending.put(None)
+            self.thread.join()
+            self.thread = None
+        self.drain()
+
+
+def init_worker(domains, view_index, module_graph, domain_verifier, simplify_expressions):
+    """
+    Initializer of the worker processes
+
+    :param dict[str, dict] domains: entries of the DOMAIN_CACHE of the main process
+    :param ViewIndex view_index: VIEW_INDEX of the main process
+    :param ModuleGraph module_graph: MODULE_GRAPH of the main process
+    :param DomainVerifier domain_verifier: DOMAIN_VERIFIER of the main process
+    :param bool simplify_expressions: SIMPLIFY_EXPRESSIONS of the main process
+    """
+    simplify.SIMPLIFY_EXPRESSIONS = simplify_expressions
+    views.VIEW_INDEX = view_index
+    modules.MODULE_GRAPH = module_graph
+    verify.DOMAIN_VERIFIER = domain_verifier
+    # Forked workers inherit the stats and verifications of the main process, which must only be merged back once
+    RUN_STATS.pop_updates()
+    verify.DOMAIN_VERIFIER.pop_updates()
+    for key, new_attrs in domains.items():
+        DOMAIN_CACHE.put(key, new_attrs)
+
+
+def iter_processed_files(files, jobs=1, cache=None, keep_original=False, io_threads=0, show_tags=True, write_mode='full',
+                         manifest_values=None, stream_threshold=0, level_key=None):
+    """
+    Yields the result of process_file() for every file, in order, in worker processes with more than one job. Files with
+    an outcome in the cache skip the attrs pass.
+    With level_key, the files of a level are only given to the worker processes once all the files of the previous
+    levels are processed.
+
+    :param list[(str, list[str])] files: files with the passes to apply to each of them
+    :param int jobs: number of worker processes, 0 to use one per CPU
+    :param ConversionCache cache:
+    :param bool keep_original: see process_file()
+    :param int io_threads: number of threads reading the files ahead, when they are processed by a single job
+    :param bool show_tags: see apply_passes()
+    :param str write_mode: see convert_xml_contents()
+    :param dict manifest_values: see apply_passes()
+    :param int stream_threshold: see is_streamed()
+    :param collections.abc.Callable level_key: gives the level of a file path, the files being sorted by level
+    :rtype: collections.abc.Iterator[FileResult]
+    """
+    cached_outcomes = {}
+    if cache is not None:
+        with RUN_STATS.phase('cache'):
+            for file_path, passes in files:
+                if 'attrs' in passes and (cached_outcome := cache.lookup(file_path)) is not None:
+                    cached_outcomes[file_path] = cached_outcome
+    files_to_process = []
+    for file_path, passes in files:
+        if file_path in cached_outcomes:
+            passes = [pass_name for pass_name in passes if pass_name != 'attrs']
+        if passes:
+            files_to_process.append((file_path, passes))
+
+    worker = partial(process_file_task, fingerprint=cache is not None, keep_original=keep_original, show_tags=show_tags,
+                     write_mode=write_mode, manifest_values=manifest_values, stream_threshold=stream_threshold)
+    if io_threads:
+        # Files are read ahead by threads while the current file is processed
+        serial_results = (
+            process_file(file_path, passes, keep_original=keep_original, prefetched=prefetched, show_tags=show_tags,
+                         write_mode=write_mode, manifest_values=manifest_values)
+            for file_path, passes, prefetched in iter_prefetched_files(files_to_process, io_threads, cache is not None, stream_threshold)
+        )
+    else:
+        serial_results = map(worker, files_to_process)
+
+    def merge_cached_outcomes(results):
+        results = iter(results)
+        for file_path, passes in files:
+            cached_error = None
+            if file_path in cached_outcomes:
+                outcome, reason = cached_outcomes[file_path]
+                cached_error = reason if outcome == 'failed' else None
+                if passes == ['attrs']:
+                    yield FileResult(file_path, [], None, cached_error, None, [], None, None, [], None, None, None)
+                    continue
+            file_result = next(results)
+            # In a serial run the updates are popped from and merged back into the same objects, which is harmless
+            DOMAIN_CACHE.merge_updates(file_result.domain_cache_updates)
+            RUN_STATS.merge_updates(file_result.stats_updates)
+            verify.DOMAIN_VERIFIER.merge_updates(file_result.verification_updates)
+            if cached_error is not None:
+                file_result = file_result._replace(attrs_error=cached_error)
+            yield file_result
+
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(files_to_process) < 2:
+        yield from merge_cached_outcomes(serial_results)
+        return
+    levels = [files_to_process]
+    if level_key is not None:
+        levels = [list(level_files) for _level, level_files in groupby(files_to_process, key=lambda file_and_passes: level_key(file_and_passes[0]))]
+    # The worker processes read their own files, overlapping their reads with the processing of the others
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(dict(DOMAIN_CACHE.entries), views.VIEW_INDEX, modules.MODULE_GRAPH, verify.DOMAIN_VERIFIER, simplify.SIMPLIFY_EXPRESSIONS)) as executor:
+        # executor.map() returns the results in submission order, so reports are identical to a serial run. The files of
+        # a level are only submitted once the results of the previous level are all returned, which is the barrier
+        # between levels. Small chunks keep the workers busy on uneven file sizes, while still limiting the
+        # inter-process overhead.
+        yield from merge_cached_outcomes(chain.from_iterable(
+            executor.map(worker, level_files, chunksize=max(1, min(16, len(level_files) // (jobs * 4)))) for level_files in levels
+        ))
+
+
+def process_file_task(file_and_passes, fingerprint=False, keep_original=False, show_tags=True, write_mode='full',
+                      manifest_values=None, stream_threshold=0):
+    """
+    process_file() for a (file, passes) tuple, picklable to be sent to the worker processes
+    """
+    file_path, passes = file_and_passes
+    return process_file(file_path, passes, fingerprint=fingerprint and 'attrs' in passes, keep_original=keep_original,
+                        show_tags=show_tags, write_mode=write_mode, manifest_values=manifest_values,
+                        stream_threshold=stream_threshold)
@@ -0,0 +1,70 @@
+"""
+Summaries printed at the end of a run, and JSON reports written by a run
+"""
+import json
+import os
+
+from .verify import VERIFY_MAX_FILES
+
+
+def print_banner(title):
+    """
+    :param str title: title of a section of the summary
+    """
+    print('\n################################################')
+    print(f"################# {title} ################")
+    print('################################################')
+
+
+def print_footer():
+    print('\n################################################')
+    print('################## Script Finished ##################')
+    print('################################################')
+
+
+def print_files_summary(ok_files, nok_files=None, no_files_message='No files'):
+    """
+    :param list[str] ok_files: files a pass succeeded on
+    :param list[(str, str)] nok_files: files a pass failed on and why, None for the passes that can't fail
+    :param str no_files_message: printed instead of the files a pass succeeded on when there are none
+    """
+    print('\nSucceeded on files:')
+    for file in ok_files:
+        print(file)
+    if not ok_files:
+        print(no_files_message)
+    if nok_files is None:
+        return
+    print('\nFailed on files:')
+    for file, reason in nok_files:
+        print(file)
+        print('Reason: ', reason)
+    if not nok_files:
+        print('No files')
+
+
+def print_mismatches(mismatches):
+    """
+    :param list[dict] mismatches: converted domains that aren't equivalent to their expression, from DomainVerifier.get_report()
+    """
+    print('\nMismatches:')
+    for mismatch in mismatches:
+        print(f"\n{mismatch['attrs']}")
+        print(f"  {mismatch['attribute']}=\"{mismatch['expression']}\"")
+        assignment = ', '.join(f"{variable}={value!r}" for variable, value in mismatch['assignment'].items())
+        print(f"  With {assignment}: the domain is {mismatch['domain_result']}, the expression is {mismatch['expression_result']}")
+        files = mismatch['files']
+        print(f"  In {', '.join(files[:VERIFY_MAX_FILES])}" + (f" and {len(files) - VERIFY_MAX_FILES} more files" if len(files) > VERIFY_MAX_FILES else ''))
+    if not mismatches:
+        print('No mismatches')
+
+
+def write_run_report(path, report):
+    """
+    :param str path:
+    :param dict report:
+    """
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=4)
+    os.replace(temporary_path, path)
@@ -0,0 +1,100 @@
+"""
+Registry of the conversion rules, and classification of the nodes of the documents by the rules applying to them
+"""
+import re
+from collections import namedtuple
+
+from lxml import etree
+
+from .stats import RUN_STATS
+
+
+# Rule of the conversion of the documents, applied by convert_document() to the nodes having the given attribute (with
+# the given value, if not None), of the given tag (of any tag if None):
+#   - convert(nodes, context): converts the nodes, in document order, in place and returns them along with the nodes it
+#     inserted, context being the ConversionContext of their document
+#   - changes_attributes: whether it changes the attributes of the nodes
+#   - changes_parent: whether it inserts or removes nodes next to the nodes (including the nodes themselves)
+ConversionRule = namedtuple('ConversionRule', ['name', 'attribute', 'value', 'tag', 'convert', 'changes_attributes', 'changes_parent'])
+# Document converted by the rules, with the ViewIndex and the module given to convert_document()
+ConversionContext = namedtuple('ConversionContext', ['doc', 'view_index', 'module'])
+# Rules applied by convert_document(), one after the other, see register_conversion_rule()
+CONVERSION_RULES = []
+# Rules applying to nodes of any tag, by attribute, and rules applying to nodes of a given tag, by tag
+CONVERSION_RULES_BY_ATTRIBUTE = ()
+CONVERSION_RULES_BY_TAG = {}
+# Attributes of the nodes the rules apply to, searched in the contents of the files before they're parsed, see
+# compile_conversion_rules()
+CONVERTED_NODES_REGEX = None
+CONVERTED_NODES_BYTES_REGEX = None
+
+
+def compile_conversion_rules():
+    """
+    Indexes the CONVERSION_RULES to classify the nodes of the documents, and compiles the patterns of the nodes they
+    apply to, used to skip the files that don't have any without parsing them
+    """
+    global CONVERSION_RULES_BY_ATTRIBUTE, CONVERSION_RULES_BY_TAG, CONVERTED_NODES_REGEX, CONVERTED_NODES_BYTES_REGEX
+    rules_by_attribute = {}
+    rules_by_tag = {}
+    patterns = {}
+    for rule in CONVERSION_RULES:
+        if rule.tag is None:
+            rules_by_attribute.setdefault(rule.attribute, []).append(rule)
+        else:
+            rules_by_tag.setdefault(rule.tag, []).append(rule)
+        value_pattern = "[\"']" if rule.value is None else f"[\"']{re.escape(rule.value)}[\"']"
+        patterns[rf"\b{re.escape(rule.attribute)}\s*=\s*{value_pattern}"] = None
+    CONVERSION_RULES_BY_ATTRIBUTE = tuple((attribute, tuple(rules)) for attribute, rules in rules_by_attribute.items())
+    CONVERSION_RULES_BY_TAG = {tag: tuple(rules) for tag, rules in rules_by_tag.items()}
+    pattern = '|'.join(patterns) or r"(?!)"
+    CONVERTED_NODES_REGEX = re.compile(pattern)
+    CONVERTED_NODES_BYTES_REGEX = re.compile(pattern.encode())
+
+
+def register_conversion_rule(rule):
+    """
+    Adds a rule to the conversion of the documents, applied after the existing ones, or replaces the rule of the same
+    name. Rules registered after the worker processes of a run are started aren't applied by them.
+
+    :param ConversionRule rule:
+    """
+    CONVERSION_RULES[:] = [existing_rule for existing_rule in CONVERSION_RULES if existing_rule.name != rule.name] + [rule]
+    compile_conversion_rules()
+
+
+def matches_conversion_rule(node, rule):
+    """
+    :param xml.etree.ElementTree.Element node:
+    :param ConversionRule rule:
+    :returns: whether the rule applies to the node
+    :rtype: bool
+    """
+    return (rule.tag is None or node.tag == rule.tag) and (value := node.get(rule.attribute)) is not None and (rule.value is None or value == rule.value)
+
+
+def find_converted_nodes(doc):
+    """
+    Classifies the nodes of a document by the rules that apply to them, in a single traversal of the document: only the
+    attributes the rules of any tag apply to, and the rules of its tag are checked on each node, whatever the number of
+    rules
+
+    :param xml.etree.ElementTree.Element doc: root node of the document, or of the subtree to convert
+    :returns: the nodes each rule applies to, in document order, by name of the rule
+    :rtype: dict[str, list[xml.etree.ElementTree.Element]]
+    """
+    converted_nodes = {rule.name: [] for rule in CONVERSION_RULES}
+    rules_by_attribute, rules_by_tag = CONVERSION_RULES_BY_ATTRIBUTE, CONVERSION_RULES_BY_TAG
+    with RUN_STATS.phase('classify'):
+        for node in doc.iter(etree.Element):
+            attrib = node.attrib
+            for attribute, rules in rules_by_attribute:
+                if attribute in attrib:
+                    for rule in rules:
+                        if rule.value is None or attrib[attribute] == rule.value:
+                            converted_nodes[rule.name].append(node)
+            if (rules := rules_by_tag.get(node.tag)) is not None:
+                for rule in rules:
+                    if matches_conversion_rule(node, rule):
+                        converted_nodes[rule.name].append(node)
+    return converted_nodes
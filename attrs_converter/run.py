@@ -0,0 +1,456 @@
+"""
+Run of the passes on the files of a root directory: the files are processed, confirmed, written and reported, then the
+summary of the run is printed
+"""
+import json
+import os
+import time
+from functools import partial
+from pathlib import Path
+
+try:
+    import numpy
+except ImportError:
+    # Optional, the converted domains are then verified one field assignment at a time
+    numpy = None
+
+from .cache import CONVERTER_VERSION, ConversionCache, DOMAIN_CACHE
+from .files import FILE_ROLES, get_unified_diff
+from . import modules
+from .processing import FileWriter, apply_passes, get_pass_change_message, iter_processed_files
+from .reports import print_banner, print_files_summary, print_footer, print_mismatches, write_run_report
+from .sharding import get_file_shard, get_relative_path
+from .stats import RUN_STATS
+from .streaming import StreamedContents
+from .tree import get_tree_rewriter
+from . import verify
+from . import views
+
+
+def get_file_passes(file_path, role, enabled_passes):
+    """
+    :param str file_path:
+    :param str role: one of FILE_ROLES
+    :param list[str] enabled_passes:
+    :returns: the enabled passes that apply to the file, according to its role and type
+    :rtype: list[str]
+    """
+    return [
+        pass_name for pass_name in enabled_passes
+        if (pass_name == 'attrs' and role == 'view_xml')
+        or (pass_name == 'tree' and get_tree_rewriter(file_path) is not None)
+        or (pass_name == 'manifest' and role == 'manifest')
+    ]
+
+
+class ConversionRun:
+    """
+    Files processed by a run and their outcomes, from the files of the root directory to the summary of the run
+    """
+
+    def __init__(self, args, root_dir, enabled_passes, confirm_each_file):
+        """
+        :param argparse.Namespace args: arguments of the command line
+        :param str root_dir:
+        :param list[str] enabled_passes: passes to run, see ask_passes()
+        :param bool confirm_each_file: whether the attrs conversion of each file is confirmed before it's written
+        """
+        self.args = args
+        self.root_dir = root_dir
+        self.enabled_passes = enabled_passes
+        self.confirm_each_file = confirm_each_file
+        # Tags are only serialized when they are displayed, the converted ones always are when they have to be confirmed
+        self.show_tags = args.output == 'verbose' or confirm_each_file
+        self.stream_threshold = args.stream_threshold
+        if confirm_each_file or args.output == 'diff' or args.write_mode == 'splice':
+            # The current and converted contents of every file are needed in memory
+            self.stream_threshold = 0
+        self.manifest_values = {'version': args.manifest_version, 'author': args.manifest_author}
+        self.cache = None
+        self.output_file = None
+        self.files_to_process = []
+        self.discovered_files = 0
+        self.planned_passes = {}
+        self.ok_attrs_states_files = []
+        self.nok_attrs_states_files = []
+        self.ok_tree_list_files = []
+        self.ok_manifest_files = []
+        self.processed_passes = set()
+        self.attrs_files_found = False
+
+    def plan(self, files_by_role):
+        """
+        Lists the files to process and the passes applied to each of them, in the order of the modules, and prepares
+        their conversion
+
+        :param dict[str, list[str]] files_by_role: result of index_files() for the root directory
+        """
+        args = self.args
+        # Passes applied to each file, according to its role and type, files without any are never read
+        for role in FILE_ROLES:
+            for file_path in files_by_role[role]:
+                if file_passes := get_file_passes(file_path, role, self.enabled_passes):
+                    self.files_to_process.append((file_path, file_passes))
+
+        # Files are processed module by module, each module after the modules it depends on
+        with RUN_STATS.phase('graph'):
+            modules.MODULE_GRAPH.build(files_by_role['manifest'])
+            self.files_to_process.sort(key=lambda file_and_passes: modules.MODULE_GRAPH.get_schedule_key(file_and_passes[0]))
+        RUN_STATS.count('modules', len(modules.MODULE_GRAPH.modules))
+        self.discovered_files = len(self.files_to_process)
+        if args.shard:
+            self.files_to_process = self.filter_shard(self.files_to_process)
+            print(f"\nShard {args.shard[0]}/{args.shard[1]}: processing {len(self.files_to_process)} of {self.discovered_files} files")
+        self.planned_passes = dict(self.files_to_process)
+
+        perform_attrs_states = 'attrs' in self.enabled_passes
+        if perform_attrs_states and args.cache and not args.no_cache:
+            self.cache = ConversionCache(args.cache)
+        if args.domain_cache:
+            DOMAIN_CACHE.load(args.domain_cache)
+        verify.DOMAIN_VERIFIER.enabled = args.verify and perform_attrs_states
+        # Without the views indexed by a previous run in the same process
+        views.VIEW_INDEX = views.ViewIndex()
+        if perform_attrs_states and not args.no_view_index:
+            # Attribute overrides are resolved against their parent views, which can be in any XML file of the repository
+            with RUN_STATS.phase('index'):
+                views.VIEW_INDEX.build(files_by_role['manifest'], files_by_role['view_xml'] + files_by_role['xml'])
+            RUN_STATS.count('indexed_views', len(views.VIEW_INDEX.views))
+        if args.output in ('diff', 'jsonl'):
+            output_path = args.output_file or ('replace_attrs.patch' if args.output == 'diff' else 'replace_attrs.jsonl')
+            self.output_file = open(output_path, 'w', encoding='utf-8', newline='')
+
+    def filter_shard(self, files):
+        """
+        :param list[(str, list[str])] files: files and their passes
+        :returns: the files of the shard given with --shard
+        :rtype: list[(str, list[str])]
+        """
+        shard_index, shard_count = self.args.shard
+        return [(file_path, file_passes) for file_path, file_passes in files
+                if get_file_shard(file_path, self.root_dir, shard_count, self.args.shard_by) == shard_index]
+
+    def write_file_record(self, file_path, attrs_outcome, error, changed_passes, todos, messages, written):
+        self.output_file.write(json.dumps({
+            'file': file_path,
+            'attrs': attrs_outcome,
+            'error': error,
+            'passes': changed_passes,
+            'todos': todos,
+            'messages': messages,
+            'written': written,
+        }) + '\n')
+
+    def finish_file(self, file_path, file_passes, attrs_outcome, attrs_error, changed_passes, fingerprint, original, contents,
+                    messages, write_error=None, written_fingerprint=None):
+        """
+        Records the outcome of a processed file, once it's written if it has to be
+        """
+        args = self.args
+        if write_error is not None:
+            if attrs_outcome == 'converted':
+                RUN_STATS.count('files_failed')
+                self.nok_attrs_states_files.append((file_path, write_error))
+            print(f"Error processing {file_path}: {write_error}") # Print the error for clarity
+            if args.output == 'jsonl':
+                self.write_file_record(file_path, 'failed' if attrs_outcome == 'converted' else attrs_outcome, write_error, [], 0, messages, False)
+            return
+        if written_fingerprint is not None:
+            if attrs_outcome is not None:
+                fingerprint = written_fingerprint
+            elif 'attrs' in self.planned_passes[file_path] and 'attrs' not in file_passes:
+                # The attrs outcome of the file is cached
+                self.cache.refresh(file_path, written_fingerprint)
+        if attrs_outcome == 'converted':
+            RUN_STATS.count('files_converted')
+            self.ok_attrs_states_files.append(file_path)
+        if fingerprint is not None and attrs_outcome in ('converted', 'unchanged', 'failed') and (attrs_outcome != 'converted' or not args.dry_run):
+            self.cache.record(file_path, attrs_outcome, fingerprint, reason=attrs_error)
+        if 'tree' in changed_passes:
+            RUN_STATS.count('tree_files_modified')
+            self.ok_tree_list_files.append(file_path)
+        if 'manifest' in changed_passes:
+            RUN_STATS.count('manifests_updated')
+            self.ok_manifest_files.append(file_path)
+        if args.output == 'diff' and contents is not None:
+            self.output_file.write(get_unified_diff(Path(os.path.relpath(file_path, self.root_dir)).as_posix(), original, contents))
+        elif args.output == 'jsonl':
+            if attrs_outcome is None and 'attrs' in self.planned_passes[file_path]:
+                attrs_outcome = 'cached'
+            if isinstance(contents, StreamedContents):
+                todos = contents.todos
+            else:
+                todos = contents.count(b'<!--TODO') - original.count(b'<!--TODO') if contents is not None else 0
+            self.write_file_record(file_path, attrs_outcome, attrs_error, changed_passes, todos, messages, contents is not None and not args.dry_run)
+
+    def confirm_file(self, file_path, tags_found, tags_replaced_by):
+        """
+        Prints the converted tags of a file, and asks whether to convert it if each file is confirmed
+
+        :returns: whether the attrs conversion of the file is accepted
+        :rtype: bool
+        """
+        if self.show_tags:
+            print('\n#############################' + ((6 + len(file_path)) * '#'))
+            print('##### Taking care of file -> %s' % file_path)
+            print('\n##### Current tags found #####\n')
+            for t in tags_found:
+                print(t)
+            print('\n##### Will be replaced by #####\n')
+            for t in tags_replaced_by:
+                print(t)
+            print('\n###############################\n')
+        if self.confirm_each_file:
+            confirm = input('Do you want to replace? (y/n) (empty == no) : ') or 'n'
+        else:
+            confirm = 'y'
+        return confirm.lower()[0] == 'y'
+
+    def process_files(self, files, jobs=None, io_threads=None):
+        """
+        Processes the files, and reports and writes them
+
+        :param list[(str, list[str])] files: files and their passes
+        :param int jobs: see iter_processed_files(), --jobs if None
+        :param int io_threads: see iter_processed_files(), --io-threads if None
+        """
+        args = self.args
+        # Files are written by a background thread, while the next ones are processed
+        writer = FileWriter()
+        files_results = iter_processed_files(files, args.jobs if jobs is None else jobs, self.cache,
+                                             keep_original=self.confirm_each_file or self.output_file is not None,
+                                             io_threads=args.io_threads if io_threads is None else io_threads,
+                                             show_tags=self.show_tags, write_mode=args.write_mode,
+                                             manifest_values=self.manifest_values, stream_threshold=self.stream_threshold,
+                                             level_key=modules.MODULE_GRAPH.get_level)
+        for file_path, file_passes, attrs_result, attrs_error, contents, changed_passes, original, fingerprint, messages, _, _, _ in files_results:
+            self.processed_passes.update(file_passes)
+            for message in messages:
+                print(message)
+            attrs_outcome = None
+            if attrs_error is not None:
+                RUN_STATS.count('files_failed')
+                self.nok_attrs_states_files.append((file_path, attrs_error))
+                print(f"Error processing {file_path}: {attrs_error}") # Print the error for clarity
+                attrs_outcome = 'failed'
+            elif attrs_result is None and 'attrs' in file_passes:
+                RUN_STATS.count('files_unchanged')
+                attrs_outcome = 'unchanged'
+            elif attrs_result is not None:
+                self.attrs_files_found = True
+                if self.confirm_file(file_path, *attrs_result):
+                    attrs_outcome = 'converted'
+                else:
+                    attrs_outcome = 'declined'
+                    # Apply the other passes again, without the declined attrs conversion
+                    contents, changed_passes, _, _ = apply_passes(file_path, original, [p for p in file_passes if p != 'attrs'], [],
+                                                               manifest_values=self.manifest_values)
+
+            if args.output == 'verbose':
+                for pass_name in ('tree', 'manifest'):
+                    if pass_name in changed_passes:
+                        print(get_pass_change_message(file_path, pass_name, args.dry_run))
+            finish = partial(self.finish_file, file_path, file_passes, attrs_outcome, attrs_error, changed_passes, fingerprint,
+                             original, contents, messages)
+            if contents is not None and not args.dry_run:
+                writer.write(file_path, contents, finish, fingerprint=self.cache is not None)
+            else:
+                if isinstance(contents, StreamedContents):
+                    os.unlink(contents.path)
+                finish()
+        writer.close()
+
+    def process_changed_files(self, changed_files):
+        """
+        Processes the files changed while watching the root directory, see watch_files()
+
+        :param list[(str, str)] changed_files: changed files and their roles
+        """
+        start = time.perf_counter()
+        if 'attrs' in self.enabled_passes and not self.args.no_view_index:
+            # The views changed by the files are indexed again before converting them
+            views.VIEW_INDEX.update([file_path for file_path, role in changed_files if role == 'manifest'],
+                                    [file_path for file_path, role in changed_files if role in ('view_xml', 'xml')])
+        files = [(file_path, file_passes) for file_path, role in changed_files if (file_passes := get_file_passes(file_path, role, self.enabled_passes))]
+        if self.args.shard:
+            files = self.filter_shard(files)
+        if not files:
+            return
+        self.planned_passes.update(files)
+        # Single process, as starting the worker processes would take longer than converting a few files
+        self.process_files(files, jobs=1, io_threads=0)
+        if self.output_file is not None:
+            self.output_file.flush()
+        print(f"Processed {len(files)} changed files in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    def close(self):
+        """
+        Closes the --output-file, and saves the caches unless it's a dry run
+        """
+        args = self.args
+        if self.output_file is not None:
+            self.output_file.close()
+            print(f"{'Diff' if args.output == 'diff' else 'File records'} written to {self.output_file.name}")
+        if args.dry_run:
+            return
+        if self.cache is not None:
+            try:
+                with RUN_STATS.phase('cache'):
+                    self.cache.save()
+            except OSError as e:
+                print(f"Warning: Could not save the conversion cache {self.cache.path}: {e}")
+        if args.domain_cache and 'attrs' in self.enabled_passes:
+            try:
+                DOMAIN_CACHE.save(args.domain_cache)
+            except OSError as e:
+                print(f"Warning: Could not save the domain cache {args.domain_cache}: {e}")
+
+    def print_summary(self):
+        args = self.args
+        root_dir = self.root_dir
+        print_banner('ATTRS/STATES Conversion Summary')
+
+        if self.cache is not None and self.cache.hits:
+            print(f"Skipped {self.cache.hits} files unchanged since the previous run (conversion cache: {self.cache.path})")
+        if DOMAIN_CACHE.hits or DOMAIN_CACHE.misses:
+            print(f"Converted {DOMAIN_CACHE.misses} distinct attrs values, reused {DOMAIN_CACHE.hits} conversions (domain cache)")
+
+        if 'attrs' not in self.enabled_passes:
+            print("Skipped attrs/states conversion.")
+        elif not self.attrs_files_found:
+            print(f'No XML Files with "attrs" or "states" found in "views" subdirectories under " {root_dir} "')
+
+        print_files_summary(self.ok_attrs_states_files, self.nok_attrs_states_files)
+
+        print_banner("'tree' to 'list' Replacement Summary")
+
+        if 'tree' not in self.processed_passes and 'tree' in self.enabled_passes:
+            print(f"No files were processed for 'tree' to 'list' replacement. Ensure '{root_dir}' contains files.")
+        elif 'tree' not in self.processed_passes:
+            print("Skipped 'tree' to 'list' replacement.")
+
+        print_files_summary(self.ok_tree_list_files, no_files_message='No files modified.')
+
+        print_banner('Odoo 18 Manifest Update Summary')
+
+        if 'manifest' not in self.processed_passes and 'manifest' in self.enabled_passes:
+            print(f"No __manifest__.py files were processed. Ensure '{root_dir}' contains modules.")
+        elif 'manifest' not in self.processed_passes:
+            print("Skipped Odoo 18 manifest update.")
+
+        print_files_summary(self.ok_manifest_files, no_files_message='No files modified.')
+
+        if verify.DOMAIN_VERIFIER.enabled:
+            print_banner('Verification of the Converted Domains')
+            print(f"Verified {RUN_STATS.counters['verified_attributes']} converted attributes of {len(verify.DOMAIN_VERIFIER.verified)} "
+                  f"distinct attrs values on {RUN_STATS.counters['verified_assignments']} field assignments "
+                  f"({'numpy' if numpy is not None else 'without numpy'}), "
+                  f"{RUN_STATS.counters['unverified_attributes']} couldn't be evaluated")
+            print_mismatches(verify.DOMAIN_VERIFIER.get_report())
+        module_graph = modules.MODULE_GRAPH
+        if module_graph.modules:
+            print_banner('Module Dependency Graph')
+            print(f"{len(module_graph.modules)} modules processed in {len(module_graph.levels)} levels of independent modules")
+            print('\nDependency cycles:')
+            for cycle in module_graph.cycles:
+                print(', '.join(cycle))
+            if not module_graph.cycles:
+                print('No cycles')
+            print('\nDependencies outside of the root directory:')
+            for dependency, dependents in module_graph.get_missing_dependencies().items():
+                print(f"{dependency} (required by {', '.join(dependents)})")
+            if not module_graph.missing:
+                print('No dependencies')
+            for name, directories in module_graph.duplicates.items():
+                print(f"Warning: module {name} is defined more than once ({', '.join(directories)}), the first one is the one depended on")
+            for manifest_file, error in module_graph.errors.items():
+                print(f"Warning: Could not read the dependencies of {manifest_file}: {error}")
+        print_footer()
+        if args.dry_run:
+            print('Dry run: no file was written')
+
+    def get_results(self):
+        """
+        :returns: the results of the run, mergeable with the results of the other shards, see merge_shard_results()
+        :rtype: dict
+        """
+        args = self.args
+        root_dir = self.root_dir
+        # Paths are relative to the root directory, as the shards of a run can check it out in different places
+        return {
+            'version': CONVERTER_VERSION,
+            'root': root_dir,
+            'passes': self.enabled_passes,
+            'shard': list(args.shard or (1, 1)),
+            'shard_by': args.shard_by,
+            'discovered_files': self.discovered_files,
+            'files': len(self.files_to_process),
+            'attrs': {
+                'processed': self.attrs_files_found,
+                'succeeded': [get_relative_path(file_path, root_dir) for file_path in self.ok_attrs_states_files],
+                'failed': [{'file': get_relative_path(file_path, root_dir), 'reason': str(reason)} for file_path, reason in self.nok_attrs_states_files],
+            },
+            'tree': {
+                'processed': 'tree' in self.processed_passes,
+                'succeeded': [get_relative_path(file_path, root_dir) for file_path in self.ok_tree_list_files],
+            },
+            'manifest': {
+                'processed': 'manifest' in self.processed_passes,
+                'succeeded': [get_relative_path(file_path, root_dir) for file_path in self.ok_manifest_files],
+            },
+            'verification_mismatches': [
+                {**mismatch, 'files': [get_relative_path(file_path, root_dir) for file_path in mismatch['files']]}
+                for mismatch in verify.DOMAIN_VERIFIER.get_report()
+            ] if verify.DOMAIN_VERIFIER.enabled else None,
+            'counters': dict(sorted(RUN_STATS.counters.items())),
+        }
+
+    def get_report(self, passes, files_by_role, wall_time):
+        """
+        :param list[str] passes: passes given with --passes
+        :param dict[str, list[str]] files_by_role: result of index_files() for the root directory
+        :param float wall_time: duration of the run, in seconds
+        :returns: the run report written to the --report file
+        :rtype: dict
+        """
+        args = self.args
+        cache = self.cache
+        return {
+            'version': CONVERTER_VERSION,
+            'root': self.root_dir,
+            'passes': passes,
+            'jobs': args.jobs,
+            'shard': list(args.shard) if args.shard else None,
+            'dry_run': args.dry_run,
+            'wall_time': round(wall_time, 6),
+            'files_by_role': {role: len(files) for role, files in files_by_role.items()},
+            'caches': {
+                name: {'hits': hits, 'misses': misses, 'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None}
+                for name, hits, misses in [
+                    ('conversion', cache.hits if cache is not None else 0, cache.misses if cache is not None else 0),
+                    ('domains', DOMAIN_CACHE.hits, DOMAIN_CACHE.misses),
+                ]
+            },
+            'module_graph': modules.MODULE_GRAPH.get_report(),
+            'verification_mismatches': verify.DOMAIN_VERIFIER.get_report() if verify.DOMAIN_VERIFIER.enabled else None,
+            **RUN_STATS.get_report(args.slowest),
+        }
+
+    def write_json(self, path, data, description):
+        """
+        :param str path:
+        :param dict data:
+        :param str description: what is written, for the messages
+        """
+        try:
+            write_run_report(path, data)
+            print(f"{description.capitalize()} written to {path}")
+        except OSError as e:
+            print(f"Warning: Could not write the {description} {path}: {e}")
+
+    def get_exit_code(self):
+        """
+        :returns: 1 if any file failed to convert or, with --verify, if any converted domain isn't equivalent
+        :rtype: int
+        """
+        return 1 if self.nok_attrs_states_files or verify.DOMAIN_VERIFIER.mismatches else 0
@@ -0,0 +1,170 @@
+"""
+Split of a run into shards processing disjoint subsets of the files, and merge of their results
+"""
+import hashlib
+import json
+import os
+from collections import Counter
+from operator import itemgetter
+from pathlib import Path
+
+from . import modules
+from .processing import PASSES
+from .reports import print_banner, print_files_summary, print_footer, print_mismatches, write_run_report
+
+
+# What files are hashed by to be assigned to a shard: their path, or the module they belong to so that all the files of a
+# module are converted by the same shard (files outside of any module are still hashed by their path)
+SHARD_KEYS = ['path', 'module']
+# Counters of the whole repository, that are the same in all the shards instead of adding up
+SHARD_REPOSITORY_COUNTERS = ['modules', 'indexed_views']
+
+
+def get_relative_path(file_path, root_dir):
+    """
+    :param str file_path:
+    :param str root_dir:
+    :returns: path of the file relative to the root directory, with / separators, the same on every machine
+    :rtype: str
+    """
+    return Path(os.path.relpath(file_path, root_dir)).as_posix()
+
+
+def get_file_shard(file_path, root_dir, shard_count, shard_by='path'):
+    """
+    Files are assigned to the shards by a hash of their relative path (or module), instead of hash() that is salted
+    differently by each Python process, so that the shards of a run never overlap whatever machine each one runs on
+
+    :param str file_path:
+    :param str root_dir:
+    :param int shard_count:
+    :param str shard_by: one of SHARD_KEYS
+    :returns: shard of the file, from 1 to shard_count
+    :rtype: int
+    """
+    key = modules.MODULE_GRAPH.get_module(file_path) if shard_by == 'module' else None
+    if key is None:
+        key = get_relative_path(file_path, root_dir)
+    return int.from_bytes(hashlib.sha1(key.encode('utf-8')).digest()[:8], 'big') % shard_count + 1
+
+
+def merge_shard_results(shard_results):
+    """
+    :param list[dict] shard_results: results of all the shards of a run, as written with --shard
+    :returns: results of the whole run, in the same shape, with the files sorted by path
+    :rtype: dict
+    :raises ValueError: if the shards aren't shards of the same run, or if some are missing or given more than once
+    """
+    first = shard_results[0]
+    shard_count = first['shard'][1]
+    for results in shard_results:
+        for key in ('version', 'passes', 'shard_by', 'discovered_files'):
+            if results[key] != first[key]:
+                raise ValueError(f"shard {results['shard'][0]}/{results['shard'][1]} has another {key} ({results[key]!r}) "
+                                 f"than shard {first['shard'][0]}/{shard_count} ({first[key]!r})")
+        if results['shard'][1] != shard_count:
+            raise ValueError(f"shard {results['shard'][0]}/{results['shard'][1]} isn't one of {shard_count} shards")
+    shard_indexes = Counter(results['shard'][0] for results in shard_results)
+    if duplicates := sorted(index for index, count in shard_indexes.items() if count > 1):
+        raise ValueError(f"shards given more than once: {', '.join(map(str, duplicates))} (of {shard_count})")
+    if missing := sorted(set(range(1, shard_count + 1)) - set(shard_indexes)):
+        raise ValueError(f"missing shards: {', '.join(map(str, missing))} (of {shard_count})")
+
+    mismatches = {}
+    for results in shard_results:
+        for mismatch in results['verification_mismatches'] or []:
+            key = (mismatch['attrs'], mismatch['attribute'])
+            if key in mismatches:
+                mismatches[key]['files'] = sorted(set(mismatches[key]['files']) | set(mismatch['files']))
+            else:
+                mismatches[key] = dict(mismatch)
+    counters = Counter()
+    for results in shard_results:
+        counters.update(results['counters'])
+    # Every shard indexes the whole repository, and the same mismatches can be found by several shards
+    for name in SHARD_REPOSITORY_COUNTERS:
+        if name in first['counters']:
+            counters[name] = first['counters'][name]
+    if mismatches:
+        counters['verification_mismatches'] = len(mismatches)
+    passes_results = {
+        pass_name: {
+            'processed': any(results[pass_name]['processed'] for results in shard_results),
+            'succeeded': sorted(file for results in shard_results for file in results[pass_name]['succeeded']),
+        }
+        for pass_name in PASSES
+    }
+    passes_results['attrs']['failed'] = sorted((failure for results in shard_results for failure in results['attrs']['failed']),
+                                               key=itemgetter('file'))
+    return {
+        'version': first['version'],
+        'root': first['root'],
+        'passes': first['passes'],
+        'shard': None,
+        'shard_by': first['shard_by'],
+        'merged_shards': shard_count,
+        'discovered_files': first['discovered_files'],
+        'files': sum(results['files'] for results in shard_results),
+        **passes_results,
+        'verification_mismatches': [mismatches[key] for key in sorted(mismatches)]
+                                   if any(results['verification_mismatches'] is not None for results in shard_results) else None,
+        'counters': dict(sorted(counters.items())),
+    }
+
+
+def merge_results_files(shard_paths, results_path=None):
+    """
+    Prints the summary of a run split with --shard, from the results files of its shards
+
+    :param list[str] shard_paths: results files of all the shards
+    :param str results_path: file the results of the whole run are written to, if any
+    :returns: exit code, as returned by main() for the whole run, 2 if the shards can't be merged
+    :rtype: int
+    """
+    try:
+        shard_results = []
+        for shard_path in shard_paths:
+            with open(shard_path, encoding='utf-8') as f:
+                shard_results.append(json.load(f))
+        results = merge_shard_results(shard_results)
+    except (OSError, ValueError) as e:
+        # json.JSONDecodeError is a ValueError
+        print(f"Error: Could not merge the shard results: {e}")
+        return 2
+    except (KeyError, TypeError) as e:
+        print(f"Error: Could not merge the shard results, they aren't all results files written with --shard: {e!r}")
+        return 2
+
+    print_banner('ATTRS/STATES Conversion Summary')
+    print(f"Merged {results['merged_shards']} shards, {results['files']} of {results['discovered_files']} files of "
+          f"\"{results['root']}\" processed (sharded by {results['shard_by']})")
+    if 'attrs' not in results['passes']:
+        print("Skipped attrs/states conversion.")
+    elif not results['attrs']['processed']:
+        print(f'No XML Files with "attrs" or "states" found in "views" subdirectories under " {results["root"]} "')
+    print_files_summary(results['attrs']['succeeded'], [(failure['file'], failure['reason']) for failure in results['attrs']['failed']])
+
+    print_banner("'tree' to 'list' Replacement Summary")
+    if 'tree' not in results['passes']:
+        print("Skipped 'tree' to 'list' replacement.")
+    print_files_summary(results['tree']['succeeded'], no_files_message='No files modified.')
+
+    print_banner('Odoo 18 Manifest Update Summary')
+    if 'manifest' not in results['passes']:
+        print("Skipped Odoo 18 manifest update.")
+    print_files_summary(results['manifest']['succeeded'], no_files_message='No files modified.')
+
+    if results['verification_mismatches'] is not None:
+        print_banner('Verification of the Converted Domains')
+        print(f"Verified {results['counters'].get('verified_attributes', 0)} converted attributes on "
+              f"{results['counters'].get('verified_assignments', 0)} field assignments, "
+              f"{results['counters'].get('unverified_attributes', 0)} couldn't be evaluated")
+        print_mismatches(results['verification_mismatches'])
+    print_footer()
+    if results_path:
+        try:
+            write_run_report(results_path, results)
+            print(f"Results written to {results_path}")
+        except OSError as e:
+            print(f"Warning: Could not write the results {results_path}: {e}")
+    return 1 if results['attrs']['failed'] or results['verification_mismatches'] else 0
@@ -0,0 +1,270 @@
+"""
+Simplification of the converted expressions
+"""
+import ast
+import re
+
+
+# Whether the converted expressions are simplified by simplify_expression(), disabled with --no-simplify
+SIMPLIFY_EXPRESSIONS = True
+XMLID_REFERENCE_REGEX = re.compile(r"%\([\w.]+\)d")
+XMLID_NAME_REGEX = re.compile(r"\b__xmlid_\d+\b")
+# Methods of the converted expressions called on constants, folded into the constants they return
+FOLDED_METHODS = {'lower': str.lower, 'upper': str.upper}
+# Comparisons whose negation is the other comparison, and whose operands are never compared with an error
+NEGATED_COMPARISONS = {ast.In: ast.NotIn, ast.NotIn: ast.In, ast.Eq: ast.NotEq, ast.NotEq: ast.Eq}
+# Comparisons with constants merged into a single one when they compare a same value
+MEMBERSHIP_COMPARISONS = {ast.In: True, ast.Eq: True, ast.NotIn: False, ast.NotEq: False}
+# Precedence of the operators of the conditions, from the loosest
+OR_PRECEDENCE, AND_PRECEDENCE, NOT_PRECEDENCE, COMPARE_PRECEDENCE, ATOM_PRECEDENCE = range(1, 6)
+COMPARISON_OPERATORS = {
+    ast.Eq: '==', ast.NotEq: '!=', ast.Lt: '<', ast.LtE: '<=', ast.Gt: '>', ast.GtE: '>=', ast.In: 'in', ast.NotIn: 'not in',
+    ast.Is: 'is', ast.IsNot: 'is not',
+}
+# Comparisons of the converted expressions, folded on constants and applied by the verification of the domains
+COMPARISON_FUNCTIONS = {
+    ast.Eq: lambda left, right: left == right,
+    ast.NotEq: lambda left, right: left != right,
+    ast.Lt: lambda left, right: left < right,
+    ast.LtE: lambda left, right: left <= right,
+    ast.Gt: lambda left, right: left > right,
+    ast.GtE: lambda left, right: left >= right,
+    ast.In: lambda left, right: left in right,
+    ast.NotIn: lambda left, right: left not in right,
+}
+
+
+def substitute_xmlid_references(expression):
+    """
+    Replaces the %(module.xml_id)d references of a converted expression, which aren't valid Python, by names
+
+    :param str expression:
+    :returns: the expression, and the reference replaced by each name
+    :rtype: (str, dict[str, str])
+    """
+    names = {}
+
+    def substitute(match):
+        if (name := names.get(match.group(0))) is None:
+            name = names[match.group(0)] = f"__xmlid_{len(names)}"
+        return name
+
+    expression = XMLID_REFERENCE_REGEX.sub(substitute, expression)
+    return expression, {name: reference for reference, name in names.items()}
+
+
+def is_constant_node(node):
+    """
+    :param ast.AST node:
+    :returns: whether the node is a constant, a negative number or a list or tuple of them
+    :rtype: bool
+    """
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return all(map(is_constant_node, node.elts))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return isinstance(node.operand, ast.Constant)
+    return isinstance(node, ast.Constant)
+
+
+def get_constant_value(node):
+    """
+    :param ast.AST node: node for which is_constant_node() is true
+    """
+    return ast.literal_eval(node)
+
+
+def get_membership_test(node):
+    """
+    :param ast.AST node:
+    :returns: the compared value, whether the comparison is positive (in, ==) and the constants it's compared with, if
+        the node is an in, not in, == or != comparison of a value with constants
+    :rtype: None|(ast.AST, bool, list)
+    """
+    if not (isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in MEMBERSHIP_COMPARISONS
+            and is_constant_node(node.comparators[0]) and not is_constant_node(node.left)):
+        return None
+    value = get_constant_value(node.comparators[0])
+    if isinstance(node.ops[0], (ast.In, ast.NotIn)):
+        if type(value) not in (list, tuple):
+            # e.g. a substring test
+            return None
+        value = list(value)
+    else:
+        value = [value]
+    return node.left, MEMBERSHIP_COMPARISONS[type(node.ops[0])], value
+
+
+def merge_membership_tests(left, tests, conjunction):
+    """
+    :param ast.AST left: value compared by all the tests
+    :param list[(bool, list)] tests: whether each test is positive, with the constants it compares the value with
+    :param bool conjunction: whether the tests are combined with 'and' rather than 'or'
+    :returns: a single test equivalent to the combined tests
+    :rtype: ast.AST
+    """
+    positive, values = tests[0]
+    for test_positive, test_values in tests[1:]:
+        if positive == test_positive:
+            if conjunction == positive:
+                # x in A and x in B, x not in A or x not in B
+                values = [value for value in values if value in test_values]
+            else:
+                # x in A or x in B, x not in A and x not in B
+                values = values + [value for value in test_values if value not in values]
+            continue
+        included, excluded = (values, test_values) if positive else (test_values, values)
+        if conjunction:
+            # x in A and x not in B
+            values = [value for value in included if value not in excluded]
+        else:
+            # x in A or x not in B
+            values = [value for value in excluded if value not in included]
+        positive = conjunction
+    if not values:
+        return ast.Constant(not positive)
+    if len(values) == 1:
+        operator, comparator = ast.Eq() if positive else ast.NotEq(), values[0]
+    else:
+        operator, comparator = ast.In() if positive else ast.NotIn(), values
+    return ast.Compare(left, [operator], [ast.parse(repr(comparator), mode='eval').body])
+
+
+def simplify_terms(terms, conjunction):
+    """
+    :param list[ast.AST] terms: simplified terms of an 'and' or 'or' chain
+    :param bool conjunction: whether it's an 'and' chain
+    :returns: the terms without constants that don't change the result and duplicates, by their unparsed condition, or
+        the constant deciding the result if there is one
+    :rtype: dict[str, ast.AST]|ast.Constant
+    """
+    unique_terms = {}
+    for term in terms:
+        if is_constant_node(term):
+            if bool(get_constant_value(term)) != conjunction:
+                return ast.Constant(not conjunction)
+            continue
+        unique_terms.setdefault(unparse_condition(term), term)
+    return unique_terms
+
+
+def simplify_bool_op(node):
+    """
+    :param ast.BoolOp node:
+    :rtype: ast.AST
+    """
+    conjunction = isinstance(node.op, ast.And)
+    terms = []
+    for term in map(simplify_node, node.values):
+        # Nested chains of the same operator are flattened
+        terms.extend(term.values if isinstance(term, ast.BoolOp) and type(term.op) is type(node.op) else [term])
+    terms = simplify_terms(terms, conjunction)
+    if isinstance(terms, ast.Constant):
+        return terms
+    # Comparisons of a same value with constants are merged into the first of them
+    term_tests = [(term, get_membership_test(term)) for term in terms.values()]
+    tests = {}
+    for term, test in term_tests:
+        if test is not None:
+            tests.setdefault(unparse_condition(test[0]), []).append(test[1:])
+    if any(len(group) > 1 for group in tests.values()):
+        merged_terms = []
+        for term, test in term_tests:
+            if test is None:
+                merged_terms.append(term)
+            elif (group := tests.pop(unparse_condition(test[0]), None)) is not None:
+                merged_terms.append(term if len(group) == 1 else merge_membership_tests(test[0], group, conjunction))
+        terms = simplify_terms(merged_terms, conjunction)
+        if isinstance(terms, ast.Constant):
+            return terms
+    # Absorption: a or (a and b) is a, a and (a or b) is a
+    terms = [
+        term for term in terms.values()
+        if not (isinstance(term, ast.BoolOp) and type(term.op) is not type(node.op) and any(unparse_condition(value) in terms for value in term.values))
+    ]
+    if not terms:
+        return ast.Constant(conjunction)
+    return terms[0] if len(terms) == 1 else ast.BoolOp(node.op, terms)
+
+
+def simplify_node(node):
+    """
+    :param ast.AST node:
+    :returns: a node with the same truth value for all values of the variables, that doesn't raise an exception when
+        the node doesn't
+    :rtype: ast.AST
+    """
+    if isinstance(node, ast.BoolOp):
+        return simplify_bool_op(node)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        operand = simplify_node(node.operand)
+        if is_constant_node(operand):
+            return ast.Constant(not get_constant_value(operand))
+        if isinstance(operand, ast.UnaryOp) and isinstance(operand.op, ast.Not):
+            return operand.operand
+        if isinstance(operand, ast.Compare) and len(operand.ops) == 1 and type(operand.ops[0]) in NEGATED_COMPARISONS:
+            return ast.Compare(operand.left, [NEGATED_COMPARISONS[type(operand.ops[0])]()], operand.comparators)
+        return ast.UnaryOp(ast.Not(), operand)
+    if isinstance(node, ast.Compare):
+        node = ast.Compare(simplify_node(node.left), node.ops, [simplify_node(comparator) for comparator in node.comparators])
+        if len(node.ops) == 1 and is_constant_node(node.left) and is_constant_node(node.comparators[0]):
+            try:
+                return ast.Constant(bool(COMPARISON_FUNCTIONS[type(node.ops[0])](get_constant_value(node.left), get_constant_value(node.comparators[0]))))
+            except (TypeError, KeyError):
+                pass
+        return node
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in FOLDED_METHODS \
+            and not node.args and not node.keywords:
+        value = simplify_node(node.func.value)
+        if isinstance(value, ast.Constant) and type(value.value) is str:
+            return ast.Constant(FOLDED_METHODS[node.func.attr](value.value))
+        return ast.Call(ast.Attribute(value, node.func.attr, ast.Load()), [], [])
+    return node
+
+
+def unparse_condition(node, precedence=0):
+    """
+    ast.unparse() for conditions, only adding the parentheses the precedence of their operators requires, and around
+    nested and/or chains for readability (ast.unparse() adds some around the last terms of long and/or chains)
+
+    :param ast.AST node:
+    :param int precedence: precedence of the operator the node is an operand of
+    :rtype: str
+    """
+    if isinstance(node, ast.BoolOp):
+        node_precedence = OR_PRECEDENCE if isinstance(node.op, ast.Or) else AND_PRECEDENCE
+        text = (' or ' if isinstance(node.op, ast.Or) else ' and ').join(unparse_condition(value, NOT_PRECEDENCE) for value in node.values)
+    elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        node_precedence = NOT_PRECEDENCE
+        text = f"not {unparse_condition(node.operand, NOT_PRECEDENCE)}"
+    elif isinstance(node, ast.Compare) and all(type(operator) in COMPARISON_OPERATORS for operator in node.ops):
+        node_precedence = COMPARE_PRECEDENCE
+        text = unparse_condition(node.left, ATOM_PRECEDENCE) + ''.join(
+            f" {COMPARISON_OPERATORS[type(operator)]} {unparse_condition(comparator, ATOM_PRECEDENCE)}"
+            for operator, comparator in zip(node.ops, node.comparators))
+    else:
+        node_precedence = ATOM_PRECEDENCE
+        text = ast.unparse(node)
+    return f"({text})" if node_precedence < precedence else text
+
+
+def simplify_expression(expression):
+    """
+    Simplifies a converted condition as far as its truth value is concerned
+
+    :param str expression:
+    :returns: the shortest of the expression and of its simplification, the expression as is if it isn't a complete
+        expression (e.g. an attrs condition to combine with states, ending with 'or') or SIMPLIFY_EXPRESSIONS is off
+    :rtype: str
+    """
+    if not SIMPLIFY_EXPRESSIONS:
+        return expression
+    text, references = substitute_xmlid_references(expression.strip())
+    try:
+        tree = ast.parse(text, mode='eval')
+    except SyntaxError:
+        return expression
+    node = simplify_node(tree.body)
+    simplified = unparse_condition(node)
+    if references:
+        simplified = XMLID_NAME_REGEX.sub(lambda match: references[match.group(0)], simplified)
+    return simplified if len(simplified) < len(expression) else expression
@@ -0,0 +1,369 @@
+"""
+Splice write mode: only the converted tags are rewritten, the rest of the files is kept byte for byte
+"""
+import bisect
+import re
+from collections import namedtuple
+from functools import partial
+from itertools import islice
+
+from lxml import etree
+
+from .convert import convert_document
+from . import rules
+from .rules import CONVERSION_RULES, find_converted_nodes
+from .stats import RUN_STATS
+
+
+# Markup of an XML document: comments, CDATA sections, processing instructions, doctype, end tags and start tags
+XML_MARKUP_REGEX = re.compile(r"""<!--.*?-->|<!\[CDATA\[.*?\]\]>|<\?.*?\?>|<!DOCTYPE(?:[^\[>]+|\[.*?\])*>|</[^>]*>|<(?:[^>"']+|"[^"]*"|'[^']*')*>""", re.DOTALL)
+XML_START_TAG_REGEX = re.compile(r"""<([^\s/>!?]+)(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|'[^']*'))*\s*/?>""")
+XML_ATTRIBUTE_NAME_REGEX = re.compile(r"""\s([^\s=/>]+)\s*=\s*(?:"[^"]*"|'[^']*')""")
+COMMENT_NODE, PI_NODE = '!--', '?'
+# libxml2 doesn't report reliable line numbers beyond
+MAX_RELIABLE_SOURCELINE = 65535
+# Regular expressions skipping 2**n lines
+LINES_SKIP_REGEXES = [re.compile(r"(?:[^\n]*\n){%d}" % (1 << n)) for n in range(24)]
+
+# Source span of a node: start and end of its markup, end of its start tag and start of its end tag (both at its end
+# for self-closing tags, comments and processing instructions)
+NodeSpan = namedtuple('NodeSpan', ['start', 'start_tag_end', 'end_tag_start', 'end'])
+# Node that may be changed by the conversion, as parsed: the span of its start tag and its attributes, and for parents
+# the span of their content, their text, children and children tails with their spans
+OriginalNode = namedtuple('OriginalNode', ['span', 'attrib', 'text', 'children', 'tails', 'text_span', 'children_spans', 'tail_spans'])
+
+
+def get_node_name(node):
+    """
+    :returns: the name of the node, as returned by scan_children_spans()
+    :rtype: str
+    """
+    if node.tag is etree.Comment:
+        return COMMENT_NODE
+    if node.tag is etree.ProcessingInstruction:
+        return PI_NODE
+    return node.tag
+
+
+class LineOffsets:
+    """
+    Offsets of the lines of a text, found on demand by skipping lines from the last line requested, which is much faster
+    than indexing all the lines of a big text when only some of them are needed, in increasing order
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.line = 1
+        self.offset = 0
+
+    def get(self, line):
+        """
+        :param int line: number of the line, from 1
+        :returns: the offset of the start of the line, None if the text has less lines
+        :rtype: None|int
+        """
+        offset = self.offset
+        if line < self.line:
+            # Usually only a few lines before
+            for _ in range(self.line - line):
+                offset = self.text.rfind('\n', 0, offset - 1) + 1
+            return offset
+        lines_to_skip = line - self.line
+        for n in range(lines_to_skip.bit_length()):
+            if lines_to_skip >> n & 1:
+                if (match := LINES_SKIP_REGEXES[n].match(self.text, offset)) is None:
+                    return None
+                offset = match.end()
+        self.line, self.offset = line, offset
+        return offset
+
+
+def get_previous_node(node):
+    """
+    :returns: the node before the given one in document order, None for the root node
+    """
+    previous = node.getprevious()
+    if previous is None:
+        return node.getparent()
+    while len(previous):
+        previous = previous[-1]
+    return previous
+
+
+def find_start_tag(text, line_offsets, node):
+    """
+    Finds the start tag of a parsed node in its source, from the line of its end given by the parser
+
+    :param str text: source of the document
+    :param LineOffsets line_offsets: offsets of the lines of the source
+    :param xml.etree.ElementTree.Element node:
+    :returns: the span of the start tag (ending with the tag for self-closing tags), None if it can't be found
+        unambiguously
+    :rtype: None|NodeSpan
+    """
+    line = node.sourceline
+    if not line or line >= MAX_RELIABLE_SOURCELINE:
+        return None
+    # The start tag is after the end of the node before it
+    region_start = 0
+    previous = get_previous_node(node)
+    while previous is not None:
+        if previous.sourceline != line:
+            region_start = line_offsets.get(previous.sourceline) if previous.sourceline else 0
+            break
+        if previous.tag == node.tag:
+            # Tags of the same name ending on the same line
+            return None
+        previous = get_previous_node(previous)
+    if region_start is None or (line_start := line_offsets.get(line)) is None:
+        return None
+    line_end = line_offsets.get(line + 1) or len(text)
+    attribute_names = node.keys()
+    prefix = '<' + node.tag
+    span = None
+    search_end = line_end
+    while (position := text.rfind(prefix, region_start, search_end)) != -1:
+        search_end = position + len(prefix) - 1
+        match = XML_START_TAG_REGEX.match(text, position)
+        if (match is None or match.group(1) != node.tag or not line_start < match.end() <= line_end
+                or XML_ATTRIBUTE_NAME_REGEX.findall(match.group()) != attribute_names):
+            continue
+        if span is not None:
+            return None
+        span = NodeSpan(position, match.end(), match.end(), match.end())
+    return span
+
+
+def scan_children_spans(text, position):
+    """
+    :param str text: source of the document
+    :param int position: end of the start tag of an element
+    :returns: the names (COMMENT_NODE and PI_NODE for comments and processing instructions) and spans of the child nodes
+        of the element, and the span of its end tag
+    :rtype: (list[(str, NodeSpan)], (int, int))
+    """
+    children = []
+    depth = 0
+    for match in XML_MARKUP_REGEX.finditer(text, position):
+        markup = match.group()
+        start, end = match.span()
+        if markup.startswith('<![CDATA['):
+            continue
+        if markup.startswith('</'):
+            if depth == 0:
+                return children, (start, end)
+            depth -= 1
+            if depth == 0:
+                name, span = children[-1]
+                children[-1] = name, span._replace(end_tag_start=start, end=end)
+        elif markup.startswith('<!--') or markup.startswith('<?'):
+            if depth == 0:
+                children.append((COMMENT_NODE if markup.startswith('<!--') else PI_NODE, NodeSpan(start, end, end, end)))
+        else:
+            if depth == 0:
+                children.append((XML_START_TAG_REGEX.match(markup).group(1), NodeSpan(start, end, end, end)))
+            if not markup.endswith('/>'):
+                depth += 1
+    raise ValueError("Unclosed tag")
+
+
+def get_original_nodes(doc, text, converted_nodes):
+    """
+    Records the nodes of a parsed document that the conversion changes, along with their source spans
+
+    :param xml.etree.ElementTree.Element doc: root node of the document
+    :param str text: source the document is parsed from
+    :param dict[str, list] converted_nodes: result of find_converted_nodes() for the document
+    :returns: the OriginalNode of those nodes, None if their spans can't be determined (e.g. with namespaces), in
+        which case the converted document can only be serialized
+    :rtype: None|dict[xml.etree.ElementTree.Element, OriginalNode]
+    """
+    # The parser also counts lines separated by \r only
+    if doc.nsmap or ('\r' in text and text.count('\r') != text.count('\r\n')):
+        return None
+    tags = [node for rule in CONVERSION_RULES if rule.changes_attributes for node in converted_nodes[rule.name]]
+    parents = list({node.getparent(): None for rule in CONVERSION_RULES if rule.changes_parent for node in converted_nodes[rule.name]})
+    if None in parents:
+        return None
+    line_offsets = LineOffsets(text)
+    original_nodes = {}
+    # In the order of the source, so the lines are found in increasing order
+    for node in sorted(tags + parents, key=lambda node: node.sourceline or 0):
+        if node not in original_nodes:
+            if (span := find_start_tag(text, line_offsets, node)) is None:
+                return None
+            original_nodes[node] = OriginalNode(span, tuple(node.attrib.items()), None, None, None, None, None, None)
+    for parent in parents:
+        original = original_nodes[parent]
+        try:
+            children_spans, end_tag_span = scan_children_spans(text, original.span.start_tag_end)
+        except ValueError:
+            return None
+        children = tuple(parent)
+        if len(children) != len(children_spans) or any(get_node_name(child) != name for child, (name, _) in zip(children, children_spans)):
+            return None
+        children_spans = [span for _, span in children_spans]
+        tail_spans = [(span.end, next_span.start) for span, next_span in zip(children_spans, children_spans[1:])]
+        tail_spans.append((children_spans[-1].end, end_tag_span[0]))
+        original_nodes[parent] = original._replace(
+            span=original.span._replace(end_tag_start=end_tag_span[0], end=end_tag_span[1]),
+            text=parent.text,
+            children=children,
+            tails=tuple(child.tail for child in children),
+            text_span=(original.span.start_tag_end, children_spans[0].start),
+            children_spans=children_spans,
+            tail_spans=tail_spans,
+        )
+    return original_nodes
+
+
+def escape_xml_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\r', '&#13;')
+
+
+def escape_xml_attribute(value):
+    return escape_xml_text(value).replace('"', '&quot;').replace('\n', '&#10;').replace('\t', '&#9;')
+
+
+def render_start_tag(node, self_closing=False):
+    """
+    :returns: the start tag of the node, with the same quoting as lxml
+    :rtype: str
+    """
+    attributes = ''.join(f' {name}="{escape_xml_attribute(value)}"' for name, value in node.items())
+    return f"<{node.tag}{attributes}{'/>' if self_closing else '>'}"
+
+
+def render_node(node):
+    """
+    :returns: the markup of the node, without its tail
+    :rtype: str
+    """
+    if node.tag is etree.Comment:
+        return f"<!--{node.text}-->"
+    if isinstance(node.tag, str) and not len(node):
+        if not node.text:
+            return render_start_tag(node, self_closing=True)
+        return f"{render_start_tag(node)}{escape_xml_text(node.text)}</{node.tag}>"
+    return etree.tostring(node, encoding='unicode', with_tail=False)
+
+
+def splice_document(doc, text, original_nodes):
+    """
+    Serializes a converted document by splicing only the start tags and contents that changed into its source: the
+    rest of the source, with its quoting and whitespace, is kept as is.
+
+    :param xml.etree.ElementTree.Element doc: root node of the converted document
+    :param str text: source the document is parsed from
+    :param dict[xml.etree.ElementTree.Element, OriginalNode] original_nodes: result of get_original_nodes() for the
+        document before its conversion
+    :returns: the source of the converted document
+    :rtype: str
+    """
+    # The parser normalizes line separators to \n, the generated markup uses the ones of the source
+    windows_line_separators = '\r\n' in text
+
+    def generated(markup):
+        return markup.replace('\n', '\r\n') if windows_line_separators else markup
+
+    def render_content(node, original):
+        parts = []
+        if node.text == original.text:
+            parts.append(text[slice(*original.text_span)])
+        elif node.text:
+            parts.append(generated(escape_xml_text(node.text)))
+        original_children = dict(zip(original.children, zip(original.children_spans, original.tail_spans, original.tails)))
+        for child in node:
+            if child in original_children:
+                span, tail_span, tail = original_children[child]
+                parts.append(render_range(span.start, span.end))
+                if child.tail == tail:
+                    parts.append(text[slice(*tail_span)])
+                    continue
+            else:
+                parts.append(generated(render_node(child)))
+            if child.tail:
+                parts.append(generated(escape_xml_text(child.tail)))
+        return ''.join(parts)
+
+    # Ranges of the source to replace, with the function rendering their replacement
+    edits = []
+    for node, original in original_nodes.items():
+        if tuple(node.attrib.items()) != original.attrib:
+            self_closing = text[original.span.start_tag_end - 2] == '/'
+            edits.append((original.span.start, original.span.start_tag_end, partial(render_start_tag, node, self_closing)))
+        if original.children is not None and (node.text != original.text or tuple(node) != original.children
+                                              or tuple(child.tail for child in node) != original.tails):
+            edits.append((original.span.start_tag_end, original.span.end_tag_start, partial(render_content, node, original)))
+    # Edits of the nodes within the content of an other edited node are applied when its content is rendered
+    edits.sort(key=lambda edit: (edit[0], -edit[1]))
+    edit_starts = [edit[0] for edit in edits]
+
+    def render_range(start, end):
+        parts = []
+        position = start
+        for edit_start, edit_end, render in islice(edits, bisect.bisect_left(edit_starts, start), None):
+            if edit_start >= end:
+                break
+            if edit_start < position or edit_end > end:
+                continue
+            parts.append(text[position:edit_start])
+            parts.append(render())
+            position = edit_end
+        parts.append(text[position:end])
+        return ''.join(parts)
+
+    return render_range(0, len(text))
+
+
+def convert_xml_contents(contents, tags_found=None, tags_replaced_by=None, view_index=None, module=None, write_mode='full'):
+    """
+    Converts all attrs and states attributes of the given XML contents
+
+    :param str contents: decoded contents of an XML file
+    :param list[str] tags_found: if given, the tags that will be converted are added to it
+    :param list[str] tags_replaced_by: if given, the tags they are replaced by are added to it
+    :param ViewIndex view_index: see convert_document()
+    :param str module: see convert_document()
+    :param str write_mode: 'full' to serialize the whole converted document, 'splice' to only splice the changed
+        nodes into the contents, keeping the rest of them as is (falling back to 'full' when it isn't possible)
+    :returns: None if there is nothing to convert, else the converted contents, encoded in utf-8
+    :rtype: None|bytes
+    """
+    if not rules.CONVERTED_NODES_REGEX.search(contents):
+        return None
+    source = contents
+    convert_line_separator_back_to_windows = False
+    if '\r\n' in contents:
+        convert_line_separator_back_to_windows = True
+
+    with RUN_STATS.phase('parse'):
+        has_encoding_declaration = False
+        if encoding_declaration := re.search(r"\A.*<\?xml.*?encoding=.*?\?>\s*", contents, re.DOTALL):
+            has_encoding_declaration = True
+            contents = re.sub(r"\A.*<\?xml.*?encoding=.*?\?>\s*", "", contents, re.DOTALL)
+
+        doc = etree.fromstring(contents)
+    converted_nodes = original_nodes = None
+    if write_mode == 'splice':
+        converted_nodes = find_converted_nodes(doc)
+        with RUN_STATS.phase('serialize'):
+            # The declaration is kept as is, so it must declare the encoding the contents are written in
+            if not has_encoding_declaration or re.search(r"""encoding=["']utf-?8["']""", encoding_declaration.group(), re.IGNORECASE):
+                original_nodes = get_original_nodes(doc, contents, converted_nodes)
+    with RUN_STATS.phase('convert'):
+        converted_tags = convert_document(doc, tags_found, view_index, module, converted_nodes)
+    if not converted_tags:
+        return None
+    with RUN_STATS.phase('serialize'):
+        if tags_replaced_by is not None:
+            tags_replaced_by.extend(etree.tostring(t, encoding='unicode') for t in converted_tags)
+        if original_nodes is not None:
+            # The contents are parsed without the encoding declaration, which is kept as is
+            return (source[:len(source) - len(contents)] + splice_document(doc, contents, original_nodes)).encode('utf-8')
+        if write_mode == 'splice':
+            RUN_STATS.count('splice_fallbacks')
+        xml_string = etree.tostring(doc, encoding='utf-8', xml_declaration=has_encoding_declaration)
+        if convert_line_separator_back_to_windows:
+            xml_string = xml_string.replace(b"\n", b"\r\n")
+    return xml_string
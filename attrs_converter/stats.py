@@ -0,0 +1,122 @@
+"""
+Timings and counters of a run
+"""
+import heapq
+import time
+from collections import Counter
+from contextlib import contextmanager
+from operator import itemgetter
+
+
+class RunStats:
+    """
+    Timings of each phase and file and counters of a run, cheap enough to be always collected, mergeable from the
+    worker processes
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.file_times = {}
+        self.counters = Counter()
+        self.active_phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Times the phase of the given name, for the duration of the with block
+        """
+        # Time spent in the phases nested in this one
+        nested = [0.0, 0.0]
+        self.active_phases.append(nested)
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+            self.active_phases.pop()
+            if self.active_phases:
+                self.active_phases[-1][0] += wall
+                self.active_phases[-1][1] += cpu
+            timing = self.phases.get(name)
+            if timing is None:
+                timing = self.phases[name] = [0.0, 0.0, 0]
+            timing[0] += wall - nested[0]
+            timing[1] += cpu - nested[1]
+            timing[2] += 1
+
+    @contextmanager
+    def file(self, file_path):
+        """
+        Adds the duration of the with block to the time spent on the given file
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.file_times[file_path] = self.file_times.get(file_path, 0.0) + time.perf_counter() - start
+
+    def add_time(self, name, wall, cpu, file_path=None):
+        """
+        Adds the time of a phase measured by another thread, as only the main thread updates the stats
+        """
+        timing = self.phases.get(name)
+        if timing is None:
+            timing = self.phases[name] = [0.0, 0.0, 0]
+        timing[0] += wall
+        timing[1] += cpu
+        timing[2] += 1
+        if file_path is not None:
+            self.file_times[file_path] = self.file_times.get(file_path, 0.0) + wall
+
+    def count(self, name, value=1):
+        self.counters[name] += value
+
+    def pop_updates(self):
+        """
+        :returns: the phase timings, file timings and counters collected since the previous call
+        :rtype: (dict[str, list], dict[str, float], collections.Counter)
+        """
+        updates = self.phases, self.file_times, self.counters
+        self.phases = {}
+        self.file_times = {}
+        self.counters = Counter()
+        return updates
+
+    def merge_updates(self, updates):
+        """
+        :param (dict[str, list], dict[str, float], collections.Counter) updates: result of pop_updates() in another
+            process
+        """
+        phases, file_times, counters = updates
+        for name, (wall, cpu, calls) in phases.items():
+            timing = self.phases.get(name)
+            if timing is None:
+                timing = self.phases[name] = [0.0, 0.0, 0]
+            timing[0] += wall
+            timing[1] += cpu
+            timing[2] += calls
+        for file_path, seconds in file_times.items():
+            self.file_times[file_path] = self.file_times.get(file_path, 0.0) + seconds
+        self.counters.update(counters)
+
+    def get_report(self, slowest=10):
+        """
+        :param int slowest: number of slowest files to list
+        :returns: the timings and counters, to be dumped as JSON
+        :rtype: dict
+        """
+        return {
+            'phases': {
+                name: {'wall': round(wall, 6), 'cpu': round(cpu, 6), 'calls': calls}
+                for name, (wall, cpu, calls) in sorted(self.phases.items(), key=lambda item: -item[1][0])
+            },
+            'counters': dict(sorted(self.counters.items())),
+            'slowest_files': [
+                {'path': file_path, 'seconds': round(seconds, 6)}
+                for file_path, seconds in heapq.nlargest(slowest, self.file_times.items(), key=itemgetter(1))
+            ],
+            'file_times': {file_path: round(seconds, 6) for file_path, seconds in sorted(self.file_times.items())},
+        }
+
+
+RUN_STATS = RunStats()
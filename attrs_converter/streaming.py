@@ -0,0 +1,220 @@
+"""
+Streaming conversion of the big XML files, one record at a time
+"""
+import mmap
+import os
+import re
+from collections import namedtuple
+
+from lxml import etree
+
+from .convert import convert_document
+from . import rules
+from .rules import CONVERSION_RULES, matches_conversion_rule
+from .splice import escape_xml_text, render_start_tag
+from .stats import RUN_STATS
+
+
+# The XML declaration of the first line, removed before parsing by convert_xml_contents(), and any XML declaration
+# with an encoding, that convert_xml_contents() doesn't remove when it isn't on the first line
+XML_FIRST_LINE_ENCODING_DECLARATION_BYTES_REGEX = re.compile(rb"[^\n]*<\?xml[^\n]*?encoding=[^\n]*?\?>")
+XML_ENCODING_DECLARATION_BYTES_REGEX = re.compile(rb"<\?xml.*?encoding=", re.DOTALL)
+TODO_COMMENT_BYTES_REGEX = re.compile(rb"<!--TODO")
+# Number of bytes of a file checked for an XML declaration
+XML_DECLARATION_MAX_OFFSET = 4096
+# Size from which XML files are streamed by default, in MB
+STREAM_THRESHOLD_MB = 16
+
+# Converted contents of a file streamed to a temporary file next to it, by stream_file(), with the number of TODO
+# comments added by the conversion
+StreamedContents = namedtuple('StreamedContents', ['path', 'todos'])
+
+
+def is_streamed(file_path, passes, stream_threshold):
+    """
+    :param str file_path:
+    :param list[str] passes: passes that will be applied to the file
+    :param int stream_threshold: size in bytes from which the attrs pass is applied by stream_file(), 0 to never do it
+    :returns: whether the file is processed by stream_file()
+    :rtype: bool
+    """
+    if not stream_threshold or 'attrs' not in passes:
+        return False
+    try:
+        return os.path.getsize(file_path) >= stream_threshold
+    except OSError:
+        # Reported when reading it
+        return False
+
+
+def is_stream_container(node):
+    """
+    :returns: whether the node is the root node or a <data> node in it, whose children are converted one at a time
+    :rtype: bool
+    """
+    parent = node.getparent()
+    return parent is None or (node.tag == 'data' and parent.getparent() is None)
+
+
+class XmlStreamConverter:
+    """
+    Converts an XML file parsed incrementally, one child of the root node or of its <data> nodes at a time, giving the
+    same contents as convert_xml_contents() without holding the whole document in memory
+    """
+
+    def __init__(self, output, windows_line_separators=False, tree_rewriter=None, tags_found=None, tags_replaced_by=None,
+                 view_index=None, module=None):
+        """
+        :param io.TextIOBase output: the converted contents are written to it
+        :param bool windows_line_separators: whether to write \r\n line separators
+        :param collections.abc.Callable tree_rewriter: 'tree' to 'list' rewriter applied to the written contents, if
+            given, see get_tree_rewriter()
+        :param list[str] tags_found: see convert_xml_contents()
+        :param list[str] tags_replaced_by: see convert_xml_contents()
+        :param ViewIndex view_index: see convert_document()
+        :param str module: see convert_document()
+        """
+        self.output = output
+        self.windows_line_separators = windows_line_separators
+        self.tree_rewriter = tree_rewriter
+        self.tags_found = tags_found
+        self.tags_replaced_by = tags_replaced_by
+        self.view_index = view_index
+        self.module = module
+        # Nodes whose children are converted one at a time, with whether their start tag is written and the number of
+        # their first children that are written
+        self.containers = []
+        self.converted_tags = 0
+        # TODO comments are counted as they are written, see stream_xml_file()
+        self.todos = 0
+        self.tree_changed = False
+
+    def write(self, text):
+        if self.tree_rewriter is not None:
+            with RUN_STATS.phase('tree'):
+                new_text = self.tree_rewriter(text)
+            if new_text is not None and new_text != text:
+                text = new_text
+                self.tree_changed = True
+        self.todos += text.count('<!--TODO')
+        if self.windows_line_separators:
+            text = text.replace('\n', '\r\n')
+        with RUN_STATS.phase('write'):
+            self.output.write(text)
+
+    def flush(self, until=None):
+        """
+        Writes the children of the current container, with their tails, until the given one
+
+        :param xml.etree.ElementTree.Element until: first child not to write, None to write them all
+        """
+        container, started, written = self.containers[-1]
+        with RUN_STATS.phase('serialize'):
+            if not started:
+                self.write(render_start_tag(container) + escape_xml_text(container.text or ''))
+            chunks = []
+            for child in container[written:]:
+                if child is until:
+                    break
+                # The contents of the nested containers are already written
+                chunks.append(escape_xml_text(child.tail or '') if is_stream_container(child) else etree.tostring(child, encoding='unicode'))
+                written += 1
+            if chunks:
+                self.write(''.join(chunks))
+        if written > 1:
+            container[written - 1].clear(keep_tail=True)
+            del container[:written - 1]
+            written = 1
+        self.containers[-1] = (container, True, written)
+
+    def end_container(self):
+        container, started, _ = self.containers[-1]
+        if not started and not len(container) and container.text is None:
+            # Rendered as a self-closing tag, like lxml does
+            self.containers.pop()
+            self.write(render_start_tag(container, self_closing=True))
+            return
+        self.flush()
+        self.containers.pop()
+        self.write(f"</{container.tag}>")
+
+    def convert(self, node):
+        with RUN_STATS.phase('convert'):
+            converted_tags = convert_document(node, self.tags_found, self.view_index, self.module)
+        if not converted_tags:
+            return
+        self.converted_tags += len(converted_tags)
+        if self.tags_replaced_by is not None:
+            with RUN_STATS.phase('serialize'):
+                self.tags_replaced_by.extend(etree.tostring(t, encoding='unicode') for t in converted_tags)
+
+    def run(self, source):
+        """
+        :param io.BufferedIOBase source: binary XML contents to convert
+        :returns: False if the document can't be streamed: when it has namespaces or its root or <data> nodes have
+            attributes to convert, else True
+        :rtype: bool
+        """
+        with RUN_STATS.phase('parse'):
+            # Like the conversion in memory, the contents are decoded as utf-8 whatever their declaration says
+            for event, node in etree.iterparse(source, events=('start', 'end'), encoding='utf-8'):
+                if event == 'start':
+                    if node.getparent() is None and node.nsmap:
+                        # Namespaces would be declared again on every serialized child
+                        return False
+                    if not is_stream_container(node):
+                        if node.getparent() is self.containers[-1][0]:
+                            # Its previous siblings and their tails are parsed
+                            self.flush(until=node)
+                        continue
+                    if any(matches_conversion_rule(node, rule) for rule in CONVERSION_RULES):
+                        return False
+                    if self.containers:
+                        self.flush(until=node)
+                    self.containers.append((node, False, 0))
+                elif self.containers and node is self.containers[-1][0]:
+                    self.end_container()
+                elif node.getparent() is self.containers[-1][0]:
+                    self.convert(node)
+        return True
+
+
+def stream_xml_file(file_path, output, tags_found=None, tags_replaced_by=None, view_index=None, module=None, tree_rewriter=None):
+    """
+    Converts all attrs and states attributes of an XML file with an XmlStreamConverter
+
+    :param str file_path:
+    :param io.TextIOBase output: seekable output the converted contents are written to
+    :param list[str] tags_found: see convert_xml_contents()
+    :param list[str] tags_replaced_by: see convert_xml_contents()
+    :param ViewIndex view_index: see convert_document()
+    :param str module: see convert_document()
+    :param collections.abc.Callable tree_rewriter: see XmlStreamConverter
+    :returns: None if the file can't be streamed and has to be converted in memory, else the converter, with the number
+        of tags it converted (none if the file has no attrs or states attribute or override) and of TODO comments it added
+    :rtype: None|XmlStreamConverter
+    """
+    with open(file_path, 'rb') as f:
+        with RUN_STATS.phase('read'):
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            # Checked on the memory mapped bytes, like read_file(), without loading the file
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                if rules.CONVERTED_NODES_BYTES_REGEX.search(mapped_file) is None:
+                    return XmlStreamConverter(output)
+                windows_line_separators = mapped_file.find(b'\r\n') != -1
+                source_todos = sum(1 for _ in TODO_COMMENT_BYTES_REGEX.finditer(mapped_file))
+                head = mapped_file[:XML_DECLARATION_MAX_OFFSET]
+        if head.startswith(b'\xef\xbb\xbf'):
+            return None
+        has_encoding_declaration = XML_FIRST_LINE_ENCODING_DECLARATION_BYTES_REGEX.match(head) is not None
+        if not has_encoding_declaration and XML_ENCODING_DECLARATION_BYTES_REGEX.search(head):
+            return None
+        converter = XmlStreamConverter(output, windows_line_separators, tree_rewriter, tags_found, tags_replaced_by, view_index, module)
+        # Only the TODO comments added by the conversion are counted
+        converter.todos = -source_todos
+        if has_encoding_declaration:
+            converter.write("<?xml version='1.0' encoding='utf-8'?>\n")
+        if not converter.run(f):
+            return None
+    return converter
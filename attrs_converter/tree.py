@@ -0,0 +1,248 @@
+"""
+Replacement of the tree views by list views in XML, Python and JavaScript files
+"""
+import ast
+import io
+import os
+import re
+import tokenize
+
+
+# View types, a string only made of those is a view type or a view_mode, in which 'tree' is to be replaced by 'list'
+VIEW_TYPES = {
+    'list', 'tree', 'form', 'kanban', 'calendar', 'pivot', 'graph', 'gantt', 'activity', 'map', 'search', 'cohort',
+    'dashboard', 'grid', 'hierarchy', 'qweb',
+}
+# Python keyword arguments, variables and dict keys whose string values are view types or view modes
+PYTHON_VIEW_MODE_NAMES = {'view_mode', 'view_type', 'default_view_mode', 'default_view_type'}
+# Python keyword arguments, variables and dict keys whose values are lists of (view id, view type)
+PYTHON_VIEWS_NAMES = {'views'}
+XML_TREE_TAG_REGEX = re.compile(r"<(/?)tree(?=[\s/>])")
+XML_VIEW_MODE_FIELD_REGEX = re.compile(r"""(<field\s+name\s*=\s*["'](?:view_mode|view_type|type)["']\s*>)([^<]*)(?=</field>)""")
+# Preceded by a space, so data-mode or t-att-mode attributes aren't matched
+XML_MODE_ATTRIBUTE_REGEX = re.compile(r"""(\smode\s*=\s*)(["'])(.*?)\2""")
+XML_EXPR_ATTRIBUTE_REGEX = re.compile(r"""(\bexpr\s*=\s*)(["'])(.*?)\2""", re.DOTALL)
+# A tree element step of an XPath expression (not an attribute, a function or a string)
+XPATH_TREE_STEP_REGEX = re.compile(r"(?:(?<=/)|(?<=::)|(?<=\|)|(?<=\[)|^)(\s*)tree(?![\w.:-]|\s*\()")
+# Javascript property names and variables whose string values are view types or view modes, and whose values are
+# lists of [view id, view type]
+JS_VIEW_MODE_NAMES = {'view_mode', 'viewMode', 'view_type', 'viewType'}
+JS_VIEWS_NAMES = {'views'}
+# Comments, strings and template literals (including the strings inside them, that aren't rewritten), regex literal
+# candidates, names and other characters. Regex literals are told apart from divisions by the preceding token.
+JS_TOKEN_REGEX = re.compile(r'''
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<string>`(?:\\.|[^`\\])*`|'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*")
+    | (?P<regex>/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*)
+    | (?P<name>[\w$]+)
+    | (?P<space>\s+)
+    | (?P<operator>[=!]==?|.)
+''', re.DOTALL | re.VERBOSE)
+# Keywords after which a slash starts a regex literal rather than a division
+JS_REGEX_KEYWORDS = {
+    'return', 'typeof', 'instanceof', 'in', 'of', 'new', 'delete', 'void', 'throw', 'case', 'do', 'else', 'yield', 'await',
+}
+
+
+def replace_tree_in_view_mode(value):
+    """
+    :param str value:
+    :returns: the value with 'tree' replaced by 'list' if it's a comma separated list of view types (e.g. a view_mode),
+        else the value unchanged
+    :rtype: str
+    """
+    view_types = [view_type.strip() for view_type in value.split(',')]
+    if 'tree' not in view_types or not all(view_type in VIEW_TYPES for view_type in view_types):
+        return value
+    return re.sub(r'\btree\b', 'list', value)
+
+
+def replace_tree_with_list_in_xml(contents):
+    """
+    Replaces the tree views by list views in XML contents: <tree> tags, view_mode, view_type and type fields, mode
+    attributes of x2many fields and tree steps of xpath expressions
+
+    :param str contents:
+    :rtype: str
+    """
+    if 'tree' not in contents:
+        return contents
+    contents = XML_TREE_TAG_REGEX.sub(r"<\1list", contents)
+    contents = XML_VIEW_MODE_FIELD_REGEX.sub(lambda match: match.group(1) + replace_tree_in_view_mode(match.group(2)), contents)
+    contents = XML_MODE_ATTRIBUTE_REGEX.sub(
+        lambda match: match.group(1) + match.group(2) + replace_tree_in_view_mode(match.group(3)) + match.group(2), contents)
+    return XML_EXPR_ATTRIBUTE_REGEX.sub(
+        lambda match: match.group(1) + match.group(2) + XPATH_TREE_STEP_REGEX.sub(r"\1list", match.group(3)) + match.group(2),
+        contents)
+
+
+def get_python_string_value(token):
+    """
+    :param tokenize.TokenInfo token:
+    :returns: the value of a string token, None for a byte string, an f-string or an invalid string
+    :rtype: None|str
+    """
+    try:
+        value = ast.literal_eval(token.string)
+    except (SyntaxError, ValueError):
+        return None
+    return value if isinstance(value, str) else None
+
+
+def is_python_view_mode_value(previous_tokens, names=PYTHON_VIEW_MODE_NAMES):
+    """
+    :param list[tokenize.TokenInfo] previous_tokens: the significant tokens preceding a string literal (or a bracket)
+    :param set[str] names: the names of the keyword arguments, variables and dict keys to look for
+    :returns: True if the string literal is given to one of the names as keyword argument, assignment, comparison,
+        dict key or subscript assignment
+    :rtype: bool
+    """
+    if len(previous_tokens) < 2 or previous_tokens[-1].type != tokenize.OP:
+        return False
+    operator, name = previous_tokens[-1].string, previous_tokens[-2]
+    if operator in ('=', '==', '!=') and name.type == tokenize.NAME:
+        return name.string in names
+    if operator == ':' and name.type == tokenize.STRING:
+        return get_python_string_value(name) in names
+    if operator == '=' and name.string == ']' and len(previous_tokens) == 4 and previous_tokens[0].string == '[':
+        # e.g. action['view_mode'] = 'tree,form'
+        return previous_tokens[1].type == tokenize.STRING and get_python_string_value(previous_tokens[1]) in names
+    return False
+
+
+def replace_tree_with_list_in_python(contents):
+    """
+    Replaces 'tree' by 'list' in the string literals of Python contents given to a view_mode or view_type, such as
+    view_mode='tree,form' or {'view_type': 'tree'}, and in the views of an action ('views': [(False, 'tree')]).
+    Other literals, e.g. the values of a selection, are left as is.
+
+    :param str contents:
+    :rtype: str
+    """
+    if 'tree' not in contents:
+        return contents
+    lines = io.StringIO(contents).readlines()
+    try:
+        tokens = list(tokenize.generate_tokens(iter(lines).__next__))
+    except (tokenize.TokenError, SyntaxError):
+        # Not valid Python, left as is
+        return contents
+    line_offsets = [0]
+    for line in lines:
+        line_offsets.append(line_offsets[-1] + len(line))
+    new_contents = []
+    position = 0
+    previous_tokens = []
+    # For each open bracket, whether it's inside the views of an action
+    in_views = [False]
+    for token in tokens:
+        if token.type in (tokenize.COMMENT, tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT):
+            continue
+        if token.type == tokenize.OP and token.string in '([{':
+            in_views.append(in_views[-1] or is_python_view_mode_value(previous_tokens, PYTHON_VIEWS_NAMES))
+        elif token.type == tokenize.OP and token.string in ')]}' and len(in_views) > 1:
+            in_views.pop()
+        is_view_mode = token.type == tokenize.STRING and 'tree' in token.string and (
+            in_views[-1] or is_python_view_mode_value(previous_tokens))
+        previous_tokens = previous_tokens[-3:] + [token]
+        if not is_view_mode:
+            continue
+        prefix = re.match(r"[A-Za-z]*", token.string).group()
+        if set(prefix.lower()) & {'b', 'f'}:
+            continue
+        quote = token.string[len(prefix):len(prefix) + 3]
+        if quote not in ('"""', "'''"):
+            quote = quote[0]
+        value = token.string[len(prefix) + len(quote):-len(quote)]
+        if (new_value := replace_tree_in_view_mode(value)) != value:
+            start = line_offsets[token.start[0] - 1] + token.start[1]
+            end = line_offsets[token.end[0] - 1] + token.end[1]
+            new_contents += [contents[position:start], prefix, quote, new_value, quote]
+            position = end
+    return ''.join(new_contents) + contents[position:]
+
+
+def get_js_string_value(token):
+    """
+    :param str token: a quoted javascript string, without escape sequences for the values that are looked for
+    :rtype: str
+    """
+    return token[1:-1]
+
+
+def is_js_view_mode_value(previous_tokens, names=JS_VIEW_MODE_NAMES):
+    """
+    :param list[re.Match] previous_tokens: the significant tokens preceding a string literal (or a bracket)
+    :param set[str] names: the names of the properties and variables to look for
+    :returns: True if the string literal is given to one of the names as property value, assignment or comparison
+    :rtype: bool
+    """
+    if len(previous_tokens) < 2 or previous_tokens[-1].lastgroup != 'operator':
+        return False
+    operator, name = previous_tokens[-1].group(), previous_tokens[-2]
+    if operator not in (':', '=', '==', '===', '!=', '!=='):
+        return False
+    if name.lastgroup == 'name':
+        return name.group() in names
+    return operator == ':' and name.lastgroup == 'string' and name.group()[0] != '`' and get_js_string_value(name.group()) in names
+
+
+def replace_tree_with_list_in_js(contents):
+    """
+    Replaces 'tree' by 'list' in the string literals of javascript contents given to a view_mode or viewType property
+    or variable (e.g. {viewType: "tree"}) or inside the views of an action ({views: [[false, "tree"]]}). Other
+    literals, e.g. the role of an element, are left as is.
+
+    :param str contents:
+    :rtype: str
+    """
+    if 'tree' not in contents:
+        return contents
+    new_contents = []
+    position = 0
+    previous_tokens = []
+    # For each open bracket, whether it's inside the views of an action
+    in_views = [False]
+    while position < len(contents):
+        match = JS_TOKEN_REGEX.match(contents, position)
+        if match.lastgroup == 'regex' and previous_tokens and (
+                previous_tokens[-1].lastgroup == 'name' and previous_tokens[-1].group() not in JS_REGEX_KEYWORDS
+                or previous_tokens[-1].lastgroup == 'string' or previous_tokens[-1].group() in (')', ']', '}')):
+            # A division
+            match = JS_TOKEN_REGEX.match(contents, position, position + 1)
+        position = match.end()
+        token = match.group()
+        if match.lastgroup in ('comment', 'space'):
+            new_contents.append(token)
+            continue
+        if match.lastgroup == 'operator' and token in '([{':
+            in_views.append(in_views[-1] or is_js_view_mode_value(previous_tokens, JS_VIEWS_NAMES))
+        elif match.lastgroup == 'operator' and token in ')]}' and len(in_views) > 1:
+            in_views.pop()
+        if match.lastgroup == 'string' and token[0] != '`' and 'tree' in token and (
+                in_views[-1] or is_js_view_mode_value(previous_tokens)):
+            token = token[0] + replace_tree_in_view_mode(token[1:-1]) + token[-1]
+        new_contents.append(token)
+        previous_tokens = previous_tokens[-1:] + [match]
+    return ''.join(new_contents)
+
+
+# 'tree' to 'list' rewriters by file extension, files of other types are skipped without being read.
+# Rewriters take and return the decoded contents of a file, support for other types can be added here.
+TREE_REWRITERS = {
+    '.xml': replace_tree_with_list_in_xml,
+    '.py': replace_tree_with_list_in_python,
+    '.js': replace_tree_with_list_in_js,
+}
+
+
+def get_tree_rewriter(file_path):
+    """
+    :param str file_path:
+    :returns: the 'tree' to 'list' rewriter of the file, None if it has nothing to rewrite
+    :rtype: None|collections.abc.Callable
+    """
+    if os.path.basename(file_path) == '__manifest__.py':
+        # Its data files are paths, that aren't renamed
+        return None
+    return TREE_REWRITERS.get(os.path.splitext(file_path)[1].lower())
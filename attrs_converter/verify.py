@@ -0,0 +1,541 @@
+"""
+Verification that the converted domains are equivalent to the expressions they're converted to
+"""
+import ast
+import math
+import random
+import re
+from functools import partial
+from itertools import product
+from operator import methodcaller
+
+try:
+    import numpy
+except ImportError:
+    # Optional, the converted domains are then verified one field assignment at a time
+    numpy = None
+
+from .domains import ContextVariable, FieldReference, XmlIdReference, normalize_attrs_text, normalize_domain, parse_attrs
+from .simplify import COMPARISON_FUNCTIONS, XMLID_REFERENCE_REGEX, is_constant_node, substitute_xmlid_references
+from .stats import RUN_STATS
+
+
+# Assignments of the variables of a domain from which it's verified on random samples rather than on all of them
+VERIFY_MAX_ASSIGNMENTS = 4096
+VERIFY_SAMPLES = 4096
+# Assignments from which they are evaluated with numpy arrays, below which evaluating them one by one is faster
+NUMPY_MIN_ASSIGNMENTS = 64
+# Files listed per mismatch in the summary
+VERIFY_MAX_FILES = 5
+DOTTED_NAME_REGEX = re.compile(r"[A-Za-z_]\w*(?:\.[A-Za-z_]\w*)*")
+# Comparisons numpy doesn't apply element-wise, only applied one value at a time
+ELEMENT_WISE_COMPARISONS = (ast.In, ast.NotIn)
+VERIFY_METHODS = {'lower', 'upper'}
+VERIFY_NODES = (ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.Compare, ast.Name,
+                ast.Load, ast.Constant, ast.List, ast.Tuple, ast.Call, ast.Attribute) + tuple(COMPARISON_FUNCTIONS)
+# Value of an expression that raised an exception for an assignment
+EVALUATION_ERROR = object()
+
+
+def get_candidate_values(value):
+    """
+    :param value: constant a field is compared with in a domain
+    :returns: the values of the field to try for this constant: itself and the values around it
+    :rtype: list
+    """
+    if type(value) is str:
+        return [value, value.upper(), f"_{value}_"] + ([value[1:]] if len(value) > 1 else [])
+    if type(value) is bool:
+        return [value, not value]
+    if type(value) in (int, float):
+        return [value - 1, value, value + 1]
+    return [value]
+
+
+def get_verification_candidates(domain):
+    """
+    :param list[str|DomainLeaf] domain:
+    :returns: the values to try for each variable of the domain (fields and context variables by their expression, xml
+        id references by their %(xml_id)d text): the constants it's compared with and the values around them, and
+        False, the value of unset fields
+    :rtype: dict[str, list]
+    :raises ValueError: if a term doesn't compare a field
+    """
+    candidates = {}
+    linked = []
+    for leaf in domain:
+        if isinstance(leaf, str):
+            continue
+        left, operator, right = leaf
+        if not (type(left) in (FieldReference, ContextVariable) or (type(left) is str and DOTTED_NAME_REGEX.fullmatch(left))):
+            raise ValueError(f"{left!r} isn't a field")
+        values = candidates.setdefault(str(left), [False])
+        for value in right if operator in ('in', 'not in') and type(right) in (list, tuple) else [right]:
+            if is_domain_variable(value):
+                # Both sides are tried with the values of each other
+                candidates.setdefault(str(value), [False] if type(value) is not XmlIdReference else [1])
+                linked.append((str(left), str(value)))
+            else:
+                values.extend(get_candidate_values(value))
+    for left, right in linked:
+        candidates[left] = candidates[right] = candidates[left] + candidates[right]
+    for variable, values in candidates.items():
+        # Values are compared with their type, as True == 1 and 1 == 1.0
+        unique_values = list({(type(value), repr(value)): value for value in values}.values())
+        if not any(unique_values):
+            # Only compared with False or empty lists, e.g. a boolean or a relational field
+            unique_values.append(True)
+        candidates[variable] = unique_values
+    return candidates
+
+
+def get_verification_assignments(candidates, seed):
+    """
+    :param dict[str, list] candidates: result of get_verification_candidates()
+    :param str seed: seed of the random samples, so a domain is always verified with the same assignments
+    :returns: the values of each variable in every assignment (all the combinations of the candidates, or random
+        samples of them when there are more than VERIFY_MAX_ASSIGNMENTS), and the number of assignments
+    :rtype: (dict[str, list], int)
+    """
+    if math.prod(len(values) for values in candidates.values()) <= VERIFY_MAX_ASSIGNMENTS:
+        assignments = list(product(*candidates.values()))
+        return {variable: [assignment[index] for assignment in assignments] for index, variable in enumerate(candidates)}, len(assignments)
+    generator = random.Random(seed)
+    return {variable: [generator.choice(values) for _ in range(VERIFY_SAMPLES)] for variable, values in candidates.items()}, VERIFY_SAMPLES
+
+
+def is_unset(value):
+    return value is False or value is None or (type(value) is list and not value)
+
+
+def match_domain_leaf(operator, field_value, value):
+    """
+    Evaluates a domain term for a value of its field, the way the views evaluated domains before Odoo 17, False (or an
+    empty list of ids) being the value of unset fields
+
+    :param str operator:
+    :param field_value:
+    :param value: right operand of the term
+    :rtype: bool
+    :raises ValueError: if the operator isn't supported
+    """
+    if operator == '=?':
+        if value is False or value is None:
+            return True
+        operator = '='
+    if operator in ('=', '!='):
+        if value is False or (type(value) is list and not value):
+            result = is_unset(field_value)
+        elif value is True:
+            result = field_value is True
+        else:
+            result = field_value == value
+        return result if operator == '=' else not result
+    if operator in ('in', 'not in'):
+        values = value if type(value) in (list, tuple) else [value]
+        result = any(item in values for item in (field_value if type(field_value) is list else [field_value]))
+        return result if operator == 'in' else not result
+    if operator in ('<', '<=', '>', '>='):
+        try:
+            return COMPARISON_FUNCTIONS[{'<': ast.Lt, '<=': ast.LtE, '>': ast.Gt, '>=': ast.GtE}[operator]](field_value, value)
+        except TypeError:
+            return False
+    if 'like' in operator:
+        if type(field_value) is not str or type(value) is not str:
+            return False
+        if 'ilike' in operator:
+            field_value, value = field_value.lower(), value.lower()
+        if operator.startswith('='):
+            return field_value == value
+        return (value in field_value) != operator.startswith('not')
+    raise ValueError(f"Operator {operator!r} can't be evaluated")
+
+
+def evaluate_domain(domain, evaluate_leaf, logical_and, logical_or, logical_not):
+    """
+    :param list[str|DomainLeaf] domain:
+    :param evaluate_leaf: function returning the value of a term
+    :param logical_and: functions combining the values of terms
+    :param logical_or:
+    :param logical_not:
+    :returns: the value of the domain
+    :raises ValueError: if the domain is incomplete, as the domains to combine with the states of their tag are
+    """
+    stack = []
+    for item in reversed(normalize_domain(domain)):
+        if isinstance(item, str):
+            if len(stack) < (1 if item == '!' else 2):
+                raise ValueError(f"Missing term for the {item!r} operator")
+            if item == '!':
+                stack.append(logical_not(stack.pop()))
+            else:
+                left = stack.pop()
+                stack.append((logical_and if item == '&' else logical_or)(left, stack.pop()))
+        else:
+            stack.append(evaluate_leaf(item))
+    if len(stack) != 1:
+        raise ValueError("Missing operator")
+    return stack[0]
+
+
+def get_dotted_name(node):
+    """
+    :param ast.AST node:
+    :returns: the dotted name of a name or of attributes of a name (e.g. parent.company_id), None for other nodes
+    :rtype: str|None
+    """
+    attributes = []
+    while isinstance(node, ast.Attribute):
+        attributes.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    return '.'.join([node.id] + attributes[::-1])
+
+
+class VariableTransformer(ast.NodeTransformer):
+    """
+    Replaces the variables of an expression by names
+    """
+
+    def __init__(self, dotted_variables, variables):
+        """
+        :param dict[str, str] dotted_variables: name of the variables that are dotted names, by dotted name
+        :param dict[str, str] variables: name of the other variables, by ast.dump() of their tree
+        """
+        self.dotted_variables = dotted_variables
+        self.variables = variables
+
+    def visit(self, node):
+        if isinstance(node, (ast.Name, ast.Attribute)):
+            name = self.dotted_variables.get(get_dotted_name(node))
+        elif isinstance(node, (ast.Call, ast.Subscript)) and self.variables:
+            name = self.variables.get(ast.dump(node))
+        else:
+            name = None
+        if name is not None:
+            return ast.copy_location(ast.Name(name, ast.Load()), node)
+        return self.generic_visit(node)
+
+
+def get_verification_tree(expression, names):
+    """
+    :param str expression: expression converted from a domain
+    :param dict[str, str] names: name of each variable of the domain in the returned tree, by expression
+    :returns: the parsed expression, with its variables replaced by their names
+    :rtype: ast.Expression
+    :raises ValueError: if the expression isn't valid, or uses anything else than the variables, constants and
+        operators of the converted domains
+    """
+    expression, references = substitute_xmlid_references(expression)
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {e.msg}")
+    # Fields and names are found by their dotted name, calls and subscripts (e.g. context.get('key')) by their tree
+    dotted_variables = {name: names.get(reference, name) for name, reference in references.items()}
+    variables = {}
+    for variable, name in names.items():
+        if DOTTED_NAME_REGEX.fullmatch(variable):
+            dotted_variables[variable] = name
+        elif not XMLID_REFERENCE_REGEX.fullmatch(variable):
+            try:
+                variables[ast.dump(ast.parse(variable, mode='eval').body)] = name
+            except SyntaxError:
+                continue
+    tree = VariableTransformer(dotted_variables, variables).visit(tree)
+    for node in ast.walk(tree):
+        if not isinstance(node, VERIFY_NODES) or (isinstance(node, ast.Compare) and len(node.ops) > 1) or \
+                (isinstance(node, ast.Call) and not (isinstance(node.func, ast.Attribute) and node.func.attr in VERIFY_METHODS
+                                                     and not node.args and not node.keywords)) or \
+                (isinstance(node, ast.Attribute) and node.attr not in VERIFY_METHODS) or \
+                (isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub) and not isinstance(node.operand, ast.Constant)) or \
+                (isinstance(node, ast.Name) and node.id not in names.values()):
+            raise ValueError(f"Can't evaluate {ast.unparse(node)!r}")
+    return tree
+
+
+def get_truth_column(values):
+    return values if values.dtype == bool else values.astype(bool)
+
+
+def get_constant_column(value, size):
+    return numpy.fromiter((value for _ in range(size)), dtype=object, count=size)
+
+
+def map_columns(function, errors, *columns):
+    """
+    Applies a function to the values of the columns one at a time, as numpy doesn't apply it element-wise
+
+    :returns: the results, and the assignments for which it raised an exception (or that already had an error)
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    def apply(*values):
+        try:
+            return function(*values)
+        except Exception:
+            return EVALUATION_ERROR
+
+    values = numpy.frompyfunc(apply, len(columns), 1)(*columns)
+    return values, errors | numpy.frompyfunc(lambda value: value is EVALUATION_ERROR, 1, 1)(values).astype(bool)
+
+
+def evaluate_expression_columns(node, columns, size):
+    """
+    Evaluates an expression checked by get_verification_tree() for all the assignments at once, with numpy arrays
+
+    :param ast.AST node:
+    :param dict[str, numpy.ndarray] columns: values of each variable in the assignments, by name
+    :param int size: number of assignments
+    :returns: the values of the expression, and the assignments for which evaluating it raised an exception
+    :rtype: (numpy.ndarray, numpy.ndarray)
+    """
+    if isinstance(node, ast.Expression):
+        return evaluate_expression_columns(node.body, columns, size)
+    if isinstance(node, ast.Name):
+        return columns[node.id], numpy.zeros(size, dtype=bool)
+    if is_constant_node(node):
+        return get_constant_column(ast.literal_eval(node), size), numpy.zeros(size, dtype=bool)
+    if isinstance(node, (ast.List, ast.Tuple)):
+        # List of variables, e.g. [uid, False]
+        container = list if isinstance(node, ast.List) else tuple
+        elements = [evaluate_expression_columns(element, columns, size) for element in node.elts]
+        return map_columns(lambda *values: container(values), numpy.logical_or.reduce([errors for _, errors in elements]),
+                           *[values for values, _ in elements])
+    if isinstance(node, ast.UnaryOp):
+        values, errors = evaluate_expression_columns(node.operand, columns, size)
+        return ~get_truth_column(values), errors
+    if isinstance(node, ast.BoolOp):
+        values, errors = evaluate_expression_columns(node.values[0], columns, size)
+        for operand in node.values[1:]:
+            truth = get_truth_column(values)
+            # Like in Python, an operand is only evaluated when the previous ones don't decide the result
+            evaluated = ~errors & (truth if isinstance(node.op, ast.And) else ~truth)
+            operand_values, operand_errors = evaluate_expression_columns(operand, columns, size)
+            values = numpy.where(evaluated, operand_values, values)
+            errors = errors | (evaluated & operand_errors)
+        return values, errors
+    if isinstance(node, ast.Compare):
+        left, left_errors = evaluate_expression_columns(node.left, columns, size)
+        right, right_errors = evaluate_expression_columns(node.comparators[0], columns, size)
+        compare = COMPARISON_FUNCTIONS[type(node.ops[0])]
+        if not isinstance(node.ops[0], ELEMENT_WISE_COMPARISONS):
+            try:
+                values = compare(left, right)
+                if isinstance(values, numpy.ndarray) and values.shape == (size,):
+                    return values, left_errors | right_errors
+            except TypeError:
+                # Values that can't be compared, e.g. False < 'a', the errors are found one value at a time
+                pass
+        return map_columns(compare, left_errors | right_errors, left, right)
+    values, errors = evaluate_expression_columns(node.func.value, columns, size)
+    return map_columns(methodcaller(node.func.attr), errors, values)
+
+
+def evaluate_expression(code, assignment):
+    """
+    :param code: compiled result of get_verification_tree()
+    :param dict assignment: value of each variable, by name
+    :returns: the value of the expression for the assignment, or the exception it raised
+    """
+    try:
+        return eval(code, {'__builtins__': {}}, assignment)
+    except Exception as e:
+        return e
+
+
+def is_domain_variable(value):
+    return type(value) in (FieldReference, ContextVariable, XmlIdReference)
+
+
+def get_domain_operand(value, assignment):
+    """
+    :param value: right operand of a domain term
+    :param dict assignment: value of each variable, by expression
+    :returns: the operand with the values of its variables
+    """
+    if is_domain_variable(value):
+        return assignment[str(value)]
+    if type(value) in (list, tuple) and any(map(is_domain_variable, value)):
+        return type(value)(get_domain_operand(item, assignment) for item in value)
+    return value
+
+
+def match_assignment_leaf(leaf, assignment):
+    return match_domain_leaf(leaf[1], assignment[str(leaf[0])], get_domain_operand(leaf[2], assignment))
+
+
+def get_domain_function(domain):
+    """
+    :param list[str|DomainLeaf] domain:
+    :returns: function returning the result of the domain for an assignment, by variable expression
+    :rtype: (dict) -> bool
+    """
+    return evaluate_domain(
+        domain, lambda leaf: partial(match_assignment_leaf, leaf),
+        lambda left, right: lambda assignment: left(assignment) and right(assignment),
+        lambda left, right: lambda assignment: left(assignment) or right(assignment),
+        lambda function: lambda assignment: not function(assignment))
+
+
+def verify_domain(domain, expression):
+    """
+    Checks that a converted expression gives the same result as its domain for all the assignments of its variables (or
+    random samples of them)
+
+    :param list[str|DomainLeaf] domain:
+    :param str expression: result of stringify_attr() for the domain
+    :returns: the number of assignments checked, and the first assignment (by variable expression) for which the
+        results differ, with the result of the domain and the result of the expression or the exception it raised, None
+        if they are equivalent
+    :rtype: (int, None|(dict, bool, bool|str))
+    :raises ValueError: if the domain or the expression can't be evaluated
+    """
+    candidates = get_verification_candidates(domain)
+    names = {variable: f"__v{index}" for index, variable in enumerate(candidates)}
+    tree = get_verification_tree(expression, names)
+    code = compile(tree, '<expression>', 'eval')
+    assignments, size = get_verification_assignments(candidates, expression)
+
+    def get_assignment(index):
+        return {variable: values[index] for variable, values in assignments.items()}
+
+    if numpy is not None and size >= NUMPY_MIN_ASSIGNMENTS:
+        columns = {variable: numpy.fromiter(values, dtype=object, count=size) for variable, values in assignments.items()}
+
+        def evaluate_leaf(leaf):
+            left, operator, right = leaf
+            if is_domain_variable(right):
+                right_column = columns[str(right)]
+            elif type(right) in (list, tuple) and any(map(is_domain_variable, right)):
+                right_column = numpy.fromiter((get_domain_operand(right, get_assignment(index)) for index in range(size)),
+                                              dtype=object, count=size)
+            else:
+                right_column = get_constant_column(right, size)
+            return numpy.frompyfunc(partial(match_domain_leaf, operator), 2, 1)(columns[str(left)], right_column).astype(bool)
+
+        expected = evaluate_domain(domain, evaluate_leaf, numpy.logical_and, numpy.logical_or, numpy.logical_not)
+        values, errors = evaluate_expression_columns(tree, {names[variable]: column for variable, column in columns.items()}, size)
+        differences = numpy.flatnonzero(errors | (get_truth_column(values) != expected))
+        index = int(differences[0]) if len(differences) else None
+    else:
+        domain_function = get_domain_function(domain)
+        for index in range(size):
+            assignment = get_assignment(index)
+            value = evaluate_expression(code, {names[variable]: value for variable, value in assignment.items()})
+            if isinstance(value, Exception) or bool(value) != domain_function(assignment):
+                break
+        else:
+            index = None
+    if index is None:
+        return size, None
+    assignment = get_assignment(index)
+    value = evaluate_expression(code, {names[variable]: value for variable, value in assignment.items()})
+    actual = f"{type(value).__name__}: {value}" if isinstance(value, Exception) else bool(value)
+    return size, (assignment, get_domain_function(domain)(assignment), actual)
+
+
+class DomainVerifier:
+    """
+    Verifies the conversion of every distinct attrs value of a run, recording the mismatches with a counterexample
+    """
+
+    def __init__(self):
+        self.enabled = False
+        # Normalized attrs values already verified, and mismatches of each of them with the files they are found in
+        self.verified = set()
+        self.mismatches = {}
+        self.files = {}
+        # File being converted by this process
+        self.file_path = None
+        self.new_verified = set()
+        self.new_mismatches = {}
+        self.new_files = {}
+
+    def verify(self, attrs, new_attrs):
+        """
+        :param str attrs: attrs value
+        :param dict[bool|str|int] new_attrs: result of compile_new_attrs() for it
+        """
+        key = normalize_attrs_text(attrs)
+        if key not in self.verified:
+            self.verified.add(key)
+            self.new_verified.add(key)
+            with RUN_STATS.phase('verify'):
+                mismatches = self.verify_attrs(attrs, new_attrs)
+            if mismatches:
+                self.mismatches[key] = self.new_mismatches[key] = mismatches
+                self.files[key] = []
+        if key in self.mismatches and self.file_path is not None and self.file_path not in self.files[key]:
+            self.files[key].append(self.file_path)
+            self.new_files.setdefault(key, []).append(self.file_path)
+
+    @staticmethod
+    def verify_attrs(attrs, new_attrs):
+        """
+        :returns: the mismatches of the domains of the attributes
+        :rtype: list[dict]
+        """
+        attrs = attrs.replace("&lt;", "<").replace("&gt;", ">").strip()
+        if not attrs:
+            return []
+        mismatches = []
+        for attr, domain in parse_attrs(attrs).items():
+            if type(domain) is not list or type(new_attrs.get(attr)) is not str:
+                continue
+            try:
+                assignments, mismatch = verify_domain(domain, new_attrs[attr])
+            except ValueError:
+                # Incomplete domains, combined with the states of their tag, and operators that aren't converted
+                RUN_STATS.count('unverified_attributes')
+                continue
+            RUN_STATS.count('verified_attributes')
+            RUN_STATS.count('verified_assignments', assignments)
+            if mismatch is not None:
+                RUN_STATS.count('verification_mismatches')
+                assignment, expected, actual = mismatch
+                mismatches.append({
+                    'attribute': attr,
+                    'expression': new_attrs[attr],
+                    'assignment': assignment,
+                    'domain_result': expected,
+                    'expression_result': actual,
+                })
+        return mismatches
+
+    def pop_updates(self):
+        """
+        :returns: the attrs values verified, their mismatches and the files they are found in since the previous call
+        :rtype: (set[str], dict[str, list], dict[str, list[str]])
+        """
+        updates = self.new_verified, self.new_mismatches, self.new_files
+        self.new_verified = set()
+        self.new_mismatches = {}
+        self.new_files = {}
+        return updates
+
+    def merge_updates(self, updates):
+        """
+        :param (set[str], dict[str, list], dict[str, list[str]]) updates: result of pop_updates() in another process
+        """
+        verified, mismatches, files = updates
+        self.verified.update(verified)
+        for key, key_mismatches in mismatches.items():
+            self.mismatches.setdefault(key, key_mismatches)
+            self.files.setdefault(key, [])
+        for key, key_files in files.items():
+            self.files[key].extend(file_path for file_path in key_files if file_path not in self.files[key])
+
+    def get_report(self):
+        """
+        :returns: the mismatches, to be dumped as JSON
+        :rtype: list[dict]
+        """
+        return [
+            {'attrs': key, **mismatch, 'files': self.files[key]}
+            for key, key_mismatches in self.mismatches.items()
+            for mismatch in key_mismatches
+        ]
+
+
+DOMAIN_VERIFIER = DomainVerifier()
@@ -0,0 +1,478 @@
+"""
+Index of the inherited views of the root directory, resolving the attribute overrides against their parent views
+"""
+import os
+import re
+from collections import namedtuple
+
+from lxml import etree
+
+from .cache import get_new_attrs
+from .domains import NEW_ATTRS
+from .files import read_file
+from .simplify import simplify_expression
+
+
+def get_parent_etree_node(root_node, target_node):
+    """
+    Returns the parent node of a given node, and the index and indentation of the target node in the parent node's direct child nodes list
+
+    lxml keeps the parent and sibling links of every node up to date when nodes are inserted or removed, so they are
+    used instead of searching the document: the lookup doesn't depend on the document size, which keeps the conversion
+    of big views with many attribute overrides linear.
+
+    :param xml.etree.ElementTree.Element root_node: root node of the document, only kept for backward compatibility
+    :param xml.etree.ElementTree.Element target_node:
+    :returns: index, parent_node, indentation
+    :rtype: (int, xml.etree.ElementTree.Element, str)
+    """
+    parent_elem = target_node.getparent()
+    if parent_elem is None:
+        return None
+    previous_child = target_node.getprevious()
+    if previous_child is not None:
+        indent = previous_child.tail
+    else:
+        # For the first child element it's the text in between the parent's opening tag and the first child that determines indentation
+        indent = parent_elem.text
+    return parent_elem.index(target_node), parent_elem, indent
+
+
+def get_child_tag_at_index(parent_node, index):
+    """
+    Returns the child node of a node with a given index
+
+    :param xml.etree.ElementTree.Element parent_node:
+    :param int index:
+    :returns: child_node
+    :rtype: xml.etree.ElementTree.Element
+    """
+    if 0 <= index < len(parent_node):
+        return parent_node[index]
+
+
+def get_sibling_attribute_tag_of_type(root_node, target_node, attribute_name):
+    """
+    If it exists, returns the attribute tag with the same parent tag for the given name
+
+    :param xml.etree.ElementTree.Element root_node: root node of the document, only kept for backward compatibility
+    :param xml.etree.ElementTree.Element target_node:
+    :param str attribute_name:
+    :returns: attribute_tag with name="<attribute_name>"
+    :rtype: xml.etree.ElementTree.Element
+    """
+    for attribute_tag in target_node.getparent().iterchildren('attribute'):
+        if attribute_tag.get('name') == attribute_name:
+            return attribute_tag
+
+
+def get_inherited_tag_type(root_node, target_node):
+    """
+    Checks what the type of the tag is that the attribute tag applies to
+
+    :param xml.etree.ElementTree.Element root_node:
+    :param xml.etree.ElementTree.Element target_node:
+    :rtype: str|None
+    """
+    parent_tag = target_node.getparent()
+    if expr := parent_tag.get('expr'):
+        # Checks if the last part of the xpath expression is a tag name and returns it
+        # If not (eg. if the pattern is for example expr="//field[@name='...']/.."), return None
+        if matches := re.findall("^.*/(\\w+)[^/]*?$", expr):
+            return matches[0]
+    else:
+        return parent_tag.tag
+
+
+def get_combined_invisible_condition(invisible_attribute, states_attribute):
+    """
+    :param str invisible_attribute: invisible attribute condition already present on the same tag as the states
+    :param str states_attribute: string of the form 'state1,state2,...'
+    """
+    invisible_attribute = invisible_attribute.strip()
+    states_attribute = states_attribute.strip()
+    if not states_attribute:
+        return invisible_attribute
+    states_list = re.split(r"\s*,\s*", states_attribute.strip())
+    states_to_add = f"state not in {states_list}"
+    if invisible_attribute:
+        if invisible_attribute.endswith('or') or invisible_attribute.endswith('and'):
+            combined_invisible_condition = f"{invisible_attribute} {states_to_add}"
+        else:
+            combined_invisible_condition = f"({invisible_attribute}) or ({states_to_add})"
+    else:
+        combined_invisible_condition = states_to_add
+    return simplify_expression(combined_invisible_condition)
+
+
+def get_combined_attribute_value(old_attr_value, new_attr_value):
+    """
+    :param str old_attr_value: value of an attribute that is also given by an attrs dictionary
+    :param str new_attr_value: condition of the attribute in the attrs dictionary
+    :returns: the condition combining both
+    :rtype: str
+    """
+    if old_attr_value in [True, 1, 'True', '1']:
+        return simplify_expression(f"True or ({new_attr_value})")
+    elif old_attr_value in [False,  0, 'False', '0']:
+        return simplify_expression(f"False or ({new_attr_value})")
+    return simplify_expression(f"({old_attr_value}) or ({new_attr_value})")
+
+
+# Attributes of the tags of a view that are indexed, to resolve the attributes inherited by attribute overrides
+INDEXED_ATTRIBUTES = ['attrs', 'states'] + NEW_ATTRS
+# XPath expression locating a tag by its name in its last step, e.g. //page[@name='extra']/field[@name='partner_id']
+XPATH_NAMED_TAG_REGEX = re.compile(r"""/(?:.*/)?(\w+)\[@name\s*=\s*(['"])([^'"]+)\2\]""")
+VIEW_RECORD_BYTES_REGEX = re.compile(rb"ir\.ui\.view")
+
+# Indexed view:
+#   - inherit_id: xml id of the inherited view, None for a base view
+#   - definitions: attributes (among INDEXED_ATTRIBUTES) of the tags it adds, by key (see get_locator_key()), None
+#     for keys that are defined more than once or replaced
+#   - overrides: attributes it sets with <attribute> tags, by key
+#   - unresolved: whether it overrides indexed attributes of tags it doesn't locate by name
+ViewInfo = namedtuple('ViewInfo', ['xmlid', 'inherit_id', 'definitions', 'overrides', 'unresolved'])
+
+
+def get_xmlid(xmlid, module):
+    """
+    :returns: the xml id qualified with the module of the file it's found in, if it isn't already
+    :rtype: str
+    """
+    if '.' in xmlid or not module:
+        return xmlid
+    return f"{module}.{xmlid}"
+
+
+def get_locator_key(locator):
+    """
+    :param xml.etree.ElementTree.Element locator: tag of an inheriting view locating the tag it applies to, an xpath
+        or a tag with a name
+    :returns: tag and name of the located tag, None if it isn't located by its name
+    :rtype: None|(str, str)
+    """
+    if locator.tag == 'xpath':
+        if match := XPATH_NAMED_TAG_REGEX.fullmatch(locator.get('expr', '').strip()):
+            return match.group(1), match.group(3)
+        return None
+    if (name := locator.get('name')) is not None:
+        return locator.tag, name
+    return None
+
+
+def index_arch(arch, inheriting):
+    """
+    :param xml.etree.ElementTree.Element arch: arch field of a view record
+    :param bool inheriting: whether the view inherits another view
+    :returns: definitions, overrides and unresolved flag of the view, see ViewInfo
+    :rtype: (dict, dict, bool)
+    """
+    definitions = {}
+    overrides = {}
+    unresolved = False
+
+    def add_definitions(elements):
+        for element in elements:
+            if isinstance(element.tag, str) and element.tag not in ('xpath', 'attribute') and (name := element.get('name')):
+                key = element.tag, name
+                # A key defined twice can't be told apart by a locator
+                definitions[key] = None if key in definitions else {
+                    attribute: element.get(attribute) for attribute in INDEXED_ATTRIBUTES if element.get(attribute) is not None
+                }
+
+    if not inheriting:
+        add_definitions(arch.iterdescendants())
+        return definitions, overrides, unresolved
+    for locator in arch.iterdescendants():
+        if not isinstance(locator.tag, str) or (position := locator.get('position')) is None:
+            continue
+        key = get_locator_key(locator)
+        if position == 'attributes':
+            values = {
+                attribute_tag.get('name'): (attribute_tag.text or '').strip()
+                for attribute_tag in locator.iterchildren('attribute') if attribute_tag.get('name') in INDEXED_ATTRIBUTES
+            }
+            if values and key is None:
+                unresolved = True
+            elif values:
+                overrides.setdefault(key, {}).update(values)
+        else:
+            add_definitions(locator.iterdescendants())
+            if position == 'replace' and key is not None:
+                # The replaced tag is defined again, by this view
+                definitions[key] = None
+    return definitions, overrides, unresolved
+
+
+def get_file_module(file_path, module_directories):
+    """
+    :param str file_path:
+    :param dict[str, str] module_directories: name of the module of each module directory (absolute path)
+    :returns: name of the module of the file, the directory of the nearest __manifest__.py, None if there is none
+    :rtype: None|str
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    while directory not in module_directories:
+        parent_directory = os.path.dirname(directory)
+        if parent_directory == directory:
+            return None
+        directory = parent_directory
+    return module_directories[directory]
+
+
+class ViewIndex:
+    """
+    Index of the views of a repository, resolving the attributes a tag inherits from the parent views of an attribute
+    override when the lookup isn't ambiguous
+    """
+
+    def __init__(self):
+        self.views = {}
+        self.module_directories = {}
+        self.touches = {}
+        self.unresolved_roots = set()
+        # xml ids of the views defined by each file
+        self.files = {}
+
+    def get_module(self, file_path):
+        return get_file_module(file_path, self.module_directories)
+
+    def build(self, manifest_files, xml_files):
+        """
+        :param list[str] manifest_files: __manifest__.py files of the modules
+        :param list[str] xml_files: XML files that may contain views
+        """
+        for manifest_file in manifest_files:
+            directory = os.path.dirname(os.path.abspath(manifest_file))
+            self.module_directories[directory] = os.path.basename(directory)
+        for xml_file in xml_files:
+            self.add_file(xml_file)
+        self.index_inheritance()
+
+    def update(self, manifest_files, xml_files):
+        """
+        Indexes the given files again, once they changed (e.g. in watch mode)
+
+        :param list[str] manifest_files: __manifest__.py files of new modules
+        :param list[str] xml_files: XML files that may contain views, the views they used to define are removed
+        """
+        for manifest_file in manifest_files:
+            directory = os.path.dirname(os.path.abspath(manifest_file))
+            self.module_directories[directory] = os.path.basename(directory)
+        for xml_file in xml_files:
+            for xmlid in self.files.pop(xml_file, ()):
+                self.views.pop(xmlid, None)
+            self.add_file(xml_file)
+        self.index_inheritance()
+
+    def add_file(self, xml_file):
+        """
+        :param str xml_file: XML file that may contain views
+        """
+        try:
+            contents = read_file(xml_file)
+            if VIEW_RECORD_BYTES_REGEX.search(contents):
+                self.add_document(etree.fromstring(contents), self.get_module(xml_file), xml_file)
+        except (OSError, etree.XMLSyntaxError):
+            # Files that can't be read or parsed are reported by the conversion
+            pass
+
+    def index_inheritance(self):
+        """
+        Indexes the views touching each tag by base view, once all the views are added
+        """
+        self.touches = {}
+        self.unresolved_roots = set()
+        for xmlid in self.views:
+            root = self.get_root(xmlid)
+            view = self.views[xmlid]
+            if view.unresolved:
+                self.unresolved_roots.add(root)
+            for key in set(view.definitions) | set(view.overrides):
+                self.touches.setdefault((root, key), []).append(xmlid)
+
+    def add_document(self, doc, module, file_path=None):
+        """
+        :param xml.etree.ElementTree.Element doc: root node of an XML data file
+        :param str module:
+        :param str file_path: file the document is parsed from
+        """
+        for record in doc.iter('record'):
+            if record.get('model') != 'ir.ui.view' or not record.get('id'):
+                continue
+            inherit_id = arch = None
+            for field in record.iterchildren('field'):
+                if field.get('name') == 'inherit_id' and field.get('ref'):
+                    inherit_id = get_xmlid(field.get('ref'), module)
+                elif field.get('name') == 'arch':
+                    arch = field
+            if arch is None:
+                continue
+            xmlid = get_xmlid(record.get('id'), module)
+            self.views[xmlid] = ViewInfo(xmlid, inherit_id, *index_arch(arch, inherit_id is not None))
+            self.files.setdefault(file_path, []).append(xmlid)
+
+    def get_parents(self, xmlid):
+        """
+        :returns: the views inherited by the given view, from its parent to its base view, and whether they are all in
+            the index
+        :rtype: (list[ViewInfo], bool)
+        """
+        parents = []
+        inherit_id = self.views[xmlid].inherit_id if xmlid in self.views else None
+        while inherit_id is not None:
+            if inherit_id not in self.views or len(parents) > len(self.views):
+                # Inherited view of another repository (or inheritance loop)
+                return parents, False
+            parents.append(self.views[inherit_id])
+            inherit_id = parents[-1].inherit_id
+        return parents, True
+
+    def get_root(self, xmlid):
+        """
+        :returns: the xml id of the base view of the given view, or of the first inherited view outside of the index
+        :rtype: str
+        """
+        parents, complete = self.get_parents(xmlid)
+        if not parents:
+            return self.views[xmlid].inherit_id or xmlid
+        return parents[-1].xmlid if complete else parents[-1].inherit_id
+
+    def inherits_from(self, xmlid, parent_xmlid):
+        return any(parent.xmlid == parent_xmlid for parent in self.get_parents(xmlid)[0])
+
+    def lookup(self, xmlid, key):
+        """
+        :param str xmlid: xml id of a view overriding attributes of a tag
+        :param (str, str) key: key of the tag, see get_locator_key()
+        :returns: the attributes (among INDEXED_ATTRIBUTES) the tag has in the parent views of the given view, None if
+            they can't be determined
+        :rtype: None|dict[str, str]
+        """
+        if key is None or xmlid not in self.views:
+            return None
+        parents, complete = self.get_parents(xmlid)
+        if not parents or not complete:
+            return None
+        parents.reverse()
+        root = parents[0].xmlid
+        if root in self.unresolved_roots:
+            return None
+        parent_xmlids = {parent.xmlid for parent in parents}
+        for other_xmlid in self.touches.get((root, key), ()):
+            # Views that aren't parents of the given view may be applied before it, depending on module dependencies and priorities
+            if other_xmlid != xmlid and other_xmlid not in parent_xmlids and not self.inherits_from(other_xmlid, xmlid):
+                return None
+        definitions = [parent.definitions[key] for parent in parents if key in parent.definitions]
+        if len(definitions) != 1 or definitions[0] is None:
+            return None
+        attributes = dict(definitions[0])
+        for parent in parents:
+            for attribute, value in parent.overrides.get(key, {}).items():
+                if value:
+                    attributes[attribute] = value
+                else:
+                    attributes.pop(attribute, None)
+        return attributes
+
+    def has_other_overrides(self, xmlid, key):
+        """
+        :returns: whether attributes of the tag of the given view are overridden by other views, True if unknown
+        :rtype: bool
+        """
+        if key is None or xmlid not in self.views:
+            return True
+        root = self.get_root(xmlid)
+        if root in self.unresolved_roots:
+            return True
+        return any(
+            other_xmlid != xmlid and key in self.views[other_xmlid].overrides and not self.inherits_from(xmlid, other_xmlid)
+            for other_xmlid in self.touches.get((root, key), ())
+        )
+
+
+VIEW_INDEX = ViewIndex()
+
+
+def get_inherited_attributes(view_index, module, attribute_tag):
+    """
+    :param ViewIndex view_index:
+    :param str module: module of the converted file
+    :param xml.etree.ElementTree.Element attribute_tag: <attribute> tag of an attribute override
+    :returns: the attributes the overridden tag has in the parent views, None if they can't be determined
+    :rtype: None|dict[str, str]
+    """
+    if view_index is None:
+        return None
+    record = next(attribute_tag.iterancestors('record'), None)
+    if record is None or not record.get('id'):
+        return None
+    return view_index.lookup(get_xmlid(record.get('id'), module), get_locator_key(attribute_tag.getparent()))
+
+
+def get_inherited_states(inherited):
+    """
+    :param dict[str, str] inherited: result of get_inherited_attributes()
+    :returns: the states attribute of the overridden tag, empty if it has none, None if it can't be determined
+    :rtype: None|str
+    """
+    if inherited is None:
+        return None
+    if 'states' in inherited:
+        return inherited['states']
+    if 'attrs' not in inherited and 'invisible' in inherited:
+        # Maybe the result of an earlier conversion of a states attribute
+        return None
+    return ''
+
+
+def get_inherited_invisible_condition(inherited):
+    """
+    :param dict[str, str] inherited: result of get_inherited_attributes()
+    :returns: the invisible condition of the overridden tag without its states, empty if it has none, None if it
+        can't be determined
+    :rtype: None|str
+    """
+    if inherited is None:
+        return None
+    if 'attrs' not in inherited and 'states' not in inherited:
+        # The tag isn't converted yet only if it has neither, so its invisible attribute may come from states
+        return None if 'invisible' in inherited else ''
+    invisible_attribute = inherited.get('invisible', '')
+    try:
+        attrs_invisible = get_new_attrs(inherited.get('attrs', '')).get('invisible')
+    except ValueError:
+        return None
+    if attrs_invisible is None:
+        return invisible_attribute
+    if invisible_attribute:
+        return get_combined_attribute_value(invisible_attribute, attrs_invisible)
+    return str(attrs_invisible)
+
+
+def get_inherited_missing_attributes(inherited, missing_attrs):
+    """
+    :param dict[str, str] inherited: result of get_inherited_attributes()
+    :param list[str] missing_attrs: attributes that an attrs override doesn't set anymore
+    :returns: the value to override each of those attributes with, for those the tag had in the attrs of the parent
+        views, None if it can't be determined
+    :rtype: None|dict[str, str]
+    """
+    if inherited is None:
+        return None
+    try:
+        inherited_attrs = get_new_attrs(inherited.get('attrs', ''))
+    except ValueError:
+        return None
+    values = {}
+    for missing_attr in missing_attrs:
+        if missing_attr in inherited_attrs:
+            # The attrs override removed it, leaving the attribute outside of the attrs
+            value = inherited.get(missing_attr, '')
+            if missing_attr == 'invisible':
+                value = get_combined_invisible_condition(value, inherited.get('states', ''))
+            values[missing_attr] = value
+        elif missing_attr in inherited and 'attrs' not in inherited:
+            # Maybe the result of an earlier conversion of an attrs attribute
+            return None
+    return values
@@ -0,0 +1,254 @@
+"""
+Watch mode: the root directory is watched with inotify, or by polling, and the changed files are processed
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import signal
+import struct
+import time
+from pathlib import Path
+
+from .files import IGNORED_DIRECTORIES, IGNORED_GLOBS, get_file_role, is_ignored_path, walk_files
+
+
+# Time without any other change after which the changed files are processed, so the several writes of a file saved by
+# an editor (or of the files changed together, e.g. by a checkout) are processed at once
+WATCH_DEBOUNCE = 0.1
+# Longest time changes are collected for, while files keep changing
+WATCH_MAX_DELAY = 2
+# Interval at which the files are checked for changes when inotify isn't available, in seconds
+WATCH_POLL_INTERVAL = 1.0
+# inotify events of the watched directories: files written and closed, or moved into them, and directories created
+IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE = 0x8, 0x80, 0x100
+IN_Q_OVERFLOW, IN_IGNORED, IN_ISDIR = 0x4000, 0x8000, 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """
+    Changes of the files of a directory tree, from the inotify events of the Linux kernel, through ctypes
+    """
+
+    def __init__(self, root, ignored_globs):
+        """
+        :param str root:
+        :param list[str] ignored_globs: globs of the ignored paths, relative to the root directory
+        :raises OSError: if inotify isn't available, or the directories can't all be watched (e.g. too many of them)
+        """
+        self.root = root
+        self.ignored_globs = ignored_globs
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError("inotify isn't available")
+        # IN_NONBLOCK and IN_CLOEXEC have the values of O_NONBLOCK and O_CLOEXEC
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        self.directories = {}
+        try:
+            self.add_directory(root)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def add_directory(self, directory):
+        """
+        Watches the directory and its subdirectories that aren't ignored
+
+        :param str directory:
+        :returns: the files of those directories
+        :rtype: list[str]
+        """
+        files = []
+        stack = [directory]
+        while stack:
+            directory = stack.pop()
+            watch_descriptor = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), INOTIFY_MASK)
+            if watch_descriptor < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOENT:
+                    # Removed in the meantime
+                    continue
+                raise OSError(error, f"Could not watch {directory}: {os.strerror(error)}")
+            self.directories[watch_descriptor] = directory
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name not in IGNORED_DIRECTORIES and not is_ignored_path(self.get_relative_path(entry.path), self.ignored_globs):
+                                stack.append(entry.path)
+                        elif entry.is_file():
+                            files.append(entry.path)
+            except OSError:
+                continue
+        return files
+
+    def get_relative_path(self, path):
+        return Path(os.path.relpath(path, self.root)).as_posix()
+
+    def wait(self, timeout=None):
+        """
+        :param float timeout: time to wait for changes, in seconds, None to wait until there are
+        :returns: the files that may have changed since the last call, None if changes were lost (when the events
+            overflow the queue of the kernel), empty if there weren't any
+        :rtype: None|set[str]
+        """
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return set()
+        changed_files = set()
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return changed_files
+            offset = 0
+            while offset < len(data):
+                watch_descriptor, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = os.fsdecode(data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0'))
+                offset += INOTIFY_EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    changed_files = None
+                    continue
+                if mask & IN_IGNORED:
+                    # The directory was removed
+                    self.directories.pop(watch_descriptor, None)
+                    continue
+                if (directory := self.directories.get(watch_descriptor)) is None:
+                    continue
+                path = os.path.join(directory, name)
+                if mask & IN_ISDIR:
+                    if name not in IGNORED_DIRECTORIES and not is_ignored_path(self.get_relative_path(path), self.ignored_globs):
+                        # Its files may be written before it's watched
+                        files = self.add_directory(path)
+                        if changed_files is not None:
+                            changed_files.update(files)
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and changed_files is not None:
+                    changed_files.add(path)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Changes of the files of a directory tree, found by comparing the size and modification time of its files at
+    regular intervals, where inotify isn't available (e.g. on network filesystems and other platforms)
+    """
+
+    def __init__(self, root, exclude, interval=WATCH_POLL_INTERVAL):
+        """
+        :param str root:
+        :param list[str] exclude: see walk_files()
+        :param float interval: seconds between two scans of the files
+        """
+        self.root = root
+        self.exclude = exclude
+        self.interval = interval
+        self.files = self.scan()
+
+    def scan(self):
+        """
+        :returns: the size and modification time of each file
+        :rtype: dict[str, (int, int)]
+        """
+        files = {}
+        for file_path, _ in walk_files(self.root, self.exclude):
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            files[file_path] = stat.st_size, stat.st_mtime_ns
+        return files
+
+    def wait(self, timeout=None):
+        """
+        See InotifyWatcher.wait()
+        """
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        files = self.scan()
+        changed_files = {file_path for file_path, stat in files.items() if self.files.get(file_path) != stat}
+        self.files = files
+        return changed_files
+
+    def close(self):
+        pass
+
+
+def get_file_stat(file_path):
+    """
+    :returns: the size and modification time of the file, None if it doesn't exist anymore
+    :rtype: None|(int, int)
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def watch_files(root, exclude, on_change, poll=False):
+    """
+    Calls on_change with the files of the root directory that changed, debounced, until interrupted (with Ctrl+C)
+
+    :param str root:
+    :param list[str] exclude: see walk_files()
+    :param collections.abc.Callable on_change: called with the changed files (sorted by path) and their role, the files
+        it writes don't trigger it again
+    :param bool poll: whether to poll the files for changes instead of using inotify
+    """
+    ignored_globs = IGNORED_GLOBS + list(exclude)
+    watcher = None
+    if not poll:
+        try:
+            watcher = InotifyWatcher(root, ignored_globs)
+        except (OSError, AttributeError, TypeError) as e:
+            print(f"Warning: Could not watch {root} with inotify, polling the files every {WATCH_POLL_INTERVAL}s instead: {e}")
+    if watcher is None:
+        watcher = PollingWatcher(root, exclude)
+    # Size and modification time of the files when they were last processed, to ignore the files written by on_change
+    processed = {}
+    print(f"\nWatching {root} for changes ({'inotify' if isinstance(watcher, InotifyWatcher) else 'polling'}), press Ctrl+C to stop")
+
+    def stop(signal_number, frame):
+        raise KeyboardInterrupt
+
+    # Also stopped like with Ctrl+C when terminated, e.g. in a container, so the run is still reported and its caches saved
+    previous_handler = signal.signal(signal.SIGTERM, stop)
+    try:
+        while True:
+            changed_files = watcher.wait()
+            if changed_files is not None and not changed_files:
+                continue
+            deadline = time.monotonic() + WATCH_MAX_DELAY
+            while changed_files is not None and time.monotonic() < deadline:
+                more_changed_files = watcher.wait(WATCH_DEBOUNCE)
+                if not more_changed_files:
+                    if more_changed_files is None:
+                        changed_files = None
+                    break
+                changed_files |= more_changed_files
+            if changed_files is None:
+                # Changes were lost, all the files are checked
+                changed_files = {file_path for file_path, _ in walk_files(root, exclude)}
+            files = []
+            for file_path in sorted(changed_files):
+                # The ignored directories aren't watched
+                relative_path = Path(os.path.relpath(file_path, root)).as_posix()
+                if is_ignored_path(relative_path, ignored_globs):
+                    continue
+                if (stat := get_file_stat(file_path)) is not None and processed.get(file_path) != stat:
+                    files.append((file_path, get_file_role(os.path.basename(file_path), 'views' in relative_path.split('/')[:-1])))
+            if not files:
+                continue
+            on_change(files)
+            for file_path, _ in files:
+                processed[file_path] = get_file_stat(file_path)
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+    finally:
+        signal.signal(signal.SIGTERM, previous_handler)
+        watcher.close()
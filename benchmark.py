@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Throughput benchmark of replace_attrs.py on synthetic Odoo addons trees.
+
+    python3 benchmark.py generate path/to/corpus --modules 50
+    python3 benchmark.py run --scales 5,20,80 --save-baseline baseline.json
+    python3 benchmark.py run --scales 5,20,80 --baseline baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'replace_attrs.py')
+PASSES = ['attrs', 'tree', 'manifest']
+
+FIELD_NAMES = [
+    'name', 'state', 'partner_id', 'company_id', 'user_id', 'amount_total', 'date_order', 'note', 'active', 'type',
+    'currency_id', 'product_id', 'quantity', 'price_unit', 'move_type', 'journal_id', 'payment_state', 'priority',
+]
+STATES = ['draft', 'sent', 'sale', 'done', 'cancel', 'posted', 'confirmed']
+WORDS = ['alpha', 'beta', 'gamma', 'delta', 'omega', 'sale', 'purchase', 'stock']
+
+
+def random_leaf(rng):
+    """
+    :param random.Random rng:
+    :returns: a domain term, as written in an attrs value
+    :rtype: str
+    """
+    field = rng.choice(FIELD_NAMES)
+    kind = rng.randrange(10)
+    if kind == 0:
+        return f"('{field}', '=', False)"
+    if kind == 1:
+        return f"('{field}', '!=', False)"
+    if kind == 2:
+        return f"('state', 'in', {rng.sample(STATES, rng.randint(1, 3))})"
+    if kind == 3:
+        return f"('state', 'not in', {rng.sample(STATES, rng.randint(1, 3))})"
+    if kind == 4:
+        return f"('{field}', '=', parent.{rng.choice(FIELD_NAMES)})"
+    if kind == 5:
+        return f"('{field}', '=', uid)"
+    if kind == 6:
+        return f"('{field}', '>', {rng.randint(0, 100)})"
+    if kind == 7:
+        return f"('{field}', '{rng.choice(['like', 'ilike', 'not like', '=ilike'])}', '{rng.choice(WORDS)}')"
+    if kind == 8:
+        return f"('{field}', 'in', [%(base.group_{rng.choice(WORDS)})d])"
+    return f"('{field}', '=?', {rng.choice(FIELD_NAMES)})"
+
+
+def random_domain(rng):
+    """
+    :param random.Random rng:
+    :rtype: str
+    """
+    leaves = [random_leaf(rng) for _ in range(rng.choice([1, 1, 1, 2, 2, 3]))]
+    operators = []
+    if len(leaves) > 1 and rng.random() < 0.5:
+        operators = ["'|'"] * (len(leaves) - 1)
+    return f"[{', '.join(operators + leaves)}]"
+
+
+def random_attrs(rng, field=True):
+    """
+    :param random.Random rng:
+    :param bool field: whether the attrs is on a field tag, the only ones with all the attributes
+    :returns: the attrs value, with single quotes as in most views, and its number of attributes
+    :rtype: (str, int)
+    """
+    attributes = ['invisible', 'readonly', 'required', 'column_invisible'] if field else ['invisible']
+    chosen = rng.sample(attributes, rng.randint(1, min(2, len(attributes))))
+    values = [f"'{attribute}': {rng.choice(['True', '0']) if rng.random() < 0.1 else random_domain(rng)}" for attribute in chosen]
+    return '{' + ', '.join(values) + '}', len(chosen)
+
+
+def xml_attribute(value):
+    """
+    :param str value:
+    :returns: the value escaped for a double quoted XML attribute
+    :rtype: str
+    """
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def xml_text(value):
+    return value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def generate_form_view(rng, module, index, depth, stats):
+    """
+    :returns: lines of a form view record with attrs and states attributes nested in groups up to the given depth
+    :rtype: list[str]
+    """
+    lines = [
+        f'    <record id="view_{module}_{index}_form" model="ir.ui.view">',
+        f'        <field name="name">{module}.model{index}.form</field>',
+        f'        <field name="model">{module}.model{index}</field>',
+        '        <field name="arch" type="xml">',
+        '            <form>',
+        '                <header>',
+    ]
+    for _ in range(rng.randint(1, 3)):
+        lines.append(f'                    <button name="action_{rng.choice(WORDS)}" type="object" string="Do" '
+                     f'states="{",".join(rng.sample(STATES, 2))}"/>')
+        stats['states'] += 1
+    lines += ['                </header>', '                <sheet>']
+    indent = ' ' * 20
+    for level in range(depth):
+        group_attrs = ''
+        if rng.random() < 0.3:
+            attrs, count = random_attrs(rng, field=False)
+            group_attrs = f' attrs="{xml_attribute(attrs)}"'
+            stats['attrs'] += 1
+            stats['attrs_attributes'] += count
+        lines.append(f'{indent}<group name="group_{level}"{group_attrs}>')
+        indent += '    '
+        for _ in range(rng.randint(2, 5)):
+            field_attributes = f' name="{rng.choice(FIELD_NAMES)}"'
+            kind = rng.random()
+            if kind < 0.5:
+                attrs, count = random_attrs(rng)
+                field_attributes += f' attrs="{xml_attribute(attrs)}"'
+                stats['attrs'] += 1
+                stats['attrs_attributes'] += count
+            if 0.4 < kind < 0.6:
+                field_attributes += f' states="{",".join(rng.sample(STATES, 2))}"'
+                stats['states'] += 1
+            if kind > 0.9:
+                field_attributes += ' invisible="1"'
+            lines.append(f'{indent}<field{field_attributes}/>')
+    for level in range(depth):
+        indent = indent[:-4]
+        lines.append(f'{indent}</group>')
+    lines += ['                </sheet>', '            </form>', '        </field>', '    </record>']
+    return lines
+
+
+def generate_tree_view(rng, module, index, stats):
+    """
+    :returns: lines of a tree view record and of its window action
+    :rtype: list[str]
+    """
+    lines = [
+        f'    <record id="view_{module}_{index}_tree" model="ir.ui.view">',
+        f'        <field name="name">{module}.model{index}.tree</field>',
+        f'        <field name="model">{module}.model{index}</field>',
+        '        <field name="arch" type="xml">',
+        '            <tree>',
+    ]
+    for _ in range(rng.randint(3, 8)):
+        field_attributes = f' name="{rng.choice(FIELD_NAMES)}"'
+        if rng.random() < 0.4:
+            attrs, count = random_attrs(rng)
+            field_attributes += f' attrs="{xml_attribute(attrs)}"'
+            stats['attrs'] += 1
+            stats['attrs_attributes'] += count
+        lines.append(f'                <field{field_attributes}/>')
+    lines += [
+        '            </tree>', '        </field>', '    </record>',
+        f'    <record id="action_{module}_{index}" model="ir.actions.act_window">',
+        f'        <field name="name">Model {index}</field>',
+        f'        <field name="res_model">{module}.model{index}</field>',
+        '        <field name="view_mode">tree,form</field>',
+        '    </record>',
+    ]
+    return lines
+
+
+def generate_inherited_view(rng, module, parent_module, index, stats):
+    """
+    :returns: lines of a view record overriding attrs and states of fields of a parent view with xpath attribute tags
+    :rtype: list[str]
+    """
+    lines = [
+        f'    <record id="view_{module}_{index}_inherit" model="ir.ui.view">',
+        f'        <field name="name">{module}.inherit{index}</field>',
+        f'        <field name="model">{parent_module}.model0</field>',
+        f'        <field name="inherit_id" ref="{parent_module}.view_{parent_module}_0_form"/>',
+        '        <field name="arch" type="xml">',
+    ]
+    for _ in range(rng.randint(1, 6)):
+        field = rng.choice(FIELD_NAMES)
+        if rng.random() < 0.5:
+            lines.append(f'            <xpath expr="//field[@name=\'{field}\']" position="attributes">')
+            closing_tag = '            </xpath>'
+        else:
+            lines.append(f'            <field name="{field}" position="attributes">')
+            closing_tag = '            </field>'
+        kind = rng.random()
+        if kind < 0.7:
+            attrs, count = random_attrs(rng)
+            lines.append(f'                <attribute name="attrs">{xml_text(attrs)}</attribute>')
+            stats['attribute_attrs'] += 1
+            stats['attrs_attributes'] += count
+        if kind > 0.5:
+            lines.append(f'                <attribute name="states">{",".join(rng.sample(STATES, 2))}</attribute>')
+            stats['attribute_states'] += 1
+        lines.append(closing_tag)
+    lines += ['        </field>', '    </record>']
+    return lines
+
+
+def generate_corpus(root, modules=10, views_per_module=4, depth=3, crlf_ratio=0.1, seed=0):
+    """
+    Generates a reproducible tree of Odoo addons with views to convert, python and javascript files, and manifests
+
+    :param str root: directory to generate the addons into, created if needed
+    :param int modules: number of addons
+    :param int views_per_module: number of view files per addon
+    :param int depth: nesting depth of the groups in the form views
+    :param float crlf_ratio: fraction of the view files with Windows line endings
+    :param int seed: seed of the random generator, the same arguments always give the same tree
+    :returns: number of files and of tags of each kind that were generated
+    :rtype: dict[str, int]
+    """
+    rng = random.Random(seed)
+    stats = {'files': 0, 'view_files': 0, 'manifests': 0, 'attrs': 0, 'states': 0, 'attribute_attrs': 0,
+             'attribute_states': 0, 'attrs_attributes': 0}
+    os.makedirs(root, exist_ok=True)
+    for module_index in range(modules):
+        module = f"addon_{module_index}"
+        module_dir = os.path.join(root, module)
+        os.makedirs(os.path.join(module_dir, 'views'), exist_ok=True)
+        os.makedirs(os.path.join(module_dir, 'models'), exist_ok=True)
+        os.makedirs(os.path.join(module_dir, 'static', 'src', 'js'), exist_ok=True)
+        depends = ['base'] + [f"addon_{i}" for i in rng.sample(range(module_index), min(module_index, rng.randint(0, 2)))]
+        view_files = []
+        for view_index in range(views_per_module):
+            lines = ['<?xml version="1.0" encoding="utf-8"?>', '<odoo>']
+            lines += generate_form_view(rng, module, view_index, depth, stats)
+            lines += generate_tree_view(rng, module, view_index, stats)
+            if len(depends) > 1 and rng.random() < 0.7:
+                lines += generate_inherited_view(rng, module, rng.choice(depends[1:]), view_index, stats)
+            lines += ['</odoo>', '']
+            line_separator = '\r\n' if rng.random() < crlf_ratio else '\n'
+            view_file = f"views/{module}_views_{view_index}.xml"
+            with open(os.path.join(module_dir, view_file), 'w', encoding='utf-8', newline='') as f:
+                f.write(line_separator.join(lines))
+            view_files.append(view_file)
+            stats['view_files'] += 1
+        with open(os.path.join(module_dir, '__manifest__.py'), 'w', encoding='utf-8') as f:
+            f.write(repr({
+                'name': f"Addon {module_index}",
+                'version': '16.0.1.0.0',
+                'depends': depends,
+                'data': view_files,
+                'license': 'LGPL-3',
+            }) + '\n')
+        stats['manifests'] += 1
+        with open(os.path.join(module_dir, '__init__.py'), 'w', encoding='utf-8') as f:
+            f.write('from . import models\n')
+        with open(os.path.join(module_dir, 'models', '__init__.py'), 'w', encoding='utf-8') as f:
+            f.write(f"from . import {module}\n")
+        with open(os.path.join(module_dir, 'models', f"{module}.py"), 'w', encoding='utf-8') as f:
+            f.write(
+                "from odoo import fields, models\n\n\n"
+                f"class Model{module_index}(models.Model):\n"
+                f"    _name = '{module}.model0'\n\n"
+                "    name = fields.Char()\n\n"
+                "    def action_open(self):\n"
+                "        return {'type': 'ir.actions.act_window', 'view_mode': 'tree,form', 'res_model': self._name}\n"
+            )
+        with open(os.path.join(module_dir, 'static', 'src', 'js', f"{module}.js"), 'w', encoding='utf-8') as f:
+            f.write(f"/** @odoo-module **/\nexport const viewType = 'tree';\n")
+        stats['files'] += 5 + views_per_module
+    return stats
+
+
+def run_pass(corpus, pass_name, jobs):
+    """
+    Runs one pass of the converter on a copy of the corpus, in its own process
+
+    :param str corpus: corpus generated by generate_corpus()
+    :param str pass_name: one of PASSES
+    :param int jobs: --jobs argument of the converter
+    :returns: wall time in seconds, peak RSS of the converter (and its worker processes) in bytes or None if unknown
+    :rtype: (float, int|None)
+    """
+    with tempfile.TemporaryDirectory() as temporary_directory:
+        work_dir = os.path.join(temporary_directory, 'corpus')
+        shutil.copytree(corpus, work_dir)
+        command = [sys.executable, SCRIPT, work_dir, '--yes', '--no-cache', '--passes', pass_name, '--jobs', str(jobs)]
+        start = time.perf_counter()
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        peak_rss = None
+        if hasattr(os, 'wait4'):
+            _, status, rusage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            peak_rss = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+            stderr = process.stderr.read()
+            process.stderr.close()
+        else:
+            _, stderr = process.communicate()
+        wall_time = time.perf_counter() - start
+        if process.returncode:
+            raise RuntimeError(f"{' '.join(command)} failed with exit code {process.returncode}: {stderr.decode(errors='replace')}")
+        return wall_time, peak_rss
+
+
+def run_benchmark(scales, views_per_module=4, jobs=1, repeat=1, seed=0):
+    """
+    :param list[int] scales: numbers of modules of the generated corpora
+    :param int views_per_module:
+    :param int jobs: --jobs argument of the converter
+    :param int repeat: number of runs of each pass, the fastest one is kept
+    :param int seed:
+    :returns: results for each scale and pass
+    :rtype: dict
+    """
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'jobs': jobs,
+        'scales': {},
+    }
+    for modules in scales:
+        with tempfile.TemporaryDirectory() as corpus:
+            stats = generate_corpus(corpus, modules=modules, views_per_module=views_per_module, seed=seed)
+            tags = stats['attrs'] + stats['states'] + stats['attribute_attrs'] + stats['attribute_states']
+            # Units processed by each pass, for the throughput
+            pass_units = {
+                'attrs': (stats['view_files'], tags),
+                'tree': (stats['files'] - stats['manifests'], None),
+                'manifest': (stats['manifests'], None),
+            }
+            scale_results = {'corpus': stats, 'passes': {}}
+            for pass_name in PASSES:
+                wall_time, peak_rss = min(run_pass(corpus, pass_name, jobs) for _ in range(repeat))
+                files, pass_tags = pass_units[pass_name]
+                scale_results['passes'][pass_name] = {
+                    'wall_time': round(wall_time, 4),
+                    'files_per_second': round(files / wall_time, 1),
+                    'tags_per_second': round(pass_tags / wall_time, 1) if pass_tags is not None else None,
+                    'peak_rss_mb': round(peak_rss / 2 ** 20, 1) if peak_rss is not None else None,
+                }
+            results['scales'][str(modules)] = scale_results
+    return results
+
+
+def print_results(results, baseline=None):
+    """
+    :param dict results: result of run_benchmark()
+    :param dict baseline: previous result of run_benchmark() to compare with
+    """
+    print(f"{'modules':>8} {'pass':>9} {'files':>7} {'tags':>7} {'time (s)':>9} {'files/s':>9} {'tags/s':>9} {'RSS (MB)':>9}  vs baseline")
+    for modules, scale_results in results['scales'].items():
+        corpus = scale_results['corpus']
+        for pass_name, pass_results in scale_results['passes'].items():
+            files = {'attrs': corpus['view_files'], 'tree': corpus['files'] - corpus['manifests'], 'manifest': corpus['manifests']}[pass_name]
+            tags = corpus['attrs'] + corpus['states'] + corpus['attribute_attrs'] + corpus['attribute_states'] if pass_name == 'attrs' else '-'
+            comparison = ''
+            baseline_results = ((baseline or {}).get('scales', {}).get(modules) or {}).get('passes', {}).get(pass_name)
+            if baseline_results:
+                speedup = baseline_results['wall_time'] / pass_results['wall_time']
+                comparison = f"{speedup:.2f}x speed"
+                if baseline_results.get('peak_rss_mb') and pass_results['peak_rss_mb']:
+                    comparison += f", {pass_results['peak_rss_mb'] / baseline_results['peak_rss_mb']:.2f}x RSS"
+            print(f"{modules:>8} {pass_name:>9} {files:>7} {tags:>7} {pass_results['wall_time']:>9.3f} "
+                  f"{pass_results['files_per_second']:>9.1f} {pass_results['tags_per_second'] or '-':>9} "
+                  f"{pass_results['peak_rss_mb'] or '-':>9}  {comparison}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark replace_attrs.py on synthetic Odoo addons")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    generate_parser = subparsers.add_parser('generate', help="Generate a synthetic addons tree")
+    generate_parser.add_argument('output', help="Directory to generate the addons into")
+    generate_parser.add_argument('--modules', type=int, default=10)
+    run_parser = subparsers.add_parser('run', help="Run every pass of the converter on generated corpora")
+    run_parser.add_argument('--scales', default='5,20,80',
+                            help="Comma separated numbers of modules of the corpora (default: 5,20,80)")
+    run_parser.add_argument('-j', '--jobs', type=int, default=1, help="--jobs argument of the converter")
+    run_parser.add_argument('--repeat', type=int, default=1, help="Runs of each pass, the fastest one is kept")
+    run_parser.add_argument('--output', help="Write the results to this JSON file")
+    run_parser.add_argument('--baseline', help="Compare the results with this JSON file written by --save-baseline")
+    run_parser.add_argument('--save-baseline', help="Write the results to this JSON file to compare future runs with")
+    for subparser in (generate_parser, run_parser):
+        subparser.add_argument('--views-per-module', type=int, default=4)
+        subparser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        stats = generate_corpus(args.output, modules=args.modules, views_per_module=args.views_per_module, seed=args.seed)
+        print(json.dumps(stats, indent=4))
+        return 0
+
+    scales = [int(scale) for scale in args.scales.split(',')]
+    results = run_benchmark(scales, views_per_module=args.views_per_module, jobs=args.jobs, repeat=args.repeat, seed=args.seed)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=4)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Restores the latest backup of the Odoo database into the PostgreSQL server of a Docker container (or into a local
+PostgreSQL server with --local), creating its user and database first.
+
+    python3 restore_to_docker.py --jobs 8
+    python3 restore_to_docker.py --backup path/to/Backup.dump --jobs 8 --report restore.json
+    python3 restore_to_docker.py --backup path/to/Backup.dump --local --host localhost --database contabilidad_test
+
+The format of the backup is detected from its contents: custom (pg_dump -Fc, as made by upgrade_postgresql.sh), tar,
+directory or plain SQL, any of them but the directory possibly gzipped. Plain SQL is streamed into psql, and archives
+are restored by pg_restore one section at a time (pre-data, data, then the indexes and constraints of post-data), with
+--jobs parallel jobs for the data and post-data sections of custom and directory archives.
+"""
+import argparse
+import getpass
+import gzip
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+ODOO_DB_NAME = 'contabilidad'
+ODOO_DB_USER = 'odoo-v14'
+BACKUP_DIR = '/home/ubuntu/backups/'
+DOCKER_CONTAINER_NAME = 'postgres_odoo_17'
+DOCKER_SUPER_USER = 'postgres'
+# Environment variable the password of the Odoo user is read from, when not given with --password
+PASSWORD_ENVIRONMENT_VARIABLE = 'ODOO_DB_PASSWORD'
+# Directory of the container archives are copied into when pg_restore needs to seek them
+CONTAINER_BACKUP_DIR = '/tmp'
+BACKUP_SUFFIXES = ('.dump', '.backup', '.sql', '.tar', '.gz')
+SECTIONS = ['pre-data', 'data', 'post-data']
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Where the PostgreSQL client programs run: in the container, as its super user, or on this machine, connecting to
+# the given host and port as the super user
+Target = namedtuple('Target', ['container', 'superuser', 'local', 'host', 'port'])
+
+
+class RestoreError(Exception):
+    """
+    Step of the restoration that failed, with the reason
+    """
+
+
+def quote_identifier(name):
+    """
+    :param str name:
+    :returns: the name quoted as an SQL identifier, e.g. "odoo-v14"
+    :rtype: str
+    """
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value):
+    """
+    :param str value:
+    :returns: the value quoted as an SQL string literal
+    :rtype: str
+    """
+    return "'" + value.replace("'", "''") + "'"
+
+
+def find_latest_backup(backup_dir):
+    """
+    :param str backup_dir:
+    :returns: the most recently modified backup of the directory: dump, SQL or tar file, possibly gzipped, or
+        directory archive
+    :rtype: str
+    :raises RestoreError: if there is none
+    """
+    backups = []
+    try:
+        with os.scandir(backup_dir) as entries:
+            for entry in entries:
+                if (entry.is_file() and entry.name.endswith(BACKUP_SUFFIXES)) or \
+                        (entry.is_dir() and os.path.isfile(os.path.join(entry.path, 'toc.dat'))):
+                    backups.append((entry.stat().st_mtime, entry.path))
+    except OSError as e:
+        raise RestoreError(f"Could not list the backups of {backup_dir}: {e}")
+    if not backups:
+        raise RestoreError(f"No backup found in {backup_dir}")
+    return max(backups)[1]
+
+
+def detect_backup_format(path):
+    """
+    :param str path: backup file or directory
+    :returns: format of the backup (custom, tar, directory or plain), and whether it's gzipped
+    :rtype: (str, bool)
+    :raises RestoreError: if the backup can't be read
+    """
+    if os.path.isdir(path):
+        if not os.path.isfile(os.path.join(path, 'toc.dat')):
+            raise RestoreError(f"{path} is a directory without toc.dat, not a directory archive of pg_dump")
+        return 'directory', False
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(512)
+        compressed = header[:2] == b'\x1f\x8b'
+        if compressed:
+            with gzip.open(path, 'rb') as f:
+                header = f.read(512)
+    except (OSError, EOFError) as e:
+        raise RestoreError(f"Could not read the backup {path}: {e}")
+    if header.startswith(b'PGDMP'):
+        return 'custom', compressed
+    if header[257:262] == b'ustar':
+        return 'tar', compressed
+    return 'plain', compressed
+
+
+def get_command(target, program, arguments, stdin=False):
+    """
+    :param Target target:
+    :param str program: PostgreSQL client program, e.g. psql
+    :param list[str] arguments:
+    :param bool stdin: whether the input of the command is piped into it
+    :returns: the command running the program on the target
+    :rtype: list[str]
+    """
+    if target.local:
+        connection = ['-U', target.superuser]
+        if target.host:
+            connection += ['-h', target.host]
+        if target.port:
+            connection += ['-p', str(target.port)]
+        return [program] + connection + arguments
+    return ['docker', 'exec'] + (['-i'] if stdin else []) + ['-u', target.superuser, target.container, program] + arguments
+
+
+def run_command(command, dry_run=False, input_data=None, input_path=None, decompress=False, capture=False, input_text=None):
+    """
+    Runs a command, streaming the given file into it through a pipe, by blocks, instead of copying it anywhere
+
+    :param list[str] command:
+    :param bool dry_run: only print the command
+    :param bytes input_data: input of the command, e.g. SQL containing a password, kept out of its arguments
+    :param str input_path: file streamed into the command
+    :param bool decompress: whether the file is gzipped, to stream its decompressed contents
+    :param bool capture: whether to return the output of the command instead of letting it through
+    :param str input_text: input printed with the command, e.g. the SQL of input_data with its password masked
+    :returns: the output of the command if captured
+    :rtype: None|str
+    :raises RestoreError: if the command fails
+    """
+    print(f"$ {shlex.join(command)}" + (f" < {input_path}" if input_path else ''))
+    if input_text:
+        print(f"    {input_text};")
+    if dry_run:
+        return '' if capture else None
+    try:
+        if input_path is None:
+            process = subprocess.run(command, input=input_data, stdout=subprocess.PIPE if capture else None)
+            returncode, output = process.returncode, process.stdout
+        else:
+            process = subprocess.Popen(command, stdin=subprocess.PIPE)
+            try:
+                with (gzip.open if decompress else open)(input_path, 'rb') as f:
+                    shutil.copyfileobj(f, process.stdin, COPY_BUFFER_SIZE)
+            except BrokenPipeError:
+                # The command exited before reading everything, its exit code tells why
+                pass
+            except (OSError, EOFError) as e:
+                # The backup can't be read (or is truncated), the command mustn't restore part of it
+                process.kill()
+                raise RestoreError(f"Could not stream {input_path} into {command[0]}: {e}")
+            except BaseException:
+                process.kill()
+                raise
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+                # Never left running nor as a zombie, whatever happened
+                returncode, output = process.wait(), None
+    except OSError as e:
+        raise RestoreError(f"Could not run {command[0]}: {e}")
+    if returncode:
+        raise RestoreError(f"{shlex.join(command[:6])}{' ...' if len(command) > 6 else ''} failed with exit code {returncode}")
+    return output.decode('utf-8') if capture else None
+
+
+@contextmanager
+def timed_phase(timings, name):
+    """
+    Measures the wall time of a phase of the restoration, printed at the end and written to the --report file
+
+    :param dict[str, float] timings:
+    :param str name:
+    """
+    print(f"\n--- {name} ---")
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0) + time.perf_counter() - start
+
+
+def query(target, sql, database='postgres', dry_run=False, secret=None):
+    """
+    :param Target target:
+    :param str sql: query, given to psql on its input
+    :param str database:
+    :param bool dry_run:
+    :param str secret: value of the query masked when it's printed, e.g. a password
+    :returns: the unaligned output of the query
+    :rtype: str
+    """
+    command = get_command(target, 'psql', ['-X', '-q', '-t', '-A', '-v', 'ON_ERROR_STOP=1', '-d', database], stdin=True)
+    printed_sql = sql.replace(quote_literal(secret), "'********'") if secret else sql
+    return run_command(command, dry_run, input_data=sql.encode('utf-8'), capture=True, input_text=printed_sql).strip()
+
+
+def create_user_and_database(target, user, password, database, drop_existing=False, dry_run=False):
+    """
+    Creates the Odoo user, or updates its password if it exists, and the database it owns
+
+    :param Target target:
+    :param str user:
+    :param str password:
+    :param str database:
+    :param bool drop_existing: whether to drop the database first if it exists, instead of failing
+    :param bool dry_run:
+    :raises RestoreError: if the database exists and isn't dropped
+    """
+    role_exists = query(target, f"SELECT 1 FROM pg_roles WHERE rolname = {quote_literal(user)}", dry_run=dry_run)
+    # The password is given on the input of psql, so that it doesn't show in the list of processes
+    action = 'ALTER' if role_exists else 'CREATE'
+    query(target, f"{action} ROLE {quote_identifier(user)} LOGIN PASSWORD {quote_literal(password)}", dry_run=dry_run,
+          secret=password)
+    if query(target, f"SELECT 1 FROM pg_database WHERE datname = {quote_literal(database)}", dry_run=dry_run):
+        if not drop_existing:
+            raise RestoreError(f"The database {database} already exists, use --drop-existing to replace it")
+        query(target, f"DROP DATABASE {quote_identifier(database)}", dry_run=dry_run)
+    query(target, f"CREATE DATABASE {quote_identifier(database)} OWNER {quote_identifier(user)}", dry_run=dry_run)
+
+
+def restore_backup(target, backup, backup_format, compressed, database, timings, jobs=1, on_error=None, dry_run=False):
+    """
+    Restores the backup into the database: plain SQL is streamed into psql, archives are restored one section at a time
+    by pg_restore, streamed into it unless it has to seek them to restore them in parallel
+
+    :param Target target:
+    :param str backup: backup file or directory
+    :param str backup_format: see detect_backup_format()
+    :param bool compressed: see detect_backup_format()
+    :param str database:
+    :param dict[str, float] timings: the wall time of each phase is added to it
+    :param int jobs: number of parallel jobs of pg_restore
+    :param str on_error: 'stop' or 'continue' after an SQL error, by default 'continue' for plain SQL (like psql -f,
+        that still succeeds) and 'stop' for archives
+    :param bool dry_run:
+    """
+    if on_error is None:
+        on_error = 'continue' if backup_format == 'plain' else 'stop'
+    if backup_format == 'plain':
+        arguments = ['-X', '-q', '-d', database] + (['-v', 'ON_ERROR_STOP=1'] if on_error == 'stop' else [])
+        with timed_phase(timings, 'restore'):
+            run_command(get_command(target, 'psql', arguments, stdin=True), dry_run, input_path=backup, decompress=compressed)
+        return
+
+    # pg_restore can only restore a directory archive, or a custom archive in parallel, from a file it can seek
+    seekable = backup_format == 'directory' or (jobs > 1 and backup_format == 'custom' and not compressed)
+    if jobs > 1 and not seekable:
+        print(f"Warning: a {'gzipped ' if compressed else ''}{backup_format} archive can't be restored in parallel, "
+              f"restoring it with a single job{' (decompress it to restore it in parallel)' if compressed else ''}")
+    archive = backup
+    if seekable and not target.local:
+        archive = f"{CONTAINER_BACKUP_DIR}/restore_{os.getpid()}_{os.path.basename(os.path.normpath(backup))}"
+        with timed_phase(timings, 'copy'):
+            run_command(['docker', 'cp', backup, f"{target.container}:{archive}"], dry_run)
+    try:
+        for section in SECTIONS:
+            arguments = ['-d', database, f"--section={section}"] + (['--exit-on-error'] if on_error == 'stop' else [])
+            if seekable and section != 'pre-data' and jobs > 1:
+                arguments += ['-j', str(jobs)]
+            with timed_phase(timings, section):
+                if seekable:
+                    run_command(get_command(target, 'pg_restore', arguments + [archive]), dry_run)
+                else:
+                    # Each section streams the archive again, reading it costs little next to restoring it
+                    run_command(get_command(target, 'pg_restore', arguments, stdin=True), dry_run, input_path=backup,
+                                decompress=compressed)
+    finally:
+        if archive != backup:
+            try:
+                run_command(['docker', 'exec', '-u', 'root', target.container, 'rm', '-rf', archive], dry_run)
+            except RestoreError as e:
+                print(f"Warning: Could not remove the copy of the backup from the container: {e}")
+
+
+def print_timings(timings, total):
+    """
+    :param dict[str, float] timings:
+    :param float total:
+    """
+    print('\nPhase timings:')
+    for name, seconds in timings.items():
+        print(f"  {name:<10} {seconds:>10.2f}s")
+    print(f"  {'total':<10} {total:>10.2f}s")
+
+
+def main(argv=None):
+    """
+    :param list[str] argv: arguments, sys.argv[1:] when None
+    :returns: exit code, 1 if the restoration failed
+    :rtype: int
+    """
+    parser = argparse.ArgumentParser(description="Restore the latest backup of the Odoo database into PostgreSQL in Docker")
+    parser.add_argument('--backup', metavar='PATH',
+                        help="Backup to restore (default: the most recent backup of --backup-dir)")
+    parser.add_argument('--backup-dir', default=BACKUP_DIR, metavar='DIR',
+                        help="Directory of the backups (default: %(default)s)")
+    parser.add_argument('--database', default=ODOO_DB_NAME, help="Database to create (default: %(default)s)")
+    parser.add_argument('--user', default=ODOO_DB_USER, help="Owner of the database, created if needed (default: %(default)s)")
+    parser.add_argument('--password',
+                        help=f"Password of the user (default: the {PASSWORD_ENVIRONMENT_VARIABLE} environment variable, "
+                             "or asked), prefer the environment variable as arguments show in the list of processes")
+    parser.add_argument('--container', default=DOCKER_CONTAINER_NAME,
+                        help="Docker container of PostgreSQL (default: %(default)s)")
+    parser.add_argument('--superuser', default=DOCKER_SUPER_USER,
+                        help="PostgreSQL super user restoring the backup (default: %(default)s)")
+    parser.add_argument('--local', action='store_true',
+                        help="Restore into a PostgreSQL server with the client programs of this machine instead of the "
+                             "ones of the container, e.g. to test the restoration (its password is read from PGPASSWORD)")
+    parser.add_argument('--host', help="With --local, host of the server (default: local socket)")
+    parser.add_argument('--port', type=int, help="With --local, port of the server (default: 5432)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="Parallel jobs of pg_restore for the data and post-data sections (default: one per CPU)")
+    parser.add_argument('--drop-existing', action='store_true',
+                        help="Drop the database first if it already exists, instead of failing")
+    parser.add_argument('--on-error', choices=['stop', 'continue'],
+                        help="Stop at the first SQL error, or go on and report the errors (default: continue for plain "
+                             "SQL, like psql -f, stop for archives, whose restoration then still fails at the end)")
+    parser.add_argument('--no-analyze', action='store_true',
+                        help="Don't analyze the restored database, whose queries are slow until it is")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Only print the commands that would be run")
+    parser.add_argument('--report', metavar='PATH',
+                        help="Write the backup, its format and the time spent in each phase to this JSON file")
+    args = parser.parse_args(argv)
+
+    password = args.password or os.environ.get(PASSWORD_ENVIRONMENT_VARIABLE)
+    if password is None:
+        if args.dry_run:
+            password = ''
+        elif sys.stdin.isatty():
+            password = getpass.getpass(f"Password of the PostgreSQL user {args.user}: ")
+        else:
+            print(f"Error: No password given for {args.user}, use --password or {PASSWORD_ENVIRONMENT_VARIABLE}")
+            return 1
+    target = Target(args.container, args.superuser, args.local, args.host, args.port)
+    timings = {}
+    start = time.perf_counter()
+    report = {'backup': args.backup, 'format': None, 'compressed': None, 'jobs': args.jobs, 'database': args.database}
+    try:
+        with timed_phase(timings, 'find'):
+            backup = args.backup or find_latest_backup(args.backup_dir)
+            backup_format, compressed = detect_backup_format(backup)
+        report.update(backup=backup, format=backup_format, compressed=compressed)
+        print(f"Restoring {backup} ({'gzipped ' if compressed else ''}{backup_format} format) into {args.database}")
+        with timed_phase(timings, 'create'):
+            create_user_and_database(target, args.user, password, args.database, args.drop_existing, args.dry_run)
+        restore_backup(target, backup, backup_format, compressed, args.database, timings, jobs=max(1, args.jobs),
+                       on_error=args.on_error, dry_run=args.dry_run)
+        if not args.no_analyze:
+            with timed_phase(timings, 'analyze'):
+                run_command(get_command(target, 'vacuumdb', ['--analyze-only', '-j', str(max(1, args.jobs)), '-d', args.database]),
+                            args.dry_run)
+    except RestoreError as e:
+        print(f"Error: {e}")
+        report['error'] = str(e)
+    total = time.perf_counter() - start
+    print_timings(timings, total)
+    if args.report:
+        report.update(phases={name: round(seconds, 6) for name, seconds in timings.items()}, total=round(total, 6))
+        try:
+            with open(args.report, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=4)
+        except OSError as e:
+            print(f"Warning: Could not write the report {args.report}: {e}")
+    if 'error' in report:
+        return 1
+    print(f"\nRestored {backup} into {args.database}, owned by {args.user}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Tests of the domain cache and of the conversion cache
+"""
+import json
+import os
+
+import pytest
+
+from attrs_converter import cache
+from attrs_converter.cache import DOMAIN_CACHE, ConversionCache, DomainCache, get_file_fingerprint, get_new_attrs
+from attrs_converter.cli import main
+
+VIEW = """<odoo>
+    <record id="view_form" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <form>
+                <field name="name" attrs="{'invisible': [('state', '=', 'draft')]}"/>
+            </form>
+        </field>
+    </record>
+</odoo>
+"""
+
+
+def write_view(path, contents):
+    path.write_text(contents, encoding='utf-8')
+    return str(path)
+
+
+def get_saved_cache(tmp_path, contents='<odoo/>'):
+    file_path = write_view(tmp_path / 'view.xml', contents)
+    conversion_cache = ConversionCache(str(tmp_path / 'cache.json'))
+    conversion_cache.record(file_path, 'converted', get_file_fingerprint(file_path))
+    conversion_cache.save()
+    return file_path, ConversionCache(conversion_cache.path)
+
+
+def test_conversion_cache_hit(tmp_path):
+    file_path, conversion_cache = get_saved_cache(tmp_path)
+    assert conversion_cache.lookup(file_path) == ('converted', None)
+    assert (conversion_cache.hits, conversion_cache.misses) == (1, 0)
+    assert not os.path.exists(f"{conversion_cache.path}.tmp")
+
+
+def test_conversion_cache_hit_when_touched(tmp_path):
+    file_path, conversion_cache = get_saved_cache(tmp_path)
+    stat = os.stat(file_path)
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert conversion_cache.lookup(file_path) == ('converted', None)
+    # The new modification time is recorded so the file isn't hashed again by the next runs
+    assert conversion_cache.entries[conversion_cache.get_key(file_path)]['mtime_ns'] == stat.st_mtime_ns + 10 ** 9
+
+
+def test_conversion_cache_invalidated_when_modified(tmp_path):
+    file_path, conversion_cache = get_saved_cache(tmp_path)
+    stat = os.stat(file_path)
+    # Same size, other contents
+    write_view(tmp_path / 'view.xml', '<data/>')
+    os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert conversion_cache.lookup(file_path) is None
+    write_view(tmp_path / 'view.xml', '<odoo></odoo>')
+    assert conversion_cache.lookup(file_path) is None
+    assert (conversion_cache.hits, conversion_cache.misses) == (0, 2)
+
+
+def test_conversion_cache_invalidated_when_deleted(tmp_path):
+    file_path, conversion_cache = get_saved_cache(tmp_path)
+    os.remove(file_path)
+    assert conversion_cache.lookup(file_path) is None
+
+
+def test_conversion_cache_invalidated_by_another_version(tmp_path, monkeypatch):
+    file_path, conversion_cache = get_saved_cache(tmp_path)
+    monkeypatch.setattr(cache, 'CONVERTER_VERSION', cache.CONVERTER_VERSION + 1)
+    assert ConversionCache(conversion_cache.path).lookup(file_path) is None
+
+
+def test_conversion_cache_keyed_by_relative_path(tmp_path):
+    file_path, conversion_cache = get_saved_cache(tmp_path)
+    with open(conversion_cache.path, encoding='utf-8') as f:
+        assert list(json.load(f)['files']) == ['view.xml']
+
+
+def test_conversion_cache_ignores_invalid_file(tmp_path, capsys):
+    cache_path = tmp_path / 'cache.json'
+    cache_path.write_text('{', encoding='utf-8')
+    assert ConversionCache(str(cache_path)).entries == {}
+    assert 'Ignoring invalid conversion cache' in capsys.readouterr().out
+
+
+@pytest.fixture
+def module(tmp_path):
+    (tmp_path / 'module' / 'views').mkdir(parents=True)
+    write_view(tmp_path / 'module' / 'views' / 'converted.xml', VIEW)
+    write_view(tmp_path / 'module' / 'views' / 'unchanged.xml', '<odoo/>\n')
+    write_view(tmp_path / 'module' / 'views' / 'broken.xml', '<odoo attrs="{}"><record></odoo>\n')
+    return tmp_path / 'module'
+
+
+def run(module, capsys, *args):
+    exit_code = main([str(module), '--yes', *args])
+    return exit_code, capsys.readouterr().out
+
+
+def test_run_with_cache(module, tmp_path, capsys):
+    cache_path = tmp_path / 'cache.json'
+    exit_code, output = run(module, capsys, '--cache', str(cache_path))
+    assert exit_code == 1 and 'unchanged since the previous run' not in output
+    with open(cache_path, encoding='utf-8') as f:
+        entries = json.load(f)['files']
+    assert {key: entry['outcome'] for key, entry in entries.items()} == {
+        'module/views/broken.xml': 'failed', 'module/views/converted.xml': 'converted', 'module/views/unchanged.xml': 'unchanged',
+    }
+    # The converted file is recorded with its written contents
+    assert entries['module/views/converted.xml']['sha1'] == get_file_fingerprint(str(module / 'views' / 'converted.xml'))[2]
+
+    exit_code, cached_output = run(module, capsys, '--cache', str(cache_path))
+    assert 'Skipped 3 files unchanged since the previous run' in cached_output
+    # Cached failures are reported again
+    assert exit_code == 1 and f"Error processing {module / 'views' / 'broken.xml'}" in cached_output
+
+
+def test_run_with_modified_file(module, tmp_path, capsys):
+    cache_path = str(tmp_path / 'cache.json')
+    run(module, capsys, '--cache', cache_path)
+    write_view(module / 'views' / 'unchanged.xml', VIEW)
+    _exit_code, output = run(module, capsys, '--cache', cache_path)
+    assert 'Skipped 2 files unchanged since the previous run' in output
+    assert 'attrs=' not in (module / 'views' / 'unchanged.xml').read_text()
+
+
+def test_run_without_cache(module, tmp_path, capsys):
+    # No cache file by default
+    _exit_code, output = run(module, capsys)
+    assert 'unchanged since the previous run' not in output
+    assert sorted(p.name for p in tmp_path.rglob('*') if p.is_file()) == ['broken.xml', 'converted.xml', 'unchanged.xml']
+    run(module, capsys, '--cache', str(tmp_path / 'cache.json'))
+    _exit_code, output = run(module, capsys, '--cache', str(tmp_path / 'cache.json'), '--no-cache')
+    assert 'unchanged since the previous run' not in output
+
+
+def test_dry_run_cache(module, tmp_path, capsys):
+    cache_path = tmp_path / 'cache.json'
+    run(module, capsys, '--dry-run', '--cache', str(cache_path))
+    assert not cache_path.exists()
+
+
+def test_cache_inside_root_directory(module, capsys):
+    # Named like a view, so it would be processed if it wasn't excluded
+    cache_path = module / 'views' / 'cache.xml'
+    run(module, capsys, '--cache', str(cache_path))
+    with open(cache_path, encoding='utf-8') as f:
+        assert set(json.load(f)['files']) == {'broken.xml', 'converted.xml', 'unchanged.xml'}
+    _exit_code, output = run(module, capsys, '--cache', str(cache_path))
+    # Only mentioned as the conversion cache
+    assert 'Skipped 3 files unchanged since the previous run' in output and output.count('cache.xml') == 1
+
+
+@pytest.fixture
+def domain_cache():
+    DOMAIN_CACHE.entries.clear()
+    DOMAIN_CACHE.pop_updates()
+    yield DOMAIN_CACHE
+    DOMAIN_CACHE.entries.clear()
+    DOMAIN_CACHE.pop_updates()
+
+
+def test_domain_cache_hit():
+    domain_cache = DomainCache()
+    new_attrs = domain_cache.get("{'invisible': [('state', '=', 'draft')]}")
+    assert new_attrs == {'invisible': "state == 'draft'"}
+    # Whitespace doesn't change the key
+    assert domain_cache.get("{ 'invisible' : [ ('state','=','draft') ] }") == new_attrs
+    assert (domain_cache.hits, domain_cache.misses) == (1, 1)
+    # Results are copies of the cached value
+    new_attrs['invisible'] = 'True'
+    assert domain_cache.get("{'invisible': [('state', '=', 'draft')]}") == {'invisible': "state == 'draft'"}
+
+
+def test_domain_cache_eviction():
+    domain_cache = DomainCache(maxsize=2)
+    for value in range(3):
+        domain_cache.get(f"{{'invisible': [('a', '=', {value})]}}")
+    assert list(domain_cache.entries) == ["{'invisible':[('a','=',1)]}", "{'invisible':[('a','=',2)]}"]
+    # The least recently used entry is evicted, not the oldest one
+    domain_cache.get("{'invisible': [('a', '=', 1)]}")
+    domain_cache.get("{'invisible': [('a', '=', 3)]}")
+    assert list(domain_cache.entries) == ["{'invisible':[('a','=',1)]}", "{'invisible':[('a','=',3)]}"]
+    assert (domain_cache.hits, domain_cache.misses) == (1, 4)
+
+
+def test_domain_cache_updates():
+    worker_cache, main_cache = DomainCache(), DomainCache()
+    worker_cache.get("{'invisible': [('a', '=', 1)]}")
+    worker_cache.get("{'invisible': [('a', '=', 1)]}")
+    updates = worker_cache.pop_updates()
+    assert updates == ({"{'invisible':[('a','=',1)]}": {'invisible': 'a == 1'}}, 1, 1)
+    assert worker_cache.pop_updates() == ({}, 0, 0)
+    main_cache.merge_updates(updates)
+    main_cache.merge_updates(updates)
+    assert dict(main_cache.entries) == updates[0]
+    assert (main_cache.hits, main_cache.misses) == (2, 2)
+
+
+def test_domain_cache_load_other_version(tmp_path, monkeypatch):
+    domain_cache = DomainCache()
+    domain_cache.get("{'invisible': [('a', '=', 1)]}")
+    path = str(tmp_path / 'domains.json')
+    domain_cache.save(path)
+    loaded_cache = DomainCache()
+    loaded_cache.load(path)
+    assert loaded_cache.entries == domain_cache.entries
+    monkeypatch.setattr(cache, 'CONVERTER_VERSION', cache.CONVERTER_VERSION + 1)
+    other_cache = DomainCache()
+    other_cache.load(path)
+    assert not other_cache.entries
+
+
+def test_get_new_attrs(domain_cache):
+    assert get_new_attrs("{'readonly': [('a', '!=', False)]}") == {'readonly': 'a'}
+    assert get_new_attrs("{'readonly':[('a','!=',False)]}") == {'readonly': 'a'}
+    assert (domain_cache.hits, domain_cache.misses) == (1, 1)
+
+
+def test_run_with_domain_cache(tmp_path, capsys, domain_cache):
+    views = tmp_path / 'module' / 'views'
+    views.mkdir(parents=True)
+    for i in range(4):
+        write_view(views / f'view_{i}.xml', VIEW.replace("'draft'", f"'state_{i}'"))
+    domain_cache_path = str(tmp_path / 'domains.json')
+    # Converted in the worker processes, and merged back in the main process
+    _exit_code, output = run(tmp_path / 'module', capsys, '--dry-run', '--jobs', '2', '--domain-cache', domain_cache_path)
+    assert 'Converted 4 distinct attrs values, reused 0 conversions (domain cache)' in output
+    # Not saved by dry runs
+    assert not (tmp_path / 'domains.json').exists()
+    _exit_code, output = run(tmp_path / 'module', capsys, '--jobs', '2', '--domain-cache', domain_cache_path)
+    with open(domain_cache_path, encoding='utf-8') as f:
+        assert len(json.load(f)['domains']) == 4
+
+    domain_cache.entries.clear()
+    domain_cache.pop_updates()
+    for i in range(4):
+        write_view(views / f'view_{i}.xml', VIEW.replace("'draft'", f"'state_{i}'"))
+    write_view(views / 'view_4.xml', VIEW)
+    _exit_code, output = run(tmp_path / 'module', capsys, '--domain-cache', domain_cache_path)
+    # Loaded from the domain cache file
+    assert 'Converted 1 distinct attrs values, reused 4 conversions (domain cache)' in output
+    with open(domain_cache_path, encoding='utf-8') as f:
+        assert len(json.load(f)['domains']) == 5
@@ -0,0 +1,137 @@
+"""
+Tests of the census of the attrs/states usage of a repository
+"""
+import csv
+import json
+
+import pytest
+
+from attrs_converter import census, modules, simplify, views
+from attrs_converter.census import CENSUS_COUNTERS, Census, census_attrs, census_file
+from attrs_converter.cli import main
+
+VIEW = """<odoo>
+    <record id="view_form" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <form>
+                <field name="name" attrs="{'invisible': [('state', '=', 'draft')], 'readonly': [('partner_id', '!=', uid)]}"/>
+                <field name="ref" attrs="{'invisible': [('state', '=', 'draft')], 'readonly': [('partner_id', '!=', uid)]}"/>
+                <field name="code" attrs="{'required': [('name', 'ilike', 'ab')], 'column_invisible': True, 'other': [('a', '=', 1)]}"/>
+                <button name="action_done" states="draft,done"/>
+            </form>
+        </field>
+    </record>
+    <record id="view_form_inherit" model="ir.ui.view">
+        <field name="inherit_id" ref="other_module.view_form"/>
+        <field name="arch" type="xml">
+            <field name="name" position="attributes">
+                <attribute name="attrs">{'invisible': [('state', '!=', 'done')]}</attribute>
+                <attribute name="states">done</attribute>
+            </field>
+        </field>
+    </record>
+</odoo>
+"""
+
+
+@pytest.fixture
+def addons(tmp_path, monkeypatch):
+    monkeypatch.setattr(simplify, 'SIMPLIFY_EXPRESSIONS', True)
+    monkeypatch.setattr(views, 'VIEW_INDEX', views.ViewIndex())
+    monkeypatch.setattr(modules, 'MODULE_GRAPH', modules.ModuleGraph())
+    monkeypatch.setattr(census, 'ATTRS_CENSUS_CACHE', {})
+    for module in ('sale', 'stock'):
+        (tmp_path / 'addons' / module / 'views').mkdir(parents=True)
+        (tmp_path / 'addons' / module / '__manifest__.py').write_text(f"{{'name': '{module}'}}\n")
+    (tmp_path / 'addons' / 'sale' / 'views' / 'views.xml').write_text(VIEW)
+    (tmp_path / 'addons' / 'sale' / 'views' / 'nothing.xml').write_text('<odoo/>\n')
+    (tmp_path / 'addons' / 'sale' / 'views' / 'unsupported.xml').write_text(
+        '''<odoo><form><field name="a" attrs="{'readonly': [('partner_id', 'child_of', uid), ('name', 'like', 'a_b')]}"/></form></odoo>\n''')
+    (tmp_path / 'addons' / 'stock' / 'views' / 'views.xml').write_text('<odoo>\n    <form>\n        <field name="a" states="draft"/>\n    </form>\n</odoo>\n')
+    (tmp_path / 'addons' / 'stock' / 'views' / 'broken.xml').write_text('<odoo attrs="{}"><record></odoo>\n')
+    return tmp_path / 'addons'
+
+
+def test_census_attrs(monkeypatch):
+    monkeypatch.setattr(census, 'ATTRS_CENSUS_CACHE', {})
+    counters, operators, attributes = census_attrs("{'invisible': [('a', 'not like', '%x')], 'readonly': [('b', 'parent_of', 1)], 'help': 'x'}")
+    assert counters == {'domains': 2, 'like_wildcards': 1, 'unsupported_operators': 1}
+    assert operators == {'not like': 1, 'parent_of': 1}
+    assert attributes == {'invisible': 1, 'readonly': 1, 'help': 1}
+    # Counted once per distinct value
+    assert census_attrs("{'invisible': [('a', 'not like', '%x')], 'readonly': [('b', 'parent_of', 1)], 'help': 'x'}")[0] is counters
+    assert census_attrs("{'invisible': [('a', '=',") == ({'invalid_attrs': 1}, {}, {})
+
+
+def test_census_file(addons):
+    file_census = census_file(str(addons / 'sale' / 'views' / 'views.xml'))
+    assert file_census.counters == {
+        'files': 1, 'attrs_tags': 3, 'attrs_overrides': 1, 'states_tags': 1, 'states_overrides': 1, 'domains': 6, 'todos': 2,
+    }
+    assert file_census.operators == {'!=': 3, '=': 2, 'ilike': 1}
+    assert file_census.attributes == {'invisible': 3, 'readonly': 2, 'required': 1, 'column_invisible': 1, 'other': 1}
+    # The parent view of the override isn't in the repository
+    assert file_census.todos == {'attrs_overrides': 1, 'states_tags': 1} and file_census.error is None
+    # Nothing is written
+    assert (addons / 'sale' / 'views' / 'views.xml').read_text() == VIEW
+    assert census_file(str(addons / 'sale' / 'views' / 'nothing.xml')) is None
+    unsupported = census_file(str(addons / 'sale' / 'views' / 'unsupported.xml'))
+    assert +unsupported.counters == {
+        'files': 1, 'attrs_tags': 1, 'domains': 1, 'unsupported_operators': 1, 'like_wildcards': 1, 'failed_files': 1,
+    }
+    assert 'like' in unsupported.error and not unsupported.todos
+    broken = census_file(str(addons / 'stock' / 'views' / 'broken.xml'))
+    assert broken.counters == {'failed_files': 1} and broken.error
+
+
+def test_census_aggregation(tmp_path):
+    aggregated = Census()
+    for module, counters in (('sale', {'files': 1, 'attrs_tags': 1}), ('stock', {'files': 2, 'states_tags': 5}), ('sale', {'files': 1})):
+        aggregated.add(census.FileCensus(f'{module}.xml', census.Counter(counters), census.Counter(), census.Counter(), census.Counter(), None), module)
+    assert aggregated.get_totals() == dict.fromkeys(CENSUS_COUNTERS, 0) | {'files': 4, 'attrs_tags': 1, 'states_tags': 5}
+    # The modules with the most converted nodes first
+    assert [module for module, _row in aggregated.get_module_rows()] == ['stock', 'sale']
+    csv_path = tmp_path / 'census.csv'
+    aggregated.write_csv(str(csv_path))
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ['module'] + CENSUS_COUNTERS
+    assert rows[1][:4] == ['stock', '2', '0', '0'] and rows[2][:3] == ['sale', '2', '1']
+
+
+@pytest.mark.parametrize('jobs', ['1', '2'])
+def test_main_census(addons, tmp_path, jobs, capsys):
+    contents = {p: p.read_bytes() for p in addons.rglob('*') if p.is_file()}
+    json_path, csv_path = tmp_path / 'census.json', tmp_path / 'census.csv'
+    assert main([str(addons), '--census', '--jobs', jobs, '--census-file', str(json_path), '--census-file', str(csv_path)]) == 0
+    assert {p: p.read_bytes() for p in addons.rglob('*') if p.is_file()} == contents
+    report = json.loads(json_path.read_text())
+    assert report['scanned_files'] == 5
+    assert report['totals'] == {
+        'files': 3, 'attrs_tags': 4, 'attrs_overrides': 1, 'states_tags': 2, 'states_overrides': 1, 'domains': 7,
+        'invalid_attrs': 0, 'unsupported_operators': 1, 'like_wildcards': 1, 'todos': 2, 'failed_files': 2,
+    }
+    # With the view index, the states of the button don't need a TODO comment
+    assert report['todos'] == {'states_tags': 1, 'attrs_overrides': 1}
+    assert report['operators'] == {'!=': 3, '=': 2, 'ilike': 1, 'child_of': 1, 'like': 1}
+    # The modules with the most converted nodes first
+    assert list(report['modules']) == ['sale', 'stock']
+    assert report['modules']['stock'] == dict.fromkeys(CENSUS_COUNTERS, 0) | {'files': 1, 'states_tags': 1, 'todos': 1, 'failed_files': 1}
+    assert [failed['file'] for failed in report['failed_files']] == [
+        str(addons / 'sale' / 'views' / 'unsupported.xml'), str(addons / 'stock' / 'views' / 'broken.xml'),
+    ]
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        assert [row[0] for row in csv.reader(f)] == ['module', 'sale', 'stock']
+    output = capsys.readouterr().out
+    assert 'child_of' in output and '(left out by the conversion)' in output
+
+
+@pytest.mark.parametrize('no_simplify', [False, True])
+def test_main_census_only_printed(addons, tmp_path, monkeypatch, capsys, no_simplify):
+    monkeypatch.chdir(tmp_path)
+    files = sorted(tmp_path.rglob('*'))
+    assert main([str(addons), '--census'] + (['--no-simplify'] if no_simplify else [])) == 0
+    # Without any file written, nor changing the simplification of the next runs
+    assert sorted(tmp_path.rglob('*')) == files
+    assert 'Census written' not in capsys.readouterr().out
+    assert simplify.SIMPLIFY_EXPRESSIONS is not no_simplify
@@ -0,0 +1,142 @@
+import json
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+from lxml import etree
+
+from attrs_converter.cli import main
+from replace_attrs import convert_document, convert_file
+
+VIEW = """<odoo>
+    <record id="view_form" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <tree>
+                <field name="name" attrs="{'invisible': [('state', '=', parent.state)]}"/>
+                <button name="action_done" states="draft"/>
+            </tree>
+        </field>
+    </record>
+</odoo>
+"""
+
+
+@pytest.fixture
+def module(tmp_path, monkeypatch):
+    """
+    A module, with the prompts failing as nothing should be asked
+    """
+    def no_input(prompt):
+        raise AssertionError(f"Unexpected prompt {prompt!r}")
+    monkeypatch.setattr('builtins.input', no_input)
+    (tmp_path / 'module' / 'views').mkdir(parents=True)
+    (tmp_path / 'module' / 'views' / 'views.xml').write_text(VIEW)
+    (tmp_path / 'module' / '__manifest__.py').write_text("{'name': 'Module', 'version': '16.0.1.0.0'}\n")
+    return tmp_path / 'module'
+
+
+def get_contents(module):
+    return {p.name: p.read_text() for p in sorted(module.rglob('*')) if p.is_file()}
+
+
+def test_convert_document():
+    doc = etree.fromstring(VIEW)
+    tags_found = []
+    converted = convert_document(doc, tags_found)
+    assert [node.tag for node in converted] == ['field', 'button']
+    assert len(tags_found) == 2 and 'attrs=' in tags_found[0]
+    field, button = doc.xpath('//field[@name="name"] | //button')
+    # Dynamic right operands are kept as is
+    assert dict(field.attrib) == {'name': 'name', 'invisible': 'state == parent.state'}
+    assert dict(button.attrib) == {'name': 'action_done', 'invisible': "state not in ['draft']"}
+    assert convert_document(doc) == []
+
+
+def test_convert_file(module):
+    view_file = str(module / 'views' / 'views.xml')
+    assert convert_file(view_file, dry_run=True)
+    assert Path(view_file).read_text() == VIEW
+    assert convert_file(view_file)
+    assert 'invisible="state == parent.state"' in Path(view_file).read_text()
+    assert not convert_file(view_file)
+
+
+def test_dry_run(module, capsys):
+    contents = get_contents(module)
+    assert main([str(module), '--dry-run', '--passes', 'attrs,tree,manifest']) == 0
+    assert get_contents(module) == contents
+    output = capsys.readouterr().out
+    assert str(module / 'views' / 'views.xml') in output
+    assert str(module / '__manifest__.py') in output
+
+
+def test_yes(module):
+    assert main([str(module), '--yes']) == 0
+    contents = get_contents(module)
+    # Only the attrs pass by default
+    assert 'attrs=' not in contents['views.xml'] and '<tree>' in contents['views.xml']
+    assert contents['__manifest__.py'] == "{'name': 'Module', 'version': '16.0.1.0.0'}\n"
+    assert main([str(module), '--yes', '--passes', 'tree,manifest']) == 0
+    contents = get_contents(module)
+    assert '<tree>' not in contents['views.xml']
+    assert "'version': '18.0.1.0.0'" in contents['__manifest__.py']
+
+
+def test_failed_file(module):
+    (module / 'views' / 'broken.xml').write_text('<odoo attrs="{}"><record></odoo>\n')
+    assert main([str(module), '--yes']) == 1
+
+
+def test_invalid_passes(module, capsys):
+    with pytest.raises(SystemExit) as exception:
+        main([str(module), '--yes', '--passes', 'attrs,views'])
+    assert exception.value.code == 2
+    assert "unknown passes ['views']" in capsys.readouterr().err
+
+
+def test_output_summary(module, capsys):
+    assert main([str(module), '--yes', '--passes', 'attrs,tree', '--output', 'summary']) == 0
+    output = capsys.readouterr().out
+    # The files are converted, without printing their tags
+    assert 'attrs=' not in get_contents(module)['views.xml']
+    assert 'Current tags found' not in output and 'attrs=' not in output
+    assert str(module / 'views' / 'views.xml') in output
+
+
+def test_output_diff(module, tmp_path):
+    (module / 'views' / 'windows.xml').write_bytes(VIEW.replace('\n', '\r\n').encode())
+    (module / 'views' / 'nothing.xml').write_text('<odoo/>\n')
+    converted = tmp_path / 'converted'
+    shutil.copytree(module, converted)
+    assert main([str(converted), '--yes', '--passes', 'attrs,tree,manifest', '--no-cache']) == 0
+    patch_file = tmp_path / 'changes.patch'
+    contents = get_contents(module)
+    assert main([str(module), '--dry-run', '--passes', 'attrs,tree,manifest', '--no-cache',
+                 '--output', 'diff', '--output-file', str(patch_file)]) == 0
+    assert get_contents(module) == contents
+    patch = patch_file.read_text()
+    assert 'a/views/views.xml' in patch and 'a/__manifest__.py' in patch and 'nothing.xml' not in patch
+    # Applying the patch gives the same files as the conversion, line endings included
+    subprocess.run(['patch', '-p1', '-s', '-i', str(patch_file)], cwd=module, check=True)
+    assert {p.name: p.read_bytes() for p in module.rglob('*') if p.is_file()} == \
+        {p.name: p.read_bytes() for p in converted.rglob('*') if p.is_file()}
+
+
+def test_output_jsonl(module, tmp_path):
+    (module / 'views' / 'broken.xml').write_text('<odoo attrs="{}"><record></odoo>\n')
+    records_file = tmp_path / 'records.jsonl'
+    args = [str(module), '--yes', '--passes', 'attrs,manifest', '--output', 'jsonl', '--output-file', str(records_file),
+            '--cache', str(tmp_path / 'cache.json')]
+    assert main(args) == 1
+    records = {Path(record['file']).name: record for record in map(json.loads, records_file.read_text().splitlines())}
+    assert records['views.xml'] == {
+        'file': str(module / 'views' / 'views.xml'), 'attrs': 'converted', 'error': None, 'passes': ['attrs'],
+        'todos': 0, 'messages': [], 'written': True,
+    }
+    assert records['broken.xml']['attrs'] == 'failed' and records['broken.xml']['error']
+    assert records['__manifest__.py']['passes'] == ['manifest'] and records['__manifest__.py']['attrs'] is None
+    # The outcome of the files unchanged since the previous run is cached
+    assert main(args) == 1
+    records = {Path(record['file']).name: record for record in map(json.loads, records_file.read_text().splitlines())}
+    assert records['views.xml']['attrs'] == 'cached' and not records['views.xml']['written']
@@ -0,0 +1,107 @@
+"""
+Tests of the tokenizer and parser of the attrs values
+"""
+import pytest
+
+from attrs_converter.cache import compile_new_attrs
+from attrs_converter.domains import (
+    ContextVariable, DomainLeaf, DomainSyntaxError, FieldReference, XmlIdReference, parse_attrs, tokenize_attrs,
+)
+
+
+def test_tokenize_attrs():
+    assert tokenize_attrs("{'invisible': [('a', '>=', -1.5e3)]}") == \
+        ['{', "'invisible'", ':', '[', '(', "'a'", ',', "'>='", ',', '-1.5e3', ')', ']', '}']
+    assert tokenize_attrs("[('x', 'in', [%(base.main_company)d, parent.id])]") == \
+        ['[', '(', "'x'", ',', "'in'", ',', '[', '%(base.main_company)d', ',', 'parent.id', ']', ')', ']']
+    # Characters that aren't part of any token are kept on their own, to be reported
+    assert tokenize_attrs("{'a': @}") == ['{', "'a'", ':', '@', '}']
+
+
+def test_parse_attrs_constants():
+    assert parse_attrs("{'invisible': 1, 'readonly': True, 'required': '0'}") == \
+        {'invisible': 1, 'readonly': True, 'required': '0'}
+
+
+def test_parse_attrs_values():
+    attrs = parse_attrs(
+        "{'invisible': [('a', '=', -1), '|', ('b', '!=', 2.5), ('c', 'in', [None, False, %(base.user_admin)d])],"
+        " 'readonly': [('parent.state', '=', \"it's\"), ('d', '=', 'a\\'b'), ('e', '=', uid)]}"
+    )
+    assert attrs['invisible'] == [
+        DomainLeaf('a', '=', -1),
+        '|',
+        DomainLeaf('b', '!=', 2.5),
+        DomainLeaf('c', 'in', [None, False, XmlIdReference('base.user_admin')]),
+    ]
+    assert attrs['readonly'] == [
+        DomainLeaf('parent.state', '=', "it's"),
+        DomainLeaf('d', '=', "a'b"),
+        DomainLeaf('e', '=', ContextVariable('uid')),
+    ]
+
+
+def test_parse_attrs_references():
+    attrs = parse_attrs("{'invisible': [('a', '=', company_id), ('b', 'in', context.get('ids', [1, 2]))]}")
+    left, right = attrs['invisible']
+    assert type(left.right) is FieldReference and left.right == FieldReference('company_id')
+    assert type(right.right) is ContextVariable and str(right.right) == "context.get('ids', [1, 2])"
+
+
+def test_parse_attrs_keeps_other_keys():
+    assert parse_attrs("{'invisible': [], 'other': (1,), 'nested': {'a': ()}}") == \
+        {'invisible': [], 'other': (1,), 'nested': {'a': ()}}
+
+
+@pytest.mark.parametrize('attrs, message, position', [
+    ("{'invisible': [('a', '=', 1)]", "Unexpected end", 29),
+    ("{'invisible': [('a' '=', 1)]}", "Expected a comma", 20),
+    ("{'invisible' [('a', '=', 1)]}", "Expected a colon", 13),
+    ("{'invisible': @}", "Unexpected character", 14),
+    ("{'invisible': [('a', '=', '\\x')]}", "Invalid string", 26),
+    ("{'invisible': [('a', '=', 1)]}}", "Unexpected closing punctuation", 30),
+    ("{'invisible': [('a', '=', 1),, ]}", "Unexpected comma", 29),
+    ("{'invisible': [('a', 'eq', 1)]}", "Invalid domain term operator 'eq'", 21),
+    ("{'invisible': ['^', ('a', '=', 1)]}", "Invalid domain operator '^'", 15),
+    ("{'invisible': [('a', '=')]}", "Invalid domain term", 14),
+    ("{'invisible': 1.5}", "Expected a domain or a constant for 'invisible'", 14),
+    ("{1: 2}", "Expected an attribute name", 1),
+    ("[('a', '=', 1)]", "Expected a single attrs dictionary", 0),
+    ("{} {}", "Expected a comma", 3),
+    ("", "Unexpected end", 0),
+])
+def test_parse_attrs_errors(attrs, message, position):
+    with pytest.raises(DomainSyntaxError) as error:
+        parse_attrs(attrs)
+    assert str(error.value).startswith(message)
+    assert error.value.position == position
+    assert error.value.text == attrs
+
+
+def test_parse_attrs_never_evaluates():
+    with pytest.raises(DomainSyntaxError):
+        parse_attrs("{'invisible': __import__('os').system('true')}")
+
+
+@pytest.mark.parametrize('attrs, new_attrs', [
+    ("{'invisible': [('a', '=', uid)]}", {'invisible': 'a == uid'}),
+    ("{'invisible': [('a', 'in', [%(base.main_company)d, parent.id])]}", {'invisible': 'a in [%(base.main_company)d, parent.id]'}),
+    ("{'readonly': ['|', ('a', '=', False), ('b', '!=', 'x')], 'required': 1}", {'readonly': "not a or b != 'x'", 'required': '1'}),
+    ("{'invisible': [('a', '=', context.get('x'))], 'other': 1}", {'invisible': "a == context.get('x')"}),
+    ("{'column_invisible': [('parent.state', 'not in', ['a', 'b'])]}", {'column_invisible': "parent.state not in ['a', 'b']"}),
+    ("{'invisible': ['!', ('a', '&lt;', 3)]}", {'invisible': 'not a < 3'}),
+])
+def test_compile_new_attrs(attrs, new_attrs):
+    assert compile_new_attrs(attrs) == new_attrs
+
+
+@pytest.mark.parametrize('value', ["it's", 'say "hi"', 'C:\\tmp\\new', "it's \\ \"quoted\"", '\\'])
+@pytest.mark.parametrize('operator, condition', [('=', '{} == a'), ('!=', '{} != a'), ('=?', '{} == a'), ('ilike', '{}.lower() in a.lower()')])
+def test_compile_new_attrs_quoted_strings(value, operator, condition):
+    """
+    Strings with quotes or backslashes are written as valid Python literals of the same value
+    """
+    invisible = compile_new_attrs(f"{{'invisible': [('a', '{operator}', {value!r})]}}")['invisible']
+    assert eval(invisible, {'a': value}) == eval(condition.format('b'), {'a': value, 'b': value})
+    assert eval(invisible, {'a': 'other'}) == eval(condition.format('b'), {'a': 'other', 'b': value})
+    assert eval(compile_new_attrs(f"{{'invisible': [('a', 'in', [{value!r}, 'x'])]}}")['invisible'], {'a': value})
@@ -0,0 +1,132 @@
+import os
+
+import pytest
+
+from attrs_converter.cli import main
+from attrs_converter.files import get_file_role, index_files, read_xml_file_with_attrs_or_states, walk_files
+from attrs_converter.processing import convert_xml_file
+
+FILES = [
+    'module/__manifest__.py',
+    'module/models/model.py',
+    'module/report/report.xml',
+    'module/static/description/icon.png',
+    'module/static/lib/library/library.js',
+    'module/static/src/js/widget.js',
+    'module/static/src/xml/templates.xml',
+    'module/tests/data/views.xml',
+    'module/views/sub/nested.xml',
+    'module/views/views.xml',
+    'module/.git/config',
+    'node_modules/package/index.js',
+    'static/lib/top_level.js',
+    'README.md',
+]
+
+
+@pytest.fixture
+def root_dir(tmp_path):
+    for file_path in FILES:
+        (tmp_path / file_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / file_path).write_text('<tree/>\n')
+    return tmp_path
+
+
+def get_relative_files(root_dir, files):
+    return [os.path.relpath(file_path, root_dir) for file_path in files]
+
+
+@pytest.mark.parametrize('name, in_views, role', [
+    ('views.xml', True, 'view_xml'),
+    ('data.XML', False, 'xml'),
+    ('__manifest__.py', False, 'manifest'),
+    ('models.py', True, 'python'),
+    ('widget.js', False, 'js'),
+    ('logo.PNG', False, 'asset'),
+    ('README.md', False, 'other'),
+])
+def test_get_file_role(name, in_views, role):
+    assert get_file_role(name, in_views) == role
+
+
+def test_walk_files(root_dir):
+    files = [(os.path.relpath(file_path, root_dir), role) for file_path, role in walk_files(str(root_dir))]
+    # Depth first and sorted by name, the files of a directory before its subdirectories, without the ignored
+    # directories and globs, at any level
+    assert files == [
+        ('README.md', 'other'),
+        ('module/__manifest__.py', 'manifest'),
+        ('module/models/model.py', 'python'),
+        ('module/report/report.xml', 'xml'),
+        ('module/static/description/icon.png', 'asset'),
+        ('module/static/src/js/widget.js', 'js'),
+        ('module/static/src/xml/templates.xml', 'xml'),
+        ('module/tests/data/views.xml', 'xml'),
+        ('module/views/views.xml', 'view_xml'),
+        ('module/views/sub/nested.xml', 'view_xml'),
+    ]
+
+
+def test_walk_files_exclude(root_dir):
+    files = get_relative_files(root_dir, (file_path for file_path, _role in walk_files(str(root_dir), ['*/static', 'module/views/sub*'])))
+    assert files == ['README.md', 'module/__manifest__.py', 'module/models/model.py', 'module/report/report.xml',
+                     'module/tests/data/views.xml', 'module/views/views.xml']
+
+
+def test_ignored_directories_not_entered(root_dir, monkeypatch):
+    entered = []
+    scandir = os.scandir
+
+    def tracked_scandir(path):
+        entered.append(os.path.relpath(path, root_dir))
+        return scandir(path)
+    monkeypatch.setattr(os, 'scandir', tracked_scandir)
+    list(walk_files(str(root_dir)))
+    assert not {'module/.git', 'node_modules', 'static/lib', 'module/static/lib'} & set(entered)
+
+
+def test_index_files(root_dir):
+    files_by_role = index_files(str(root_dir), ['README.md'])
+    assert {role: get_relative_files(root_dir, files) for role, files in files_by_role.items() if files} == {
+        'view_xml': ['module/views/views.xml', 'module/views/sub/nested.xml'],
+        'xml': ['module/report/report.xml', 'module/static/src/xml/templates.xml', 'module/tests/data/views.xml'],
+        'manifest': ['module/__manifest__.py'],
+        'python': ['module/models/model.py'],
+        'js': ['module/static/src/js/widget.js'],
+        'asset': ['module/static/description/icon.png'],
+    }
+
+
+def test_excluded_files_unchanged(root_dir):
+    assert main([str(root_dir), '--yes', '--passes', 'tree', '--exclude', 'module/views']) == 0
+    assert (root_dir / 'module' / 'report' / 'report.xml').read_text() != '<tree/>\n'
+    assert (root_dir / 'module' / 'views' / 'views.xml').read_text() == '<tree/>\n'
+    # Neither the ignored directories nor the assets are read
+    assert (root_dir / 'module' / 'static' / 'lib' / 'library' / 'library.js').read_text() == '<tree/>\n'
+    assert (root_dir / 'module' / 'static' / 'description' / 'icon.png').read_text() == '<tree/>\n'
+
+
+@pytest.mark.parametrize('contents, found', [
+    ('<field name="a" attrs="{}"/>', True),
+    ("<field name='a' attrs='{}'/>", True),
+    ('<button states = "draft"/>', True),
+    ('<attribute name="attrs">{}</attribute>', True),
+    ("<attribute name='states'>draft</attribute>", True),
+    ('<field name="attrs_count"/>', False),
+    ('<field name="state_ids" string="States"/>', False),
+    ('<!-- attrs and states are gone in Odoo 17 -->', False),
+    ('<p>Set the states of the order</p>', False),
+    ('', False),
+])
+def test_read_xml_file_with_attrs_or_states(tmp_path, contents, found):
+    xml_file = tmp_path / 'views.xml'
+    xml_file.write_text(contents)
+    assert read_xml_file_with_attrs_or_states(str(xml_file)) == (contents if found else None)
+
+
+def test_prefiltered_files_not_decoded_nor_parsed(tmp_path):
+    xml_file = tmp_path / 'views.xml'
+    # Neither valid utf-8 nor valid XML, but there is nothing to convert
+    xml_file.write_bytes('<odoo><p>Les états (states) du devis</odoo>'.encode('latin-1'))
+    assert read_xml_file_with_attrs_or_states(str(xml_file)) is None
+    assert convert_xml_file(str(xml_file)) is None
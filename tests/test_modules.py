@@ -0,0 +1,163 @@
+"""
+Tests of the dependency graph of the modules and of the manifest pass
+"""
+import json
+
+import pytest
+
+from attrs_converter import modules, processing, views
+from attrs_converter.cli import main
+from attrs_converter.modules import ModuleGraph, get_strongly_connected_components, update_manifest_contents
+
+# Modules of a small repository: sale_stock and stock_extra depend on each other, and base isn't in the repository
+MANIFESTS = {
+    'sale': {'depends': ['base']},
+    'stock': {'depends': ['base']},
+    'sale_stock': {'depends': ['sale', 'stock', 'stock_extra']},
+    'stock_extra': {'depends': ['sale_stock']},
+    'report': {'depends': ['sale_stock', 'account']},
+    'standalone': {},
+}
+
+
+@pytest.fixture
+def addons(tmp_path):
+    for name, manifest in MANIFESTS.items():
+        (tmp_path / 'addons' / name / 'views').mkdir(parents=True)
+        (tmp_path / 'addons' / name / '__manifest__.py').write_text(repr({'name': name, 'version': '16.0.1.0.0', **manifest}))
+        (tmp_path / 'addons' / name / 'views' / 'views.xml').write_text('<odoo><tree/></odoo>\n')
+    return tmp_path / 'addons'
+
+
+def build_graph(addons):
+    graph = ModuleGraph()
+    graph.build([str(p) for p in addons.rglob('__manifest__.py')])
+    return graph
+
+
+def test_strongly_connected_components():
+    graph = {'a': ['b'], 'b': ['c'], 'c': ['b', 'd'], 'd': [], 'e': ['e']}
+    # Each component after the components it depends on
+    assert [sorted(component) for component in get_strongly_connected_components(graph)] == [['d'], ['b', 'c'], ['a'], ['e']]
+    # Without recursion
+    chain = {str(i): [str(i + 1)] for i in range(5000)} | {'5000': []}
+    assert len(get_strongly_connected_components(chain)) == 5001
+
+
+def test_build(addons):
+    graph = build_graph(addons)
+    assert graph.levels == [['sale', 'standalone', 'stock'], ['sale_stock', 'stock_extra'], ['report']]
+    assert graph.cycles == [['sale_stock', 'stock_extra']]
+    assert graph.get_missing_dependencies() == {'account': ['report'], 'base': ['sale', 'stock']}
+    assert not graph.duplicates and not graph.errors
+    assert graph.get_module(str(addons / 'sale_stock' / 'views' / 'views.xml')) == 'sale_stock'
+    assert graph.get_schedule_key(str(addons / 'report' / 'views' / 'views.xml')) == (2, 'report')
+    # Files outside of any module last
+    assert graph.get_schedule_key(str(addons / 'views.xml')) == (3, '')
+
+
+def test_build_again(addons):
+    graph = build_graph(addons)
+    (addons / 'report' / '__manifest__.py').unlink()
+    graph.build([str(p) for p in addons.rglob('__manifest__.py')])
+    # Only the modules of the last build
+    assert graph.levels == [['sale', 'standalone', 'stock'], ['sale_stock', 'stock_extra']]
+    assert graph.get_missing_dependencies() == {'base': ['sale', 'stock']}
+    assert graph.get_level(str(addons / 'report' / 'views' / 'views.xml')) == 2
+
+
+def test_build_duplicates_and_errors(addons, tmp_path):
+    (tmp_path / 'other' / 'sale').mkdir(parents=True)
+    (tmp_path / 'other' / 'sale' / '__manifest__.py').write_text("{'name': 'sale', 'depends': ['stock']}")
+    (addons / 'standalone' / '__manifest__.py').write_text("{'name': 'standalone', 'depends': 'base'}")
+    (addons / 'stock_extra' / '__manifest__.py').write_text("{'name': ")
+    graph = ModuleGraph()
+    graph.build([str(p) for p in tmp_path.rglob('__manifest__.py')])
+    # The first module of a name is the one depended on
+    assert graph.duplicates == {'sale': [str(addons / 'sale'), str(tmp_path / 'other' / 'sale')]}
+    assert graph.modules['sale'].depends == ['base']
+    assert set(graph.errors) == {str(addons / 'standalone' / '__manifest__.py'), str(addons / 'stock_extra' / '__manifest__.py')}
+    # Modules whose dependencies couldn't be read don't depend on anything
+    assert graph.modules['stock_extra'].manifest is None and not graph.cycles
+    assert graph.get_manifest(str(addons / 'standalone' / '__manifest__.py'), "{'name': 'standalone', 'depends': 'base'}") == \
+        {'name': 'standalone', 'depends': 'base'}
+
+
+def test_get_manifest(addons):
+    graph = build_graph(addons)
+    manifest_file = addons / 'sale' / '__manifest__.py'
+    manifest = graph.get_manifest(str(manifest_file), manifest_file.read_text())
+    assert manifest == {'name': 'sale', 'version': '16.0.1.0.0', 'depends': ['base']}
+    # A copy, updated in place by the manifest pass
+    manifest['depends'].append('stock')
+    assert graph.modules['sale'].manifest['depends'] == ['base']
+    assert graph.get_manifest(str(manifest_file), manifest_file.read_text() + '\n') is None
+
+
+def test_update_manifest_contents():
+    messages = []
+    contents = "{'name': 'sale', 'maintainers': ['someone']}"
+    updated = update_manifest_contents(contents, '__manifest__.py', messages, version='17.0.1.0.0', author='Someone Else')
+    assert eval(updated) == {'name': 'sale', 'version': '17.0.1.0.0', 'author': 'Someone Else', 'maintainers': ['someone', 'Someone Else']}
+    assert update_manifest_contents(contents, '__manifest__.py', messages, version='', author='') is None
+    assert update_manifest_contents("['sale']", '__manifest__.py', messages) is None
+    assert len(messages) == 1 and 'Could not parse' in messages[0]
+
+
+def test_main_processes_modules_in_order(addons, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(modules, 'MODULE_GRAPH', ModuleGraph())
+    monkeypatch.setattr(views, 'VIEW_INDEX', views.ViewIndex())
+    report_file = tmp_path / 'report.json'
+    assert main([str(addons), '--yes', '--passes', 'tree,manifest', '--no-cache', '--manifest-author', '',
+                 '--report', str(report_file)]) == 0
+    output = capsys.readouterr().out
+    converted = [line.split(addons.name + '/')[1].split('/')[0] for line in output.splitlines() if "Replacing 'tree'" in line]
+    assert converted == ['sale', 'standalone', 'stock', 'sale_stock', 'stock_extra', 'report']
+    assert 'sale_stock, stock_extra' in output and 'account (required by report)' in output
+    assert eval((addons / 'sale' / '__manifest__.py').read_text()) == {'name': 'sale', 'version': '18.0.1.0.0', 'depends': ['base']}
+    report = json.loads(report_file.read_text())['module_graph']
+    assert report['modules'] == 6 and report['cycles'] == [['sale_stock', 'stock_extra']]
+
+
+class RecordingExecutor:
+    """
+    Executor running the tasks in the main process, recording when the files are submitted and processed
+    """
+    events = []
+
+    def __init__(self, max_workers, initializer, initargs):
+        self.events.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, function, iterable, chunksize=1):
+        items = list(iterable)
+        self.events.append(('submit', [get_module_name(file_path) for file_path, _passes in items]))
+
+        def iter_results():
+            for item in items:
+                self.events.append(('done', get_module_name(item[0])))
+                yield function(item)
+        return iter_results()
+
+
+def get_module_name(file_path):
+    return file_path.split('/')[-3]
+
+
+def test_main_jobs_level_by_level(addons, monkeypatch):
+    monkeypatch.setattr(modules, 'MODULE_GRAPH', ModuleGraph())
+    monkeypatch.setattr(views, 'VIEW_INDEX', views.ViewIndex())
+    monkeypatch.setattr(processing, 'ProcessPoolExecutor', RecordingExecutor)
+    assert main([str(addons), '--yes', '--passes', 'tree', '--no-cache', '--jobs', '4']) == 0
+    # The files of a level are only submitted once the files of the previous level are all processed
+    assert RecordingExecutor.events == [
+        ('submit', ['sale', 'standalone', 'stock']), ('done', 'sale'), ('done', 'standalone'), ('done', 'stock'),
+        ('submit', ['sale_stock', 'stock_extra']), ('done', 'sale_stock'), ('done', 'stock_extra'),
+        ('submit', ['report']), ('done', 'report'),
+    ]
+    assert '<list/>' in (addons / 'report' / 'views' / 'views.xml').read_text()
@@ -0,0 +1,196 @@
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from attrs_converter import processing
+from attrs_converter.cli import main
+from attrs_converter.processing import FileWriter, iter_processed_files, process_file, write_file_atomically
+from attrs_converter.tree import replace_tree_with_list_in_xml
+
+REPOSITORY = Path(__file__).parent.parent
+TESTFILE = REPOSITORY / 'testfile.xml'
+VIEW = """<odoo>
+    <record id="view_form" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <form>
+                <field name="name" attrs="{'invisible': [('state', '=', '%s')]}"/>
+                <button name="action_done" states="draft,%s"/>
+            </form>
+        </field>
+    </record>
+</odoo>
+"""
+
+
+@pytest.fixture
+def addons(tmp_path):
+    """
+    Addons with enough files for the worker processes to each get several of them, a file without anything to convert
+    and a file that can't be parsed
+    """
+    views = tmp_path / 'addons' / 'module' / 'views'
+    views.mkdir(parents=True)
+    for i in range(12):
+        (views / f'view_{i:02}.xml').write_text(VIEW % (f'state_{i}', f'state_{i}'))
+    shutil.copy(TESTFILE, views / 'testfile.xml')
+    (views / 'nothing.xml').write_text('<odoo><record id="a" model="b"/></odoo>\n')
+    (views / 'broken.xml').write_text('<odoo attrs="{}"><record></odoo>\n')
+    (tmp_path / 'addons' / 'module' / '__manifest__.py').write_text("{'name': 'Module', 'version': '16.0.1.0.0'}\n")
+    return tmp_path / 'addons'
+
+
+def get_files(addons, passes):
+    return [(str(p), passes) for p in sorted(addons.rglob('*.xml'))]
+
+
+def test_jobs_same_results_as_serial(addons):
+    files = get_files(addons, ['attrs', 'tree'])
+    # Without the updates of the caches and stats of each worker
+    serial = [file_result[:9] for file_result in iter_processed_files(files, 1)]
+    assert [file_result[:9] for file_result in iter_processed_files(files, 3)] == serial
+    # In submission order, whatever worker finished first
+    assert [file_path for file_path, *_ in serial] == [file_path for file_path, _passes in files]
+
+
+def test_errors_returned(addons):
+    results = {Path(file_result.file_path).name: file_result for file_result in iter_processed_files(get_files(addons, ['attrs']), 3)}
+    assert results['nothing.xml'].contents is None and results['nothing.xml'].attrs_error is None
+    assert results['broken.xml'].contents is None and results['broken.xml'].attrs_error
+    tags_found, tags_replaced_by = results['view_03.xml'].attrs_result
+    assert len(tags_found) == len(tags_replaced_by) == 2
+    assert b'''invisible="state == 'state_3'"''' in results['view_03.xml'].contents
+    assert b'''invisible="state not in ['draft', 'state_3']"''' in results['view_03.xml'].contents
+
+
+def run_script(root_dir, *args):
+    command = [sys.executable, str(REPOSITORY / 'replace_attrs.py'), str(root_dir), '--yes', '--passes', 'attrs,tree,manifest',
+               '--no-cache', *args]
+    process = subprocess.run(command, capture_output=True, text=True, cwd=root_dir)
+    return process.returncode, process.stdout.replace(str(root_dir), '<root>')
+
+
+def get_contents(root_dir):
+    return {str(p.relative_to(root_dir)): p.read_bytes() for p in sorted(root_dir.rglob('*')) if p.is_file()}
+
+
+def test_script_jobs_same_as_serial(addons, tmp_path):
+    # Paths of the same length, as they are framed in the output
+    serial, parallel = tmp_path / 'serial', tmp_path / 'jobs_3'
+    shutil.copytree(addons, serial)
+    shutil.copytree(addons, parallel)
+    returncode, serial_output = run_script(serial)
+    assert run_script(parallel, '--jobs', '3') == (returncode, serial_output)
+    assert get_contents(parallel) == get_contents(serial)
+    # broken.xml failed
+    assert returncode == 1 and 'Reason: ' in serial_output
+    assert b'attrs=' not in (serial / 'module' / 'views' / 'view_00.xml').read_bytes()
+
+
+def test_process_file_all_passes(tmp_path):
+    view_file = tmp_path / 'views.xml'
+    view_file.write_bytes((VIEW % ('done', 'done')).replace('form>', 'tree>').replace('\n', '\r\n').encode())
+    result = process_file(str(view_file), ['attrs', 'tree'])
+    assert result.changed_passes == ['attrs', 'tree'] and result.attrs_error is None
+    # Line endings are kept by all passes
+    assert result.contents.count(b'\r\n') == result.contents.count(b'\n') and b'\r\r' not in result.contents
+    assert b'<tree>' not in result.contents and b'attrs=' not in result.contents
+    # Nothing is written
+    assert b'attrs=' in view_file.read_bytes()
+    assert process_file(str(view_file), ['manifest'], keep_original=True).original is None
+    assert process_file(str(view_file), ['tree'], keep_original=True).original == view_file.read_bytes()
+    assert process_file(str(view_file), ['attrs'], keep_original=True).original == view_file.read_bytes()
+
+
+def test_read_and_written_once(addons, monkeypatch):
+    reads, writes = [], []
+    read_file, write = processing.read_file, processing.write_file_atomically
+
+    def counted_read_file(file_path, *args, **kwargs):
+        reads.append(file_path)
+        return read_file(file_path, *args, **kwargs)
+
+    def counted_write(file_path, contents):
+        writes.append(file_path)
+        return write(file_path, contents)
+    monkeypatch.setattr(processing, 'read_file', counted_read_file)
+    monkeypatch.setattr(processing, 'write_file_atomically', counted_write)
+    views = addons / 'module' / 'views'
+    (views / 'view_00.xml').write_text((VIEW % ('done', 'done')).replace('form>', 'tree>'))
+    main([str(addons), '--yes', '--passes', 'attrs,tree,manifest', '--no-cache'])
+    assert sorted(reads) == sorted(set(reads)) and str(views / 'view_00.xml') in reads
+    assert sorted(writes) == sorted(set(writes)) and str(views / 'view_00.xml') in writes
+    # Unchanged files aren't written
+    assert str(views / 'nothing.xml') in reads and str(views / 'nothing.xml') not in writes
+    assert '<tree>' not in (views / 'view_00.xml').read_text() and 'attrs=' not in (views / 'view_00.xml').read_text()
+
+
+def test_declined_attrs_conversion(tmp_path, monkeypatch):
+    view_file = tmp_path / 'module' / 'views' / 'views.xml'
+    view_file.parent.mkdir(parents=True)
+    view_file.write_text((VIEW % ('done', 'done')).replace('form>', 'tree>'))
+    # No auto-replace, tree pass, no manifest pass, then the attrs conversion of the file is declined
+    answers = iter(['n', 'y', 'n', 'n'])
+    monkeypatch.setattr('builtins.input', lambda prompt: next(answers))
+    main([str(tmp_path / 'module'), '--no-cache'])
+    # Only the tree pass is applied
+    assert view_file.read_text() == replace_tree_with_list_in_xml((VIEW % ('done', 'done')).replace('form>', 'tree>'))
+
+
+def test_write_file_atomically(tmp_path, monkeypatch):
+    file_path = tmp_path / 'script.sh'
+    file_path.write_bytes(b'old')
+    file_path.chmod(0o750)
+    write_file_atomically(str(file_path), b'new')
+    assert file_path.read_bytes() == b'new' and file_path.stat().st_mode & 0o777 == 0o750
+    assert os.listdir(tmp_path) == ['script.sh']
+
+    def failing_replace(source, destination):
+        raise OSError('No space left on device')
+    monkeypatch.setattr(os, 'replace', failing_replace)
+    with pytest.raises(OSError):
+        write_file_atomically(str(file_path), b'newer')
+    # The file is left as it was, without temporary file
+    assert file_path.read_bytes() == b'new'
+    assert os.listdir(tmp_path) == ['script.sh']
+
+
+def test_io_threads_same_results(addons):
+    files = get_files(addons, ['attrs', 'tree'])
+    serial = [file_result[:9] for file_result in iter_processed_files(files, 1)]
+    # Fewer files read ahead than files, so some are only read once the first ones are processed
+    assert [file_result[:9] for file_result in iter_processed_files(files, 1, io_threads=2)] == serial
+    assert [file_result[:9] for file_result in iter_processed_files(files[:3], 1, io_threads=4)] == serial[:3]
+
+
+def test_file_writer(tmp_path):
+    written = []
+    for i in range(5):
+        (tmp_path / f'file_{i}.xml').write_bytes(b'old')
+    writer = FileWriter(maxsize=2)
+    for i in range(5):
+        writer.write(str(tmp_path / f'file_{i}.xml'), f'contents {i}'.encode(),
+                     lambda error, fingerprint, i=i: written.append((i, error, fingerprint)), fingerprint=i == 0)
+    # Only existing files are replaced
+    writer.write(str(tmp_path / 'missing' / 'file.xml'), b'contents', lambda error, fingerprint: written.append((5, error, fingerprint)))
+    writer.close()
+    # The callbacks are all run by close(), in the order of the writes
+    assert [i for i, _error, _fingerprint in written] == list(range(6))
+    assert written[0][2] is not None and all(fingerprint is None for _i, _error, fingerprint in written[1:])
+    assert all(error is None for _i, error, _fingerprint in written[:5]) and isinstance(written[5][1], OSError)
+    assert [(tmp_path / f'file_{i}.xml').read_bytes() for i in range(5)] == [f'contents {i}'.encode() for i in range(5)]
+    assert sorted(os.listdir(tmp_path)) == [f'file_{i}.xml' for i in range(5)]
+    # Closing a writer without anything written doesn't start its thread
+    writer.close()
+    assert writer.thread is None
+
+
+def test_script_io_threads_same_as_serial(addons, tmp_path):
+    serial, threaded = tmp_path / 'serial', tmp_path / 'thread'
+    shutil.copytree(addons, serial)
+    shutil.copytree(addons, threaded)
+    assert run_script(threaded, '--io-threads', '2') == run_script(serial, '--io-threads', '0')
+    assert get_contents(threaded) == get_contents(serial)
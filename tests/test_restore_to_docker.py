@@ -0,0 +1,201 @@
+"""
+Tests of the detection of the backup formats, and of the commands run to restore them
+"""
+import gzip
+import io
+import os
+import subprocess
+import sys
+import tarfile
+
+import pytest
+
+from restore_to_docker import (
+    CONTAINER_BACKUP_DIR, RestoreError, Target, create_user_and_database, detect_backup_format, find_latest_backup,
+    get_command, main, restore_backup, run_command,
+)
+
+CONTAINER = Target('postgres_odoo', 'postgres', False, None, None)
+LOCAL = Target(None, 'postgres', True, 'localhost', 5433)
+
+
+def write_tar(path, compressed=False):
+    with (gzip.open if compressed else open)(path, 'wb') as f:
+        with tarfile.open(fileobj=f, mode='w') as archive:
+            data = b'-- toc'
+            info = tarfile.TarInfo('toc.dat')
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture
+def backups(tmp_path):
+    (tmp_path / 'backup.dump').write_bytes(b'PGDMP\x01\x0e\x00' + bytes(600))
+    (tmp_path / 'backup.sql').write_text('CREATE TABLE a (id integer);\n', encoding='utf-8')
+    with gzip.open(tmp_path / 'backup.sql.gz', 'wb') as f:
+        f.write(b'CREATE TABLE a (id integer);\n')
+    with gzip.open(tmp_path / 'backup.dump.gz', 'wb') as f:
+        f.write(b'PGDMP\x01\x0e\x00')
+    write_tar(tmp_path / 'backup.tar')
+    write_tar(tmp_path / 'backup.tar.gz', compressed=True)
+    (tmp_path / 'backup_directory').mkdir()
+    (tmp_path / 'backup_directory' / 'toc.dat').write_bytes(b'PGDMP')
+    (tmp_path / 'empty.sql').write_bytes(b'')
+    return tmp_path
+
+
+@pytest.mark.parametrize('name, backup_format', [
+    ('backup.dump', ('custom', False)),
+    ('backup.dump.gz', ('custom', True)),
+    ('backup.sql', ('plain', False)),
+    ('backup.sql.gz', ('plain', True)),
+    ('empty.sql', ('plain', False)),
+    ('backup.tar', ('tar', False)),
+    ('backup.tar.gz', ('tar', True)),
+    ('backup_directory', ('directory', False)),
+])
+def test_detect_backup_format(backups, name, backup_format):
+    assert detect_backup_format(str(backups / name)) == backup_format
+
+
+def test_detect_backup_format_invalid(tmp_path):
+    (tmp_path / 'directory').mkdir()
+    with pytest.raises(RestoreError, match='without toc.dat'):
+        detect_backup_format(str(tmp_path / 'directory'))
+    with pytest.raises(RestoreError, match='Could not read the backup'):
+        detect_backup_format(str(tmp_path / 'missing.dump'))
+    (tmp_path / 'truncated.sql.gz').write_bytes(gzip.compress(b'SELECT 1;')[:12])
+    with pytest.raises(RestoreError, match='Could not read the backup'):
+        detect_backup_format(str(tmp_path / 'truncated.sql.gz'))
+
+
+def test_find_latest_backup(backups):
+    os.utime(backups / 'backup_directory', (0, 2 ** 31))
+    assert find_latest_backup(str(backups)) == str(backups / 'backup_directory')
+    (backups / 'notes.txt').write_text('', encoding='utf-8')
+    os.utime(backups / 'notes.txt', (0, 2 ** 32))
+    assert find_latest_backup(str(backups)) == str(backups / 'backup_directory')
+    with pytest.raises(RestoreError, match='No backup found'):
+        find_latest_backup(str(backups / 'backup_directory'))
+
+
+def test_get_command():
+    assert get_command(CONTAINER, 'psql', ['-d', 'odoo']) == ['docker', 'exec', '-u', 'postgres', 'postgres_odoo', 'psql', '-d', 'odoo']
+    assert get_command(CONTAINER, 'psql', ['-d', 'odoo'], stdin=True) == \
+        ['docker', 'exec', '-i', '-u', 'postgres', 'postgres_odoo', 'psql', '-d', 'odoo']
+    assert get_command(LOCAL, 'pg_restore', ['-d', 'odoo'], stdin=True) == \
+        ['pg_restore', '-U', 'postgres', '-h', 'localhost', '-p', '5433', '-d', 'odoo']
+
+
+def get_commands(capsys, *args, **kwargs):
+    timings = {}
+    restore_backup(*args, timings, dry_run=True, **kwargs)
+    return [line for line in capsys.readouterr().out.splitlines() if line.startswith('$ ')], timings
+
+
+def test_restore_plain(backups, capsys):
+    backup = str(backups / 'backup.sql.gz')
+    commands, timings = get_commands(capsys, CONTAINER, backup, 'plain', True, 'odoo')
+    # Like psql -f, plain SQL goes on after errors by default
+    assert commands == [f"$ docker exec -i -u postgres postgres_odoo psql -X -q -d odoo < {backup}"]
+    assert list(timings) == ['restore']
+    commands, timings = get_commands(capsys, CONTAINER, backup, 'plain', True, 'odoo', on_error='stop')
+    assert commands == [f"$ docker exec -i -u postgres postgres_odoo psql -X -q -d odoo -v ON_ERROR_STOP=1 < {backup}"]
+
+
+def test_restore_custom_streamed(backups, capsys):
+    backup = str(backups / 'backup.dump')
+    commands, timings = get_commands(capsys, CONTAINER, backup, 'custom', False, 'odoo')
+    assert commands == [
+        f"$ docker exec -i -u postgres postgres_odoo pg_restore -d odoo --section={section} --exit-on-error < {backup}"
+        for section in ('pre-data', 'data', 'post-data')
+    ]
+    assert list(timings) == ['pre-data', 'data', 'post-data']
+    commands, timings = get_commands(capsys, CONTAINER, backup, 'custom', False, 'odoo', on_error='continue')
+    assert all('--exit-on-error' not in command for command in commands)
+
+
+def test_restore_custom_parallel(backups, capsys):
+    backup = str(backups / 'backup.dump')
+    commands, timings = get_commands(capsys, CONTAINER, backup, 'custom', False, 'odoo', jobs=4)
+    archive = f"{CONTAINER_BACKUP_DIR}/restore_{os.getpid()}_backup.dump"
+    # Copied into the container for pg_restore to seek it, and removed afterwards
+    assert commands == [
+        f"$ docker cp {backup} postgres_odoo:{archive}",
+        f"$ docker exec -u postgres postgres_odoo pg_restore -d odoo --section=pre-data --exit-on-error {archive}",
+        f"$ docker exec -u postgres postgres_odoo pg_restore -d odoo --section=data --exit-on-error -j 4 {archive}",
+        f"$ docker exec -u postgres postgres_odoo pg_restore -d odoo --section=post-data --exit-on-error -j 4 {archive}",
+        f"$ docker exec -u root postgres_odoo rm -rf {archive}",
+    ]
+    assert list(timings) == ['copy', 'pre-data', 'data', 'post-data']
+
+
+def test_restore_local_directory(backups, capsys):
+    backup = str(backups / 'backup_directory')
+    commands, timings = get_commands(capsys, LOCAL, backup, 'directory', False, 'odoo', jobs=2)
+    assert commands == [
+        f"$ pg_restore -U postgres -h localhost -p 5433 -d odoo --section=pre-data --exit-on-error {backup}",
+        f"$ pg_restore -U postgres -h localhost -p 5433 -d odoo --section=data --exit-on-error -j 2 {backup}",
+        f"$ pg_restore -U postgres -h localhost -p 5433 -d odoo --section=post-data --exit-on-error -j 2 {backup}",
+    ]
+
+
+def test_restore_compressed_archive_single_job(backups, capsys):
+    backup = str(backups / 'backup.tar.gz')
+    timings = {}
+    restore_backup(CONTAINER, backup, 'tar', True, 'odoo', timings, jobs=4, dry_run=True)
+    output = capsys.readouterr().out
+    assert "Warning: a gzipped tar archive can't be restored in parallel" in output
+    assert output.count(f"--exit-on-error < {backup}") == 3
+    assert ' -j ' not in output
+
+
+def test_create_user_and_database_masks_password(capsys):
+    create_user_and_database(CONTAINER, 'odoo-v14', "it's secret", 'odoo', dry_run=True)
+    output = capsys.readouterr().out
+    assert "secret" not in output
+    assert """    CREATE ROLE "odoo-v14" LOGIN PASSWORD '********';""" in output
+    assert """    CREATE DATABASE "odoo" OWNER "odoo-v14";""" in output
+
+
+def test_main_dry_run_report(backups, capsys):
+    report = backups / 'missing' / 'restore.json'
+    assert main(['--backup', str(backups / 'backup.sql'), '--password', 'secret', '--dry-run', '--report', str(report)]) == 0
+    output = capsys.readouterr().out
+    # The report that can't be written doesn't fail the restoration
+    assert f"Warning: Could not write the report {report}" in output
+    assert 'secret' not in output
+
+
+@pytest.fixture
+def processes(monkeypatch):
+    """
+    Processes started by run_command()
+    """
+    processes = []
+    popen = subprocess.Popen
+
+    def recorded_popen(*args, **kwargs):
+        processes.append(popen(*args, **kwargs))
+        return processes[-1]
+    monkeypatch.setattr(subprocess, 'Popen', recorded_popen)
+    return processes
+
+
+def test_run_command_streams_file(backups, tmp_path, processes):
+    output = tmp_path / 'output.sql'
+    command = [sys.executable, '-c', f'import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, open({str(output)!r}, "wb"))']
+    run_command(command, input_path=str(backups / 'backup.sql.gz'), decompress=True)
+    assert output.read_bytes() == b'CREATE TABLE a (id integer);\n'
+    assert processes[0].returncode == 0
+
+
+@pytest.mark.parametrize('name, decompress', [('missing.sql', False), ('truncated.sql.gz', True), ('backup.sql', True)])
+def test_run_command_unreadable_file(backups, processes, name, decompress):
+    (backups / 'truncated.sql.gz').write_bytes((backups / 'backup.sql.gz').read_bytes()[:20])
+    # A command waiting for its input until it's closed
+    command = [sys.executable, '-c', 'import sys, time; sys.stdin.read(); time.sleep(60)']
+    with pytest.raises(RestoreError, match=f"Could not stream {backups / name} into "):
+        run_command(command, input_path=str(backups / name), decompress=decompress)
+    # Killed and waited for, not left running
+    assert processes[0].returncode is not None and processes[0].returncode < 0
@@ -0,0 +1,89 @@
+"""
+Tests of the conversion rules and of the classification of the nodes by the rules applying to them
+"""
+import pytest
+from lxml import etree
+
+from attrs_converter import rules
+from attrs_converter.convert import convert_document
+from attrs_converter.files import read_xml_file_with_attrs_or_states
+from attrs_converter.rules import ConversionRule, find_converted_nodes, register_conversion_rule
+from attrs_converter.stats import RUN_STATS
+
+VIEW = """<odoo>
+    <record id="view_form" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <form>
+                <field name="name" attrs="{'invisible': [('state', '=', 'draft')]}" states="done"/>
+                <button name="action_done" states="draft" groups="base.group_no_one"/>
+                <xpath expr="//field[@name='date']" position="attributes">
+                    <attribute name="attrs">{'readonly': 1}</attribute>
+                    <attribute name="states">draft</attribute>
+                    <attribute name="string">Date</attribute>
+                </xpath>
+            </form>
+        </field>
+    </record>
+</odoo>
+"""
+
+
+@pytest.fixture
+def conversion_rules():
+    """
+    The rules registered by a test are removed after it
+    """
+    default_rules = list(rules.CONVERSION_RULES)
+    yield rules.CONVERSION_RULES
+    rules.CONVERSION_RULES[:] = default_rules
+    rules.compile_conversion_rules()
+
+
+def convert_groups(nodes, context):
+    for node in nodes:
+        node.set('groups', 'base.group_system')
+    return nodes
+
+
+def test_find_converted_nodes():
+    doc = etree.fromstring(VIEW)
+    converted_nodes = find_converted_nodes(doc)
+    assert {name: [node.get('name') for node in nodes] for name, nodes in converted_nodes.items()} == {
+        'attrs_tags': ['name'],
+        'attrs_overrides': ['attrs'],
+        'states_tags': ['name', 'action_done'],
+        'states_overrides': ['states'],
+    }
+    # The same nodes as the XPath queries, in document order
+    assert converted_nodes['states_tags'] == doc.xpath('//*[@states]')
+
+
+def test_register_conversion_rule(conversion_rules, tmp_path):
+    view_file = tmp_path / 'views.xml'
+    view_file.write_text('<odoo><form><button name="action_done" groups="base.group_no_one"/></form></odoo>\n')
+    # Nothing to convert, until a rule applies to the groups of the buttons
+    assert read_xml_file_with_attrs_or_states(str(view_file)) is None
+    register_conversion_rule(ConversionRule('no_one_buttons', 'groups', 'base.group_no_one', 'button', convert_groups,
+                                            changes_attributes=True, changes_parent=False))
+    assert [rule.name for rule in conversion_rules][-1] == 'no_one_buttons'
+    assert read_xml_file_with_attrs_or_states(str(view_file)) is not None
+
+    doc = etree.fromstring(VIEW)
+    RUN_STATS.pop_updates()
+    converted = convert_document(doc)
+    assert RUN_STATS.pop_updates()[2]['no_one_buttons'] == 1
+    button = doc.find('.//button')
+    assert button in converted and button.get('groups') == 'base.group_system'
+    assert button.get('invisible') == "state not in ['draft']"
+
+
+def test_register_conversion_rule_replaces(conversion_rules):
+    register_conversion_rule(ConversionRule('states_tags', 'groups', None, 'button', convert_groups,
+                                            changes_attributes=True, changes_parent=False))
+    # The previous rule of that name is removed, and the new one is applied after the other ones
+    assert [rule.name for rule in conversion_rules] == ['attrs_tags', 'attrs_overrides', 'states_overrides', 'states_tags']
+    doc = etree.fromstring(VIEW)
+    convert_document(doc)
+    assert doc.find('.//button').attrib == {'name': 'action_done', 'states': 'draft', 'groups': 'base.group_system'}
+    # The states of the fields are kept
+    assert doc.find('.//field[@name="name"]').get('states') == 'done'
@@ -0,0 +1,122 @@
+"""
+Tests of the assignment of the files to the shards, and of the merge of the results of the shards
+"""
+import json
+import os
+import re
+from collections import Counter
+
+import pytest
+
+from attrs_converter import modules
+from attrs_converter.cache import CONVERTER_VERSION
+from attrs_converter.modules import ModuleGraph
+from attrs_converter.sharding import get_file_shard, merge_results_files, merge_shard_results
+
+FILES = [f"addons/module_{module}/views/view_{view}.xml" for module in range(20) for view in range(10)]
+
+
+def test_file_shard_stable():
+    # Hashed the same way by every Python process and on every machine
+    assert [get_file_shard(os.path.join('/repository', file_path), '/repository', 7) for file_path in FILES[:5]] == \
+        [get_file_shard(os.path.join('/other/checkout', file_path), '/other/checkout', 7) for file_path in FILES[:5]]
+    assert get_file_shard('/repository/addons/sale/views/sale_views.xml', '/repository', 4) == 3
+    assert get_file_shard('/repository/addons/sale/__manifest__.py', '/repository', 4) == 4
+
+
+@pytest.mark.parametrize('shard_count', [1, 2, 3, 8])
+def test_file_shards_cover_files(shard_count):
+    shards = Counter(get_file_shard(os.path.join('/repository', file_path), '/repository', shard_count) for file_path in FILES)
+    assert set(shards) == set(range(1, shard_count + 1))
+    assert sum(shards.values()) == len(FILES)
+
+
+def test_file_shard_by_module(tmp_path, monkeypatch):
+    module_graph = ModuleGraph()
+    module_graph.build([str(tmp_path / 'addons' / f"module_{module}" / '__manifest__.py') for module in range(20)])
+    monkeypatch.setattr(modules, 'MODULE_GRAPH', module_graph)
+    shards = {}
+    for file_path in FILES:
+        shards.setdefault(file_path.split('/')[1], set()).add(get_file_shard(str(tmp_path / file_path), str(tmp_path), 3, 'module'))
+    assert all(len(module_shards) == 1 for module_shards in shards.values())
+    assert set.union(*shards.values()) == {1, 2, 3}
+    # Files outside of any module are hashed by their path
+    assert get_file_shard(str(tmp_path / 'other.xml'), str(tmp_path), 3, 'module') == get_file_shard(str(tmp_path / 'other.xml'), str(tmp_path), 3)
+
+
+def get_shard_results(shard_index, shard_count, succeeded=(), failed=(), counters=None, mismatches=None):
+    return {
+        'version': CONVERTER_VERSION,
+        'root': '/repository',
+        'passes': ['attrs', 'tree'],
+        'shard': [shard_index, shard_count],
+        'shard_by': 'path',
+        'discovered_files': 10,
+        'files': len(succeeded) + len(failed),
+        'attrs': {
+            'processed': bool(succeeded or failed),
+            'succeeded': list(succeeded),
+            'failed': [{'file': file, 'reason': 'Invalid'} for file in failed],
+        },
+        'tree': {'processed': True, 'succeeded': list(succeeded)},
+        'manifest': {'processed': False, 'succeeded': []},
+        'verification_mismatches': mismatches,
+        'counters': counters or {},
+    }
+
+
+def test_merge_shard_results():
+    results = merge_shard_results([
+        get_shard_results(2, 2, ['b.xml', 'a.xml'], ['d.xml'], {'attrs_tags': 3, 'modules': 5}),
+        get_shard_results(1, 2, ['c.xml'], ['e.xml', 'a_failed.xml'], {'attrs_tags': 1, 'modules': 5, 'states_tags': 2}),
+    ])
+    assert results['shard'] is None
+    assert results['merged_shards'] == 2
+    assert results['files'] == 6
+    assert results['attrs'] == {
+        'processed': True,
+        'succeeded': ['a.xml', 'b.xml', 'c.xml'],
+        'failed': [{'file': file, 'reason': 'Invalid'} for file in ('a_failed.xml', 'd.xml', 'e.xml')],
+    }
+    assert results['tree'] == {'processed': True, 'succeeded': ['a.xml', 'b.xml', 'c.xml']}
+    assert results['manifest'] == {'processed': False, 'succeeded': []}
+    # Counters of the whole repository are the same in every shard
+    assert results['counters'] == {'attrs_tags': 4, 'modules': 5, 'states_tags': 2}
+    assert results['verification_mismatches'] is None
+
+
+def test_merge_shard_results_mismatches():
+    mismatch = {'attrs': "{'invisible': [('a', '=', 1)]}", 'attribute': 'invisible', 'files': ['b.xml']}
+    results = merge_shard_results([
+        get_shard_results(1, 2, mismatches=[mismatch]),
+        get_shard_results(2, 2, mismatches=[{**mismatch, 'files': ['a.xml', 'b.xml']}]),
+    ])
+    assert results['verification_mismatches'] == [{**mismatch, 'files': ['a.xml', 'b.xml']}]
+    assert results['counters']['verification_mismatches'] == 1
+
+
+@pytest.mark.parametrize('shard_results, message', [
+    ([get_shard_results(1, 3), get_shard_results(3, 3)], "missing shards: 2 (of 3)"),
+    ([get_shard_results(1, 2), get_shard_results(1, 2), get_shard_results(2, 2)], "shards given more than once: 1 (of 2)"),
+    ([get_shard_results(1, 2), get_shard_results(2, 3)], "shard 2/3 isn't one of 2 shards"),
+    ([get_shard_results(1, 2), {**get_shard_results(2, 2), 'passes': ['attrs']}], "shard 2/2 has another passes"),
+    ([get_shard_results(1, 2), {**get_shard_results(2, 2), 'version': CONVERTER_VERSION - 1}], "shard 2/2 has another version"),
+])
+def test_merge_shard_results_invalid(shard_results, message):
+    with pytest.raises(ValueError, match=re.escape(message)):
+        merge_shard_results(shard_results)
+
+
+def test_merge_results_files(tmp_path, capsys):
+    shard_paths = []
+    for shard_results in (get_shard_results(1, 2, ['a.xml']), get_shard_results(2, 2, ['b.xml'])):
+        shard_paths.append(str(tmp_path / f"shard_{shard_results['shard'][0]}.json"))
+        with open(shard_paths[-1], 'w', encoding='utf-8') as f:
+            json.dump(shard_results, f)
+    results_path = tmp_path / 'results.json'
+    assert merge_results_files(shard_paths, str(results_path)) == 0
+    assert 'Merged 2 shards, 2 of 10 files' in capsys.readouterr().out
+    assert json.loads(results_path.read_text(encoding='utf-8'))['attrs']['succeeded'] == ['a.xml', 'b.xml']
+    # Missing shard
+    assert merge_results_files(shard_paths[:1]) == 2
+    assert 'Could not merge the shard results: missing shards: 2 (of 2)' in capsys.readouterr().out
@@ -0,0 +1,113 @@
+"""
+Tests of the simplification of the converted expressions, which must keep their truth value
+"""
+import ast
+import itertools
+
+import pytest
+
+from attrs_converter import simplify
+from attrs_converter.cache import compile_new_attrs
+from attrs_converter.simplify import simplify_expression
+
+# Values the variables of the expressions are evaluated with
+VALUES = ['a', 'b', 'c', '', 'A', True, False, None, 0, 1, 2, -1]
+
+EXPRESSIONS = [
+    "(state == 'a') or (state == 'b')",
+    "(not (state != 'a'))",
+    "state in ['a', 'b'] and state not in ['b']",
+    "state not in ['a', 'b'] or state == 'a'",
+    "state in ['a', 'b'] and state in ['b', 'c']",
+    "state != 'a' and state != 'b' and state != 'c'",
+    "(state == 'a' or state == 'b') and other",
+    "True and x",
+    "(a or a)",
+    "a or (a and b)",
+    "a and (a or b)",
+    "not not x",
+    "not (x == 1)",
+    "(a == 1 and True) or False",
+    "'A'.lower() in name.lower()",
+    "'a' in ['a', 'b'] and x",
+    "1 > 2 or x > 1",
+    "(x == 1 or x == 2) and (x == 2 or x == 3)",
+    "not (x in [1, 2] or x == 0)",
+]
+
+ATTRS = [
+    "{'invisible': ['|', ('state', '=', 'a'), ('state', '=', 'b')]}",
+    "{'invisible': ['&', ('state', '!=', 'a'), ('state', '!=', 'b')]}",
+    "{'invisible': ['|', ('state', 'in', ['a', 'b']), ('state', 'not in', ['a'])]}",
+    "{'invisible': ['!', ('state', '=', 'a')]}",
+    "{'invisible': [('state', '=', 'a'), ('state', '=', False)]}",
+    "{'readonly': ['|', '|', ('x', '=', 1), ('x', '=', 2), ('y', '=', True)]}",
+    "{'required': ['|', ('x', '=', False), '&', ('x', '!=', False), ('y', '>', 1)]}",
+    "{'invisible': [('name', 'ilike', 'A'), ('state', '=?', 'a')]}",
+]
+
+
+def get_variables(expression):
+    return sorted({node.id for node in ast.walk(ast.parse(expression, mode='eval')) if isinstance(node, ast.Name)} - {'True', 'False', 'None'})
+
+
+def evaluate(expression, variables):
+    """
+    :returns: the truth value of the expression, or the type of the exception it raises
+    :rtype: bool|type
+    """
+    try:
+        return bool(eval(expression, {'__builtins__': {}}, variables))
+    except Exception as e:
+        return type(e)
+
+
+def assert_equivalent(expression, simplified):
+    variables = get_variables(expression)
+    assert set(get_variables(simplified)) <= set(variables)
+    for values in itertools.product(VALUES, repeat=len(variables)):
+        context = dict(zip(variables, values))
+        result = evaluate(expression, context)
+        if isinstance(result, bool):
+            # The simplification may avoid an exception, but never adds one
+            assert evaluate(simplified, context) is result, f"{expression!r} and {simplified!r} differ for {context}"
+
+
+@pytest.mark.parametrize('expression', EXPRESSIONS)
+def test_simplify_expression_equivalent(expression):
+    simplified = simplify_expression(expression)
+    assert len(simplified) <= len(expression)
+    assert_equivalent(expression, simplified)
+
+
+@pytest.mark.parametrize('attrs', ATTRS)
+def test_simplify_converted_attrs_equivalent(attrs, monkeypatch):
+    simplified_attrs = compile_new_attrs(attrs)
+    monkeypatch.setattr(simplify, 'SIMPLIFY_EXPRESSIONS', False)
+    for attr, expression in compile_new_attrs(attrs).items():
+        assert_equivalent(expression, simplified_attrs[attr])
+
+
+@pytest.mark.parametrize('expression, simplified', [
+    ("(state == 'a') or (state == 'b')", "state in ['a', 'b']"),
+    ("(not (state != 'a'))", "state == 'a'"),
+    ("state in ['a', 'b'] and state not in ['b']", "state == 'a'"),
+    ("a or (a and b)", "a"),
+    ("(a == 1 and True) or False", "a == 1"),
+    ("'A'.lower() in name.lower()", "'a' in name.lower()"),
+])
+def test_simplify_expression(expression, simplified):
+    assert simplify_expression(expression) == simplified
+
+
+def test_simplify_expression_kept():
+    # Incomplete conditions, to be combined with states
+    assert simplify_expression("state == 'a' or") == "state == 'a' or"
+    assert simplify_expression("x == %(base.main_company)d or x == %(base.other_company)d") == \
+        "x == %(base.main_company)d or x == %(base.other_company)d"
+    assert simplify_expression("(x == %(base.main_company)d)") == "x == %(base.main_company)d"
+
+
+def test_simplify_expression_disabled(monkeypatch):
+    monkeypatch.setattr(simplify, 'SIMPLIFY_EXPRESSIONS', False)
+    assert simplify_expression("(not (state != 'a'))") == "(not (state != 'a'))"
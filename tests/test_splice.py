@@ -0,0 +1,83 @@
+"""
+Tests of the splice write mode, which must give the same document as the full serialization
+"""
+import os
+
+from lxml import etree
+
+from attrs_converter.files import decode_contents, read_file
+from attrs_converter.splice import convert_xml_contents
+from attrs_converter.stats import RUN_STATS
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Already formatted the way lxml serializes it, so the full serialization only differs from it in the converted tags
+VIEW = """<odoo>
+    <!-- Kept as is -->
+    <record id="view_order_form" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <form>
+                <field name="state"/>
+                <field name="partner_id" attrs="{'readonly': [('state', '!=', 'draft')], 'invisible': [('state', '=', 'cancel')]}"/>
+                <button name="action_confirm" states="draft,sent" type="object"/>
+                <field name="note" attrs="{'required': [('state', 'in', ['sent'])]}">
+                    <tree>
+                        <field name="name"/>
+                    </tree>
+                </field>
+            </form>
+        </field>
+    </record>
+</odoo>"""
+
+
+def get_canonical(contents):
+    return etree.tostring(etree.fromstring(contents), method='c14n')
+
+
+def test_splice_identical_to_full():
+    full = convert_xml_contents(VIEW)
+    assert full is not None
+    RUN_STATS.pop_updates()
+    assert convert_xml_contents(VIEW, write_mode='splice') == full
+    # Spliced, not serialized in full as a fallback
+    assert not RUN_STATS.pop_updates()[2]['splice_fallbacks']
+
+
+def test_splice_identical_to_full_with_windows_line_separators():
+    contents = VIEW.replace('\n', '\r\n')
+    assert convert_xml_contents(contents, write_mode='splice') == convert_xml_contents(contents)
+
+
+def test_splice_keeps_formatting():
+    contents = VIEW.replace('<field name="state"/>', "<field  name='state' />")
+    spliced = convert_xml_contents(contents, write_mode='splice')
+    assert b"<field  name='state' />" in spliced
+    assert get_canonical(spliced) == get_canonical(convert_xml_contents(contents))
+
+
+def test_splice_nothing_to_convert():
+    contents = VIEW.replace('attrs=', 'domain=').replace('states=', 'groups=')
+    assert convert_xml_contents(contents, write_mode='splice') is None
+    assert convert_xml_contents(contents) is None
+
+
+def test_splice_same_document_as_full():
+    contents = decode_contents(read_file(os.path.join(ROOT_DIRECTORY, 'testfile.xml')))[0]
+    full_tags, splice_tags = [], []
+    full = convert_xml_contents(contents, tags_replaced_by=full_tags)
+    spliced = convert_xml_contents(contents, tags_replaced_by=splice_tags, write_mode='splice')
+    assert get_canonical(spliced) == get_canonical(full)
+    assert splice_tags == full_tags
+
+
+def test_splice_falls_back_to_full():
+    # The declaration would have to be changed, as the contents are written in utf-8
+    contents = '<?xml version="1.0" encoding="iso-8859-1"?>\n' + VIEW
+    RUN_STATS.pop_updates()
+    assert convert_xml_contents(contents, write_mode='splice') == convert_xml_contents(contents)
+    assert RUN_STATS.pop_updates()[2]['splice_fallbacks'] == 1
+    contents = '<?xml version="1.0" encoding="utf-8"?>\n' + VIEW
+    spliced = convert_xml_contents(contents, write_mode='splice')
+    assert spliced.startswith(b'<?xml version="1.0" encoding="utf-8"?>\n<odoo>\n    <!-- Kept as is -->')
+    assert not RUN_STATS.pop_updates()[2]['splice_fallbacks']
@@ -0,0 +1,138 @@
+"""
+Tests of the run stats and of the run report
+"""
+import json
+import time
+
+import pytest
+
+from attrs_converter.cache import DOMAIN_CACHE
+from attrs_converter import modules, views
+from attrs_converter.cli import main
+from attrs_converter.stats import RUN_STATS, RunStats
+
+VIEW = """<odoo>
+    <record id="view_form" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <form>
+                <field name="name" attrs="{'invisible': [('state', '=', 'draft')]}"/>
+                <button name="action_done" states="draft"/>
+            </form>
+        </field>
+    </record>
+    <record id="view_form_inherit" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <field name="name" position="attributes">
+                <attribute name="attrs">{'readonly': [('state', '=', 'done')]}</attribute>
+            </field>
+        </field>
+    </record>
+</odoo>
+"""
+
+
+class Clock:
+    """
+    Clock advanced by the tests, for both the wall and the CPU time
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(time, 'perf_counter', clock)
+    monkeypatch.setattr(time, 'process_time', clock)
+    return clock
+
+
+def test_nested_phases(clock):
+    stats = RunStats()
+    with stats.phase('read'):
+        clock.now += 1
+        with stats.phase('parse'):
+            clock.now += 2
+            with stats.phase('xpath'):
+                clock.now += 4
+        with stats.phase('parse'):
+            clock.now += 8
+    # The time of the nested phases is excluded, so the phases add up to the time spent in all of them
+    assert stats.phases == {'xpath': [4, 4, 1], 'parse': [10, 10, 2], 'read': [1, 1, 1]}
+
+
+def test_file_times_and_counters(clock):
+    stats = RunStats()
+    for file_path, seconds in [('a.xml', 1), ('b.xml', 3), ('a.xml', 4)]:
+        with stats.file(file_path):
+            clock.now += seconds
+    stats.count('files_converted')
+    stats.count('attrs_tags', 3)
+    stats.count('attrs_tags', 2)
+    report = stats.get_report(slowest=1)
+    assert report['slowest_files'] == [{'path': 'a.xml', 'seconds': 5}]
+    assert report['file_times'] == {'a.xml': 5, 'b.xml': 3}
+    assert report['counters'] == {'attrs_tags': 5, 'files_converted': 1}
+
+
+def test_merge_updates(clock):
+    worker_stats, main_stats = RunStats(), RunStats()
+    with main_stats.phase('walk'):
+        clock.now += 1
+    for _ in range(2):
+        with worker_stats.phase('parse'), worker_stats.file('a.xml'):
+            clock.now += 2
+        worker_stats.count('attrs_tags')
+        main_stats.merge_updates(worker_stats.pop_updates())
+    assert worker_stats.pop_updates() == ({}, {}, {})
+    assert main_stats.phases == {'walk': [1, 1, 1], 'parse': [4, 4, 2]}
+    assert main_stats.file_times == {'a.xml': 4}
+    assert main_stats.counters == {'attrs_tags': 2}
+
+
+def get_report(tmp_path, name, *args):
+    module = tmp_path / name
+    (module / 'views').mkdir(parents=True)
+    for i in range(3):
+        (module / 'views' / f'view_{i}.xml').write_text(VIEW)
+    (module / '__manifest__.py').write_text("{'name': 'Module', 'version': '16.0.1.0.0'}\n")
+    report_path = tmp_path / f'{name}.json'
+    RUN_STATS.pop_updates()
+    DOMAIN_CACHE.entries.clear()
+    DOMAIN_CACHE.pop_updates()
+    views.VIEW_INDEX = views.ViewIndex()
+    modules.MODULE_GRAPH = modules.ModuleGraph()
+    assert main([str(module), '--yes', '--passes', 'attrs,manifest', '--report', str(report_path), *args]) == 0
+    with open(report_path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def test_report(tmp_path):
+    report = get_report(tmp_path, 'module', '--slowest', '2', '--cache', str(tmp_path / 'cache.json'))
+    assert report['counters'] == {
+        'attrs_tags': 3, 'attrs_overrides': 3, 'states_tags': 3, 'states_overrides': 0,
+        'files_converted': 3, 'manifests_updated': 1, 'indexed_views': 2, 'modules': 1,
+    }
+    assert {'walk', 'index', 'graph', 'read', 'parse', 'classify', 'write', 'manifest'} <= set(report['phases'])
+    assert report['files_by_role']['view_xml'] == 3 and report['files_by_role']['manifest'] == 1
+    # The same attrs values are converted once
+    assert report['caches']['domains'] == {'hits': 4, 'misses': 2, 'hit_rate': 0.6667}
+    assert report['caches']['conversion'] == {'hits': 0, 'misses': 3, 'hit_rate': 0.0}
+    assert len(report['slowest_files']) == 2 and len(report['file_times']) == 4
+    assert report['passes'] == ['attrs', 'manifest'] and not report['dry_run']
+
+
+def test_report_jobs(tmp_path):
+    """
+    The stats of the worker processes are merged into the report
+    """
+    report = get_report(tmp_path, 'serial', '--no-cache')
+    jobs_report = get_report(tmp_path, 'jobs_2', '--no-cache', '--jobs', '2')
+    assert jobs_report['counters'] == report['counters']
+    # Except the domains, converted again by each worker that finds them
+    assert {name: phase['calls'] for name, phase in jobs_report['phases'].items() if name != 'domains'} == \
+        {name: phase['calls'] for name, phase in report['phases'].items() if name != 'domains'}
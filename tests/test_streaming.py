@@ -0,0 +1,147 @@
+"""
+Tests of the streaming conversion, which must give the same contents as the conversion in memory
+"""
+import io
+import os
+import shutil
+
+import argparse
+
+import pytest
+
+from attrs_converter import processing
+from attrs_converter.cli import main, parse_stream_threshold
+from attrs_converter.processing import stream_file
+from attrs_converter.stats import RUN_STATS
+from attrs_converter.splice import convert_xml_contents
+from attrs_converter.streaming import stream_xml_file
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VIEWS = """<odoo>
+    <data noupdate="1">
+        <record id="view_order_form" model="ir.ui.view">
+            <field name="arch" type="xml">
+                <form>
+                    <field name="partner_id" attrs="{'readonly': [('state', '!=', 'draft')]}"/>
+                    <button name="action_confirm" states="draft,sent" type="object"/>
+                </form>
+            </field>
+        </record>
+        <!-- Between the records -->
+        <record id="view_order_tree" model="ir.ui.view">
+            <field name="arch" type="xml">
+                <tree>
+                    <field name="name" attrs="{'invisible': [('active', '=', False)], 'required': 1}"/>
+                </tree>
+            </field>
+        </record>
+    </data>
+    <data>
+        <menuitem id="menu_orders" name="Orders &amp; quotations"/>
+    </data>
+</odoo>
+"""
+
+
+def stream_contents(file_path):
+    output = io.StringIO(newline='')
+    converter = stream_xml_file(str(file_path), output)
+    return converter, output.getvalue().encode('utf-8')
+
+
+@pytest.mark.parametrize('contents', [
+    VIEWS,
+    VIEWS.replace('\n', '\r\n'),
+    "<?xml version='1.0' encoding='utf-8'?>\n" + VIEWS,
+    '<?xml version="1.0" encoding="UTF-8"?>\n<!-- Header -->\n' + VIEWS,
+], ids=['plain', 'windows', 'declaration', 'header'])
+def test_stream_identical_to_memory(tmp_path, contents):
+    file_path = tmp_path / 'views.xml'
+    file_path.write_bytes(contents.encode('utf-8'))
+    converter, streamed = stream_contents(file_path)
+    assert converter.converted_tags == 3
+    assert streamed == convert_xml_contents(contents)
+
+
+def test_stream_identical_to_memory_testfile(tmp_path):
+    file_path = tmp_path / 'testfile.xml'
+    shutil.copyfile(os.path.join(ROOT_DIRECTORY, 'testfile.xml'), file_path)
+    tags_found, tags_replaced_by, memory_tags_found, memory_tags_replaced_by = [], [], [], []
+    output = io.StringIO(newline='')
+    converter = stream_xml_file(str(file_path), output, tags_found, tags_replaced_by)
+    contents = file_path.read_bytes().decode('utf-8')
+    assert output.getvalue().encode('utf-8') == convert_xml_contents(contents, memory_tags_found, memory_tags_replaced_by)
+    assert (tags_found, tags_replaced_by) == (memory_tags_found, memory_tags_replaced_by)
+    assert converter.converted_tags == len(tags_replaced_by)
+
+
+def test_stream_nothing_to_convert(tmp_path):
+    file_path = tmp_path / 'views.xml'
+    file_path.write_text(VIEWS.replace('attrs=', 'domain=').replace('states=', 'groups='), encoding='utf-8')
+    converter, streamed = stream_contents(file_path)
+    assert not converter.converted_tags
+    assert not streamed
+
+
+@pytest.mark.parametrize('contents', [
+    '',
+    '\ufeff' + VIEWS,
+    "<!-- Header -->\n<?xml version='1.0' encoding='latin-1'?>" + VIEWS,
+], ids=['empty', 'bom', 'late-declaration'])
+def test_stream_fallback_to_memory(tmp_path, contents):
+    file_path = tmp_path / 'views.xml'
+    file_path.write_bytes(contents.encode('utf-8'))
+    assert stream_contents(file_path)[0] is None
+
+
+def test_main_streamed_same_as_memory(tmp_path):
+    contents = {}
+    for name, stream_threshold in (('memory', '16'), ('stream', '0.000001')):
+        module = tmp_path / name / 'module'
+        (module / 'views').mkdir(parents=True)
+        (module / 'views' / 'views.xml').write_text(VIEWS, encoding='utf-8')
+        (module / 'views' / 'broken.xml').write_text('<odoo attrs="{}"><record></odoo>\n', encoding='utf-8')
+        assert main([str(module), '--yes', '--passes', 'attrs,tree', '--no-cache', '--stream-threshold', stream_threshold]) == 1
+        contents[name] = {p.name: p.read_bytes() for p in (module / 'views').iterdir()}
+    assert contents['stream'] == contents['memory']
+    # Without temporary file left
+    assert sorted(contents['stream']) == ['broken.xml', 'views.xml']
+
+
+def test_stream_file_invalid_falls_back(tmp_path):
+    file_path = tmp_path / 'broken.xml'
+    file_path.write_text('<odoo attrs="{}"><record></odoo>\n', encoding='utf-8')
+    RUN_STATS.pop_updates()
+    result = stream_file(str(file_path), ['attrs'])
+    # Reported by the conversion in memory
+    assert result.contents is None and result.attrs_error
+    assert result.stats_updates[2]['stream_fallbacks'] == 1
+    assert os.listdir(tmp_path) == ['broken.xml']
+
+
+def test_stream_file_error_returned(tmp_path, monkeypatch):
+    def failing_stream_xml_file(file_path, output, *args):
+        output.write('<odoo>')
+        raise OSError('No space left on device')
+    monkeypatch.setattr(processing, 'stream_xml_file', failing_stream_xml_file)
+    monkeypatch.setattr(processing, 'process_file', None)
+    file_path = tmp_path / 'views.xml'
+    file_path.write_text(VIEWS, encoding='utf-8')
+    RUN_STATS.pop_updates()
+    result = stream_file(str(file_path), ['attrs'])
+    # Without converting the file again in memory, nor leaving the temporary file
+    assert result.contents is None and result.attrs_error == 'No space left on device'
+    assert not result.stats_updates[2].get('stream_fallbacks')
+    assert os.listdir(tmp_path) == ['views.xml'] and file_path.read_text(encoding='utf-8') == VIEWS
+
+
+@pytest.mark.parametrize('value, size', [('0', 0), ('16', 16 * 1024 * 1024), ('0.5', 512 * 1024), ('0.000001', 1)])
+def test_parse_stream_threshold(value, size):
+    assert parse_stream_threshold(value) == size
+
+
+@pytest.mark.parametrize('value', ['-1', 'inf', 'nan', '0.0000001', 'big'])
+def test_parse_invalid_stream_threshold(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_stream_threshold(value)
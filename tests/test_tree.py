@@ -0,0 +1,134 @@
+"""
+Tests of the replacement of the tree views by list views
+"""
+import pytest
+
+from attrs_converter.cli import main
+
+from attrs_converter.tree import (
+    get_tree_rewriter, replace_tree_in_view_mode, replace_tree_with_list_in_js, replace_tree_with_list_in_python,
+    replace_tree_with_list_in_xml,
+)
+
+
+@pytest.mark.parametrize('value, new_value', [
+    ('tree', 'list'),
+    ('tree,form', 'list,form'),
+    ('kanban, tree ,form', 'kanban, list ,form'),
+    ('list,form', 'list,form'),
+    ('tree_view', 'tree_view'),
+    ('tree,unknown', 'tree,unknown'),
+    ('Tree', 'Tree'),
+])
+def test_replace_tree_in_view_mode(value, new_value):
+    assert replace_tree_in_view_mode(value) == new_value
+
+
+@pytest.mark.parametrize('contents, new_contents', [
+    ('<tree string="Lines" editable="bottom">\n    <field name="name"/>\n</tree>',
+     '<list string="Lines" editable="bottom">\n    <field name="name"/>\n</list>'),
+    ('<tree/>', '<list/>'),
+    ('<treeview/><tree_custom></tree_custom>', '<treeview/><tree_custom></tree_custom>'),
+    ('<field name="view_mode">tree,form</field>', '<field name="view_mode">list,form</field>'),
+    ("<field name='view_type'>tree</field>", "<field name='view_type'>list</field>"),
+    ('<field name="type">tree</field>', '<field name="type">list</field>'),
+    ('<field name="name">tree</field>', '<field name="name">tree</field>'),
+    ('<field name="line_ids" mode="tree,kanban"/>', '<field name="line_ids" mode="list,kanban"/>'),
+    ('<field name="line_ids"\n       mode="tree"/>', '<field name="line_ids"\n       mode="list"/>'),
+    # Only the mode attribute itself
+    ('<div data-mode="tree" t-att-mode="tree"/>', '<div data-mode="tree" t-att-mode="tree"/>'),
+    ('<field name="line_ids" mode="tree_custom"/>', '<field name="line_ids" mode="tree_custom"/>'),
+    ('<xpath expr="//tree/field[@name=\'name\']" position="after"/>', '<xpath expr="//list/field[@name=\'name\']" position="after"/>'),
+    ('<xpath expr="//field[@name=\'line_ids\']/tree" position="inside"/>', '<xpath expr="//field[@name=\'line_ids\']/list" position="inside"/>'),
+    ('<xpath expr="//div[hasclass(\'tree\')] | //tree[@name=\'tree\']"/>', '<xpath expr="//div[hasclass(\'tree\')] | //list[@name=\'tree\']"/>'),
+    ("<xpath expr='descendant::tree[1]/field[tree]'/>", "<xpath expr='descendant::list[1]/field[list]'/>"),
+    # Attributes, functions, names and prefixed steps aren't tree elements
+    ('<xpath expr="//field[@tree]/tree-view/x:tree/tree.node/treeish"/>', '<xpath expr="//field[@tree]/tree-view/x:tree/tree.node/treeish"/>'),
+    ('<xpath expr="//field[tree()]"/>', '<xpath expr="//field[tree()]"/>'),
+    # Ids, names, data files and texts are kept
+    ('<record id="view_order_tree" model="ir.ui.view">', '<record id="view_order_tree" model="ir.ui.view">'),
+    ('<field name="view_id" ref="sale.view_order_tree"/>', '<field name="view_id" ref="sale.view_order_tree"/>'),
+    ('<p>The tree of categories</p>', '<p>The tree of categories</p>'),
+])
+def test_replace_tree_with_list_in_xml(contents, new_contents):
+    assert replace_tree_with_list_in_xml(contents) == new_contents
+
+
+@pytest.mark.parametrize('contents, new_contents', [
+    ("action = {'view_mode': 'tree,form', 'views': [(False, 'tree')]}\n",
+     "action = {'view_mode': 'list,form', 'views': [(False, 'list')]}\n"),
+    ('view_mode = """tree,kanban"""\n', 'view_mode = """list,kanban"""\n'),
+    ("tree_view_id = self.env.ref('module.view_tree').id\n", "tree_view_id = self.env.ref('module.view_tree').id\n"),
+    ("# 'tree' views\nx = b'tree' + f'tree'\n", "# 'tree' views\nx = b'tree' + f'tree'\n"),
+    ("x = 'tree' if (\n", "x = 'tree' if (\n"),
+    # Keyword arguments, assignments, comparisons, dict keys and subscript assignments
+    ("self.open_view(view_mode='tree', default_view_type=\"tree,form\")\n",
+     "self.open_view(view_mode='list', default_view_type=\"list,form\")\n"),
+    ("if view_type == 'tree' or view_mode != 'kanban,tree':\n    pass\n", "if view_type == 'list' or view_mode != 'kanban,list':\n    pass\n"),
+    ("action['view_mode'] = 'tree,form'\n", "action['view_mode'] = 'list,form'\n"),
+    ("action['name'] = 'tree'\nactions[0]['view_mode'] = 'tree'\n", "action['name'] = 'tree'\nactions[0]['view_mode'] = 'list'\n"),
+    ("context = {\n    'default_view_mode': 'tree',\n    'mode': 'tree',\n}\n", "context = {\n    'default_view_mode': 'list',\n    'mode': 'tree',\n}\n"),
+    # The views of an action, at any depth
+    ("return dict(views=[(self.env.ref('module.view').id, 'tree'), (False, 'form')])\n",
+     "return dict(views=[(self.env.ref('module.view').id, 'list'), (False, 'form')])\n"),
+    ("action['views'] = [(False, 'tree')] + [(False, 'tree')]\n", "action['views'] = [(False, 'list')] + [(False, 'tree')]\n"),
+    # Selection values and other literals
+    ("state = fields.Selection([('tree', 'Tree'), ('list', 'List')])\nx = 'tree'\n",
+     "state = fields.Selection([('tree', 'Tree'), ('list', 'List')])\nx = 'tree'\n"),
+    ("if mode == 'tree':\n    return {'type': 'tree', 'views': 'tree'}\n", "if mode == 'tree':\n    return {'type': 'tree', 'views': 'tree'}\n"),
+])
+def test_replace_tree_with_list_in_python(contents, new_contents):
+    assert replace_tree_with_list_in_python(contents) == new_contents
+
+
+@pytest.mark.parametrize('contents, new_contents', [
+    ('this.action = {views: [[false, "tree"], [false, \'form\']]};\n',
+     'this.action = {views: [[false, "list"], [false, \'form\']]};\n'),
+    ('// views: [[false, "tree"]]\n/* "tree" */\n', '// views: [[false, "tree"]]\n/* "tree" */\n'),
+    ('const html = `<div class="tree">${"tree"}</div>`;\n', 'const html = `<div class="tree">${"tree"}</div>`;\n'),
+    ('const name = "tree_view";\n', 'const name = "tree_view";\n'),
+    # View modes and types, and the views of actions at any depth
+    ('if (this.props.viewType === "tree" || viewMode != \'tree,form\') {\n', 'if (this.props.viewType === "list" || viewMode != \'list,form\') {\n'),
+    ('doAction({"view_mode": "tree,kanban", views: [[false, "tree"], [false, "form"]]}, [false, "tree"]);\n',
+     'doAction({"view_mode": "list,kanban", views: [[false, "list"], [false, "form"]]}, [false, "tree"]);\n'),
+    ("action.views = [[this.viewId, 'tree']];\n", "action.views = [[this.viewId, 'list']];\n"),
+    # Other strings equal to a view type
+    ("el.setAttribute('role', 'tree');\nconst type = {type: 'tree', name: 'tree'};\n", "el.setAttribute('role', 'tree');\nconst type = {type: 'tree', name: 'tree'};\n"),
+    # Regex literals aren't taken for strings, nor divisions for regex literals
+    ("const re = /'/; x = {viewType: 'tree'};\n", "const re = /'/; x = {viewType: 'list'};\n"),
+    ('const re = /[/"]tree/g, y = {viewType: "tree"};\n', 'const re = /[/"]tree/g, y = {viewType: "list"};\n'),
+    ("return /'/.test(s) ? {viewType: 'tree'} : null;\n", "return /'/.test(s) ? {viewType: 'list'} : null;\n"),
+    ("const half = width / 2, rate = (a + b) / c / d; action.viewType = 'tree';\n",
+     "const half = width / 2, rate = (a + b) / c / d; action.viewType = 'list';\n"),
+])
+def test_replace_tree_with_list_in_js(contents, new_contents):
+    assert replace_tree_with_list_in_js(contents) == new_contents
+
+
+@pytest.mark.parametrize('file_path, rewriter', [
+    ('module/views/views.xml', replace_tree_with_list_in_xml),
+    ('module/data/DATA.XML', replace_tree_with_list_in_xml),
+    ('module/models/model.py', replace_tree_with_list_in_python),
+    ('module/static/src/js/action.js', replace_tree_with_list_in_js),
+    ('module/__manifest__.py', None),
+    ('module/static/src/scss/tree.scss', None),
+    ('module/README.md', None),
+])
+def test_get_tree_rewriter(file_path, rewriter):
+    assert get_tree_rewriter(file_path) is rewriter
+
+
+def test_tree_pass(tmp_path):
+    files = {
+        'views/views.xml': ('<tree><field name="name"/></tree>\n', '<list><field name="name"/></list>\n'),
+        'models/model.py': ("view_mode = 'tree,form'\n", "view_mode = 'list,form'\n"),
+        'static/src/action.js': ('const views = [[false, "tree"]];\n', 'const views = [[false, "list"]];\n'),
+        'static/src/tree.scss': ('.o_tree { }\n', '.o_tree { }\n'),
+        '__manifest__.py': ("{'name': 'Module', 'data': ['views/tree.xml']}\n", "{'name': 'Module', 'data': ['views/tree.xml']}\n"),
+    }
+    for file_path, (contents, _new_contents) in files.items():
+        (tmp_path / file_path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / file_path).write_text(contents)
+    assert main([str(tmp_path), '--yes', '--passes', 'tree']) == 0
+    assert {file_path: (tmp_path / file_path).read_text() for file_path in files} == \
+        {file_path: new_contents for file_path, (_contents, new_contents) in files.items()}
@@ -0,0 +1,145 @@
+"""
+Tests of the verification of the converted domains against their expressions
+"""
+import json
+
+import pytest
+
+from attrs_converter import verify
+from attrs_converter.cli import main
+from attrs_converter.domains import parse_attrs
+from attrs_converter.stats import RUN_STATS
+from attrs_converter.verify import DomainVerifier, get_verification_candidates, match_domain_leaf, verify_domain
+
+# Domains with the expressions they are converted to
+EQUIVALENT = [
+    ("[('state', '=', 'draft')]", "state == 'draft'"),
+    ("[('state', 'not in', ['draft', 'done'])]", "state not in ['draft', 'done']"),
+    ("['|', ('a', '=', False), ('b', '>', 3)]", "not a or b > 3"),
+    ("['!', '&', ('a', '=', True), ('b', '<=', 1.5)]", "not (a and b <= 1.5)"),
+    ("[('partner_id', '=', parent.partner_id), ('name', 'ilike', 'x')]",
+     "partner_id == parent.partner_id and 'x' in (name or '').lower()"),
+    ("['|', '|', ('a', '=', 1), ('b', '=', 2), '|', ('c', '=', 3), '|', ('d', '=', 4), '|', ('e', '=', 5), ('f', '!=', 6)]",
+     "a == 1 or b == 2 or c == 3 or d == 4 or e == 5 or f != 6"),
+]
+# Domains with wrongly converted expressions
+MISMATCHES = [
+    ("[('state', '=', 'draft')]", "state != 'draft'"),
+    ("[('a', '!=', 3)]", "a > 3"),
+    ("['|', ('a', '=', 1), ('b', '=', 2), ('c', '=', 3), ('d', '=', 4), ('e', '=', 5)]",
+     "(a == 1 or b == 2) and c == 3 and d == 4 and e != 5"),
+]
+
+
+def get_domain(attrs):
+    return parse_attrs(f"{{'invisible': {attrs}}}")['invisible']
+
+
+@pytest.fixture(params=['numpy', 'scalar'])
+def evaluation(request, monkeypatch):
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+        # Every assignment batch is evaluated with numpy arrays
+        monkeypatch.setattr(verify, 'NUMPY_MIN_ASSIGNMENTS', 1)
+    else:
+        monkeypatch.setattr(verify, 'numpy', None)
+    return request.param
+
+
+def test_match_domain_leaf():
+    assert match_domain_leaf('=', False, False) and match_domain_leaf('=', [], False)
+    assert not match_domain_leaf('=', 1, True) and match_domain_leaf('=', True, True)
+    assert match_domain_leaf('in', [1, 2], [2, 3]) and match_domain_leaf('not in', 'a', ['b'])
+    assert not match_domain_leaf('<', False, 'a')
+    assert match_domain_leaf('=?', 'a', False) and match_domain_leaf('not ilike', 'ABC', 'd')
+    with pytest.raises(ValueError):
+        match_domain_leaf('child_of', 1, 1)
+
+
+def test_get_verification_candidates():
+    candidates = get_verification_candidates(get_domain("[('state', '=', 'draft'), ('amount', '>', 3)]"))
+    assert candidates == {'state': [False, 'draft', 'DRAFT', '_draft_', 'raft'], 'amount': [False, 2, 3, 4]}
+    # Unset fields only compared with False are also tried set
+    assert get_verification_candidates(get_domain("[('partner_id', '=', False)]")) == {'partner_id': [False, True]}
+
+
+@pytest.mark.parametrize('attrs, expression', EQUIVALENT)
+def test_verify_equivalent(evaluation, attrs, expression):
+    size, mismatch = verify_domain(get_domain(attrs), expression)
+    assert size > 1 and mismatch is None
+
+
+@pytest.mark.parametrize('attrs, expression', MISMATCHES)
+def test_verify_mismatch(evaluation, attrs, expression):
+    _size, (assignment, expected, actual) = verify_domain(get_domain(attrs), expression)
+    # A counterexample, for which the domain and the expression differ
+    assert expected is not actual and set(assignment) <= {'state', 'a', 'b', 'c', 'd', 'e'}
+
+
+@pytest.mark.parametrize('attrs, expression', EQUIVALENT + MISMATCHES)
+def test_numpy_same_as_scalar(monkeypatch, attrs, expression):
+    pytest.importorskip('numpy')
+    monkeypatch.setattr(verify, 'NUMPY_MIN_ASSIGNMENTS', 1)
+    result = verify_domain(get_domain(attrs), expression)
+    monkeypatch.setattr(verify, 'numpy', None)
+    # Same number of assignments and same first counterexample
+    assert verify_domain(get_domain(attrs), expression) == result
+
+
+def test_verify_raising_expression(evaluation):
+    # 'a' < False raises a TypeError, where the domain is only False
+    _size, (assignment, expected, actual) = verify_domain(get_domain("[('a', '<', 'b')]"), "a < 'b'")
+    assert assignment == {'a': False} and expected is False and actual.startswith('TypeError: ')
+
+
+def test_verify_unknown_names():
+    with pytest.raises(ValueError):
+        verify_domain(get_domain("[('state', '=', 'draft')]"), "other == 'draft'")
+    with pytest.raises(ValueError):
+        verify_domain(get_domain("[('state', '=', 'draft')]"), "__import__('os')")
+
+
+def test_domain_verifier():
+    RUN_STATS.pop_updates()
+    verifier = DomainVerifier()
+    verifier.file_path = 'a.xml'
+    attrs = "{'invisible': [('state', '=', 'draft')], 'readonly': [('state', '!=', 'done')]}"
+    verifier.verify(attrs, {'invisible': "state == 'draft'", 'readonly': "state == 'done'"})
+    verifier.file_path = 'b.xml'
+    verifier.verify(attrs, {'invisible': "state == 'draft'", 'readonly': "state == 'done'"})
+    counters = RUN_STATS.pop_updates()[2]
+    # Each attrs value is only verified once
+    assert counters['verified_attributes'] == 2 and counters['verification_mismatches'] == 1
+    [mismatch] = verifier.get_report()
+    assert mismatch['attribute'] == 'readonly' and mismatch['files'] == ['a.xml', 'b.xml']
+    assert mismatch['domain_result'] is not mismatch['expression_result']
+
+    # The verifications of a worker are merged into the main process
+    main_verifier = DomainVerifier()
+    main_verifier.merge_updates(verifier.pop_updates())
+    assert main_verifier.get_report() == verifier.get_report()
+    assert verifier.pop_updates() == (set(), {}, {})
+
+
+def test_main_verify(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(verify, 'DOMAIN_VERIFIER', DomainVerifier())
+    module = tmp_path / 'module'
+    (module / 'views').mkdir(parents=True)
+    (module / 'views' / 'views.xml').write_text("""<odoo><form>
+    <field name="name" attrs="{'invisible': [('state', 'in', ['draft', 'sent'])], 'readonly': [('amount', '>', 0)]}"/>
+</form></odoo>
+""")
+    assert main([str(module), '--yes', '--no-cache', '--dry-run', '--verify']) == 0
+    output = capsys.readouterr().out
+    assert 'Verified 2 converted attributes of 1 distinct attrs values' in output and 'No mismatches' in output
+
+    # A conversion giving wrong expressions is reported, and fails the run
+    monkeypatch.setattr(verify, 'DOMAIN_VERIFIER', DomainVerifier())
+    monkeypatch.setattr(verify, 'verify_domain', lambda domain, expression: (2, ({'state': 'draft'}, True, False)))
+    report_file = tmp_path / 'report.json'
+    assert main([str(module), '--yes', '--no-cache', '--dry-run', '--verify', '--report', str(report_file)]) == 1
+    output = capsys.readouterr().out
+    assert "With state='draft': the domain is True, the expression is False" in output
+    mismatches = json.loads(report_file.read_text())['verification_mismatches']
+    assert [mismatch['attribute'] for mismatch in mismatches] == ['invisible', 'readonly']
+    assert mismatches[0]['files'] == [str(module / 'views' / 'views.xml')]
@@ -0,0 +1,239 @@
+from lxml import etree
+
+from attrs_converter import views
+from attrs_converter.cli import main
+from attrs_converter.convert import convert_document
+from attrs_converter.views import ViewIndex, get_child_tag_at_index, get_inherited_attributes, get_inherited_tag_type, get_parent_etree_node, \
+    get_sibling_attribute_tag_of_type
+
+INHERITED_VIEW = """<odoo>
+    <record id="view_form_inherit" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <xpath expr="//form/sheet/button[@name='action_done']" position="attributes">
+                <attribute name="attrs">{'invisible': [('state', '=', 'done')]}</attribute>
+                <attribute name="required">1</attribute>
+            </xpath>
+            <field name="partner_id" position="attributes">
+                <attribute name="readonly">1</attribute>
+            </field>
+            <xpath expr="//field[@name='date']/.." position="attributes">
+                <attribute name="invisible">1</attribute>
+            </xpath>
+        </field>
+    </record>
+</odoo>
+"""
+
+
+def get_attribute_tags():
+    doc = etree.fromstring(INHERITED_VIEW)
+    return doc, doc.xpath('//attribute')
+
+
+def test_get_parent_etree_node():
+    doc, (attrs, required, readonly, invisible) = get_attribute_tags()
+    xpath = attrs.getparent()
+    # The first child is indented by the text of its parent, the next ones by the tail of their previous sibling
+    assert get_parent_etree_node(doc, attrs) == (0, xpath, '\n                ')
+    assert get_parent_etree_node(doc, required) == (1, xpath, '\n                ')
+    assert get_parent_etree_node(doc, readonly) == (0, readonly.getparent(), '\n                ')
+    assert get_parent_etree_node(doc, doc) is None
+    # Still right after nodes are inserted
+    xpath.insert(0, etree.Comment('TODO'))
+    assert get_parent_etree_node(doc, required)[0] == 2
+
+
+def test_get_child_tag_at_index():
+    doc, (attrs, required, _readonly, _invisible) = get_attribute_tags()
+    assert get_child_tag_at_index(attrs.getparent(), 1) is required
+    assert get_child_tag_at_index(attrs.getparent(), 2) is None
+    assert get_child_tag_at_index(attrs.getparent(), -1) is None
+
+
+def test_get_sibling_attribute_tag_of_type():
+    doc, (attrs, required, readonly, _invisible) = get_attribute_tags()
+    assert get_sibling_attribute_tag_of_type(doc, attrs, 'required') is required
+    assert get_sibling_attribute_tag_of_type(doc, required, 'attrs') is attrs
+    # Only the attribute tags of the same parent
+    assert get_sibling_attribute_tag_of_type(doc, attrs, 'readonly') is None
+    assert get_sibling_attribute_tag_of_type(doc, readonly, 'required') is None
+
+
+def test_get_inherited_tag_type():
+    doc, (attrs, _required, readonly, invisible) = get_attribute_tags()
+    assert get_inherited_tag_type(doc, attrs) == 'button'
+    assert get_inherited_tag_type(doc, readonly) == 'field'
+    assert get_inherited_tag_type(doc, invisible) is None
+
+
+def test_many_overrides():
+    """
+    Every override of a big inherited view is converted on its own
+    """
+    xpaths = ''.join(f"""
+            <xpath expr="//field[@name='field_{i}']" position="attributes">
+                <attribute name="attrs">{{'readonly': [('state', '=', 'state_{i}')]}}</attribute>
+                <attribute name="invisible">1</attribute>
+            </xpath>""" for i in range(300))
+    doc = etree.fromstring(f'<odoo>\n    <data>{xpaths}\n    </data>\n</odoo>')
+    convert_document(doc)
+    for i, xpath in enumerate(doc.xpath('//xpath')):
+        attributes = {tag.get('name'): tag.text for tag in xpath.iterchildren('attribute')}
+        assert attributes == {'readonly': f"state == 'state_{i}'", 'invisible': '1', 'required': None, 'column_invisible': None}
+
+
+BASE_VIEW = """<odoo>
+    <record id="view_order_form" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <form>
+                <field name="state"/>
+                <field name="partner_id" attrs="{'readonly': [('state', '!=', 'draft')]}" states="draft,sent"/>
+                <field name="note" invisible="1"/>
+            </form>
+        </field>
+    </record>
+</odoo>"""
+
+
+def get_view(xmlid, inherit_id, arch):
+    return f"""
+    <record id="{xmlid}" model="ir.ui.view">
+        <field name="inherit_id" ref="{inherit_id}"/>
+        <field name="arch" type="xml">{arch}</field>
+    </record>"""
+
+
+def get_index(*documents):
+    view_index = ViewIndex()
+    for module, document in documents:
+        view_index.add_document(etree.fromstring(document), module)
+    # Without any file, only indexes the inheritance of the added views
+    view_index.build([], [])
+    return view_index
+
+
+def test_lookup_base_view():
+    view_index = get_index(('sale', BASE_VIEW), ('sale_extra', '<odoo>%s</odoo>' % get_view(
+        'view_order_form_extra', 'sale.view_order_form',
+        '<field name="partner_id" position="attributes"><attribute name="required">1</attribute></field>',
+    )))
+    assert view_index.lookup('sale_extra.view_order_form_extra', ('field', 'partner_id')) == {
+        'attrs': "{'readonly': [('state', '!=', 'draft')]}", 'states': 'draft,sent',
+    }
+    assert view_index.lookup('sale_extra.view_order_form_extra', ('field', 'note')) == {'invisible': '1'}
+    assert view_index.lookup('sale_extra.view_order_form_extra', ('field', 'missing')) is None
+    assert not view_index.has_other_overrides('sale_extra.view_order_form_extra', ('field', 'partner_id'))
+
+
+def test_lookup_applies_parent_overrides():
+    view_index = get_index(('sale', BASE_VIEW), ('sale_extra', '<odoo>%s%s</odoo>' % (
+        get_view('view_order_form_first', 'sale.view_order_form', """
+            <xpath expr="//field[@name='partner_id']" position="attributes">
+                <attribute name="attrs">{'invisible': [('state', '=', 'done')]}</attribute>
+                <attribute name="states"></attribute>
+            </xpath>"""),
+        get_view('view_order_form_second', 'view_order_form_first',
+                 '<field name="partner_id" position="attributes"><attribute name="required">1</attribute></field>'),
+    )))
+    assert view_index.lookup('sale_extra.view_order_form_second', ('field', 'partner_id')) == {
+        'attrs': "{'invisible': [('state', '=', 'done')]}",
+    }
+    assert view_index.inherits_from('sale_extra.view_order_form_second', 'sale.view_order_form')
+    assert view_index.get_root('sale_extra.view_order_form_second') == 'sale.view_order_form'
+
+
+def test_lookup_ambiguous_sibling_override():
+    # Other views overriding the same tag may be applied before the view, depending on the module dependencies
+    view_index = get_index(('sale', BASE_VIEW), ('sale_extra', '<odoo>%s%s</odoo>' % (
+        get_view('view_order_form_first', 'sale.view_order_form',
+                 '<field name="partner_id" position="attributes"><attribute name="readonly">1</attribute></field>'),
+        get_view('view_order_form_second', 'sale.view_order_form',
+                 '<field name="partner_id" position="attributes"><attribute name="required">1</attribute></field>'),
+    )))
+    assert view_index.lookup('sale_extra.view_order_form_second', ('field', 'partner_id')) is None
+    assert view_index.has_other_overrides('sale_extra.view_order_form_second', ('field', 'partner_id'))
+    # Other tags are still resolved
+    assert view_index.lookup('sale_extra.view_order_form_second', ('field', 'note')) == {'invisible': '1'}
+
+
+def test_lookup_ambiguous_definitions():
+    view_index = get_index(('sale', BASE_VIEW), ('sale_extra', '<odoo>%s%s</odoo>' % (
+        get_view('view_order_form_first', 'sale.view_order_form',
+                 '<field name="note" position="after"><field name="partner_id"/></field>'),
+        get_view('view_order_form_second', 'view_order_form_first',
+                 '<field name="partner_id" position="attributes"><attribute name="required">1</attribute></field>'),
+    )))
+    assert view_index.lookup('sale_extra.view_order_form_second', ('field', 'partner_id')) is None
+
+
+def test_lookup_unresolved_override():
+    # Overrides of tags that aren't located by name may apply to any tag of the view
+    view_index = get_index(('sale', BASE_VIEW), ('sale_extra', '<odoo>%s%s</odoo>' % (
+        get_view('view_order_form_first', 'sale.view_order_form',
+                 '<xpath expr="//form/field[2]" position="attributes"><attribute name="invisible">1</attribute></xpath>'),
+        get_view('view_order_form_second', 'sale.view_order_form',
+                 '<field name="partner_id" position="attributes"><attribute name="required">1</attribute></field>'),
+    )))
+    assert view_index.lookup('sale_extra.view_order_form_second', ('field', 'partner_id')) is None
+
+
+def test_lookup_parent_outside_index():
+    view_index = get_index(('sale_extra', '<odoo>%s</odoo>' % get_view(
+        'view_order_form_extra', 'sale.view_order_form',
+        '<field name="partner_id" position="attributes"><attribute name="required">1</attribute></field>',
+    )))
+    assert view_index.lookup('sale_extra.view_order_form_extra', ('field', 'partner_id')) is None
+    assert view_index.get_root('sale_extra.view_order_form_extra') == 'sale.view_order_form'
+
+
+def write_modules(tmp_path, override):
+    for module, document in (('sale', BASE_VIEW), ('sale_extra', '<odoo>%s</odoo>' % get_view(
+        'view_order_form_extra', 'sale.view_order_form', f'<field name="partner_id" position="attributes">{override}</field>',
+    ))):
+        (tmp_path / module / 'views').mkdir(parents=True)
+        (tmp_path / module / '__manifest__.py').write_text("{'name': 'Test'}", encoding='utf-8')
+        (tmp_path / module / 'views' / 'views.xml').write_text(document, encoding='utf-8')
+
+
+def test_build_and_get_inherited_attributes(tmp_path):
+    write_modules(tmp_path, '<attribute name="attrs"/>')
+    view_index = ViewIndex()
+    view_index.build(
+        [str(tmp_path / module / '__manifest__.py') for module in ('sale', 'sale_extra')],
+        [str(tmp_path / module / 'views' / 'views.xml') for module in ('sale', 'sale_extra')],
+    )
+    assert set(view_index.views) == {'sale.view_order_form', 'sale_extra.view_order_form_extra'}
+    extra_file = str(tmp_path / 'sale_extra' / 'views' / 'views.xml')
+    module = view_index.get_module(extra_file)
+    assert module == 'sale_extra'
+    attribute_tag = etree.parse(extra_file).find('.//attribute')
+    assert get_inherited_attributes(view_index, module, attribute_tag) == {
+        'attrs': "{'readonly': [('state', '!=', 'draft')]}", 'states': 'draft,sent',
+    }
+    assert get_inherited_attributes(None, module, attribute_tag) is None
+
+
+def test_override_resolved_by_main(tmp_path, monkeypatch):
+    monkeypatch.setattr(views, 'VIEW_INDEX', ViewIndex())
+    write_modules(tmp_path, """<attribute name="attrs">{'invisible': [('state', '=', 'done')]}</attribute>""")
+    assert main([str(tmp_path), '--yes', '--no-cache']) == 0
+    attributes = {tag.get('name'): tag.text for tag in etree.parse(str(tmp_path / 'sale_extra' / 'views' / 'views.xml')).iter('attribute')}
+    # Combined with the states of the parent view (state == 'done' being implied by them), and the readonly condition
+    # of its attrs is removed
+    assert attributes == {'invisible': "state not in ['draft', 'sent']", 'readonly': None}
+    assert len(views.VIEW_INDEX.views) == 2
+
+
+def test_index_rebuilt_by_each_run(tmp_path, monkeypatch):
+    monkeypatch.setattr(views, 'VIEW_INDEX', ViewIndex())
+    write_modules(tmp_path / 'first', '<attribute name="required">1</attribute>')
+    assert main([str(tmp_path / 'first'), '--yes', '--no-cache']) == 0
+    assert len(views.VIEW_INDEX.views) == 2
+    # Only the views of the root directory of the run
+    (tmp_path / 'second' / 'module' / 'views').mkdir(parents=True)
+    (tmp_path / 'second' / 'module' / '__manifest__.py').write_text("{'name': 'Test'}", encoding='utf-8')
+    (tmp_path / 'second' / 'module' / 'views' / 'views.xml').write_text(BASE_VIEW, encoding='utf-8')
+    assert main([str(tmp_path / 'second'), '--yes', '--no-cache']) == 0
+    assert set(views.VIEW_INDEX.views) == {'module.view_order_form'}
+    assert main([str(tmp_path / 'first'), '--yes', '--no-cache', '--no-view-index']) == 0
+    assert not views.VIEW_INDEX.views
@@ -0,0 +1,155 @@
+"""
+Tests of the watch mode
+"""
+import os
+
+import pytest
+
+from attrs_converter import watch
+from attrs_converter.cli import main
+from attrs_converter.watch import InotifyWatcher, PollingWatcher, watch_files
+
+VIEW = """<odoo>
+    <record id="view_form" model="ir.ui.view">
+        <field name="arch" type="xml">
+            <form>
+                <field name="name" attrs="{'invisible': [('state', '=', 'draft')]}"/>
+            </form>
+        </field>
+    </record>
+</odoo>
+"""
+
+
+class ScriptedWatcher:
+    """
+    Watcher returning the given changes, one per call of wait(), then stopping the watch like Ctrl+C
+    """
+
+    def __init__(self, changes):
+        self.changes = list(changes)
+        self.timeouts = []
+        self.closed = False
+
+    def wait(self, timeout=None):
+        self.timeouts.append(timeout)
+        if not self.changes:
+            raise KeyboardInterrupt
+        changes = self.changes.pop(0)
+        return changes() if callable(changes) else changes
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def root_dir(tmp_path):
+    (tmp_path / 'module' / 'views').mkdir(parents=True)
+    for name in ('a.xml', 'b.xml'):
+        (tmp_path / 'module' / 'views' / name).write_text(VIEW)
+    (tmp_path / 'module' / '__manifest__.py').write_text("{'name': 'Module'}\n")
+    (tmp_path / 'node_modules').mkdir()
+    (tmp_path / 'node_modules' / 'c.xml').write_text(VIEW)
+    return tmp_path
+
+
+def run_watch(monkeypatch, root_dir, changes, on_change=None):
+    watcher = ScriptedWatcher(changes)
+    monkeypatch.setattr(watch, 'PollingWatcher', lambda root, exclude: watcher)
+    calls = []
+
+    def record_change(files):
+        calls.append([(os.path.relpath(file_path, root_dir), role) for file_path, role in files])
+        if on_change is not None:
+            on_change(files)
+    watch_files(str(root_dir), [], record_change, poll=True)
+    assert watcher.closed
+    return watcher, calls
+
+
+def test_debounce(root_dir, monkeypatch):
+    views = root_dir / 'module' / 'views'
+    watcher, calls = run_watch(monkeypatch, root_dir, [
+        {str(views / 'a.xml')},
+        # The burst of changes is collected until no other change is reported within WATCH_DEBOUNCE
+        {str(views / 'b.xml')},
+        {str(views / 'a.xml'), str(root_dir / 'module' / '__manifest__.py'), str(root_dir / 'README.md')},
+        set(),
+    ])
+    # Processed at once, without the files that don't exist anymore
+    assert calls == [[('module/__manifest__.py', 'manifest'), ('module/views/a.xml', 'view_xml'), ('module/views/b.xml', 'view_xml')]]
+    assert watcher.timeouts[:4] == [None, watch.WATCH_DEBOUNCE, watch.WATCH_DEBOUNCE, watch.WATCH_DEBOUNCE]
+
+
+def test_debounce_max_delay(root_dir, monkeypatch):
+    views = root_dir / 'module' / 'views'
+    monkeypatch.setattr(watch, 'WATCH_MAX_DELAY', 0)
+    # Files that keep changing are processed without waiting for the end of the burst
+    _watcher, calls = run_watch(monkeypatch, root_dir, [{str(views / 'a.xml')}, {str(views / 'b.xml')}])
+    assert calls == [[('module/views/a.xml', 'view_xml')], [('module/views/b.xml', 'view_xml')]]
+
+
+def test_lost_changes(root_dir, monkeypatch):
+    # All the files are checked when the changes overflowed the queue of the kernel
+    _watcher, calls = run_watch(monkeypatch, root_dir, [None])
+    assert calls == [[('module/__manifest__.py', 'manifest'), ('module/views/a.xml', 'view_xml'), ('module/views/b.xml', 'view_xml')]]
+
+
+def test_own_writes_ignored(root_dir, monkeypatch):
+    view_file = root_dir / 'module' / 'views' / 'a.xml'
+
+    def edit():
+        view_file.write_text(VIEW + '<!-- Edited -->\n')
+        return {str(view_file)}
+
+    _watcher, calls = run_watch(monkeypatch, root_dir, [
+        {str(view_file)}, set(),
+        # Written by on_change
+        {str(view_file)}, set(),
+        # Then edited
+        edit, set(),
+    ], on_change=lambda files: view_file.write_text(VIEW.replace('attrs=', 'data-attrs=')))
+    assert calls == [[('module/views/a.xml', 'view_xml')], [('module/views/a.xml', 'view_xml')]]
+
+
+def test_polling_watcher(root_dir):
+    watcher = PollingWatcher(str(root_dir), ['module/__manifest__.py'], interval=0)
+    assert watcher.wait() == set()
+    (root_dir / 'module' / 'views' / 'a.xml').write_text(VIEW + '\n')
+    (root_dir / 'module' / 'views' / 'd.xml').write_text(VIEW)
+    (root_dir / 'module' / '__manifest__.py').write_text("{'name': 'Module', 'version': '1.0'}\n")
+    (root_dir / 'node_modules' / 'c.xml').write_text(VIEW + '\n')
+    assert watcher.wait() == {str(root_dir / 'module' / 'views' / 'a.xml'), str(root_dir / 'module' / 'views' / 'd.xml')}
+
+
+def test_inotify_watcher(root_dir):
+    try:
+        watcher = InotifyWatcher(str(root_dir), watch.IGNORED_GLOBS)
+    except (OSError, AttributeError, TypeError) as e:
+        pytest.skip(f"inotify isn't available: {e}")
+    try:
+        assert watcher.wait(0) == set()
+        (root_dir / 'module' / 'views' / 'a.xml').write_text(VIEW + '\n')
+        (root_dir / 'node_modules' / 'c.xml').write_text(VIEW + '\n')
+        # The files of a new directory are reported, even when they are written before it's watched
+        (root_dir / 'module' / 'data').mkdir()
+        (root_dir / 'module' / 'data' / 'data.xml').write_text(VIEW)
+        changed_files = set()
+        while changes := watcher.wait(0.5):
+            changed_files |= changes
+        assert changed_files == {str(root_dir / 'module' / 'views' / 'a.xml'), str(root_dir / 'module' / 'data' / 'data.xml')}
+    finally:
+        watcher.close()
+
+
+def test_main_watch(root_dir, monkeypatch, capsys):
+    views = root_dir / 'module' / 'views'
+
+    def watch_changes(root, exclude, on_change, poll=False):
+        assert not poll
+        (views / 'b.xml').write_text(VIEW.replace("'draft'", "'done'"))
+        on_change([(str(views / 'b.xml'), 'view_xml')])
+    monkeypatch.setattr('attrs_converter.cli.watch_files', watch_changes)
+    assert main([str(root_dir / 'module'), '--yes', '--watch', '--no-cache']) == 0
+    assert '''invisible="state == 'done'"''' in (views / 'b.xml').read_text()
+    assert 'Processed 1 changed files in ' in capsys.readouterr().out